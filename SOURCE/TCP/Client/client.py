@@ -7,6 +7,30 @@ import time
 import ipaddress
 import sys
 import struct
+import argparse
+import zlib
+import hashlib
+import fnmatch
+import itertools
+import asyncio
+import functools
+import contextlib
+import random
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from common.protocol import (FRAME_HELLO, FRAME_GET, FRAME_STAT, FRAME_DELTA, FRAME_PACK, FRAME_CLOSE,
+                             FRAME_DATA, FRAME_SHUTDOWN, FRAME_MUX, FRAME_WINDOW, FRAME_BLOCKS, FRAME_TRACE, FRAME_GOAWAY, FRAME_PEERS, FRAME_HAVE, FRAME_HEADER, FLAG_END, STATUS_OK,
+                             STATUS_NOT_FOUND, FILE_STAT, NAME_LENGTH, BLOCK_LIST, BLOCK_DIGEST_SIZE, FrameReader, GoAway, ProtocolError, ResponseError,
+                             read_frame, read_header, send_frame, recv_exact, recv_into)
+from common.progress import ProgressTracker
+from common.storage import is_safe_name
+from common.blockstore import BlockStore, hash_blocks
+from common.tracing import TRACER
+from common.profiling import profiled
+from common.tuning import TUNING_MODES, ReceiveMeter, SocketTuner
+from common.swarm import PIECE_SIZE, PeerServer, PieceMap, SharedFile, has_piece
+from common.streaming import DownloadStream, OrderedBuffer, StreamSink
+from common.writer import BufferPool, WriterPool, open_direct, write_direct
 
 # Cấu hình mạng
 SERVER_HOST = None
@@ -16,6 +40,50 @@ DOWNLOAD_DIR = "downloads"
 PART_STORAGE = "bin"
 CHAR_ENCODING = "utf-8"  # Bộ mã hóa ký tự
 INPUT_TXT = "input.txt"
+MIRRORS = []  # Các mirror phụ (host, port) phục vụ cùng catalog với server chính
+CONNECTIONS_PER_MIRROR = 4  # Số kết nối song song tới mỗi mirror
+RANGE_SIZE = 1024 * 1024  # Kích thước range lớn nhất giao cho một kết nối (1MB)
+MIN_RANGE_SIZE = 64 * 1024  # Range nhỏ nhất giao cho mirror chậm
+MAX_MIRROR_FAILURES = 3  # Số lần lỗi liên tiếp trước khi bỏ qua một mirror
+SOCKET_TIMEOUT = 5  # Thời gian chờ dữ liệu trên kết nối tải (giây)
+PIPELINE_DEPTH = 2  # Số range gửi yêu cầu trước trên mỗi kết nối (pipelining)
+MULTIPLEX = False  # Tải mọi range của một mirror qua một kết nối multiplex thay vì nhiều kết nối
+MUX_STREAMS = 8  # Số range truyền xen kẽ cùng lúc trên kết nối multiplex
+MUX_WINDOW = 256 * 1024  # Credit ban đầu của mỗi stream; cấp lại khi đã nhận một nửa
+DELTA_SYNC = False  # Đồng bộ lại file đã tải khi file trên server thay đổi
+DELTA_BLOCK_SIZE = 64 * 1024  # Kích thước block khi tính chữ ký cho delta sync
+DELTA_SIGNATURE = struct.Struct(">I16s")  # Checksum cuộn adler32 + blake2b 16 byte của mỗi block
+DELTA_OP = struct.Struct(">BQQ")  # Lệnh delta: loại, tham số 1, tham số 2
+DELTA_COPY, DELTA_DATA, DELTA_END = 0, 1, 2
+BATCH_FILE_SIZE = 256 * 1024  # File không lớn hơn ngưỡng này được gộp vào container PACK
+BATCH_MAX_FILES = 1000  # Số file tối đa trong một container
+BATCH_MAX_BYTES = 64 * 1024 * 1024  # Tổng kích thước tối đa của một container
+PACK_MAGIC = b"SPK1"
+PACK_ENTRY = struct.Struct(">qQ")  # Kích thước (-1 nếu không có), mtime (ns)
+PACK_TRAILER = struct.Struct(">BI")  # Trạng thái, crc32 của nội dung
+PACK_OK, PACK_MISSING, PACK_CHANGED = 0, 1, 2
+QUIET = False  # Không vẽ thanh tiến trình (chạy không có terminal)
+BLOCK_DEDUP = False  # Lấy hash block từ server và dùng lại block đã có trong các file đã tải
+BLOCK_INDEX = "block_index.json"  # Chỉ mục hash block của các file đã tải
+MAX_LISTED_FILES = 50  # Số file tối đa in ra khi hiển thị danh sách trên server
+PROFILE_FILE = None  # Profile mọi luồng và ghi <file>.pstats (và <file>.collapsed) khi thoát, None = tắt
+PROFILE_MODE = "cpu"  # cpu / wall: cProfile mọi luồng theo thời gian CPU / thời gian thực; sample: lấy mẫu stack
+TRACE_FILE = None  # Ghi span các pha tải ra file Chrome trace JSON khi thoát, None = tắt tracing
+SOCKET_TUNING = "auto"  # auto: buffer nhận theo BDP (RTT lúc kết nối x thông lượng đo được); off: mặc định của kernel
+SOCKET_BUFFER = None  # Cố định SO_RCVBUF của các kết nối (bytes) thay vì tính theo BDP, None = tự động
+SWARM = False  # Tải cả từ các client khác (peer do server làm tracker giới thiệu) và phục vụ lại các piece đã tải
+PEER_PORT = 0  # Cổng phục vụ piece cho các peer khác, 0 = cổng bất kỳ
+SEED_TIME = 0  # Chế độ batch swarm: tiếp tục phục vụ các file đã tải chừng này giây trước khi thoát
+MAX_SWARM_PEERS = 8  # Số peer tải cùng lúc tối đa cho mỗi file
+PEER_CONNECTIONS = 1  # Số kết nối tới mỗi peer
+HAVE_INTERVAL = 0.5  # Chu kỳ hỏi các peer đã có thêm piece nào (giây)
+TRACKER_INTERVAL = 2  # Chu kỳ báo tracker và lấy thêm peer (giây)
+STREAM_WINDOW = 32 * 1024 * 1024  # Chế độ stream: chỉ tải trước chừng này byte tính từ vị trí đã đọc
+WRITER_THREADS = 4  # Số luồng ghi part file tách khỏi luồng nhận, 0 = ghi ngay trong luồng nhận
+WRITE_QUEUE_DEPTH = 16  # Số lần ghi chờ tối đa của mỗi luồng ghi
+WRITE_BUFFERS = 32  # Số buffer nhận (mỗi buffer RANGE_SIZE) dùng lại giữa các range; hết thì luồng nhận chờ ghi
+DIRECT_IO = False  # Ghi part file của file lớn bằng O_DIRECT (bỏ qua page cache) khi range căn theo khối
+DIRECT_IO_MIN_SIZE = 1024 * 1024 * 1024  # File từ kích thước này trở lên mới ghi O_DIRECT
 dot_progress = 0
 
 def get_server_ip():
@@ -50,6 +118,20 @@ def get_server_port():
         except KeyboardInterrupt:
             sys.exit(1)
 
+def parse_endpoint(value):
+    """
+    Phân tích chuỗi "host:port" thành tuple (host, port).
+    """
+    host, _, port = value.rpartition(":")
+    try:
+        ipaddress.ip_address(host)
+        port = int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Endpoint không hợp lệ: {value}")
+    if not 1024 <= port <= 65535:
+        raise argparse.ArgumentTypeError("Cổng phải nằm trong khoảng từ 1024 đến 65535.")
+    return host, port
+
 def format_size_file(size_bytes):
     """
     Chuyển đổi kích thước file từ bytes sang KB, MB, hoặc GB phù hợp.
@@ -65,37 +147,329 @@ def format_size_file(size_bytes):
     else:
         return f"{size_bytes}B"
     
-def scan_downloaded_files():
+def local_path(directory, filename):
+    """
+    Đường dẫn cục bộ cho tên file dạng "thư_mục/con/file" trong catalog,
+    từ chối tên tuyệt đối hoặc có ".." để không ghi ra ngoài thư mục.
+    """
+    if not is_safe_name(filename):
+        raise ValueError(f"Unsafe file name: {filename}")
+    return os.path.join(directory, *filename.split("/"))
+
+def is_glob_pattern(line):
+    """
+    Kiểm tra dòng trong input.txt có phải mẫu glob (*, ?, [...]) hay không.
+    """
+    return any(char in line for char in "*?[")
+
+def scan_downloaded_files(download_dir):
     """
-    Quét tất cả các file trong thư mục downloads để kiểm tra file đã tải xong.
+    Quét đệ quy thư mục downloads để kiểm tra file đã tải xong.
     """
     downloaded_files = set()
-    if not os.path.exists(DOWNLOAD_DIR):
-        print(f"Lỗi: Thư mục '{DOWNLOAD_DIR}' không tồn tại.")
+    if not os.path.exists(download_dir):
+        print(f"Lỗi: Thư mục '{download_dir}' không tồn tại.")
         sys.exit(1)  # Exit the program if the directory does not exist
     
-    if not os.access(DOWNLOAD_DIR, os.R_OK):
-        print(f"Lỗi: Không thể truy cập vào thư mục '{DOWNLOAD_DIR}'.")
+    if not os.access(download_dir, os.R_OK):
+        print(f"Lỗi: Không thể truy cập vào thư mục '{download_dir}'.")
         sys.exit(1)  # Exit the program if the directory is not accessible
     
-    for filename in os.listdir(DOWNLOAD_DIR):
-        file_path = os.path.join(DOWNLOAD_DIR, filename)
-        if os.path.isfile(file_path):
-            downloaded_files.add(filename)
+    for directory, _, filenames in os.walk(download_dir):
+        for filename in filenames:
+            file_path = os.path.join(directory, filename)
+            downloaded_files.add(os.path.relpath(file_path, download_dir).replace(os.sep, "/"))
     return downloaded_files
 
+def apply_delta(reader, old_file, new_file, block_size):
+    """
+    Dựng bản mới vào `new_file` từ bản cũ `old_file` và các lệnh COPY/DATA đọc từ `reader` (read_exact).
+    Trả về (digest của bản vừa dựng, digest server gửi kèm lệnh END).
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    while True:
+        op, first, second = DELTA_OP.unpack(reader.read_exact(DELTA_OP.size))
+        if op == DELTA_COPY:
+            old_file.seek(first * block_size)
+            remaining = second * block_size
+            while remaining > 0:
+                data = old_file.read(min(remaining, CHUNK_SIZE))
+                if not data:
+                    raise ValueError("Local copy is shorter than its signatures")
+                new_file.write(data)
+                digest.update(data)
+                remaining -= len(data)
+        elif op == DELTA_DATA:
+            remaining = first
+            while remaining > 0:
+                data = reader.read_exact(min(remaining, CHUNK_SIZE))
+                new_file.write(data)
+                digest.update(data)
+                remaining -= len(data)
+        else:
+            return digest.digest(), reader.read_exact(32)
+
+class Mirror:
+    """
+    Một endpoint phục vụ file và thống kê thông lượng của nó trong một lần tải.
+    """
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.bytes_received = 0
+        self.rate = None  # Thông lượng mỗi kết nối ước lượng theo EWMA (bytes/s)
+        self.failures = 0  # Số lần lỗi liên tiếp
+        self.alive = True
+        self.pieces = None  # Bitmap các piece peer đang có (chế độ swarm), None = có cả file (server, mirror)
+
+    def record(self, nbytes, elapsed):
+        """
+        Cập nhật thông lượng sau khi nhận xong một range.
+        """
+        self.bytes_received += nbytes
+        self.failures = 0
+        if elapsed > 0:
+            sample = nbytes / elapsed
+            self.rate = sample if self.rate is None else 0.7 * self.rate + 0.3 * sample
+
+    def __str__(self):
+        return f"{self.host}:{self.port}"
+
+class RangeScheduler:
+    """
+    Chia 4 part của file thành các range và giao cho các mirror theo thông lượng đo được:
+    mirror nhanh nhận range lớn, mirror chậm nhận range nhỏ và nhường phần cuối cho mirror nhanh.
+    Range của mirror bị lỗi được trả lại hàng đợi cho mirror khác (failover).
+    """
+    def __init__(self, part_bounds, mirrors, ranges=None):
+        # Mặc định tải toàn bộ các part; `ranges` (part, start, end) chỉ định riêng các đoạn cần tải
+        if ranges is None:
+            ranges = [(part, start, end) for part, (start, end) in enumerate(part_bounds)]
+        self.pending = [(part, start, end) for part, start, end in ranges if end > start]
+        self.mirrors = mirrors
+        self.in_flight = 0
+        self.retries = 0  # Số lần range được trả lại hàng đợi để tải lại
+        self.aborted = False
+        self.cond = threading.Condition()
+
+    def range_size_for(self, mirror):
+        """
+        Tính kích thước range cho mirror, trả về None nếu mirror nên nhường phần còn lại.
+        """
+        rates = [m.rate for m in self.mirrors if m.alive and m.rate]
+        if mirror.rate is None or not rates:
+            return RANGE_SIZE
+
+        fastest = max(rates)
+        # Làm tròn theo khối 4KB để range vẫn căn khối khi ghi O_DIRECT
+        size = max(MIN_RANGE_SIZE, int(RANGE_SIZE * mirror.rate / fastest) // 4096 * 4096)
+        if mirror.rate < fastest:
+            # Nếu mirror nhanh nhất tự tải hết phần còn lại còn sớm hơn, mirror chậm đứng chờ
+            remaining = sum(end - start for _, start, end in self.pending)
+            if size / mirror.rate > remaining / (fastest * CONNECTIONS_PER_MIRROR):
+                return None
+        return size
+
+    def take(self, mirror, block=True):
+        """
+        Lấy range tiếp theo cho mirror; trả về None khi đã hết việc hoặc mirror không còn dùng được.
+        Với block=False trả về None ngay thay vì chờ range bị trả lại.
+        """
+        with self.cond:
+            while True:
+                if self.aborted or not mirror.alive:
+                    return None
+                if not self.pending:
+                    if self.in_flight == 0 or not block:
+                        return None
+                    self.cond.wait(0.5)  # Chờ range bị trả lại từ mirror lỗi
+                    continue
+
+                size = self.range_size_for(mirror)
+                index = None if size is None else self.select(mirror)
+                if index is None:
+                    if not block:
+                        return None
+                    self.cond.wait(0.5)
+                    continue
+
+                part, start, end = self.pending[index]
+                if end - start <= size:
+                    self.pending.pop(index)
+                else:
+                    self.pending[index] = (part, start + size, end)
+                    end = start + size
+                self.in_flight += 1
+                return part, start, end
+
+    def select(self, mirror):
+        """
+        Chọn range trong hàng đợi cho mirror (chỉ số trong self.pending), None nếu mirror phải chờ.
+        Ưu tiên part còn nhiều dữ liệu nhất để các part tiến triển đều.
+        """
+        return max(range(len(self.pending)), key=lambda i: self.pending[i][2] - self.pending[i][1])
+
+    def complete(self, mirror, nbytes, elapsed, task=None):
+        with self.cond:
+            self.in_flight -= 1
+            mirror.record(nbytes, elapsed)
+            self.cond.notify_all()
+
+    def fail(self, mirror, task=None, received=0, fatal=False):
+        """
+        Ghi nhận lỗi của mirror và trả phần chưa nhận của range về hàng đợi.
+        """
+        with self.cond:
+            if task is not None:
+                part, start, end = task
+                self.in_flight -= 1
+                if start + received < end:
+                    self.pending.append((part, start + received, end))
+                    self.retries += 1
+            mirror.failures += 1
+            if fatal or mirror.failures >= MAX_MIRROR_FAILURES:
+                mirror.alive = False
+            self.cond.notify_all()
+
+    def release(self, task, received=0):
+        """
+        Trả phần chưa nhận của range về hàng đợi mà không tính là lỗi của mirror
+        (các range đã gửi trước trên kết nối vừa bị lỗi).
+        """
+        with self.cond:
+            part, start, end = task
+            self.in_flight -= 1
+            if start + received < end:
+                self.pending.append((part, start + received, end))
+                self.retries += 1
+            self.cond.notify_all()
+
+    def abort(self):
+        with self.cond:
+            self.aborted = True
+            self.cond.notify_all()
+
+    def finished(self):
+        with self.cond:
+            return not self.pending and self.in_flight == 0 and not self.aborted
+
+
+class SwarmScheduler(RangeScheduler):
+    """
+    Scheduler của chế độ swarm: range được cắt theo piece và xáo trộn để các client lấy từ server các piece khác nhau.
+    Peer chỉ nhận piece nó đã có (piece ít peer có nhất trước); server và mirror chỉ nhận piece chưa peer nào có,
+    nên server là nguồn cuối cùng. Piece đã ghi xong được đánh dấu trong `pieces` để phục vụ lại cho peer khác.
+    """
+    def __init__(self, part_bounds, mirrors, file_size):
+        ranges = []
+        for part, (start, end) in enumerate(part_bounds):
+            for piece_start in range(start - start % PIECE_SIZE, end, PIECE_SIZE):
+                ranges.append((part, max(start, piece_start), min(end, piece_start + PIECE_SIZE)))
+        random.shuffle(ranges)
+        super().__init__(part_bounds, mirrors, ranges)
+        self.pieces = PieceMap(file_size)
+
+    def range_size_for(self, mirror):
+        # Mỗi lần một piece: mirror chậm không nhường phần còn lại vì peer chỉ tải được piece nó có
+        return PIECE_SIZE
+
+    def holders(self, index):
+        return sum(1 for mirror in self.mirrors if mirror.alive and mirror.pieces is not None
+                   and has_piece(mirror.pieces, index))
+
+    def select(self, mirror):
+        candidates = [i for i, (_, start, _) in enumerate(self.pending)
+                      if mirror.pieces is None or has_piece(mirror.pieces, start // PIECE_SIZE)]
+        if mirror.pieces is None:
+            return next((i for i in candidates if not self.holders(self.pending[i][1] // PIECE_SIZE)), None)
+        if not candidates:
+            return None
+        return min(candidates, key=lambda i: self.holders(self.pending[i][1] // PIECE_SIZE))
+
+    def reachable(self):
+        """
+        Còn tải được phần còn lại không: có range đang tải, có mirror còn sống hoặc peer có piece còn thiếu.
+        """
+        with self.cond:
+            return (self.in_flight > 0 or any(mirror.alive and mirror.pieces is None for mirror in self.mirrors)
+                    or any(self.holders(start // PIECE_SIZE) for _, start, _ in self.pending))
+
+    def add_peer(self, mirror):
+        with self.cond:
+            self.mirrors.append(mirror)
+
+    def update_peer(self, mirror, pieces):
+        with self.cond:
+            mirror.pieces = pieces
+            self.cond.notify_all()
+
+    def complete(self, mirror, nbytes, elapsed, task=None):
+        if task is not None:
+            self.pieces.add(task[1], task[2])
+        super().complete(mirror, nbytes, elapsed, task)
+
+    def fail(self, mirror, task=None, received=0, fatal=False):
+        if task is not None and received:
+            self.pieces.add(task[1], task[1] + received)
+        super().fail(mirror, task, received, fatal)
+
+    def release(self, task, received=0):
+        if received:
+            self.pieces.add(task[1], task[1] + received)
+        super().release(task, received)
+
+
+class StreamScheduler(RangeScheduler):
+    """
+    Scheduler của chế độ stream: giao range theo thứ tự offset và chỉ những range bắt đầu trong cửa sổ
+    của bộ đệm (buffer.limit()); người đọc chậm thì các luồng tải đứng chờ thay vì giữ cả file trong bộ nhớ.
+    """
+    def __init__(self, part_bounds, mirrors, buffer):
+        super().__init__(part_bounds, mirrors)
+        self.buffer = buffer
+
+    def select(self, mirror):
+        index = min(range(len(self.pending)), key=lambda i: self.pending[i][1])
+        return index if self.pending[index][1] < self.buffer.limit() else None
+
+    def wake(self):
+        """
+        Người đọc vừa lấy dữ liệu: cửa sổ trượt lên, các luồng đang chờ được giao range mới.
+        """
+        with self.cond:
+            self.cond.notify_all()
+
 class Client:
     """
-    Client tải file từ server theo từng chunk.
+    Client tải file từ server theo từng chunk. Mặc định dùng cấu hình của module (SERVER_HOST, MIRRORS,
+    DOWNLOAD_DIR, ...); `interactive=False` khi dùng như thư viện: không hỏi lại IP/cổng khi kết nối lỗi,
+    không bắt SIGINT, không vẽ thanh tiến trình.
     """
-    def __init__(self):
+    def __init__(self, server=None, mirrors=None, download_dir=None, part_dir=None, interactive=True):
+        self.server = server or (SERVER_HOST, SERVER_PORT)  # (host, port) của server chính
+        self.mirrors = list(MIRRORS if mirrors is None else mirrors)  # Các mirror phụ
+        self.download_dir = download_dir or DOWNLOAD_DIR
+        self.part_dir = part_dir or PART_STORAGE  # Nơi chứa các file part khi đang tải
+        self.interactive = interactive
+        self.quiet = QUIET or not interactive
         self.server_files = {}       # Danh sách file từ server
-        self.downloaded_files = scan_downloaded_files() # File đã tải xong
+        self.downloaded_files = scan_downloaded_files(self.download_dir) # File đã tải xong
         self.is_connected = True
-        self.progress = {}
         self.client_socket = None
-        self.print_lock = threading.Lock()
-        signal.signal(signal.SIGINT, self.handle_breaking)
+        self.requested_files = []  # Các file được yêu cầu trong input.txt
+        self.last_sync_stats = None  # Thống kê lần delta sync gần nhất
+        self.last_dedup_stats = None  # Số byte tải về / dùng lại của lần tải có dedup gần nhất
+        self.block_store = BlockStore(self.download_dir, BLOCK_INDEX) if BLOCK_DEDUP else None
+        self.request_ids = itertools.count(1)  # Mã yêu cầu để ghép phản hồi khi pipelining
+        self.tuner = SocketTuner(SOCKET_TUNING, SOCKET_BUFFER)  # Buffer nhận theo BDP của từng mirror
+        self.bytes_received = 0  # Tổng số byte dữ liệu file đã nhận qua mạng
+        self.retries = 0  # Tổng số range phải tải lại (lỗi kết nối, mirror lỗi, server drain)
+        self.peer_server = PeerServer(port=PEER_PORT).start() if SWARM else None  # Phục vụ piece cho các peer khác
+        self.buffers = BufferPool(RANGE_SIZE, WRITE_BUFFERS)  # Buffer nhận range dùng lại
+        self.writer = WriterPool(WRITER_THREADS, WRITE_QUEUE_DEPTH)  # Ghi part file tách khỏi luồng nhận
+        self.direct_files = {}  # Part file -> fd O_DIRECT (DIRECT_IO)
+        if interactive:
+            signal.signal(signal.SIGINT, self.handle_breaking)
 
     def handle_breaking(self, signum, frame):
         """
@@ -116,21 +490,19 @@ class Client:
             # Tạo socket nếu chưa tồn tại
             if not self.client_socket:
                 self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                self.client_socket.connect((SERVER_HOST, SERVER_PORT))
+                started = time.monotonic()
+                with TRACER.span("connect", transfer=0):
+                    self.client_socket.connect(self.server)
+                connected = time.monotonic()
                 self.client_socket.settimeout(5)
                 print("Connected to server.")
 
-                # Nhận danh sách file từ server
-                header = self.client_socket.recv(8)
-                if not header:
-                    return False
-                    
-                # Giải mã độ dài từ header
-                data_length = struct.unpack(">Q", header)[0]
-                
-                # Nhận toàn bộ dữ liệu dựa trên độ dài đã giải mã
-                self.server_files = json.loads(self.client_socket.recv(data_length).decode(CHAR_ENCODING))
-                self.print_available_files()
+                # Nhận danh sách file từ server (frame HELLO)
+                with TRACER.span("file_list", transfer=0):
+                    self.server_files = self.read_catalog(self.client_socket)
+                self.tune_socket(self.client_socket, self.server, started, connected)
+                if self.interactive:
+                    self.print_available_files()
             
             # Kết nối thành công và không có ngoại lệ
             # Hoặc đã có socket rồi
@@ -140,10 +512,13 @@ class Client:
             if self.client_socket:
                 self.client_socket.close()
                 self.client_socket = None
+            if not self.interactive:
+                return False
                 
             # Cho phép người dùng nhập lại IP/PORT
             SERVER_HOST = get_server_ip()
             SERVER_PORT = get_server_port()
+            self.server = (SERVER_HOST, SERVER_PORT)
             return False
 
         
@@ -153,9 +528,12 @@ class Client:
         """
         print(f"{'-' * 30}")
         print("Available files on the server:")
-        for filename, size in self.server_files.items():
+        for filename, size in list(self.server_files.items())[:MAX_LISTED_FILES]:
             size_readable = format_size_file(size)
             print(f"{filename}: {size_readable}")
+        if len(self.server_files) > MAX_LISTED_FILES:
+            total_size = format_size_file(sum(self.server_files.values()))
+            print(f"... and {len(self.server_files) - MAX_LISTED_FILES} more ({len(self.server_files)} files, {total_size})")
         print(f"{'-' * 30}" + "\n")
     
     def monitor_input(self):
@@ -173,19 +551,34 @@ class Client:
                 return []
             
             with open(INPUT_TXT, 'r') as input_file:
-                files_to_download = input_file.read().strip().split("\n")
+                lines = [line.strip() for line in input_file.read().strip().split("\n")]
+
+            # Mở rộng các dòng glob (vd: "datasets/2024/*.csv") theo catalog của server
+            files_to_download = []
+            invalid_files = []
+            for line in lines:
+                if is_glob_pattern(line):
+                    matches = [f for f in self.server_files if fnmatch.fnmatchcase(f, line)]
+                    files_to_download.extend(matches)
+                    if not matches:
+                        invalid_files.append(line)
+                elif line:
+                    files_to_download.append(line)
+                    if line not in self.server_files:
+                        invalid_files.append(line)
+            files_to_download = list(dict.fromkeys(files_to_download))
+            self.requested_files = files_to_download
 
             new_files_to_download = [f for f in files_to_download 
                                         if f in self.server_files 
                                         and f not in self.downloaded_files]
             
-            invalid_files = [f for f in files_to_download
-                                if f not in self.server_files]
-            
             if new_files_to_download:
                 print('-' * 30 + "\nNew files to download:")
-                for filename in new_files_to_download:
+                for filename in new_files_to_download[:MAX_LISTED_FILES]:
                     print(filename)
+                if len(new_files_to_download) > MAX_LISTED_FILES:
+                    print(f"... and {len(new_files_to_download) - MAX_LISTED_FILES} more")
                 print('-' * 30)
             else:
                 print('-' * 30 + "\nFiles not found on the server:")
@@ -198,118 +591,915 @@ class Client:
             print(f"Error monitoring input.txt: {e}")
             return []
         
-    def print_progress(self, filename, chunk_id, progress_percent):
+    def get_endpoints(self):
         """
-        In tiến trình tải file.
+        Danh sách endpoint dùng để tải: server chính và các mirror phụ.
         """
-        with self.print_lock:
-            self.progress[f"{filename}_part_{chunk_id}"] = progress_percent
-            
-            # Xử lý in thông tin tiến trình đầu tiên
-            if chunk_id == 0 and progress_percent == 0:
-                print('\n' * 4)
+        endpoints = [self.server]
+        endpoints += [mirror for mirror in self.mirrors if mirror not in endpoints]
+        return endpoints
+
+    def read_catalog(self, sock):
+        """
+        Đọc frame HELLO server gửi khi kết nối, trả về catalog {tên file: kích thước}.
+        """
+        frame = read_frame(sock)
+        if frame.type != FRAME_HELLO:
+            raise ProtocolError(f"Expected HELLO frame, got {frame.type}")
+        return json.loads(frame.payload.decode(CHAR_ENCODING))
+
+    def send_request(self, sock, frame_type, payload=b"", offset=0, length=0):
+        """
+        Gửi một yêu cầu với mã yêu cầu mới, trả về mã đó để ghép với phản hồi.
+        """
+        request_id = next(self.request_ids)
+        send_frame(sock, frame_type, request_id, offset, length, payload)
+        return request_id
+
+    def tune_socket(self, sock, endpoint, started, connected):
+        """
+        Đặt buffer nhận của kết nối vừa mở theo BDP của endpoint. Bắt tay TCP (`started` -> `connected`) và chờ
+        HELLO (server gửi ngay khi accept) đều mất khoảng một RTT; qua proxy chỉ lần chờ HELLO thấy đủ đường đi.
+        """
+        self.tuner.connected(sock, endpoint, max(connected - started, time.monotonic() - connected))
+
+    def open_server_socket(self, host, port):
+        """
+        Mở kết nối phụ tới server, trả về socket và danh sách file server gửi khi kết nối.
+        """
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            started = time.monotonic()
+            with TRACER.span("connect", host=f"{host}:{port}"):
+                server_socket.connect((host, port))
+            connected = time.monotonic()
+            server_socket.settimeout(SOCKET_TIMEOUT)
+            server_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with TRACER.span("file_list"):
+                catalog = self.read_catalog(server_socket)
+            self.tune_socket(server_socket, (host, port), started, connected)
+            # Cho server biết kết nối thuộc lần tải nào để ghép span hai phía
+            if TRACER.transfer():
+                send_frame(server_socket, FRAME_TRACE, offset=TRACER.transfer())
+            return server_socket, catalog
+        except Exception:
+            server_socket.close()
+            raise
+
+    def open_range_socket(self, mirror, filename, file_size):
+        """
+        Mở kết nối tải range tới mirror và kiểm tra mirror có cùng phiên bản file.
+        """
+        range_socket, mirror_files = self.open_server_socket(mirror.host, mirror.port)
+        if mirror_files.get(filename) != file_size:
+            self.close_range_socket(range_socket)
+            raise FileNotFoundError(f"{filename} is missing or differs on mirror {mirror}")
+        return range_socket
+
+    def close_range_socket(self, range_socket):
+        try:
+            send_frame(range_socket, FRAME_CLOSE)
+        except OSError:
+            pass
+        finally:
+            range_socket.close()
+
+    def request_range(self, range_socket, filename, offset, size):
+        """
+        Gửi yêu cầu một range (không chờ phản hồi), trả về mã yêu cầu.
+        """
+        return self.send_request(range_socket, FRAME_GET, filename.encode(CHAR_ENCODING), offset, size)
+
+    def receive_data(self, range_socket, buffers, on_progress):
+        """
+        Nhận phản hồi range tiếp theo vào buffer của yêu cầu tương ứng (`buffers`: mã yêu cầu -> buffer),
+        trả về mã yêu cầu đã nhận.
+        """
+        frame_type, _, status, request_id, _, _, payload_length = read_header(range_socket)
+        if frame_type == FRAME_GOAWAY:
+            raise GoAway(request_id)
+        if frame_type == FRAME_SHUTDOWN:
+            raise ConnectionError("Server is shutting down")
+        if frame_type != FRAME_DATA or request_id not in buffers:
+            raise ProtocolError(f"Unexpected frame {frame_type} for request {request_id}")
+        if status != STATUS_OK:
+            message = recv_exact(range_socket, payload_length).decode(CHAR_ENCODING, "replace")
+            if status == STATUS_NOT_FOUND:
+                raise FileNotFoundError(message)
+            raise ResponseError(status, message)
+
+        # Nhận thẳng vào buffer lấy từ pool (recv_into) thay vì tạo bytes mới cho mỗi lần recv rồi nối vào
+        buffer = buffers[request_id]
+        view = buffer.reserve(payload_length)
+        received = 0
+        try:
+            while received < payload_length:
+                if not self.is_connected:
+                    raise ConnectionError("Download interrupted")
+                nbytes = range_socket.recv_into(view[received:])
+                if not nbytes:
+                    raise ConnectionError("Connection lost")
+                received += nbytes
+                on_progress(request_id, nbytes)
+        finally:
+            # Độ dài buffer luôn là số byte đã nhận được
+            view.release()
+            buffer.length += received
+        return request_id
+
+    def receive_range(self, range_socket, filename, offset, size, buffer, on_progress):
+        """
+        Gửi yêu cầu một range và nhận dữ liệu vào buffer (PooledBuffer).
+        """
+        request_id = self.request_range(range_socket, filename, offset, size)
+        self.receive_data(range_socket, {request_id: buffer}, lambda _, nbytes: on_progress(nbytes))
+        if len(buffer) != size:
+            raise ProtocolError(f"Short range response: {len(buffer)} of {size} bytes")
+
+    def connect_mirror(self, mirror, filename, file_size, scheduler):
+        """
+        Mở kết nối tải range tới mirror; trả về None (đã ghi nhận lỗi vào scheduler) nếu thất bại.
+        """
+        try:
+            return self.open_range_socket(mirror, filename, file_size)
+        except FileNotFoundError as e:
+            print(f"Error: {e}")
+            scheduler.fail(mirror, fatal=True)
+        except Exception as e:
+            scheduler.fail(mirror)
+            if not mirror.alive:
+                print(f"Mirror {mirror} is unreachable: {e}")
             else:
-                print('\033[4F', end='')
-                
-          # In tiến trình tải file
-            for i in range(4):
-                progress_display = self.progress.get(f"{filename}_part_{i}", 0)
-                bar_length = 20  # Độ dài của thanh tiến trình
-                filled_length = int(bar_length * progress_display // 100)
-                bar = '█' * filled_length + ' ' * (bar_length - filled_length)
-                print(f"\033[K{filename} - Part {i+1} {bar} {progress_display:.0f}%")
-    
-    def download_part_file(self, filename, offset, part_size, part_number):
+                time.sleep(0.5)
+        return None
+
+    def download_ranges(self, filename, file_size, mirror, scheduler, part_files, progress=None):
         """
-        Tải một phần của file.
+        Luồng tải: giữ một kết nối tới mirror, gửi trước tối đa PIPELINE_DEPTH range do scheduler giao
+        và nhận phản hồi theo mã yêu cầu.
         """
-        part_file_socket = None
-        retry_count = 0
-        while retry_count < 3:
-            try:
-                part_file_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                part_file_socket.connect((SERVER_HOST, SERVER_PORT))
-                part_file_socket.settimeout(5)
-                
-                # Bỏ qua danh sách file ban đầu
-                header = part_file_socket.recv(8)
+        range_socket = None
+        outstanding = {}  # Mã yêu cầu -> (range, buffer)
+        counts = progress.slot() if progress else [0] * len(part_files)  # Bộ đếm tiến trình riêng của luồng
+
+        meter = None  # Đo thông lượng của kết nối để tăng buffer nhận theo BDP
 
-                if not header:
-                    print("Connection lost")
+        def on_progress(request_id, nbytes):
+            counts[outstanding[request_id][0][0]] += nbytes
+            meter.add(nbytes)
+
+        try:
+            while self.is_connected:
+                if range_socket is None:
+                    range_socket = self.connect_mirror(mirror, filename, file_size, scheduler)
+                    if range_socket is None:
+                        if not mirror.alive:
+                            return
+                        continue
+                    meter = ReceiveMeter(self.tuner, range_socket, (mirror.host, mirror.port))
+
+                # Chỉ chờ scheduler khi kết nối không còn yêu cầu nào đang chờ phản hồi
+                send_failed = False
+                while len(outstanding) < PIPELINE_DEPTH:
+                    # Pool cạn (luồng ghi chưa theo kịp): nhận nốt các phản hồi đang chờ thay vì giữ buffer mà chờ
+                    buffer = self.buffers.acquire(block=not outstanding)
+                    if buffer is None:
+                        break
+                    task = scheduler.take(mirror, block=not outstanding)
+                    if task is None:
+                        buffer.release()
+                        break
+                    part, start, end = task
+                    try:
+                        request_id = self.request_range(range_socket, filename, start, end - start)
+                    except OSError:
+                        # Server đã đóng kết nối (vd: đang tắt): trả range lại hàng đợi, vẫn nhận nốt các phản hồi
+                        scheduler.release(task)
+                        buffer.release()
+                        send_failed = True
+                        break
+                    outstanding[request_id] = (task, buffer)
+                if not outstanding:
+                    if not send_failed:
+                        return
+                    range_socket.close()
+                    range_socket = None
                     continue
-              
-                # Bỏ qua dữ liệu từ server
-                data_length = struct.unpack(">Q", header)[0]
-                part_file_socket.recv(data_length).decode(CHAR_ENCODING)
 
-                # Gửi yêu cầu tải file đến server
+                started = time.monotonic()
+                try:
+                    with TRACER.span("receive") as span:
+                        request_id = self.receive_data(range_socket, {request_id: buffer for request_id, (_, buffer)
+                                                                      in outstanding.items()}, on_progress)
+                        span.set(request=request_id)
+                    (part, start, end), buffer = outstanding[request_id]
+                    if len(buffer) != end - start:
+                        raise ProtocolError(f"Short range response: {len(buffer)} of {end - start} bytes")
+                except Exception as e:
+                    # Giữ lại phần đã nhận, phần còn lại trả về cho mirror khác.
+                    # GOAWAY đến sau mọi phản hồi server đã nhận xử lý: không phải lỗi của mirror
+                    if not isinstance(e, GoAway):
+                        scheduler.fail(mirror, fatal=isinstance(e, FileNotFoundError))
+                    for task, buffer in outstanding.values():
+                        # Phần đã nhận chỉ được trả lại (tính là đã có) khi đã ghi xong
+                        self.queue_write(part_files[task[0]], task[1], buffer,
+                                         functools.partial(scheduler.release, task, len(buffer)),
+                                         functools.partial(self.write_failed, scheduler, task))
+                    outstanding.clear()
+                    range_socket.close()
+                    range_socket = None
+                    continue
 
-                # # HOÀNG LÀM:
-                message = f"{filename}|{offset}|{part_size}".encode(CHAR_ENCODING)
-                size_message_header = struct.pack(">Q", len(message))
-                # part_file_socket.sendall(size_message)
-                # ###
+                # Range chỉ tính là xong (scheduler.complete) khi đã nằm trong part file
+                del outstanding[request_id]
+                self.queue_write(part_files[part], start, buffer,
+                                 functools.partial(scheduler.complete, mirror, len(buffer), time.monotonic() - started,
+                                                   (part, start, end)),
+                                 functools.partial(self.write_failed, scheduler, (part, start, end)))
+        finally:
+            for task, buffer in outstanding.values():
+                scheduler.release(task)
+                buffer.release()
+            if range_socket:
+                self.close_range_socket(range_socket)
 
-                part_file_socket.sendall((size_message_header + message))
-                part_file_buffer = b''  # Lưu trữ dữ liệu tạm thời
-                
-                total_received = 0   # Tổng số byte nhận được
-                while total_received < part_size:
-                    remaining_in_buffer = part_size - total_received
-                    chunk_packet = part_file_socket.recv(min(remaining_in_buffer, CHUNK_SIZE))
-                    
-                    if not chunk_packet:
-                        raise ConnectionError("Connection lost")
-                    
-                    # Kiểm tra thông báo lỗi từ server
-                    if b"ERROR: File not found on server!" in chunk_packet:
-                        print("Error: File not found on server!")
-                        return False
-                    
-                    # Thêm dữ liệu vào buffer
-                    part_file_buffer += chunk_packet
-                    total_received += len(chunk_packet)
-                    self.print_progress(filename, part_number, ((total_received / part_size) * 100))
-
-                # Sau khi nhận đủ part_size, ghi dữ liệu vào file
-                part_filename = os.path.join(PART_STORAGE, f"{filename}.part{part_number}")
-                os.makedirs(os.path.dirname(part_filename), exist_ok=True)
-                with open(part_filename, "wb") as part_file:
-                    part_file.write(part_file_buffer)
-                    part_file.flush()
-                    os.fsync(part_file.fileno())
+    def download_ranges_mux(self, filename, file_size, mirror, scheduler, part_files, progress=None):
+        """
+        Luồng tải multiplex: một kết nối tới mirror chở tối đa MUX_STREAMS range cùng lúc.
+        Server gửi dữ liệu các stream xen kẽ; client ghi từng frame thẳng vào part file
+        và cấp thêm credit cho stream khi đã nhận một nửa cửa sổ.
+        """
+        mux_socket = None
+        streams = {}  # Mã yêu cầu -> [range, số byte đã nhận, số byte chưa cấp lại credit, thời điểm bắt đầu]
+        counts = progress.slot() if progress else [0] * len(part_files)
+        draining = False  # Đã nhận GOAWAY: nhận nốt các stream còn lại rồi kết nối lại
+        try:
+            while self.is_connected:
+                if draining and not streams:
+                    self.close_range_socket(mux_socket)
+                    mux_socket, draining = None, False
+                if mux_socket is None:
+                    mux_socket = self.connect_mirror(mirror, filename, file_size, scheduler)
+                    if mux_socket is None:
+                        if not mirror.alive:
+                            return
+                        continue
+                    send_frame(mux_socket, FRAME_MUX, length=MUX_WINDOW)
+                    meter = ReceiveMeter(self.tuner, mux_socket, (mirror.host, mirror.port))
+
+                while not draining and len(streams) < MUX_STREAMS:
+                    task = scheduler.take(mirror, block=not streams)
+                    if task is None:
+                        break
+                    try:
+                        request_id = self.request_range(mux_socket, filename, task[1], task[2] - task[1])
+                    except OSError:
+                        # Server đã đóng kết nối: trả range lại hàng đợi, nhận nốt các stream còn lại
+                        scheduler.release(task)
+                        draining = True
+                        break
+                    streams[request_id] = [task, 0, 0, time.monotonic()]
+                if not streams:
+                    if not draining:
+                        return
+                    continue
+
+                request_id = None
+                try:
+                    with TRACER.span("receive") as span:
+                        frame_type, flags, status, request_id, offset, _, payload_length = read_header(mux_socket)
+                        if frame_type == FRAME_GOAWAY:
+                            # Server đang tắt: vẫn gửi nốt các stream có mã <= request_id, các stream sau trả lại hàng đợi
+                            for later in [later for later in streams if later > request_id]:
+                                task, received, _, _ = streams.pop(later)
+                                self.release_written(scheduler, part_files, task, received)
+                            draining = True
+                            continue
+                        if frame_type == FRAME_SHUTDOWN:
+                            raise ConnectionError("Server is shutting down")
+                        if frame_type != FRAME_DATA or request_id not in streams:
+                            raise ProtocolError(f"Unexpected frame {frame_type} for request {request_id}")
+                        stream = streams[request_id]
+                        (part, start, end), received = stream[0], stream[1]
+                        if status != STATUS_OK:
+                            message = recv_exact(mux_socket, payload_length).decode(CHAR_ENCODING, "replace")
+                            if status == STATUS_NOT_FOUND:
+                                raise FileNotFoundError(message)
+                            raise ResponseError(status, message)
+                        if offset != start + received or offset + payload_length > end:
+                            raise ProtocolError(f"Out of order data for request {request_id}")
+                        data = self.buffers.acquire()
+                        try:
+                            recv_into(mux_socket, data.reserve(payload_length))
+                        except Exception:
+                            data.release()
+                            raise
+                        data.length = payload_length
+                        span.set(request=request_id, bytes=len(data))
+                    if flags & FLAG_END and received + len(data) != end - start:
+                        data.release()
+                        raise ProtocolError(f"Short range response: {received + len(data)} of {end - start} bytes")
+                except Exception as e:
+                    # Tính một lỗi cho mirror; phần chưa nhận của mọi stream trả lại hàng đợi
+                    # sau khi các frame đã nhận của stream đó ghi xong
+                    scheduler.fail(mirror, fatal=isinstance(e, FileNotFoundError))
+                    for task, received, _, _ in streams.values():
+                        self.release_written(scheduler, part_files, task, received)
+                    streams.clear()
+                    mux_socket.close()
+                    mux_socket = None
+                    continue
+
+                stream[1] += len(data)
+                stream[2] += len(data)
+                counts[part] += len(data)
+                meter.add(len(data))
+                if flags & FLAG_END:
+                    del streams[request_id]
+                    # Luồng ghi của part giữ thứ tự: frame cuối ghi xong thì cả range đã nằm trong part file
+                    self.queue_write(part_files[part], offset, data,
+                                     functools.partial(scheduler.complete, mirror, stream[1],
+                                                       time.monotonic() - stream[3], stream[0]),
+                                     functools.partial(self.write_failed, scheduler, stream[0]))
+                    continue
+                self.queue_write(part_files[part], offset, data)
+                if stream[2] >= MUX_WINDOW // 2:
+                    try:
+                        send_frame(mux_socket, FRAME_WINDOW, request_id, length=stream[2])
+                    except OSError:
+                        pass  # Kết nối đã đóng: lần đọc tiếp theo sẽ báo lỗi
+                    stream[2] = 0
+        finally:
+            for task, received, _, _ in streams.values():
+                self.release_written(scheduler, part_files, task, received)
+            if mux_socket:
+                self.close_range_socket(mux_socket)
+
+    def write_part(self, part_file, offset, data):
+        """
+        Ghi dữ liệu của một range vào đúng vị trí trong file part.
+        """
+        if not data:
+            return
+        file, lock, part_offset = part_file
+        position = offset - part_offset
+        with lock, TRACER.span("write_part", bytes=len(data)):
+            direct = self.direct_files.get(file)
+            if direct is not None:
+                written = write_direct(direct, position, data)
+                position, data = position + written, data[written:]
+            if data:
+                file.seek(position)
+                file.write(data)
+                if self.peer_server:
+                    file.flush()  # Peer khác (swarm) đọc part file qua file mở riêng
+
+    def queue_write(self, part_file, offset, buffer, done=None, failed=None):
+        """
+        Giao buffer đã nhận cho luồng ghi của part file để luồng nhận đọc tiếp ngay. Sau lần ghi (kể cả khi lỗi
+        hoặc bị bỏ qua) buffer được trả về pool, rồi gọi `done` nếu dữ liệu đã nằm trong part file, `failed` nếu không.
+        """
+        def finish(ok):
+            buffer.release()
+            callback = done if ok else failed
+            if callback:
+                callback()
+
+        self.writer.submit(part_file[0], lambda: self.write_part(part_file, offset, buffer.view()), finish)
+
+    def release_written(self, scheduler, part_files, task, received):
+        """
+        Trả phần chưa nhận của range về hàng đợi sau khi `received` byte đầu (đã giao cho luồng ghi)
+        nằm trong part file, để scheduler (và PieceMap của swarm) không tính phần chưa ghi.
+        """
+        if not received:
+            scheduler.release(task)
+            return
+        self.writer.submit(part_files[task[0]][0], lambda: None,
+                           lambda ok: scheduler.release(task, received) if ok else self.write_failed(scheduler, task))
+
+    def write_failed(self, scheduler, task):
+        """
+        Range không ghi được vào part file: trả cả range về hàng đợi và dừng tải file
+        (lỗi ghi được báo ở finish_writes) thay vì tải lại mãi.
+        """
+        scheduler.release(task)
+        scheduler.abort()
+
+    def finish_writes(self, part_files):
+        """
+        Chờ các lần ghi còn trong hàng đợi của các part file, ném lại lỗi ghi nếu có.
+        """
+        files = list({id(file): file for file, _, _ in part_files}.values())
+        for file in files:
+            self.writer.sync(file)
+        for file in files:
+            self.writer.check(file)
+
+    def print_mirror_summary(self, mirrors, elapsed):
+        """
+        In lượng dữ liệu tải từ mỗi mirror và thông lượng tổng.
+        """
+        total = sum(mirror.bytes_received for mirror in mirrors)
+        for mirror in mirrors:
+            status = "ok" if mirror.alive else "failed"
+            print(f"  {mirror}: {format_size_file(mirror.bytes_received)} ({status})")
+        if elapsed > 0:
+            print(f"Aggregate throughput: {format_size_file(total / elapsed)}/s")
+
+    def compute_signatures(self, file_path):
+        """
+        Tính chữ ký (adler32, blake2b) cho từng block đầy đủ của file cục bộ.
+        """
+        signatures = bytearray()
+        count = 0
+        with open(file_path, "rb") as file:
+            while True:
+                block = file.read(DELTA_BLOCK_SIZE)
+                if len(block) < DELTA_BLOCK_SIZE:
+                    break
+                strong = hashlib.blake2b(block, digest_size=16).digest()
+                signatures += DELTA_SIGNATURE.pack(zlib.adler32(block), strong)
+                count += 1
+        return bytes(signatures), count
+
+    def sync_file(self, filename):
+        """
+        Đồng bộ file đã tải với phiên bản trên server: chỉ nhận các block đã thay đổi.
+        """
+        sync_socket = None
+        temp_path = None
+        try:
+            file_path = local_path(self.download_dir, filename)
+            temp_path = local_path(self.part_dir, f"{filename}.delta")
+            sync_socket, _ = self.open_server_socket(*self.server)
+            sync_socket.settimeout(None)  # Server có thể mất thời gian so khớp file lớn
+
+            # So sánh kích thước và mtime trước khi tính chữ ký
+            name = filename.encode(CHAR_ENCODING)
+            reader = FrameReader(sync_socket, self.send_request(sync_socket, FRAME_STAT, name))
+            size, mtime_ns = FILE_STAT.unpack(reader.read_exact(FILE_STAT.size))
+            local_stat = os.stat(file_path)
+            if size == local_stat.st_size and mtime_ns == local_stat.st_mtime_ns:
                 return True
 
-            except Exception as e:
-                print(f"Error downloading chunk {part_number + 1} of {filename}: {e}")
-                retry_count += 1
+            started = time.monotonic()
+            signatures, count = self.compute_signatures(file_path)
+            payload = NAME_LENGTH.pack(len(name)) + name + signatures
+            reader = FrameReader(sync_socket, self.send_request(sync_socket, FRAME_DELTA, payload,
+                                                                DELTA_BLOCK_SIZE, count))
+            sent = FRAME_HEADER.size + len(payload)
+            size, mtime_ns = FILE_STAT.unpack(reader.read_exact(FILE_STAT.size))
+
+            # Dựng bản mới từ bản cũ + các lệnh COPY/DATA
+            os.makedirs(os.path.dirname(temp_path), exist_ok=True)
+            with open(file_path, "rb") as old_file, open(temp_path, "wb") as new_file:
+                actual, expected = apply_delta(reader, old_file, new_file, DELTA_BLOCK_SIZE)
+                reader.finish()
+                new_file.flush()
+                os.fsync(new_file.fileno())
+
+            if actual != expected:
+                raise ValueError(f"Checksum mismatch after delta sync of {filename}")
+
+            os.replace(temp_path, file_path)
+            os.utime(file_path, ns=(mtime_ns, mtime_ns))
+            self.server_files[filename] = size
+            received = reader.received
+            self.last_sync_stats = {"sent": sent, "received": received, "size": size,
+                                    "duration": time.monotonic() - started}
+            print(f"\033[JSynced {filename}: {format_size_file(sent + received)} transferred "
+                  f"for {format_size_file(size)}")
+            return True
+        except ResponseError as e:
+            # File không còn trên server
+            print(f"Error syncing {filename}: {e}")
+            return False
+        except Exception as e:
+            print(f"Error syncing {filename}: {e}")
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+        finally:
+            if sync_socket:
+                self.close_range_socket(sync_socket)
+
+    def make_batches(self, filenames):
+        """
+        Chia danh sách file nhỏ thành các lô theo số file và tổng kích thước.
+        """
+        batch, batch_bytes = [], 0
+        for filename in filenames:
+            size = self.server_files[filename]
+            if batch and (len(batch) >= BATCH_MAX_FILES or batch_bytes + size > BATCH_MAX_BYTES):
+                yield batch
+                batch, batch_bytes = [], 0
+            batch.append(filename)
+            batch_bytes += size
+        if batch:
+            yield batch
+
+    def download_pack(self, filenames):
+        """
+        Tải nhiều file nhỏ trong một container trên một kết nối và giải nén thẳng vào downloads.
+        """
+        pack_socket = None
+        temp_files = []
+        completed = 0
+        try:
+            pack_socket, _ = self.open_server_socket(*self.server)
+            reader = FrameReader(pack_socket, self.send_request(pack_socket, FRAME_PACK,
+                                                                json.dumps(filenames).encode(CHAR_ENCODING)))
+
+            # Đọc header: magic, số file và mục lục
+            if reader.read_exact(len(PACK_MAGIC)) != PACK_MAGIC:
+                raise ValueError("Invalid pack header")
+            count = struct.unpack(">I", reader.read_exact(4))[0]
+            entries = []
+            for _ in range(count):
+                name_length = struct.unpack(">H", reader.read_exact(2))[0]
+                name = reader.read_exact(name_length).decode(CHAR_ENCODING)
+                size, mtime_ns = PACK_ENTRY.unpack(reader.read_exact(PACK_ENTRY.size))
+                entries.append((name, size, mtime_ns))
+
+            # Nội dung các file nối tiếp nhau, ghi vào file tạm cạnh file đích
+            checksums = []
+            for name, size, _ in entries:
+                if size < 0:
+                    temp_files.append(None)
+                    checksums.append(0)
+                    continue
+                final_filename = local_path(self.download_dir, name)
+                os.makedirs(os.path.dirname(final_filename), exist_ok=True)
+                temp_files.append(final_filename + ".tmp")
+                crc = 0
+                with open(temp_files[-1], "wb") as file:
+                    remaining = size
+                    while remaining > 0:
+                        data = reader.read_exact(min(remaining, CHUNK_SIZE))
+                        crc = zlib.crc32(data, crc)
+                        file.write(data)
+                        remaining -= len(data)
+                checksums.append(crc)
+
+            # Trailer xác nhận từng file, chỉ đưa file hợp lệ vào downloads
+            for (name, size, mtime_ns), temp_filename, crc in zip(entries, temp_files, checksums):
+                status, expected_crc = PACK_TRAILER.unpack(reader.read_exact(PACK_TRAILER.size))
+                if status == PACK_MISSING:
+                    print(f"Error: {name} does not exist on the server.")
+                elif status != PACK_OK or crc != expected_crc:
+                    print(f"Error: {name} changed or was corrupted during transfer.")
+                    os.remove(temp_filename)
+                else:
+                    final_filename = local_path(self.download_dir, name)
+                    os.replace(temp_filename, final_filename)
+                    os.utime(final_filename, ns=(mtime_ns, mtime_ns))
+                    self.downloaded_files.add(name)
+                    completed += 1
+            reader.finish()
+            self.bytes_received += reader.received
+            temp_files = []
+            print(f"\033[K{completed} of {len(filenames)} small files have been downloaded.")
+            return completed == len(filenames)
+        except Exception as e:
+            print(f"Error downloading pack: {e}")
+            return False
+        finally:
+            for temp_filename in temp_files:
+                if temp_filename and os.path.exists(temp_filename):
+                    os.remove(temp_filename)
+            if pack_socket:
+                self.close_range_socket(pack_socket)
+
+    def transfer_ranges(self, filename, file_size, mirrors, scheduler, part_files, progress):
+        """
+        Chạy các luồng tải range của mọi mirror và chờ chúng xong.
+        """
+        # Mỗi mirror có nhiều luồng, mỗi luồng giữ một kết nối (không mở nhiều hơn số range);
+        # ở chế độ multiplex mỗi mirror chỉ cần một luồng và một kết nối
+        threads = []
+        connections = 1 if MULTIPLEX else min(CONNECTIONS_PER_MIRROR, -(-file_size // MIN_RANGE_SIZE))
+        target = self.download_ranges_mux if MULTIPLEX else self.download_ranges
+        for mirror in mirrors:
+            for _ in range(connections):
+                thread = threading.Thread(target=TRACER.wrap(target),
+                                          args=(filename, file_size, mirror, scheduler, part_files, progress),
+                                          daemon=True)
+                thread.start()
+                threads.append(thread)
+
+        if isinstance(scheduler, SwarmScheduler):
+            self.follow_swarm(filename, file_size, scheduler, part_files, progress, threads)
+        for thread in threads:
+            thread.join()
+        self.bytes_received += sum(mirror.bytes_received for mirror in mirrors)
+        self.retries += scheduler.retries
+        try:
+            self.finish_writes(part_files)
+        except Exception as e:
+            print(f"Error writing {filename}: {e}")
+            scheduler.abort()
+
+    def read_response(self, sock, request_id):
+        """
+        Đọc phản hồi một frame của yêu cầu điều khiển (PEERS, HAVE).
+        """
+        frame = read_frame(sock)
+        if frame.type != FRAME_DATA or frame.request_id != request_id:
+            raise ProtocolError(f"Unexpected frame {frame.type} for request {request_id}")
+        if frame.status != STATUS_OK:
+            raise ResponseError(frame.status, frame.payload.decode(CHAR_ENCODING, "replace"))
+        return frame
+
+    def announce(self, tracker_socket, filename):
+        """
+        Báo tracker (server) rằng client đang tải hoặc đã có file và phục vụ ở cổng peer,
+        trả về các peer khác (host, port) của file.
+        """
+        payload = json.dumps({"file": filename, "port": self.peer_server.port}).encode(CHAR_ENCODING)
+        frame = self.read_response(tracker_socket, self.send_request(tracker_socket, FRAME_PEERS, payload))
+        return [tuple(peer) for peer in json.loads(frame.payload.decode(CHAR_ENCODING))]
+
+    def query_have(self, have_socket, filename, file_size):
+        """
+        Hỏi peer bitmap các piece của file nó đang có.
+        """
+        frame = self.read_response(have_socket, self.send_request(have_socket, FRAME_HAVE, filename.encode(CHAR_ENCODING)))
+        if frame.offset != PIECE_SIZE or frame.length != PieceMap(file_size).count:
+            raise ProtocolError(f"Peer uses {frame.length} pieces of {frame.offset} bytes")
+        return frame.payload
+
+    def follow_swarm(self, filename, file_size, scheduler, part_files, progress, threads):
+        """
+        Điều phối swarm trong lúc tải: định kỳ báo tracker và nhận thêm peer (mỗi peer mới có luồng tải riêng),
+        hỏi các peer đã có những piece nào (HAVE) để scheduler giao range. Trả về khi mọi luồng tải đã xong.
+        """
+        tracker_socket = None
+        have_sockets = {}  # Peer -> kết nối hỏi HAVE
+        known = set(self.get_endpoints())  # Endpoint đã tải từ đó (server, mirror, peer đã biết)
+        next_announce = 0
+        try:
+            while self.is_connected and any(thread.is_alive() for thread in threads):
+                if time.monotonic() >= next_announce:
+                    next_announce = time.monotonic() + TRACKER_INTERVAL
+                    try:
+                        if tracker_socket is None:
+                            tracker_socket, _ = self.open_server_socket(*self.server)
+                        peers = self.announce(tracker_socket, filename)
+                    except Exception as e:
+                        print(f"Tracker unavailable: {e}")
+                        peers = []
+                        if tracker_socket:
+                            tracker_socket.close()
+                            tracker_socket = None
+                    for endpoint in peers:
+                        if endpoint in known or len(have_sockets) >= MAX_SWARM_PEERS:
+                            continue
+                        known.add(endpoint)
+                        peer = Mirror(*endpoint)
+                        peer.pieces = b""  # Chưa biết peer có gì cho đến lần HAVE đầu tiên
+                        scheduler.add_peer(peer)
+                        have_sockets[peer] = None
+                        for _ in range(PEER_CONNECTIONS):
+                            thread = threading.Thread(target=TRACER.wrap(self.download_ranges),
+                                                      args=(filename, file_size, peer, scheduler, part_files, progress),
+                                                      daemon=True)
+                            thread.start()
+                            threads.append(thread)
+
+                for peer, have_socket in list(have_sockets.items()):
+                    if not peer.alive:
+                        if have_socket:
+                            have_socket.close()
+                        del have_sockets[peer]
+                        continue
+                    try:
+                        if have_socket is None:
+                            have_socket = have_sockets[peer] = self.open_server_socket(peer.host, peer.port)[0]
+                        scheduler.update_peer(peer, self.query_have(have_socket, filename, file_size))
+                    except Exception:
+                        if have_socket:
+                            have_socket.close()
+                        have_sockets[peer] = None  # Luồng tải của peer sẽ tự ghi nhận lỗi
+
+                # Server không còn dùng được và không peer nào có phần còn thiếu: dừng thay vì chờ mãi
+                if not scheduler.reachable():
+                    print(f"Error: no server or peer has the remaining pieces of {filename}")
+                    scheduler.abort()
+                time.sleep(HAVE_INTERVAL)
+        finally:
+            for have_socket in have_sockets.values():
+                if have_socket:
+                    self.close_range_socket(have_socket)
+            if tracker_socket:
+                self.close_range_socket(tracker_socket)
+
+    def share_downloaded(self, filename):
+        """
+        Phục vụ file đã tải xong cho các peer (nếu chưa) khi nó có cùng kích thước với bản trên server.
+        """
+        if self.peer_server.is_shared(filename):
+            return True
+        path = local_path(self.download_dir, filename)
+        size = self.server_files.get(filename)
+        if not os.path.isfile(path) or os.path.getsize(path) != size:
+            return False
+        self.peer_server.share(filename, SharedFile(size, [(path, 0, size)]))
+        return True
+
+    def announce_shared(self):
+        """
+        Báo lại tracker các file đã tải đang phục vụ (chế độ swarm) để không bị bỏ khỏi danh sách peer,
+        trả về số file đang phục vụ.
+        """
+        filenames = [f for f in sorted(self.downloaded_files)
+                     if self.server_files.get(f, 0) > BATCH_FILE_SIZE and self.share_downloaded(f)]
+        tracker_socket = None
+        try:
+            if filenames:
+                tracker_socket, _ = self.open_server_socket(*self.server)
+            for filename in filenames:
+                self.announce(tracker_socket, filename)
+        except Exception as e:
+            print(f"Tracker unavailable: {e}")
+        finally:
+            if tracker_socket:
+                self.close_range_socket(tracker_socket)
+        return len(filenames)
+
+    def seed(self, duration):
+        """
+        Tiếp tục phục vụ các file đã tải cho các peer khác trong `duration` giây.
+        """
+        deadline = time.monotonic() + duration
+        count = self.announce_shared()
+        if count:
+            print(f"Seeding {count} files on port {self.peer_server.port} for {duration:g}s")
+        while count and self.is_connected and time.monotonic() < deadline:
+            time.sleep(max(0, min(TRACKER_INTERVAL, deadline - time.monotonic())))
+            self.announce_shared()
+
+    def fetch_block_hashes(self, filename):
+        """
+        Lấy kích thước block và hash sha256 (hex) của từng block của file từ server, None nếu lỗi.
+        """
+        blocks_socket = None
+        try:
+            blocks_socket, _ = self.open_server_socket(*self.server)
+            blocks_socket.settimeout(None)  # Server có thể phải băm file lớn lần đầu
+            with TRACER.span("block_hashes"):
+                reader = FrameReader(blocks_socket, self.send_request(blocks_socket, FRAME_BLOCKS,
+                                                                      filename.encode(CHAR_ENCODING)))
+                block_size, count = BLOCK_LIST.unpack(reader.read_exact(BLOCK_LIST.size))
+                data = reader.read_exact(count * BLOCK_DIGEST_SIZE)
+                reader.finish()
+            return block_size, [data[i:i + BLOCK_DIGEST_SIZE].hex() for i in range(0, len(data), BLOCK_DIGEST_SIZE)]
+        except Exception as e:
+            print(f"Block hashes of {filename} unavailable, downloading the whole file: {e}")
+            return None
+        finally:
+            if blocks_socket:
+                self.close_range_socket(blocks_socket)
+
+    def download_deduplicated(self, filename, block_size, digests):
+        """
+        Chỉ tải các block chưa có trong kho block; block đã có được sao (reflink nếu được)
+        từ file đã tải, file trùng hoàn toàn được hardlink.
+        """
+        file_size = self.server_files[filename]
+        final_filename = local_path(self.download_dir, filename)
+        temp_filename = final_filename + ".tmp"  # Cùng hệ thống file với kho để reflink được
+        try:
+            source = self.block_store.find_file(file_size, digests)
+            if source is not None:
+                method = self.block_store.link_file(source, final_filename)
+                self.block_store.add(filename, block_size, digests)
+                self.downloaded_files.add(filename)
+                self.last_dedup_stats = {"downloaded": 0, "reused": file_size}
+                print(f"\nFile {filename} is identical to {source} ({method}), nothing to download.\n")
+                return True
+
+            # Block có sẵn trên đĩa, block lặp lại trong chính file (chỉ tải lần đầu) và block phải tải
+            local, repeats, first_seen = {}, {}, {}
+            for index, digest in enumerate(digests):
+                location = self.block_store.locate(digest)
+                if location is not None:
+                    local[index] = location
+                elif digest in first_seen:
+                    repeats[index] = first_seen[digest]
+                else:
+                    first_seen[digest] = index
+
+            part_size = file_size // 4
+            part_bounds = [(i * part_size, (i + 1) * part_size if i < 3 else file_size) for i in range(4)]
+            ranges = []  # Các đoạn phải tải, gộp block liền nhau và cắt theo biên part
+            for index in first_seen.values():
+                start, end = index * block_size, min(file_size, (index + 1) * block_size)
+                for part, (part_start, part_end) in enumerate(part_bounds):
+                    low, high = max(start, part_start), min(end, part_end)
+                    if low >= high:
+                        continue
+                    if ranges and ranges[-1][0] == part and ranges[-1][2] == low:
+                        ranges[-1] = (part, ranges[-1][1], high)
+                    else:
+                        ranges.append((part, low, high))
+            downloaded = sum(end - start for _, start, end in ranges)
+            print(f"\nDownloading file {filename} ({format_size_file(downloaded)} of "
+                  f"{format_size_file(file_size)}, the rest is reused from local blocks) ...")
+
+            mirrors = [Mirror(host, port) for host, port in self.get_endpoints()]
+            scheduler = RangeScheduler(part_bounds, mirrors, ranges)
+            os.makedirs(os.path.dirname(final_filename), exist_ok=True)
+            progress = ProgressTracker(filename, [end - start for start, end in part_bounds], quiet=self.quiet).start()
+            counts = progress.slot()
+
+            def reuse(source_path, source_offset, index):
+                start, end = index * block_size, min(file_size, (index + 1) * block_size)
+                with lock:
+                    self.block_store.copy_range(source_path, source_offset, temp_file, start, end - start)
+                for part, (part_start, part_end) in enumerate(part_bounds):
+                    counts[part] += max(0, min(end, part_end) - max(start, part_start))
+
+            with open(temp_filename, "wb") as temp_file:
+                temp_file.truncate(file_size)
+                lock = threading.Lock()
+                part_files = [(temp_file, lock, 0)] * len(part_bounds)  # Mọi part ghi thẳng vào một file
+                try:
+                    # Sao block cục bộ trong lúc các luồng tải phần còn lại
+                    transfer = threading.Thread(target=TRACER.wrap(self.transfer_ranges), daemon=True,
+                                                args=(filename, file_size, mirrors, scheduler, part_files, progress))
+                    transfer.start()
+                    with TRACER.span("reuse_blocks", blocks=len(local)):
+                        for index, (source_path, source_offset) in local.items():
+                            reuse(source_path, source_offset, index)
+                    transfer.join()
+                    if scheduler.finished():
+                        temp_file.flush()
+                        for index, first in repeats.items():
+                            reuse(temp_filename, first * block_size, index)
+                finally:
+                    progress.stop()
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+
+            if not scheduler.finished():
+                print(f"Error downloading file {filename}: One or more chunks failed to download.")
+                os.remove(temp_filename)
                 return False
-            finally:
-                if part_file_socket:
-                    header = struct.pack(">Q", len(b"CLOSE PART SOCKET")) 
-                    part_file_socket.sendall(header + b"CLOSE PART SOCKET")
-                    part_file_socket.close()
-                    part_file_socket = None
-        
-        print(f"Failed to download chunk {part_number + 1} of {filename} after {3} attempts.")
-        return False
+            with TRACER.span("verify"):
+                verified = hash_blocks(temp_filename, block_size) == digests
+            if not verified:
+                print(f"Error downloading file {filename}: Block checksum mismatch.")
+                os.remove(temp_filename)
+                return False
+
+            os.replace(temp_filename, final_filename)
+            self.block_store.add(filename, block_size, digests)
+            self.downloaded_files.add(filename)
+            self.last_dedup_stats = {"downloaded": downloaded, "reused": file_size - downloaded}
+            print(f"\nFile {filename} has been downloaded ({format_size_file(file_size - downloaded)} reused).\n")
+            return True
+        except Exception as e:
+            print(f"Error downloading file {filename}: {e}")
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+            return False
 
     def merge_chunks(self, filename):
         """
         Gộp các chunk thành file hoàn chỉnh.
         """
-        final_filename = os.path.join(DOWNLOAD_DIR, filename)
-        with open(final_filename, "wb") as final_file:
+        final_filename = local_path(self.download_dir, filename)
+        os.makedirs(os.path.dirname(final_filename), exist_ok=True)
+        with open(final_filename, "wb") as final_file, TRACER.span("merge"):
             for part_number in range(4):
-                part_filename = os.path.join(PART_STORAGE, f"{filename}.part{part_number}")
+                part_filename = local_path(self.part_dir, f"{filename}.part{part_number}")
                 with open(part_filename, "rb") as part_file:
                     final_file.write(part_file.read())
-                os.remove(part_filename)
+        # Peer khác đang đọc part file chuyển sang file hoàn chỉnh trước khi xóa part
+        if self.peer_server:
+            size = self.server_files[filename]
+            self.peer_server.share(filename, SharedFile(size, [(final_filename, 0, size)]))
+        for part_number in range(4):
+            os.remove(local_path(self.part_dir, f"{filename}.part{part_number}"))
+
+    def start_transfer(self, name, **args):
+        """
+        Span gốc của một lần tải với mã transfer mới; các kết nối mở trong lần tải gửi mã này cho server.
+        """
+        TRACER.bind(TRACER.new_transfer() if TRACER.enabled else 0)
+        return TRACER.span(name, **args)
 
     def download_file(self, filename):
         """
         Tải file từ server theo từng chunk.
         """
+        with self.start_transfer("download", file=filename) as span:
+            downloaded = self.fetch_file(filename)
+            span.set(ok=downloaded)
+        return downloaded
+
+    def fetch_file(self, filename):
         if filename in self.downloaded_files:
             return True
 
@@ -317,42 +1507,73 @@ class Client:
             print(f"Error: {filename} does not exist on the server.")
             return False
         
+        # File nhỏ không cần chia 4 part và 4 kết nối
+        if self.server_files[filename] <= BATCH_FILE_SIZE:
+            return self.download_pack([filename])
+
+        # Có kho block: chỉ tải các block chưa có trên đĩa
+        if self.block_store:
+            block_list = self.fetch_block_hashes(filename)
+            if block_list:
+                return self.download_deduplicated(filename, *block_list)
+
         try:
             print(f"\nDownloading file {filename} ...")
 
             # Tính kích thước chunk file
-            self.progress = {}
             file_size = self.server_files[filename]
             part_size = file_size // 4
+            part_bounds = [(i * part_size, (i + 1) * part_size if i < 3 else file_size) for i in range(4)]
 
-            print('\n' * 4)
+            mirrors = [Mirror(host, port) for host, port in self.get_endpoints()]
+            if self.peer_server:
+                scheduler = SwarmScheduler(part_bounds, mirrors, file_size)
+            else:
+                scheduler = RangeScheduler(part_bounds, mirrors)
 
-            # Tạo 4 thread để tải file
-            threads = []
-            results = [None] * 4
-            
-            def thread_target(index, *args):
-                """
-                Hàm hỗ trợ kiểm tra kết quả của từng thread.
-                """
-                results[index] = self.download_part_file(*args)
-
-            for i in range(4):
-                offset = i * part_size
-                part_size = part_size if i < 3 else file_size - offset
-                thread = threading.Thread(target=thread_target, args=(i, filename, offset, part_size, i), daemon=True)
-                thread.daemon = True
-                thread.start()
-                threads.append(thread)
+            # Tạo trước 4 file part với kích thước cố định để ghi range vào đúng vị trí
+            part_files = []
+            segments = []
+            for part_number, (start, end) in enumerate(part_bounds):
+                part_filename = local_path(self.part_dir, f"{filename}.part{part_number}")
+                os.makedirs(os.path.dirname(part_filename), exist_ok=True)
+                part_file = open(part_filename, "wb")
+                part_file.truncate(end - start)
+                part_files.append((part_file, threading.Lock(), start))
+                segments.append((part_filename, start, end))
+                if DIRECT_IO and file_size >= DIRECT_IO_MIN_SIZE:
+                    direct = open_direct(part_filename)
+                    if direct is None:
+                        print(f"O_DIRECT is not supported for {part_filename}, writing through the page cache")
+                    else:
+                        self.direct_files[part_file] = direct
+            # Phục vụ các piece đã tải cho peer khác ngay trong lúc tải
+            if self.peer_server:
+                self.peer_server.share(filename, SharedFile(file_size, segments, scheduler.pieces))
 
-            for thread in threads:
-                thread.join()
+            started = time.monotonic()
+            progress = ProgressTracker(filename, [end - start for start, end in part_bounds], quiet=self.quiet).start()
+            try:
+                with TRACER.span("transfer", bytes=file_size):
+                    self.transfer_ranges(filename, file_size, mirrors, scheduler, part_files, progress)
+            finally:
+                progress.stop()
+                for part_file, _, _ in part_files:
+                    if part_file in self.direct_files:
+                        os.close(self.direct_files.pop(part_file))
+                    part_file.flush()
+                    os.fsync(part_file.fileno())
+                    part_file.close()
 
-             # Kiểm tra kết quả của từng thread
-            if not all(results):
+            # Kiểm tra kết quả của các luồng
+            if not scheduler.finished():
                 print(f"Error downloading file {filename}: One or more chunks failed to download.")
+                self.cleanup_chunks(filename)
                 return False
 
+            if len(mirrors) > 1:
+                self.print_mirror_summary(mirrors, time.monotonic() - started)
+
             self.merge_chunks(filename)
             self.downloaded_files.add(filename)
             print(f"\nFile {filename} has been downloaded.\n")
@@ -363,12 +1584,91 @@ class Client:
             self.cleanup_chunks(filename)
             return False
         
+    def open_stream(self, filename):
+        """
+        Tải file ở chế độ stream: trả về ngay DownloadStream đọc được theo thứ tự khi các range đầu về,
+        trong lúc các range sau vẫn được tải song song; file không được ghi xuống đĩa.
+        """
+        if filename not in self.server_files:
+            raise FileNotFoundError(f"{filename} does not exist on the server.")
+        file_size = self.server_files[filename]
+        part_size = file_size // 4
+        part_bounds = [(i * part_size, (i + 1) * part_size if i < 3 else file_size) for i in range(4)]
+
+        mirrors = [Mirror(host, port) for host, port in self.get_endpoints()]
+        buffer = OrderedBuffer(file_size, STREAM_WINDOW)
+        scheduler = StreamScheduler(part_bounds, mirrors, buffer)
+        buffer.on_consume = scheduler.wake
+        part_files = [(StreamSink(buffer), threading.Lock(), 0)] * len(part_bounds)  # Mọi part ghi vào bộ đệm
+
+        def transfer():
+            try:
+                with self.start_transfer("stream", file=filename, bytes=file_size):
+                    self.transfer_ranges(filename, file_size, mirrors, scheduler, part_files, None)
+                buffer.finish()
+            except Exception as e:
+                buffer.finish(e)
+
+        threading.Thread(target=transfer, daemon=True).start()
+        return DownloadStream(buffer, scheduler.abort)
+
+    def download_batch(self, filenames):
+        """
+        Tải danh sách file (file nhỏ gộp thành container PACK), trả về thống kê của từng file theo thứ tự:
+        {"file", "ok", "bytes", "duration", "retries"}. "bytes" là số byte nhận qua mạng (file gộp tính kích thước
+        của nó), "retries" là số range phải tải lại.
+        """
+        stats = {}
+        small_files = [f for f in dict.fromkeys(filenames) if f in self.server_files and f not in self.downloaded_files
+                       and self.server_files[f] <= BATCH_FILE_SIZE]
+        for batch in self.make_batches(small_files):
+            if not self.is_connected:
+                break
+            started = time.monotonic()
+            with self.start_transfer("pack", files=len(batch)):
+                self.download_pack(batch)
+            duration = time.monotonic() - started
+            for filename in batch:
+                ok = filename in self.downloaded_files
+                stats[filename] = {"file": filename, "ok": ok, "bytes": self.server_files[filename] if ok else 0,
+                                   "duration": duration, "retries": 0}
+
+        for filename in filenames:
+            if filename in stats or not self.is_connected:
+                continue
+            received, retries = self.bytes_received, self.retries
+            started = time.monotonic()
+            ok = self.download_file(filename)
+            if not ok:
+                print(f"Error downloading {filename}")
+            stats[filename] = {"file": filename, "ok": ok, "bytes": self.bytes_received - received,
+                               "duration": time.monotonic() - started, "retries": self.retries - retries}
+        return [stats.get(filename, {"file": filename, "ok": False, "bytes": 0, "duration": 0.0, "retries": 0})
+                for filename in filenames]
+
+    def close(self):
+        """
+        Đóng kết nối tới server.
+        """
+        if self.client_socket:
+            self.close_range_socket(self.client_socket)
+            self.client_socket = None
+        if self.peer_server:
+            self.peer_server.close()
+            self.peer_server = None
+        self.writer.close()
+
     def cleanup_chunks(self, filename):
         """
         Xóa các phần chunk của file.
         """
+        if self.peer_server:
+            self.peer_server.unshare(filename)
         for part_number in range(4):
-            part_filename = os.path.join(PART_STORAGE, f"{filename}.part{part_number}")
+            try:
+                part_filename = local_path(self.part_dir, f"{filename}.part{part_number}")
+            except ValueError:
+                return
             if os.path.exists(part_filename):
                 os.remove(part_filename)
 
@@ -381,10 +1681,20 @@ class Client:
                     continue
 
                 new_files_to_download = self.monitor_input()
-                for filename in new_files_to_download:
-                    if self.is_connected:
-                        if not self.download_file(filename):
-                            print(f"Error downloading {filename}")
+
+                # File nhỏ được gom thành lô, mỗi lô là một container trên một kết nối
+                self.download_batch(new_files_to_download)
+
+                # Cập nhật các file đã tải nếu phiên bản trên server thay đổi
+                if DELTA_SYNC:
+                    for filename in self.requested_files:
+                        if self.is_connected and filename in self.downloaded_files and filename in self.server_files:
+                            with self.start_transfer("sync", file=filename):
+                                self.sync_file(filename)
+
+                # Chế độ swarm: tiếp tục phục vụ các file đã tải cho peer khác
+                if self.peer_server:
+                    self.announce_shared()
                 
                 time.sleep(5)
             except KeyboardInterrupt:
@@ -395,8 +1705,8 @@ class Client:
             finally:
                 if self.is_connected and self.client_socket:
                     try:
-                        message = self.client_socket.recv(15).decode(CHAR_ENCODING)
-                        if "SERVER_SHUTDOWN" in message:
+                        frame = read_frame(self.client_socket)
+                        if frame.type in (FRAME_SHUTDOWN, FRAME_GOAWAY):
                             print("\33[JServer has shut down. Disconnecting...")
                             self.handle_breaking(signal.SIGINT, None)
                             break
@@ -408,8 +1718,175 @@ class Client:
                         self.client_socket.close()
         print("\33[JShut down...")
 
+def download_files(filenames, server, mirrors=(), download_dir=None, part_dir=None):
+    """
+    API thư viện: tải các file từ `server` (host, port) và các mirror mà không hỏi IP/cổng hay đọc input.txt,
+    trả về thống kê của từng file (Client.download_batch). Không kết nối được tới server thì ném ConnectionError.
+    """
+    download_dir = download_dir or DOWNLOAD_DIR
+    os.makedirs(download_dir, exist_ok=True)
+    client = Client(tuple(server), [tuple(mirror) for mirror in mirrors], download_dir, part_dir, interactive=False)
+    try:
+        if not client.connect_to_server():
+            raise ConnectionError(f"Cannot connect to server {server[0]}:{server[1]}")
+        return client.download_batch(list(filenames))
+    finally:
+        client.close()
+
+def open_stream(filename, server, mirrors=()):
+    """
+    API thư viện: đọc file trong lúc tải (Client.open_stream), vd: gzip.open(open_stream(...)).
+    Đóng stream thì đóng cả kết nối tới server.
+    """
+    os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+    client = Client(tuple(server), [tuple(mirror) for mirror in mirrors], interactive=False)
+    try:
+        if not client.connect_to_server():
+            raise ConnectionError(f"Cannot connect to server {server[0]}:{server[1]}")
+        stream = client.open_stream(filename)
+    except Exception:
+        client.close()
+        raise
+    stream.on_close.append(client.close)
+    return stream
+
+async def download_files_async(filenames, server, mirrors=(), download_dir=None, part_dir=None):
+    """
+    Như download_files nhưng không chặn event loop: chạy trong thread pool của loop,
+    các lần gọi đồng thời tải song song, mỗi lần một Client riêng.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(download_files, filenames, server, mirrors,
+                                                              download_dir, part_dir))
+
+def run_batch(filenames, as_json, seed_time=0):
+    """
+    Chế độ batch của dòng lệnh: tải các file rồi in thống kê (JSON ra stdout, thông báo tải ra stderr);
+    trả về mã thoát: 0 nếu mọi file tải xong, 1 nếu có file lỗi, 2 nếu không kết nối được server.
+    Ở chế độ swarm, sau khi in thống kê còn phục vụ các file đã tải cho peer khác trong `seed_time` giây.
+    """
+    output = sys.stderr if as_json else sys.stdout
+    os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+    client = Client((SERVER_HOST, SERVER_PORT), MIRRORS, interactive=False)
+    try:
+        with contextlib.redirect_stdout(output):
+            if not client.connect_to_server():
+                print(f"Error: Cannot connect to server {SERVER_HOST}:{SERVER_PORT}")
+                return 2
+            results = client.download_batch(list(filenames))
+        if as_json:
+            print(json.dumps(results, indent=2), flush=True)
+        else:
+            for result in results:
+                print(f"{result['file']}: {'ok' if result['ok'] else 'FAILED'}, {format_size_file(result['bytes'])} "
+                      f"in {result['duration']:.2f}s, {result['retries']} retries", flush=True)
+        if client.peer_server and seed_time:
+            with contextlib.redirect_stdout(output):
+                client.seed(seed_time)
+    finally:
+        client.close()
+    return 0 if all(result["ok"] for result in results) else 1
+
+def run_stream(filename):
+    """
+    Chế độ --stdout: ghi file ra stdout theo thứ tự trong lúc tải để nối vào pipeline
+    (vd: client.py --server HOST:PORT --stdout data.gz | gunzip); mọi thông báo ra stderr.
+    """
+    output = sys.stdout.buffer
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            stream = open_stream(filename, (SERVER_HOST, SERVER_PORT), MIRRORS)
+        except (ConnectionError, FileNotFoundError) as e:
+            print(f"Error: {e}")
+            return 2
+        try:
+            with stream:
+                for chunk in stream.chunks():
+                    output.write(chunk)
+            output.flush()
+        except BrokenPipeError:
+            return 1  # Chương trình đọc đã thoát trước khi hết file
+        except (ConnectionError, OSError) as e:
+            print(f"Error streaming {filename}: {e}")
+            return 1
+    return 0
+
 if __name__ == "__main__":
-    SERVER_HOST = get_server_ip()
-    SERVER_PORT = get_server_port()
-    client = Client()
-    client.start()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="TCP file download client")
+    parser.add_argument("files", nargs="*",
+                        help="Chế độ batch: tải các file này rồi thoát thay vì theo dõi input.txt (cần --server)")
+    parser.add_argument("--server", type=parse_endpoint, metavar="HOST:PORT",
+                        help="Địa chỉ server chính (không hỏi IP/cổng)")
+    parser.add_argument("--download-dir", default=DOWNLOAD_DIR, help="Thư mục lưu file đã tải")
+    parser.add_argument("--json", action="store_true", help="Chế độ batch: in thống kê từng file dạng JSON")
+    parser.add_argument("--stdout", action="store_true",
+                        help="Ghi file (duy nhất) ra stdout theo thứ tự trong lúc tải thay vì lưu vào thư mục tải")
+    parser.add_argument("--stream-window", type=int, default=STREAM_WINDOW, metavar="BYTES",
+                        help="Chế độ --stdout: số byte tải trước tối đa so với phần đã ghi ra")
+    parser.add_argument("--mirror", action="append", default=[], type=parse_endpoint, metavar="HOST:PORT",
+                        help="Mirror phục vụ cùng catalog với server chính (có thể lặp lại)")
+    parser.add_argument("--sync", action="store_true",
+                        help="Đồng bộ delta các file đã tải khi file trên server thay đổi")
+    parser.add_argument("--multiplex", action="store_true",
+                        help="Tải các range qua một kết nối multiplex cho mỗi mirror")
+    parser.add_argument("--quiet", action="store_true", help="Không vẽ thanh tiến trình (chạy không có terminal)")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Dùng lại các block đã có trong file đã tải thay vì tải lại (theo hash block của server)")
+    parser.add_argument("--socket-tuning", choices=TUNING_MODES, default=SOCKET_TUNING,
+                        help="auto: buffer nhận theo RTT và thông lượng đo được của từng mirror; off: mặc định của kernel")
+    parser.add_argument("--socket-buffer", type=int, default=SOCKET_BUFFER, metavar="BYTES",
+                        help="Cố định buffer nhận của mỗi kết nối (bytes) thay vì tự điều chỉnh")
+    parser.add_argument("--swarm", action="store_true",
+                        help="Tải cả từ các client khác đang tải cùng file (server làm tracker) và phục vụ lại các piece đã tải")
+    parser.add_argument("--peer-port", type=int, default=PEER_PORT,
+                        help="Cổng phục vụ piece cho các peer khác ở chế độ swarm (0 = cổng bất kỳ)")
+    parser.add_argument("--seed-time", type=float, default=SEED_TIME, metavar="SECONDS",
+                        help="Chế độ batch swarm: tiếp tục phục vụ các file đã tải chừng này giây trước khi thoát")
+    parser.add_argument("--writer-threads", type=int, default=WRITER_THREADS,
+                        help="Số luồng ghi part file tách khỏi luồng nhận mạng (0 = ghi ngay trong luồng nhận)")
+    parser.add_argument("--direct-io", action="store_true",
+                        help=f"Ghi part file của file từ {DIRECT_IO_MIN_SIZE // 1024 // 1024}MB trở lên bằng O_DIRECT")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="Ghi span các pha tải (kết nối, nhận range, gộp part, ...) ra file Chrome trace JSON khi thoát")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="Profile mọi luồng, ghi FILE.pstats (và FILE.collapsed cho flamegraph) khi thoát")
+    parser.add_argument("--profile-mode", choices=["cpu", "wall", "sample"], default=PROFILE_MODE,
+                        help="cProfile mọi luồng theo thời gian CPU hoặc thời gian thực, hoặc lấy mẫu stack (chi phí thấp)")
+    args = parser.parse_args()
+    if args.files and not args.server:
+        parser.error("batch mode needs --server")
+    if args.stdout and len(args.files) != 1:
+        parser.error("--stdout needs exactly one file")
+    MIRRORS = args.mirror
+    DOWNLOAD_DIR = args.download_dir
+    DELTA_SYNC = args.sync
+    MULTIPLEX = args.multiplex
+    QUIET = args.quiet
+    BLOCK_DEDUP = args.dedup
+    SWARM, PEER_PORT, SEED_TIME = args.swarm, args.peer_port, args.seed_time
+    STREAM_WINDOW = args.stream_window
+    WRITER_THREADS, DIRECT_IO = args.writer_threads, args.direct_io
+    TRACE_FILE = args.trace
+    SOCKET_TUNING, SOCKET_BUFFER = args.socket_tuning, args.socket_buffer
+    PROFILE_FILE, PROFILE_MODE = args.profile, args.profile_mode
+    if TRACE_FILE:
+        TRACER.enable("tcp-client")
+
+    if args.server:
+        SERVER_HOST, SERVER_PORT = args.server
+    else:
+        SERVER_HOST = get_server_ip()
+        SERVER_PORT = get_server_port()
+    exit_code = 0
+    try:
+        with profiled(PROFILE_FILE, PROFILE_MODE):
+            if args.stdout:
+                exit_code = run_stream(args.files[0])
+            elif args.files:
+                exit_code = run_batch(args.files, args.json, SEED_TIME)
+            else:
+                Client().start()
+    finally:
+        if TRACE_FILE:
+            print(f"Wrote {TRACER.export(TRACE_FILE)} trace spans to {TRACE_FILE}")
+    sys.exit(exit_code)
@@ -8,12 +8,33 @@ import logging
 import datetime
 import struct
 import time
+import argparse
+import zlib
+import hashlib
+import multiprocessing
+import logging.handlers
+import select
+import collections
+import ipaddress
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from common.storage import (CAS_BLOCK_SIZE, COALESCE_CACHE_SIZE, DROP_BEHIND_SIZE, READ_AHEAD_SIZE, create_storage,
+                            open_backend)
+from common.protocol import (FRAME_HELLO, FRAME_GET, FRAME_STAT, FRAME_DELTA, FRAME_PACK, FRAME_CLOSE,
+                             FRAME_DATA, FRAME_MUX, FRAME_WINDOW, FRAME_BLOCKS, FRAME_TRACE, FRAME_GOAWAY, FRAME_PEERS, FLAG_END, STATUS_NOT_FOUND, STATUS_BAD_REQUEST,
+                             STATUS_SERVER_ERROR, FILE_STAT, NAME_LENGTH, BLOCK_LIST, FrameWriter, ProtocolError,
+                             pack_header, read_frame, send_frame)
+from common.tracing import TRACER
+from common.profiling import profiled
+from common.handoff import HandoffListener, receive_handoff
+from common.tuning import TUNING_MODES, SocketTuner
+from common.swarm import Tracker
 
 LOG_DIRECTORY = 'logs'
 if not os.path.exists(LOG_DIRECTORY):
     os.makedirs(LOG_DIRECTORY)
 
-log_file = os.path.join(LOG_DIRECTORY, f'server_{datetime.datetime.now().strftime('%d-%m-%Y_%Hh%Mm%Ss')}.log')
+log_file = os.path.join(LOG_DIRECTORY, f'server_{datetime.datetime.now().strftime("%d-%m-%Y_%Hh%Mm%Ss")}.log')
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
@@ -27,12 +48,55 @@ logging.basicConfig(
 SERVER_HOST = '0.0.0.0'
 SERVER_PORT = 6264
 SERVER_FILES_DIRECTORY = "server_files"  # Thư mục chứa file
+STORAGE_BACKEND = "local"  # Backend lưu trữ: local, cas (kho theo nội dung) hoặc memory
+CAS_ROOT = "cas_store"  # Thư mục kho theo nội dung khi dùng backend cas
+READ_AHEAD = READ_AHEAD_SIZE  # Nạp trước phía sau mỗi luồng đọc tuần tự (bytes), 0 = tắt
+DROP_BEHIND = DROP_BEHIND_SIZE  # File từ kích thước này không được giữ trong page cache sau khi gửi (bytes), 0 = tắt
+COALESCE_READS = True  # Các yêu cầu đồng thời cùng một block dùng chung một lần đọc đĩa (single-flight)
+READ_CACHE = COALESCE_CACHE_SIZE  # Cache các block vừa đọc khi gộp lần đọc (bytes, mỗi worker), 0 = không cache
 CHAR_ENCODING = "utf-8"  # Bộ mã hóa ký tự
 METADATA_FILE = "data.txt"
+THROTTLE_RATE = 0  # Giới hạn băng thông gửi của cả server (bytes/s), 0 = không giới hạn
+FAIR_SHARE = False  # Chia băng thông giữa các client theo deficit round robin thay vì ai gửi trước được trước
+CLIENT_CAP = 0  # Giới hạn băng thông của mỗi client khi bật fair share (bytes/s), 0 = không giới hạn
+PRIORITY_RULES = []  # Các cặp (mạng, lớp ưu tiên), vd: ("10.0.0.0/8", "high")
+PRIORITY_WEIGHTS = {"high": 4, "normal": 2, "low": 1}  # Tỉ lệ băng thông của mỗi lớp ưu tiên
+DEFAULT_PRIORITY = "normal"
+WORKERS = 1  # Số tiến trình worker (pre-fork), 1 = chạy một tiến trình như cũ
+METRICS_INTERVAL = 10  # Chu kỳ supervisor ghi log số liệu tổng hợp (giây)
+SEND_SLICE_SIZE = 64 * 1024  # Kích thước mỗi lần gửi khi bị giới hạn băng thông
+LISTEN_BACKLOG = 4096  # Hàng đợi kết nối chờ accept (nhiều client kết nối cùng lúc)
+MUX_QUANTUM = 64 * 1024  # Lượng dữ liệu mỗi stream được gửi trong một lượt xoay vòng (multiplex)
+MUX_IDLE_WAIT = 0.25  # Thời gian chờ frame tối đa của kết nối multiplex không có gì để gửi (giây)
+DRAIN_TIMEOUT = 10  # Hạn chót chung khi tắt server để các yêu cầu đang xử lý chạy xong (giây)
+HANDOFF_PATH = None  # Unix socket cho hot restart: tiến trình mới nhận socket lắng nghe của tiến trình đang chạy, None = tắt
+NEW_CONNECTION_GRACE = 1  # Khi drain, kết nối mới chưa gửi yêu cầu nào được chờ thêm chừng này để gửi yêu cầu đầu tiên (giây)
+FORCE_CLOSE_WAIT = 1  # Thời gian chờ các luồng thoát sau khi đóng cưỡng bức các kết nối còn lại (giây)
+SOCKET_TUNING = "auto"  # auto: buffer gửi theo BDP đo được (TCP_INFO) và TCP_NOTSENT_LOWAT; off: mặc định của kernel
+SOCKET_BUFFER = None  # Cố định SO_SNDBUF của kết nối client (bytes) thay vì tính theo BDP, None = tự động
+TRACE_FILE = None  # Ghi span các pha xử lý ra file Chrome trace JSON khi tắt server, None = tắt tracing
+PROFILE_FILE = None  # Profile mọi luồng và ghi <file>.pstats (và <file>.collapsed) khi thoát, None = tắt
+PROFILE_MODE = "cpu"  # cpu / wall: cProfile mọi luồng theo thời gian CPU / thời gian thực; sample: lấy mẫu stack
+REQUEST_NAMES = {FRAME_GET: "get", FRAME_STAT: "stat", FRAME_DELTA: "delta", FRAME_PACK: "pack",
+                 FRAME_BLOCKS: "blocks", FRAME_PEERS: "peers"}  # Tên span của từng loại yêu cầu
+
+# Delta sync (kiểu rsync): client gửi chữ ký block, server chỉ gửi phần khác biệt
+DELTA_SIGNATURE = struct.Struct(">I16s")  # Checksum cuộn adler32 + blake2b 16 byte của mỗi block
+DELTA_OP = struct.Struct(">BQQ")  # Lệnh delta: loại, tham số 1, tham số 2
+DELTA_COPY, DELTA_DATA, DELTA_END = 0, 1, 2  # COPY(block đầu, số block), DATA(độ dài), END + digest
+DELTA_READ_SIZE = 4 * 1024 * 1024  # Đọc file mới theo từng khối 4MB
+DELTA_MAX_LITERAL = 1024 * 1024  # Gửi dữ liệu chưa khớp khi tích lũy đủ 1MB
+ADLER_MOD = 65521
+
+# Container gộp nhiều file nhỏ: PACK_MAGIC, số file, mục lục; nội dung nối tiếp; trailer
+PACK_MAGIC = b"SPK1"
+PACK_ENTRY = struct.Struct(">qQ")  # Kích thước (-1 nếu không có), mtime (ns)
+PACK_TRAILER = struct.Struct(">BI")  # Trạng thái, crc32 của nội dung
+PACK_OK, PACK_MISSING, PACK_CHANGED = 0, 1, 2
 
-def scan_available_files():
+def scan_available_files(storage, write_metadata=True):
     """
-    Quét tất cả các file trong thư mục hiện tại, tính kích thước,
+    Quét tất cả các file của backend lưu trữ, tính kích thước,
     lưu vào `data.txt` và trả về thông tin file dưới dạng dictionary.
     """
     if not os.path.exists(SERVER_FILES_DIRECTORY):
@@ -43,15 +107,12 @@ def scan_available_files():
         logging.error(f"Error: Directory '{SERVER_FILES_DIRECTORY}' is not accessible.")
         sys.exit(1)  # Exit the program if the directory is not accessible
     
-    file_data = {}
-    with open(METADATA_FILE, "w") as data_file:
-        for filename in os.listdir(SERVER_FILES_DIRECTORY):
-            file_path = os.path.join(SERVER_FILES_DIRECTORY, filename)
-            if os.path.isfile(file_path):
-                size_bytes = os.path.getsize(file_path)
-                size_readable = convert_size(size_bytes)
-                file_data[filename] = size_bytes    
-                data_file.write(f"{filename} {size_readable}\n")
+    # Tên file là đường dẫn tương đối dạng "thư_mục/con/file"
+    file_data = {filename: stat.size for filename, stat in storage.list().items()}
+    if write_metadata:
+        with open(METADATA_FILE, "w") as data_file:
+            for filename, size in file_data.items():
+                data_file.write(f"{filename} {convert_size(size)}\n")
     return file_data
 
 def convert_size(size_bytes):
@@ -69,128 +130,790 @@ def convert_size(size_bytes):
     else:
         return f"{size_bytes}B"
 
+def generate_delta(file, block_size, signatures, digest):
+    """
+    So khớp nội dung file với chữ ký block của client bằng checksum cuộn (kiểu rsync).
+    Sinh ra các lệnh ("copy", block đầu, số block) hoặc ("data", bytes); `digest` được
+    cập nhật với toàn bộ nội dung file để client kiểm tra kết quả.
+    """
+    table = {}
+    for index, (weak, strong) in enumerate(signatures):
+        table.setdefault(weak, []).append((strong, index))
+
+    buffer = b''
+    pos = 0  # Vị trí cửa sổ trong buffer
+    literal = 0  # Đầu vùng dữ liệu chưa khớp
+    eof = False
+    a = b = None  # Hai nửa của checksum adler32 cuộn, None khi cần tính lại
+    run = None  # Dãy block liên tiếp đang gom (block đầu, số block)
+
+    while True:
+        # Nạp thêm dữ liệu khi cửa sổ chạm cuối buffer, giữ lại phần chưa khớp
+        if not eof and len(buffer) - pos <= block_size:
+            data = file.read(DELTA_READ_SIZE)
+            eof = not data
+            digest.update(data)
+            buffer = buffer[literal:] + data
+            pos -= literal
+            literal = 0
+            continue
+
+        if len(buffer) - pos < block_size:
+            break
+
+        if a is None:
+            weak = zlib.adler32(buffer[pos:pos + block_size])
+            a, b = weak & 0xFFFF, weak >> 16
+
+        candidates = table.get((b << 16) | a)
+        if candidates:
+            strong = hashlib.blake2b(buffer[pos:pos + block_size], digest_size=16).digest()
+            index = next((index for expected, index in candidates if expected == strong), None)
+            if index is not None:
+                if pos > literal:
+                    if run is not None:
+                        yield ("copy", *run)
+                        run = None
+                    yield ("data", buffer[literal:pos])
+                if run is not None and run[0] + run[1] == index:
+                    run = (run[0], run[1] + 1)
+                else:
+                    if run is not None:
+                        yield ("copy", *run)
+                    run = (index, 1)
+                pos += block_size
+                literal = pos
+                a = None
+                continue
+
+        if pos - literal >= DELTA_MAX_LITERAL:
+            if run is not None:
+                yield ("copy", *run)
+                run = None
+            yield ("data", buffer[literal:pos])
+            literal = pos
+
+        end = len(buffer) - block_size
+        if pos >= end:
+            if eof:
+                break
+            continue
+
+        # Trượt cửa sổ từng byte cho đến khi gặp checksum có trong bảng
+        limit = min(end, literal + DELTA_MAX_LITERAL)
+        while pos < limit:
+            out_byte, in_byte = buffer[pos], buffer[pos + block_size]
+            a = (a - out_byte + in_byte) % ADLER_MOD
+            b = (b - block_size * out_byte + a - 1) % ADLER_MOD
+            pos += 1
+            if (b << 16) | a in table:
+                break
+
+    if run is not None:
+        yield ("copy", *run)
+    if len(buffer) > literal:
+        yield ("data", buffer[literal:])
+
+def parse_priority(value):
+    """
+    Phân tích "NETWORK=CLASS" (vd: 10.0.0.0/8=high) cho tham số --priority.
+    """
+    network, _, name = value.partition("=")
+    if name not in PRIORITY_WEIGHTS:
+        raise argparse.ArgumentTypeError(f"Unknown priority class: {name}")
+    try:
+        ipaddress.ip_network(network, strict=False)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return network, name
+
+def export_trace(path):
+    """
+    Ghi các span đã ghi nhận ra file Chrome trace JSON.
+    """
+    try:
+        count = TRACER.export(path)
+        logging.info(f"Wrote {count} trace spans to {path}")
+    except OSError as e:
+        logging.error(f"Error writing trace file {path}: {e}")
+
+def apply_settings(settings):
+    """
+    Áp dụng cấu hình dòng lệnh vào các biến cấu hình của module (cả trong tiến trình worker).
+    """
+    globals().update(settings)
+
+def request_shutdown():
+    """
+    Tắt tiến trình hiện tại như khi nhận SIGTERM (drain chạy trên luồng chính).
+    """
+    os.kill(os.getpid(), signal.SIGTERM)
+
+def start_handoff_listener(listen_socket, catalog):
+    """
+    Chờ tiến trình mới ở HANDOFF_PATH: chuyển socket lắng nghe và catalog cho nó rồi tắt tiến trình này.
+    """
+    return HandoffListener(HANDOFF_PATH, lambda: [listen_socket], lambda: {"catalog": catalog},
+                           request_shutdown, logging.info).start()
+
+def create_listen_socket(reuse_port=False):
+    """
+    Tạo socket lắng nghe; với `reuse_port` nhiều tiến trình cùng bind một cổng (SO_REUSEPORT)
+    và kernel chia đều kết nối mới giữa chúng.
+    """
+    listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if reuse_port:
+        listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    listen_socket.bind((SERVER_HOST, SERVER_PORT))
+    listen_socket.listen(LISTEN_BACKLOG)
+    return listen_socket
+
+class ServerMetrics:
+    """
+    Bộ đếm của một tiến trình server. Khi chạy nhiều worker, bộ đếm nằm trong
+    bộ nhớ dùng chung (mỗi worker một vùng) để supervisor cộng dồn.
+    """
+    FIELDS = ("connections", "requests", "bytes_sent")
+
+    def __init__(self, shared=None, slot=0):
+        self.values = shared if shared is not None else [0] * len(self.FIELDS)
+        self.base = slot * len(self.FIELDS) if shared is not None else 0
+        self.lock = threading.Lock()
+
+    def add(self, field, amount=1):
+        with self.lock:
+            self.values[self.base + self.FIELDS.index(field)] += amount
+
+    @classmethod
+    def totals(cls, shared):
+        return {field: sum(shared[index::len(cls.FIELDS)]) for index, field in enumerate(cls.FIELDS)}
+
+class FairShareScheduler:
+    """
+    Chia băng thông gửi (THROTTLE_RATE) giữa các client theo deficit round robin.
+
+    Mỗi client (theo địa chỉ IP, gộp mọi kết nối của client đó) là một luồng dữ liệu; các luồng gửi
+    xin phép gửi từng lát SEND_SLICE_SIZE. Đến lượt, client được cộng quantum × trọng số lớp ưu tiên
+    vào deficit và được gửi các lát xếp hàng cho đến khi hết deficit, rồi nhường client kế tiếp.
+    Client có thể bị giới hạn băng thông riêng (CLIENT_CAP).
+    """
+    def __init__(self, rate, quantum=SEND_SLICE_SIZE, client_cap=0):
+        self.rate = rate
+        self.quantum = quantum
+        self.client_cap = client_cap
+        self.lookahead = quantum / rate if rate else 0  # Cấp trước một lát để đường truyền không trống
+        self.cond = threading.Condition()
+        self.flows = {}  # Khóa client -> trạng thái luồng
+        self.active = collections.deque()  # Các client đang có lát chờ gửi, theo thứ tự xoay vòng
+        self.next_send = 0.0  # Thời điểm đường truyền rảnh
+        self.cap_next = {}  # Khóa client -> thời điểm sớm nhất được gửi tiếp (CLIENT_CAP)
+
+    def submit(self, key, sizes, weight=1):
+        """
+        Xếp hàng các lát (kích thước `sizes`) của một lần gửi của client `key`, trả về các phiếu
+        theo thứ tự; xếp hàng cả lần gửi để client có tồn đọng và được hưởng đủ trọng số.
+        """
+        tickets = [{"nbytes": nbytes, "send_at": None} for nbytes in sizes]
+        with self.cond:
+            flow = self.flows.get(key)
+            if flow is None:
+                flow = self.flows[key] = {"queue": collections.deque(), "deficit": 0, "in_turn": False,
+                                          "weight": weight, "users": 0}
+            flow["users"] += 1
+            if not flow["queue"]:
+                self.active.append(key)
+            flow["queue"].extend(tickets)
+        return tickets
+
+    def wait(self, ticket):
+        """
+        Chờ phiếu được cấp lượt, trả về thời điểm được gửi.
+        """
+        with self.cond:
+            while ticket["send_at"] is None:
+                wake_at = self.dispatch()
+                if ticket["send_at"] is None:
+                    self.cond.wait(max(0.0005, wake_at - time.monotonic()) if wake_at else None)
+            return ticket["send_at"]
+
+    def release(self, key, tickets):
+        """
+        Kết thúc lần gửi: bỏ các phiếu chưa dùng (client ngắt giữa chừng) và dọn client không còn gửi.
+        """
+        with self.cond:
+            flow = self.flows[key]
+            pending = {id(ticket) for ticket in tickets if ticket["send_at"] is None}
+            if pending:
+                flow["queue"] = collections.deque(ticket for ticket in flow["queue"] if id(ticket) not in pending)
+                if not flow["queue"]:
+                    self.active.remove(key)
+                    flow["deficit"], flow["in_turn"] = 0, False
+                self.cond.notify_all()
+            flow["users"] -= 1
+            if not flow["users"] and not flow["queue"]:
+                del self.flows[key]
+                # Bỏ mốc giới hạn đã hết hạn; giữ mốc còn hiệu lực để client gửi lại không vượt giới hạn
+                if len(self.cap_next) > 2 * len(self.flows) + 64:
+                    now = time.monotonic()
+                    self.cap_next = {k: t for k, t in self.cap_next.items() if t > now or k in self.flows}
+
+    def dispatch(self):
+        """
+        Cấp lượt gửi theo DRR khi đường truyền sắp rảnh; trả về thời điểm cần xét lại (None nếu không cần).
+        """
+        now = time.monotonic()
+        skipped = 0
+        wake_at = None
+        while self.active:
+            if self.rate and self.next_send > now + self.lookahead:
+                wake_at = self.next_send - self.lookahead
+                break
+            key = self.active[0]
+            flow = self.flows[key]
+            if not flow["queue"]:
+                self.active.popleft()
+                flow["deficit"], flow["in_turn"] = 0, False
+                continue
+            # Client đã dùng hết giới hạn riêng: bỏ qua lượt này, không tích deficit
+            cap_next = self.cap_next.get(key, 0.0)
+            if cap_next > now:
+                wake_at = cap_next if wake_at is None else min(wake_at, cap_next)
+                skipped += 1
+                if skipped >= len(self.active):
+                    break
+                self.active.rotate(-1)
+                continue
+            skipped = 0
+            if not flow["in_turn"]:
+                flow["deficit"] += self.quantum * flow["weight"]
+                flow["in_turn"] = True
+
+            ticket = flow["queue"][0]
+            if flow["deficit"] < ticket["nbytes"]:
+                flow["in_turn"] = False
+                self.active.rotate(-1)
+                continue
+
+            flow["queue"].popleft()
+            flow["deficit"] -= ticket["nbytes"]
+            send_at = max(now, self.next_send)
+            if self.rate:
+                self.next_send = send_at + ticket["nbytes"] / self.rate
+            if self.client_cap:
+                self.cap_next[key] = max(now, cap_next) + ticket["nbytes"] / self.client_cap
+            ticket["send_at"] = send_at
+            if not flow["queue"]:
+                self.active.popleft()
+                flow["deficit"], flow["in_turn"] = 0, False
+            self.cond.notify_all()
+        return wake_at
+
 class Server:
     """
     Server xử lý đa luồng cho phép client tải file theo từng chunk.
     """
-    def __init__(self):
-        self.file_data = scan_available_files()    # Lưu thông tin file trên server
+    def __init__(self, metrics=None, catalog=None, backend=None):
+        self.metrics = metrics or ServerMetrics()  # Số liệu kết nối, yêu cầu và byte đã gửi
+        # Nơi đọc dữ liệu file; worker dùng backend supervisor đã mở (kho cas đã nạp, file memory đã đọc)
+        self.storage = create_storage(STORAGE_BACKEND, SERVER_FILES_DIRECTORY, CAS_ROOT, READ_AHEAD, DROP_BEHIND,
+                                      COALESCE_READS, READ_CACHE, backend)
+        # Lưu thông tin file trên server (worker không ghi data.txt, supervisor đã ghi).
+        # Catalog có sẵn (của supervisor hoặc tiến trình trước khi hot restart) thì không quét lại
+        if catalog is not None:
+            self.file_data = dict(catalog)
+        else:
+            self.file_data = scan_available_files(self.storage, write_metadata=metrics is None)
         self.is_running = True   # Biến kiểm tra server đang hoạt động hay không
         self.clients = set()  # Lưu thông tin client kết nối đến server
+        self.mux_clients = set()  # Các kết nối đang ở chế độ multiplex
+        self.new_clients = set()  # Các kết nối chưa gửi yêu cầu nào
+        self.drain_deadline = None  # Hạn chót drain khi đang tắt server
+        self.handoff_listener = None  # Chờ tiến trình mới khi hot restart
         self.server_socket = None  # Socket server
         self.client_threads = []    # Luồng xử lý client
         self.finished_threads = [] # Luồng đã kết thúc
+        self.throttle_lock = threading.Lock()  # Đồng bộ bộ giới hạn băng thông giữa các luồng
+        self.throttle_next_send = 0.0  # Thời điểm sớm nhất được gửi lát dữ liệu tiếp theo
+        # Bộ chia băng thông giữa các client và các lớp ưu tiên theo mạng
+        self.fair_share = FairShareScheduler(THROTTLE_RATE, SEND_SLICE_SIZE, CLIENT_CAP) if FAIR_SHARE else None
+        self.priority_rules = [(ipaddress.ip_network(network, strict=False), PRIORITY_WEIGHTS[name])
+                               for network, name in PRIORITY_RULES]
+        self.tuner = SocketTuner(SOCKET_TUNING, SOCKET_BUFFER, logging.warning)  # Buffer gửi theo BDP của từng kết nối
+        self.tracker = Tracker()  # Các client đang tải/seed từng file (chế độ swarm)
         signal.signal(signal.SIGINT, self.handle_shutdown) # Xử lý tắt server khi nhận tín hiệu SIGINT
+        signal.signal(signal.SIGTERM, self.handle_shutdown)
     
     def handle_shutdown(self, signum, frame):
         """
-        Xử lý tắt server khi nhận tín hiệu SIGINT - Ctrl + C.
+        Bắt đầu tắt server khi nhận SIGINT (Ctrl + C) hoặc SIGTERM: ngừng nhận kết nối mới, luồng accept
+        thoát vòng lặp và drain các kết nối (xem drain). Nhận tín hiệu lần nữa trong lúc drain thì đóng ngay.
+        Không ghi log ở đây: tín hiệu có thể đến khi luồng chính đang giữ khóa của hàng đợi log (worker)
+        và ghi log lần nữa sẽ tự khóa chết.
+        """
+        if self.drain_deadline is not None:
+            self.drain_deadline = time.monotonic()
+            return
+        self.drain_deadline = time.monotonic() + DRAIN_TIMEOUT
+        self.is_running = False
+        if self.handoff_listener:
+            self.handoff_listener.close()
+
+        # Ngừng nhận kết nối mới (accept đang chờ trên socket này sẽ lỗi và vòng accept kết thúc)
+        if self.server_socket:
+            try:
+                self.server_socket.close()
+            except OSError:
+                pass
+            finally:
+                self.server_socket = None
+
+    def drain(self):
+        """
+        Chạy trên luồng accept sau khi ngừng nhận kết nối: báo GOAWAY cho mọi client cùng lúc, cho các yêu cầu
+        đang xử lý chạy xong trước hạn chót chung DRAIN_TIMEOUT rồi đóng song song các kết nối còn lại.
+        """
+        started = time.monotonic()
+        clients = list(self.clients)
+        logging.info(f"Server shutting down, draining {len(clients)} connections (deadline {DRAIN_TIMEOUT}s)...")
+
+        # Đánh thức các luồng đang chờ yêu cầu; kết nối vừa mở (vd: client vừa kết nối đúng lúc hot restart)
+        # được chờ thêm NEW_CONNECTION_GRACE giây để gửi yêu cầu đầu tiên
+        self.wake_idle_clients(include_new=False)
+        self.wait_client_threads(started + NEW_CONNECTION_GRACE)
+        self.wake_idle_clients(include_new=True)
+
+        # Chờ mọi luồng trên cùng một hạn chót
+        self.wait_client_threads(self.drain_deadline)
+
+        # Quá hạn: đóng cả hai chiều các kết nối còn lại, lệnh gửi đang chờ của luồng sẽ lỗi ngay
+        forced = list(self.clients)
+        for client in forced:
+            try:
+                client.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        force_deadline = time.monotonic() + FORCE_CLOSE_WAIT
+        for thread in self.client_threads:
+            thread.join(max(0, force_deadline - time.monotonic()))
+        self.client_threads = [thread for thread in self.client_threads if thread.is_alive()]
+        logging.info(f"Drained {len(clients) - len(forced)} connections, closed {len(forced)} after the deadline "
+                     f"in {time.monotonic() - started:.2f}s")
+
+        for handler in logging.getLogger().handlers:
+            handler.flush()
+            handler.close()
+
+    def wait_client_threads(self, until):
+        """
+        Chờ các luồng xử lý client kết thúc trước thời điểm `until` hoặc hạn chót drain nếu sớm hơn
+        (hạn chót có thể bị rút ngắn bởi tín hiệu thứ hai nên chờ từng đoạn ngắn).
+        """
+        for thread in self.client_threads:
+            while thread.is_alive():
+                remaining = min(until, self.drain_deadline) - time.monotonic()
+                if remaining <= 0:
+                    return
+                thread.join(min(remaining, 0.1))
+
+    def wake_idle_clients(self, include_new):
+        """
+        Đóng chiều nhận của các kết nối thường: luồng đang chờ yêu cầu gặp EOF, gửi GOAWAY rồi đóng kết nối.
+        Luồng đang gửi dở một range vẫn gửi tiếp được và gửi GOAWAY khi xong. Kết nối multiplex cần nhận
+        tiếp frame WINDOW nên tự gửi GOAWAY ở lượt xoay vòng kế tiếp.
+        """
+        for client in list(self.clients):
+            if client in self.mux_clients or (client in self.new_clients and not include_new):
+                continue
+            try:
+                client.shutdown(socket.SHUT_RD)
+            except OSError:
+                pass
+
+    def client_weight(self, address):
+        """
+        Trọng số băng thông của client theo lớp ưu tiên của mạng chứa địa chỉ đó.
+        """
+        ip = ipaddress.ip_address(address)
+        for network, weight in self.priority_rules:
+            if ip in network:
+                return weight
+        return PRIORITY_WEIGHTS[DEFAULT_PRIORITY]
+
+    def send_data(self, client_connect, data):
+        """
+        Gửi dữ liệu đến client, chia nhỏ và giãn cách nếu server bị giới hạn băng thông.
+        """
+        self.metrics.add("bytes_sent", len(data))
+        if self.fair_share:
+            address = client_connect.getpeername()[0]
+            weight = self.client_weight(address)
+            view = memoryview(data)
+            starts = range(0, len(view), SEND_SLICE_SIZE)
+            tickets = self.fair_share.submit(address, [len(view[start:start + SEND_SLICE_SIZE]) for start in starts],
+                                             weight)
+            try:
+                for start, ticket in zip(starts, tickets):
+                    delay = self.fair_share.wait(ticket) - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    client_connect.sendall(view[start:start + SEND_SLICE_SIZE])
+            finally:
+                self.fair_share.release(address, tickets)
+            return
+
+        if not THROTTLE_RATE:
+            client_connect.sendall(data)
+            return
+
+        view = memoryview(data)
+        for start in range(0, len(view), SEND_SLICE_SIZE):
+            piece = view[start:start + SEND_SLICE_SIZE]
+            # Đặt chỗ thời gian gửi trên "đường truyền" dùng chung của server
+            with self.throttle_lock:
+                now = time.monotonic()
+                send_at = max(now, self.throttle_next_send)
+                self.throttle_next_send = send_at + len(piece) / THROTTLE_RATE
+            if send_at > now:
+                time.sleep(send_at - now)
+            client_connect.sendall(piece)
+
+    def send_error(self, client_connect, request_id, status, message):
+        """
+        Trả về lỗi cho một yêu cầu: frame DATA cuối với trạng thái lỗi và thông báo.
+        """
+        send_frame(client_connect, FRAME_DATA, request_id, payload=message.encode(CHAR_ENCODING),
+                   flags=FLAG_END, status=status)
+
+    def stat_file(self, filename):
+        """
+        Lấy kích thước và thời điểm sửa đổi hiện tại của file, cập nhật lại catalog.
         """
+        stat = self.storage.stat(filename) if filename in self.file_data else None
+        if stat is not None:
+            self.file_data[filename] = stat.size
+        return stat
+
+    def handle_get(self, client_connect, client_address, frame):
+        """
+        Gửi một range của file trong một frame DATA.
+        """
+        filename = frame.payload.decode(CHAR_ENCODING)
+        logging.debug(f'File download request from {client_address}: {filename}')
         try:
-            logging.info("Starting server shutdown sequence...")
-            self.is_running = False
+            if filename not in self.file_data:
+                raise FileNotFoundError(filename)
+            with TRACER.span("disk_read", bytes=frame.length):
+                data = self.storage.read_range(filename, frame.offset, frame.length)
+        except FileNotFoundError:
+            self.send_error(client_connect, frame.request_id, STATUS_NOT_FOUND, "File not found on server!")
+            return
 
-            # Đóng tất cả kết nối đến client
-            for client in self.clients.copy():
-                try:
-                    # Kiểm tra socket còn mở trước khi gửi thông báo
-                    if client.fileno() != -1:  
-                        logging.info(f"Closing connection to {client.getpeername()}")
-                        message = (f"SERVER_SHUTDOWN").encode(CHAR_ENCODING)
-                        client.sendall(message)
-                        time.sleep(3)
-                    client.close()
-                except Exception as e:
-                    logging.error(f"Error while closing client socket: {e}")
-
-                
-            for thread in self.client_threads:
-                try:
-                    thread.join(timeout=2.0)
-                    logging.info(f"Thread {thread.name} successfully joined")
-                except Exception as e:
-                    logging.error(f"Error: {e}")
+        header = pack_header(FRAME_DATA, frame.request_id, frame.offset, len(data), len(data), FLAG_END)
+        with TRACER.span("send", bytes=len(data)):
+            if len(data) <= SEND_SLICE_SIZE:
+                self.send_data(client_connect, header + data)
+            else:
+                client_connect.sendall(header)
+                self.send_data(client_connect, data)
+        self.tuner.sent(client_connect, len(data))
+        logging.debug(f"File chunk sent to {client_address}")
+
+    def handle_stat(self, client_connect, frame):
+        """
+        Trả về kích thước và mtime (ns) của file.
+        """
+        stat = self.stat_file(frame.payload.decode(CHAR_ENCODING))
+        if stat is None:
+            self.send_error(client_connect, frame.request_id, STATUS_NOT_FOUND, "File not found on server!")
+        else:
+            send_frame(client_connect, FRAME_DATA, frame.request_id,
+                       payload=FILE_STAT.pack(stat.size, stat.mtime_ns), flags=FLAG_END)
+
+    def handle_blocks(self, client_connect, client_address, frame):
+        """
+        Gửi hash sha256 của từng block của file để client bỏ qua các block đã có sẵn.
+        """
+        filename = frame.payload.decode(CHAR_ENCODING)
+        if self.stat_file(filename) is None:
+            self.send_error(client_connect, frame.request_id, STATUS_NOT_FOUND, "File not found on server!")
+            return
+        digests = self.storage.block_hashes(filename)
+        writer = FrameWriter(lambda data: self.send_data(client_connect, data), frame.request_id)
+        writer.write(BLOCK_LIST.pack(CAS_BLOCK_SIZE, len(digests)))
+        for digest in digests:
+            writer.write(digest)
+        writer.close()
+        logging.debug(f"Sent {len(digests)} block hashes of {filename} to {client_address}")
+
+    def handle_peers(self, client_connect, client_address, frame):
+        """
+        Tracker của chế độ swarm: ghi nhận peer của client (IP của kết nối, cổng client báo)
+        và trả về các peer khác đang tải hoặc đã có file.
+        """
+        request = json.loads(frame.payload.decode(CHAR_ENCODING))
+        if not isinstance(request, dict) or not isinstance(request.get("file"), str):
+            raise ValueError("Expected {\"file\": name, \"port\": peer port}")
+        filename, port = request["file"], int(request.get("port", 0))
+        if not 0 <= port <= 65535:
+            raise ValueError(f"Invalid peer port {port}")
+        if filename not in self.file_data:
+            self.send_error(client_connect, frame.request_id, STATUS_NOT_FOUND, "File not found on server!")
+            return
+        peers = self.tracker.announce(filename, (client_address[0], port))
+        send_frame(client_connect, FRAME_DATA, frame.request_id, payload=json.dumps(peers).encode(CHAR_ENCODING),
+                   flags=FLAG_END)
+        logging.debug(f"Sent {len(peers)} peers of {filename} to {client_address}")
+
+    def handle_delta(self, client_connect, client_address, frame):
+        """
+        Nhận chữ ký block bản cũ của client và gửi lại các lệnh COPY/DATA để dựng bản mới.
+        """
+        block_size, count = frame.offset, frame.length
+        name_length = NAME_LENGTH.unpack_from(frame.payload)[0]
+        filename = frame.payload[NAME_LENGTH.size:NAME_LENGTH.size + name_length].decode(CHAR_ENCODING)
+        signatures_offset = NAME_LENGTH.size + name_length
+        if not block_size or len(frame.payload) - signatures_offset != count * DELTA_SIGNATURE.size:
+            raise ProtocolError("Malformed delta request")
+        signatures = [DELTA_SIGNATURE.unpack_from(frame.payload, signatures_offset + i * DELTA_SIGNATURE.size)
+                      for i in range(count)]
+        logging.info(f'Delta sync request from {client_address}: {filename} ({count} blocks)')
+
+        stat = self.stat_file(filename)
+        if stat is None:
+            self.send_error(client_connect, frame.request_id, STATUS_NOT_FOUND, "File not found on server!")
+            return
+
+        response = FrameWriter(lambda data: self.send_data(client_connect, data), frame.request_id, SEND_SLICE_SIZE)
+        response.write(FILE_STAT.pack(stat.size, stat.mtime_ns))
+        digest = hashlib.blake2b(digest_size=32)
+        literal_bytes = 0
+        with self.storage.reader(filename) as file:
+            for op in generate_delta(file, block_size, signatures, digest):
+                if op[0] == "copy":
+                    response.write(DELTA_OP.pack(DELTA_COPY, op[1], op[2]))
+                else:
+                    literal_bytes += len(op[1])
+                    response.write(DELTA_OP.pack(DELTA_DATA, len(op[1]), 0))
+                    response.write(op[1])
+        response.write(DELTA_OP.pack(DELTA_END, 0, 0) + digest.digest())
+        response.close()
+        logging.info(f"Delta for {filename} sent to {client_address}: "
+                     f"{convert_size(literal_bytes)} literal of {convert_size(stat.size)}")
+
+    def handle_pack(self, client_connect, client_address, frame):
+        """
+        Gửi nhiều file nhỏ dưới dạng một container (kiểu tar) trên một kết nối:
+        header (magic, số file, bảng mục lục tên/kích thước/mtime), nội dung các file nối tiếp nhau,
+        cuối cùng là trailer (trạng thái + crc32 của từng file).
+        """
+        filenames = json.loads(frame.payload.decode(CHAR_ENCODING))
+        if not isinstance(filenames, list) or not all(isinstance(name, str) for name in filenames):
+            raise ValueError("Expected a JSON list of file names")
+        logging.info(f'Pack request from {client_address}: {len(filenames)} files')
+
+        # Lập mục lục trước để client biết kích thước từng file
+        entries = []
+        header = bytearray(PACK_MAGIC + struct.pack(">I", len(filenames)))
+        for filename in filenames:
+            stat = self.stat_file(filename)
+            size, mtime_ns = (stat.size, stat.mtime_ns) if stat else (-1, 0)
+            name = filename.encode(CHAR_ENCODING)
+            header += struct.pack(">H", len(name)) + name + PACK_ENTRY.pack(size, mtime_ns)
+            entries.append((filename, size))
+
+        # Gửi nội dung nối tiếp; FrameWriter gom nhiều file nhỏ vào một frame
+        response = FrameWriter(lambda data: self.send_data(client_connect, data), frame.request_id, SEND_SLICE_SIZE)
+        response.write(header)
+        trailer = bytearray()
+        sent_bytes = 0
+        for filename, size in entries:
+            if size < 0:
+                trailer += PACK_TRAILER.pack(PACK_MISSING, 0)
+                continue
+
+            status, crc, remaining = PACK_OK, 0, size
+            with self.storage.reader(filename) as file:
+                while remaining > 0:
+                    data = file.read(min(remaining, 1024 * 1024))
+                    if not data:
+                        # File bị thu nhỏ sau khi lập mục lục: bù 0 để giữ đúng khung và báo lỗi
+                        data = bytes(remaining)
+                        status = PACK_CHANGED
+                    crc = zlib.crc32(data, crc)
+                    response.write(data)
+                    remaining -= len(data)
+            trailer += PACK_TRAILER.pack(status, crc)
+            sent_bytes += size
 
-            self.clients.clear()
-            self.client_threads.clear()
+        response.write(trailer)
+        response.close()
+        logging.info(f"Pack of {len(filenames)} files ({convert_size(sent_bytes)}) sent to {client_address}")
 
-            # Đóng server socket
-            if self.server_socket and self.server_socket.fileno() != -1:
+    def wait_readable(self, client_connect, timeout):
+        """
+        Chờ client gửi frame tới (không giới hạn số fd như select trên Linux).
+        """
+        if hasattr(select, "poll"):
+            poller = select.poll()
+            poller.register(client_connect, select.POLLIN)
+            return bool(poller.poll(timeout * 1000))
+        return bool(select.select([client_connect], [], [], timeout)[0])
+
+    def serve_mux(self, client_connect, client_address, initial_window):
+        """
+        Chế độ multiplex: nhiều stream range trên một kết nối, do một luồng phục vụ.
+        Mỗi lượt xoay vòng gửi tối đa MUX_QUANTUM byte cho mỗi stream còn credit,
+        nên stream lớn hay stream bị client dừng nhận không chặn các stream khác.
+        """
+        logging.info(f"Multiplexed connection from {client_address} (window {convert_size(initial_window)})")
+        streams = {}  # Mã yêu cầu -> [tên file, vị trí tiếp theo, vị trí kết thúc, credit]
+        last_request = 0  # Mã yêu cầu GET lớn nhất đã nhận xử lý
+        draining = False
+        while True:
+            # Server đang tắt: báo GOAWAY một lần, gửi nốt các stream đã nhận rồi đóng kết nối
+            if not self.is_running and not draining:
+                draining = True
+                send_frame(client_connect, FRAME_GOAWAY, last_request)
+            if draining and not streams:
+                return
+            sendable = any(stream[3] > 0 for stream in streams.values())
+            # Nhận hết các frame đang chờ trước khi gửi lượt tiếp theo
+            while self.wait_readable(client_connect, 0 if sendable else MUX_IDLE_WAIT):
                 try:
-                    self.server_socket.close()
-                    logging.info("Server socket successfully closed")
-                except Exception as e:
-                    logging.error(f"Error: {e}")
-                finally:
-                    self.server_socket = None
+                    frame = read_frame(client_connect)
+                except ConnectionError:
+                    return
+                self.metrics.add("requests")
 
-            for handler in logging.getLogger().handlers:
-                handler.flush()
-                handler.close()
+                if frame.type == FRAME_CLOSE:
+                    logging.info(f'Close request from {client_address}')
+                    return
+                if frame.type == FRAME_WINDOW:
+                    if frame.request_id in streams:
+                        streams[frame.request_id][3] += frame.length
+                elif frame.type == FRAME_TRACE:
+                    TRACER.bind(frame.offset)
+                elif frame.type == FRAME_GET:
+                    # Gửi sau GOAWAY: bỏ qua, client gửi lại ở kết nối khác
+                    if draining:
+                        continue
+                    last_request = max(last_request, frame.request_id)
+                    filename = frame.payload.decode(CHAR_ENCODING, "replace")
+                    if filename not in self.file_data or frame.request_id in streams:
+                        self.send_error(client_connect, frame.request_id, STATUS_NOT_FOUND, "File not found on server!")
+                    else:
+                        streams[frame.request_id] = [filename, frame.offset, frame.offset + frame.length,
+                                                     initial_window]
+                else:
+                    self.send_error(client_connect, frame.request_id, STATUS_BAD_REQUEST,
+                                    f"Unsupported frame type {frame.type} on multiplexed connection")
+                sendable = any(stream[3] > 0 for stream in streams.values())
+
+            round_bytes = 0  # Số byte đã gửi trong lượt xoay vòng này
+            for request_id, stream in list(streams.items()):
+                filename, position, end, window = stream
+                if window <= 0:
+                    continue
+                try:
+                    with TRACER.span("disk_read", request=request_id):
+                        data = self.storage.read_range(filename, position, min(MUX_QUANTUM, window, end - position))
+                except FileNotFoundError:
+                    del streams[request_id]
+                    self.send_error(client_connect, request_id, STATUS_NOT_FOUND, "File not found on server!")
+                    continue
+                # File ngắn hơn yêu cầu: kết thúc stream sớm, client tự kiểm tra độ dài
+                finished = position + len(data) >= end or not data
+                header = pack_header(FRAME_DATA, request_id, position, len(data), len(data),
+                                     FLAG_END if finished else 0)
+                with TRACER.span("send", request=request_id, bytes=len(data)):
+                    self.send_data(client_connect, header + data)
+                stream[1] += len(data)
+                stream[3] -= len(data)
+                round_bytes += len(data)
+                if finished:
+                    del streams[request_id]
+            self.tuner.sent(client_connect, round_bytes)
 
-        except Exception as e:
-            logging.critical(f'Unexpected error during shutdown: {str(e)}')
-            raise
-                
-    
     def handle_clients(self, client_connect, client_address):
         """
         Xử lý client kết nối đến server.
         """
-        self.clients.add(client_connect)
+        self.metrics.add("connections")
+        # Phản hồi nhỏ của các yêu cầu pipelining không bị Nagle giữ lại
+        client_connect.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.tuner.sender(client_connect)
 
         try:
             # Gửi thông tin file trên server đến client
-            json_data = json.dumps(self.file_data).encode(CHAR_ENCODING)
-            
-            # Định dạng độ dài (4 bytes unsigned int)
-            header = struct.pack(">Q", len(json_data))
-
-            # Gửi header trước, sau đó là payload
-            client_connect.sendall(header + json_data)
-
-            while self.is_running:
-                # Nhận yêu cầu tải file từ client (format: filename|offset|size)
-                size_request = client_connect.recv(8)
-
-                if not size_request:
-                    break
+            with TRACER.span("hello"):
+                json_data = json.dumps(self.file_data).encode(CHAR_ENCODING)
+                send_frame(client_connect, FRAME_HELLO, payload=json_data)
 
-                size_request = struct.unpack(">Q", size_request)[0]
-                request = client_connect.recv(size_request).decode(CHAR_ENCODING)
-                if not request:
-                    break
-                
-                if "CLOSE PART SOCKET" in request:
-                    logging.info(f'Message: "{request}" from {client_address}')
+            last_request = 0  # Mã yêu cầu cuối cùng đã trả lời
+            # Kết nối mới luôn được phục vụ yêu cầu đầu tiên, kể cả khi server bắt đầu tắt ngay sau khi accept
+            while self.is_running or client_connect in self.new_clients:
+                try:
+                    frame = read_frame(client_connect)
+                except ConnectionError:
                     break
+                self.new_clients.discard(client_connect)
+                self.metrics.add("requests")
 
-                # Xử lý yêu cầu tải file từ client
-                if "|" in request:
+                if frame.type == FRAME_CLOSE:
+                    logging.info(f'Close request from {client_address}')
+                    return
 
-                    filename, offset, size = request.split("|")
-                    offset, size = int(offset), int(size)
-                    logging.info(f'File download request from {client_address}: {filename}')
+                if frame.type == FRAME_MUX:
+                    self.mux_clients.add(client_connect)
+                    self.serve_mux(client_connect, client_address, frame.length)
+                    return
 
-                    if filename in self.file_data:
-                        file_path = os.path.join(SERVER_FILES_DIRECTORY, filename)
+                # Thông báo mã transfer: không có phản hồi
+                if frame.type == FRAME_TRACE:
+                    TRACER.bind(frame.offset)
+                    continue
 
-                        if os.path.exists(file_path) and os.path.isfile(file_path):
-                            with open(file_path, "rb") as file:
-                                file.seek(offset)
-                                part_file_data = file.read(size)
-                                client_connect.sendall(part_file_data)
-                            logging.info(f"File chunk sent to {client_address}")
-                        
+                try:
+                    with TRACER.span(REQUEST_NAMES.get(frame.type, "request"), request=frame.request_id):
+                        if frame.type == FRAME_GET:
+                            self.handle_get(client_connect, client_address, frame)
+                        elif frame.type == FRAME_STAT:
+                            self.handle_stat(client_connect, frame)
+                        elif frame.type == FRAME_DELTA:
+                            self.handle_delta(client_connect, client_address, frame)
+                        elif frame.type == FRAME_PACK:
+                            self.handle_pack(client_connect, client_address, frame)
+                        elif frame.type == FRAME_BLOCKS:
+                            self.handle_blocks(client_connect, client_address, frame)
+                        elif frame.type == FRAME_PEERS:
+                            self.handle_peers(client_connect, client_address, frame)
                         else:
-                            client_connect.sendall(b"ERROR: File not found on server!")
+                            raise ProtocolError(f"Unknown frame type {frame.type}")
+                except (ProtocolError, ValueError, struct.error) as e:
+                    # Yêu cầu sai định dạng chỉ làm hỏng yêu cầu đó, kết nối vẫn dùng được
+                    logging.warning(f"Bad request from {client_address}: {e}")
+                    self.send_error(client_connect, frame.request_id, STATUS_BAD_REQUEST, str(e))
+                except OSError as e:
+                    if isinstance(e, ConnectionError):
+                        raise
+                    logging.error(f"Error serving request from {client_address}: {e}")
+                    self.send_error(client_connect, frame.request_id, STATUS_SERVER_ERROR, str(e))
+                last_request = frame.request_id
+
+            # Server đang tắt: yêu cầu đang xử lý đã xong, báo client gửi lại các yêu cầu sau ở nơi khác
+            if not self.is_running:
+                try:
+                    send_frame(client_connect, FRAME_GOAWAY, last_request)
+                except OSError:
+                    pass  # Client đã đóng kết nối
 
         except Exception as e:
             logging.error(f"Error: {e}")
 
         finally:
-            if client_connect in self.clients:
-                self.clients.remove(client_connect)
+            self.clients.discard(client_connect)
+            self.mux_clients.discard(client_connect)
+            self.new_clients.discard(client_connect)
             try:
                 if client_connect.fileno() != -1:
                     client_connect.close()
@@ -200,46 +923,245 @@ class Server:
 
 
 
-    def start(self):
+    def start(self, listen_socket=None, reuse_port=False, handoff=None, hot_restart=False):
+        """
+        Nhận kết nối cho đến khi tắt. `handoff` là socket và catalog nhận từ tiến trình trước khi hot restart;
+        với `hot_restart` server chờ tiến trình kế tiếp ở HANDOFF_PATH.
+        """
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+            with listen_socket or create_listen_socket(reuse_port) as server:
                 self.server_socket = server
-                server.bind((SERVER_HOST, SERVER_PORT))
-                server.listen()
                 server.settimeout(1)
 
                 local_ip = socket.gethostbyname(socket.gethostname())
                 logging.info(f'Server running on {SERVER_HOST}:{SERVER_PORT}') # Ghi log server đang chạy
                 logging.info(f'Local IP address: {local_ip}') # Ghi log địa chỉ IP local
+                if handoff:
+                    # Tiến trình cũ ngừng accept và drain từ đây, kết nối mới trong hàng đợi do tiến trình này nhận
+                    handoff.ready()
+                    logging.info(f"Took over the listening socket ({len(self.file_data)} files in the catalog)")
+                if hot_restart:
+                    self.handoff_listener = start_handoff_listener(server, self.file_data)
 
                 while self.is_running:
                     try:
                         client_connect, client_address = server.accept()
                         logging.info(f'New connection from {client_address}') # Ghi log kết nối mới từ client
 
-                        if self.is_running:
-                            client_handle = threading.Thread(target=self.handle_clients, 
-                                                             args=(client_connect, client_address), 
-                                                             daemon=True)
-                            client_handle.start()
-                            self.client_threads.append(client_handle)
+                        # Kết nối đã accept luôn được phục vụ (kể cả khi server vừa bắt đầu tắt), drain sẽ chờ nó
+                        self.clients.add(client_connect)
+                        self.new_clients.add(client_connect)
+                        client_handle = threading.Thread(target=self.handle_clients, 
+                                                         args=(client_connect, client_address), 
+                                                         daemon=True)
+                        client_handle.start()
+                        # Bỏ các luồng đã kết thúc để danh sách không lớn dần theo số kết nối đã phục vụ
+                        self.client_threads = [thread for thread in self.client_threads if thread.is_alive()]
+                        self.client_threads.append(client_handle)
                     except socket.timeout:
                         continue    
                     except OSError:
                         break
         except KeyboardInterrupt:
-            self.handle_shutdown(signal.SIGINT, None)
             logging.info("Keyboard interrupt received")
         except Exception as e:
-            self.handle_shutdown(signal.SIGINT, None)
             logging.error(f"Unexpected error: {str(e)}")
         finally:
-            if self.is_running:
+            if self.drain_deadline is None:
                 self.handle_shutdown(signal.SIGINT, None)
+            self.drain()
 
             for handler in logging.getLogger().handlers:
                 handler.flush()
 
+def run_worker(worker_id, settings, log_queue, shared_metrics, listen_socket, catalog, backend):
+    """
+    Điểm vào của tiến trình worker: ghi log qua hàng đợi của supervisor và phục vụ trên cổng chung.
+    """
+    apply_settings(settings)
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter(f"[worker {worker_id}] %(message)s"))
+    root_logger.addHandler(queue_handler)
+
+    if TRACE_FILE:
+        TRACER.enable(f"tcp-server worker {worker_id}")
+    server = Server(ServerMetrics(shared_metrics, worker_id), catalog, backend)
+    profile_file = f"{PROFILE_FILE}.worker{worker_id}" if PROFILE_FILE else None
+    with profiled(profile_file, PROFILE_MODE, logging.info):
+        server.start(listen_socket, reuse_port=listen_socket is None)
+    if TRACE_FILE:
+        root, ext = os.path.splitext(TRACE_FILE)
+        export_trace(f"{root}.worker{worker_id}{ext}")
+
+class Supervisor:
+    """
+    Chạy nhiều tiến trình worker trên cùng một cổng để tận dụng nhiều nhân CPU (tránh giới hạn GIL),
+    khởi động lại worker bị lỗi, gom log và số liệu của các worker.
+    """
+    def __init__(self, settings, workers, handoff=None):
+        self.settings = settings
+        self.handoff = handoff  # Socket và catalog nhận từ tiến trình trước khi hot restart
+        self.workers = workers
+        self.processes = [None] * workers
+        self.started_at = [0.0] * workers
+        self.is_running = True
+        self.log_queue = multiprocessing.Queue()
+        self.metrics = multiprocessing.Array("Q", workers * len(ServerMetrics.FIELDS), lock=False)
+        self.listen_socket = None
+        self.catalog = None
+        self.backend = None  # Backend mở một lần rồi dùng chung cho các worker (kế thừa qua fork)
+        self.pid = os.getpid()
+        signal.signal(signal.SIGINT, self.handle_shutdown)
+        signal.signal(signal.SIGTERM, self.handle_shutdown)
+
+    def handle_shutdown(self, signum, frame):
+        # Worker vừa fork còn giữ bộ xử lý này cho đến khi tạo Server: chưa phục vụ gì nên thoát luôn
+        if os.getpid() != self.pid:
+            sys.exit(0)
+        self.is_running = False
+
+    def spawn(self, worker_id):
+        process = multiprocessing.Process(target=run_worker, name=f"worker-{worker_id}",
+                                          args=(worker_id, self.settings, self.log_queue,
+                                                self.metrics, self.listen_socket, self.catalog, self.backend))
+        process.start()
+        self.processes[worker_id] = process
+        self.started_at[worker_id] = time.monotonic()
+        logging.info(f"Started worker {worker_id} (pid {process.pid})")
+
+    def start(self):
+        # Gom log của các worker về các handler (file + console) của supervisor
+        listener = logging.handlers.QueueListener(self.log_queue, *logging.getLogger().handlers)
+        listener.start()
+
+        # Không có SO_REUSEPORT (vd: Windows) hoặc khi hot restart (supervisor giữ socket để chuyển giao)
+        # thì các worker dùng chung socket do supervisor tạo
+        if self.handoff:
+            self.listen_socket = self.handoff.sockets[0]
+            self.catalog = self.handoff.state["catalog"]
+        elif HANDOFF_PATH or not hasattr(socket, "SO_REUSEPORT"):
+            self.listen_socket = create_listen_socket()
+        # Chỉ supervisor nạp thư mục (kho cas, bộ nhớ): các worker cùng nạp sẽ ghi đè manifest của nhau
+        # và mỗi worker giữ một bản riêng của toàn bộ file
+        self.backend = open_backend(STORAGE_BACKEND, SERVER_FILES_DIRECTORY, CAS_ROOT, DROP_BEHIND)
+        if self.catalog is None:
+            self.catalog = scan_available_files(self.backend)
+        logging.info(f"Supervisor starting {self.workers} workers on {SERVER_HOST}:{SERVER_PORT}")
+
+        handoff_listener = None
+        try:
+            for worker_id in range(self.workers):
+                self.spawn(worker_id)
+            if self.handoff:
+                self.handoff.ready()
+                logging.info("Took over the listening socket from the previous supervisor")
+            if HANDOFF_PATH:
+                handoff_listener = start_handoff_listener(self.listen_socket, self.catalog)
+
+            last_report = time.monotonic()
+            while self.is_running:
+                time.sleep(0.5)
+                for worker_id, process in enumerate(self.processes):
+                    if process.is_alive() or not self.is_running:
+                        continue
+                    logging.warning(f"Worker {worker_id} exited with code {process.exitcode}, restarting")
+                    # Worker chết ngay sau khi khởi động thì chờ một chút tránh vòng lặp khởi động lại
+                    if time.monotonic() - self.started_at[worker_id] < 1:
+                        time.sleep(1)
+                    self.spawn(worker_id)
+
+                if time.monotonic() - last_report >= METRICS_INTERVAL:
+                    last_report = time.monotonic()
+                    totals = ServerMetrics.totals(self.metrics)
+                    logging.info(f"Metrics: {totals['connections']} connections, {totals['requests']} requests, "
+                                 f"{convert_size(totals['bytes_sent'])} sent")
+        finally:
+            logging.info("Supervisor shutting down workers...")
+            if handoff_listener:
+                handoff_listener.close()
+            for process in self.processes:
+                if process and process.is_alive():
+                    os.kill(process.pid, signal.SIGINT)
+            for process in self.processes:
+                if process:
+                    process.join(timeout=DRAIN_TIMEOUT + FORCE_CLOSE_WAIT + 5)
+                    if process.is_alive():
+                        process.kill()
+            totals = ServerMetrics.totals(self.metrics)
+            logging.info(f"Final metrics: {totals['connections']} connections, {totals['requests']} requests, "
+                         f"{convert_size(totals['bytes_sent'])} sent")
+            listener.stop()
+            if self.listen_socket:
+                self.listen_socket.close()
+
 if __name__ == '__main__':
-    server = Server()
-    server.start() # Khởi động server
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="TCP file server")
+    parser.add_argument("--host", default=SERVER_HOST, help="Địa chỉ lắng nghe")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="Cổng lắng nghe")
+    parser.add_argument("--directory", default=SERVER_FILES_DIRECTORY, help="Thư mục chứa file phục vụ")
+    parser.add_argument("--storage", choices=["local", "cas", "memory"], default=STORAGE_BACKEND,
+                        help="Backend lưu trữ: thư mục cục bộ, kho theo nội dung hoặc bộ nhớ")
+    parser.add_argument("--cas-root", default=CAS_ROOT, help="Thư mục kho theo nội dung (backend cas)")
+    parser.add_argument("--read-ahead", type=int, default=READ_AHEAD,
+                        help="Nạp trước phía sau mỗi luồng đọc tuần tự (bytes), 0 = tắt")
+    parser.add_argument("--drop-behind", type=int, default=DROP_BEHIND,
+                        help="Bỏ khỏi page cache phần đã gửi của file từ kích thước này (bytes), 0 = tắt")
+    parser.add_argument("--no-coalesce", dest="coalesce", action="store_false",
+                        help="Mỗi yêu cầu tự đọc đĩa thay vì dùng chung lần đọc đồng thời cùng block")
+    parser.add_argument("--read-cache", type=int, default=READ_CACHE,
+                        help="Cache các block vừa đọc để dùng chung giữa các yêu cầu (bytes), 0 = tắt")
+    parser.add_argument("--throttle", type=int, default=THROTTLE_RATE,
+                        help="Giới hạn băng thông gửi (bytes/s) để giả lập mirror chậm")
+    parser.add_argument("--fair-share", action="store_true",
+                        help="Chia băng thông (--throttle) giữa các client theo deficit round robin")
+    parser.add_argument("--client-cap", type=int, default=CLIENT_CAP,
+                        help="Giới hạn băng thông mỗi client khi bật --fair-share (bytes/s)")
+    parser.add_argument("--priority", action="append", default=[], type=parse_priority, metavar="NETWORK=CLASS",
+                        help=f"Lớp ưu tiên cho một mạng khi bật --fair-share ({', '.join(PRIORITY_WEIGHTS)})")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="Số tiến trình worker dùng chung cổng (SO_REUSEPORT)")
+    parser.add_argument("--drain-timeout", type=float, default=DRAIN_TIMEOUT,
+                        help="Khi tắt, chờ tối đa chừng này giây để các yêu cầu đang xử lý chạy xong")
+    parser.add_argument("--handoff", metavar="PATH",
+                        help="Hot restart qua Unix socket PATH: nhận socket lắng nghe và catalog của server đang chạy "
+                             "ở PATH (server cũ drain rồi thoát), sau đó chờ bản kế tiếp ở PATH")
+    parser.add_argument("--socket-tuning", choices=TUNING_MODES, default=SOCKET_TUNING,
+                        help="auto: buffer gửi theo RTT và thông lượng đo được của từng kết nối; off: mặc định của kernel")
+    parser.add_argument("--socket-buffer", type=int, default=SOCKET_BUFFER, metavar="BYTES",
+                        help="Cố định buffer gửi của mỗi kết nối (bytes) thay vì tự điều chỉnh")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="Ghi span các pha xử lý (đọc đĩa, gửi, ...) ra file Chrome trace JSON khi tắt server")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="Profile mọi luồng, ghi FILE.pstats (và FILE.collapsed cho flamegraph) khi thoát")
+    parser.add_argument("--profile-mode", choices=["cpu", "wall", "sample"], default=PROFILE_MODE,
+                        help="cProfile mọi luồng theo thời gian CPU hoặc thời gian thực, hoặc lấy mẫu stack (chi phí thấp)")
+    args = parser.parse_args()
+    settings = {
+        "SERVER_HOST": args.host, "SERVER_PORT": args.port,
+        "SERVER_FILES_DIRECTORY": args.directory,
+        "STORAGE_BACKEND": args.storage, "CAS_ROOT": args.cas_root,
+        "READ_AHEAD": args.read_ahead, "DROP_BEHIND": args.drop_behind,
+        "COALESCE_READS": args.coalesce, "READ_CACHE": args.read_cache,
+        "THROTTLE_RATE": args.throttle,
+        "FAIR_SHARE": args.fair_share, "CLIENT_CAP": args.client_cap, "PRIORITY_RULES": args.priority,
+        "DRAIN_TIMEOUT": args.drain_timeout, "HANDOFF_PATH": args.handoff,
+        "SOCKET_TUNING": args.socket_tuning, "SOCKET_BUFFER": args.socket_buffer,
+        "TRACE_FILE": args.trace, "PROFILE_FILE": args.profile, "PROFILE_MODE": args.profile_mode,
+    }
+    apply_settings(settings)
+    handoff = receive_handoff(HANDOFF_PATH) if HANDOFF_PATH else None
+
+    if args.workers > 1:
+        Supervisor(settings, args.workers, handoff).start()
+    else:
+        if TRACE_FILE:
+            TRACER.enable("tcp-server")
+        server = Server(catalog=handoff.state["catalog"] if handoff else None)
+        with profiled(PROFILE_FILE, PROFILE_MODE, logging.info):
+            # Khởi động server (trên socket lắng nghe của tiến trình trước khi hot restart)
+            server.start(handoff.sockets[0] if handoff else None, handoff=handoff, hot_restart=bool(HANDOFF_PATH))
+        if TRACE_FILE:
+            export_trace(TRACE_FILE)
\ No newline at end of file
@@ -8,6 +8,19 @@ import sys
 import threading
 import struct
 import ipaddress
+import argparse
+import asyncio
+import functools
+import contextlib
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from common.progress import ProgressTracker
+from common.sequence import SequenceWindow
+from common.tracing import TRACER
+from common.profiling import profiled
+from common.tuning import set_buffer
+from common.multicast import MulticastReceiver, parse_group
+from common.writer import BufferPool, WriterPool
 
 SERVER_HOST = None
 SERVER_PORT = None
@@ -16,6 +29,18 @@ CHAR_ENCODING = "utf_8"
 INPUT_TXT = "input.txt"
 DIR_DOWNLOADED = "downloads"
 dot_progress = 0
+QUIET = False  # Không vẽ thanh tiến trình (chạy không có terminal)
+PACKET_TIMEOUT = 1  # Chờ gói tiếp theo tối đa chừng này giây rồi gửi lại SACK/yêu cầu (giây)
+MAX_TIMEOUTS = 15  # Số lần hết thời gian chờ liên tiếp trước khi bỏ part (trạng thái vẫn được giữ để tải tiếp)
+STATE_SAVE_INTERVAL = 128  # Lưu trạng thái tải tiếp sau mỗi chừng này gói
+RECEIVE_BUFFER_SIZE = 4 * 1024 * 1024  # SO_RCVBUF của socket nhận part: chứa được các gói đến dồn dập khi luồng ghi chậm
+WRITER_THREADS = 4  # Số luồng ghi part file tách khỏi luồng nhận, 0 = ghi ngay trong luồng nhận
+WRITE_QUEUE_DEPTH = 256  # Số gói chờ ghi tối đa của mỗi luồng ghi
+WRITE_BUFFERS = 512  # Số buffer gói (mỗi buffer BUFFER + 12 byte) dùng lại; hết thì luồng nhận chờ ghi
+WRITE_BATCH = 16  # Số gói liền nhau tối đa gộp thành một lần ghi (một lần giao cho luồng ghi)
+PROFILE_FILE = None  # Profile mọi luồng và ghi <file>.pstats (và <file>.collapsed) khi thoát, None = tắt
+PROFILE_MODE = "cpu"  # cpu / wall: cProfile mọi luồng theo thời gian CPU / thời gian thực; sample: lấy mẫu stack
+TRACE_FILE = None  # Ghi span các pha tải ra file Chrome trace JSON khi thoát, None = tắt tracing
 
 logging.basicConfig(
     filename = "client.log",
@@ -56,16 +81,43 @@ def get_server_port():
         except KeyboardInterrupt:
             sys.exit(1)
 
+def parse_endpoint(value):
+    """
+    Phân tích chuỗi "host:port" thành tuple (host, port).
+    """
+    host, _, port = value.rpartition(":")
+    try:
+        ipaddress.ip_address(host)
+        port = int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Endpoint không hợp lệ: {value}")
+    if not 1024 <= port <= 65535:
+        raise argparse.ArgumentTypeError("Cổng phải nằm trong khoảng từ 1024 đến 65535.")
+    return host, port
+
 class Client:
-    def __init__(self):
+    """
+    Client tải file qua UDP. `server` là (host, port), mặc định SERVER_HOST/SERVER_PORT;
+    interactive=False dùng như thư viện: không vẽ tiến trình, không bắt SIGINT và không hỏi lại IP/cổng khi lỗi.
+    """
+    def __init__(self, server=None, download_dir=None, interactive=True):
+        self.server = server or (SERVER_HOST, SERVER_PORT)
+        self.download_dir = download_dir or DIR_DOWNLOADED
+        self.interactive = interactive
+        self.quiet = QUIET or not interactive
         self.server_addr = None
         self.available_files = {}
         self.downloaded_files = set()
         self.is_running = True
-        self.progress = {}
         self.client_socket = None
-        self.print_lock = threading.Lock()
-        signal.signal(signal.SIGINT, self.handle_shutdown)
+        self.buffer_capped = False  # Đã cảnh báo buffer nhận bị hệ thống giới hạn
+        self.bytes_received = 0  # Số byte dữ liệu nhận qua mạng (không tính gói trùng, hỏng)
+        self.retries = 0  # Số lần hết thời gian chờ phải gửi lại yêu cầu/SACK
+        self.stats_lock = threading.Lock()
+        self.buffers = BufferPool(BUFFER + 12, WRITE_BUFFERS)  # Buffer nhận gói dùng lại
+        self.writer = WriterPool(WRITER_THREADS, WRITE_QUEUE_DEPTH)  # Ghi part file tách khỏi luồng nhận
+        if interactive:
+            signal.signal(signal.SIGINT, self.handle_shutdown)
 
     def handle_shutdown(self, signum, frame):
         logging.error("[handle_shutdown] Shutdown client.")
@@ -109,27 +161,31 @@ class Client:
         print(f"{'-' * 30}" + "\n")
 
     def connect_to_server(self):
-        global SERVER_HOST, SERVER_PORT
         try:
             if not self.client_socket:
                 self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                self.server_addr = (SERVER_HOST, SERVER_PORT)
+                if not self.interactive:
+                    # Không có người chờ: server không trả lời thì báo lỗi thay vì chờ mãi
+                    self.client_socket.settimeout(PACKET_TIMEOUT * MAX_TIMEOUTS)
+                self.server_addr = self.server
                 message = "GET_FILE_LIST"
                 message_len = struct.pack("!I", len(message))
-                self.client_socket.sendto(message_len, self.server_addr)
-                self.client_socket.sendto(message.encode(CHAR_ENCODING), self.server_addr)
+                with TRACER.span("file_list", transfer=0):
+                    self.client_socket.sendto(message_len, self.server_addr)
+                    self.client_socket.sendto(message.encode(CHAR_ENCODING), self.server_addr)
 
-                logging.info("[get_file_list] Sent GET_FILE_LIST request to server.")
+                    logging.info("[get_file_list] Sent GET_FILE_LIST request to server.")
 
-                len_data, _ = self.client_socket.recvfrom(4)
-                len_data = struct.unpack("!I", len_data)[0]
-                data, _ = self.client_socket.recvfrom(len_data) # _ là bỏ qua address server
+                    len_data, _ = self.client_socket.recvfrom(4)
+                    len_data = struct.unpack("!I", len_data)[0]
+                    data, _ = self.client_socket.recvfrom(len_data) # _ là bỏ qua address server
 
                 if data.decode(CHAR_ENCODING).startswith("ERROR"):
                     return False
 
                 self.available_files = json.loads(data.decode(CHAR_ENCODING))
-                self.display_available_files()
+                if self.interactive:
+                    self.display_available_files()
             return True # Chưa có socket thì khởi tạo, nếu có tức đã khởi tạo
         except Exception as e:
             logging.error(f"[get_file_list] {e}")
@@ -138,8 +194,8 @@ class Client:
                 self.client_socket.close()
                 self.client_socket = None
 
-            SERVER_HOST = get_server_ip()
-            SERVER_PORT = get_server_port()
+            if self.interactive:
+                self.server = (get_server_ip(), get_server_port())
             return False
 
     def monitor_input(self):
@@ -186,31 +242,13 @@ class Client:
             self.client_socket = None
             sys.exit(1)
 
-    def print_progress(self, file_name, part_number, progress_percent):
-        with self.print_lock:
-            self.progress[f"{file_name}_chunk_{part_number}"] = progress_percent
-            
-            # Xử lý in thông tin tiến trình đầu tiên
-            if part_number == 0 and progress_percent == 0:
-                print('\n' * 4)
-            else:
-                print('\033[4F', end='')
-                
-          # In tiến trình tải file
-            for i in range(4):
-                progress_display = self.progress.get(f"{file_name}_chunk_{i}", 0)
-                bar_length = 20  # Độ dài của thanh tiến trình
-                filled_length = int(bar_length * progress_display // 100)
-                bar = '█' * filled_length + ' ' * (bar_length - filled_length)
-                print(f"\033[K{file_name} - Chunk {i+1} {bar} {progress_display:.0f}%")
-
     def calc_checksum(self, data):
         """
         Tính checksum cho dữ liệu nhị phân (binary data) bằng cách gộp các byte thành số 16-bit 
         và tính bù một (one's complement) của tổng.
         """
-        if not isinstance(data, (bytes, bytearray)):
-            raise TypeError("Dữ liệu đầu vào phải là kiểu bytes hoặc bytearray.")
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            raise TypeError("Dữ liệu đầu vào phải là kiểu bytes, bytearray hoặc memoryview.")
         
         # Tổng ban đầu
         checksum = 0
@@ -235,90 +273,224 @@ class Client:
 
         return checksum
 
-    def download_chunk(self, file_name, offset_part, size_part, part_number):
-        chunk_socket = None
-        received_packets = set()
-        retry_count = 0
+    def part_paths(self, file_name, part_number):
+        """
+        Đường dẫn file part và file trạng thái (bitmap các gói đã nhận) để tải tiếp.
+        """
+        part_file = os.path.join(self.download_dir, f"{file_name}.part{part_number}")
+        return part_file, f"{part_file}.state"
 
-        while retry_count < 3:
-            try:
-                chunk_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                logging.info(f"[download_chunk] Sent GET_CHUNK request for {file_name}, part {part_number}")
-                request = f"GET_CHUNK|{file_name}|{offset_part}|{size_part}|{part_number}".encode(CHAR_ENCODING)
-                chunk_socket.sendto(request, self.server_addr)
+    def load_state(self, state_file, total):
+        """
+        Đọc trạng thái đã lưu của part; bỏ qua nếu hỏng hoặc không khớp số gói.
+        """
+        try:
+            with open(state_file, "rb") as state:
+                window = SequenceWindow.from_bytes(state.read())
+            if window.total == total:
+                return window
+        except (OSError, ValueError, struct.error):
+            pass
+        return SequenceWindow(total)
+
+    def save_state(self, part, state_file, state):
+        """
+        Ghi dữ liệu part xuống đĩa trước rồi mới ghi trạng thái (bản chụp SequenceWindow.to_bytes()), để trạng thái
+        không bao giờ đánh dấu gói chưa thực sự nằm trên đĩa. Chạy trên luồng ghi của part, sau các gói đã gửi trước.
+        """
+        with TRACER.span("fsync"):
+            part.flush()
+            os.fsync(part.fileno())
+        with open(f"{state_file}.tmp", "wb") as file, TRACER.span("save_state", size=len(state)):
+            file.write(state)
+        os.replace(f"{state_file}.tmp", state_file)
+
+    def write_packet(self, part, offset, data):
+        part.seek(offset)
+        part.write(data)
+
+    def submit_batch(self, part, batch):
+        """
+        Giao các gói liền nhau [(seq, buffer, dữ liệu)] cho luồng ghi của part: một lần seek + write
+        thay vì một lần mỗi gói; các buffer được trả về pool sau khi ghi (kể cả khi ghi lỗi).
+        """
+        if not batch:
+            return
+        offset = batch[0][0] * BUFFER
+        buffers = [buffer for _, buffer, _ in batch]
+        chunks = [chunk for _, _, chunk in batch]
 
-                seq_check = 0
-                total_received = b""
-                
-                while len(total_received) < size_part and self.is_running:
-                    try:
-                        chunk_socket.settimeout(5)
-                        remaining = size_part - len(total_received)
-                        data_recv, chunk_server = chunk_socket.recvfrom(min(remaining, BUFFER) + 12)
-                        part_recv, seq_recv, checksum, buffer_chunk = struct.unpack(
-                            f"!I I I {len(data_recv) - 12}s", data_recv
-                        )
-
-                        if not buffer_chunk:
-                            raise ConnectionError("Connection lost")
-
-                        # computed_checksum = sum(buffer_chunk) % 256
-                        computed_checksum = self.calc_checksum(buffer_chunk)
-                        packet_id = (part_recv, seq_recv)
-
-                        if packet_id in received_packets:
-                            logging.info(f"[download_chunk] Duplicate packet {packet_id} received, discarding.")
-                            continue
-                        
-                        if seq_recv == seq_check and checksum == computed_checksum:
-                            logging.info(f"[download_chunk] Valid packet {packet_id} received.")
-                            ack_message = f"ACK-{part_number}_{seq_check}".encode(CHAR_ENCODING)
-                            chunk_socket.sendto(ack_message, chunk_server)
-                            total_received += buffer_chunk
-                            seq_check += 1
-                            self.print_progress(file_name, part_number, (len(total_received) / size_part) * 100)
-                            received_packets.add(packet_id)
-                            part_file = os.path.join(DIR_DOWNLOADED, f"{file_name}.part{part_number}")
-                            os.makedirs(os.path.dirname(part_file), exist_ok=True)
-                            with open(part_file, "wb") as part_file:
-                                part_file.write(total_received)
-                                part_file.flush()
-                                os.fsync(part_file.fileno())
-                        else:
-                            logging.warning(f"[download_chunk] Packet {packet_id} invalid, sending NAK.")
-                            nak_message = f"NAK-{part_number}_{seq_check}".encode(CHAR_ENCODING)
-                            chunk_socket.sendto(nak_message, chunk_server)
-                            continue
-                    except socket.timeout:
-                        logging.warning(f"[download_chunk] Timeout for packet {part_number}_{seq_check}, retrying.")
-                        nak_message = f"NAK-{part_number}_{seq_check}".encode(CHAR_ENCODING)
-                        chunk_socket.sendto(nak_message, chunk_server)
+        def write():
+            self.write_packet(part, offset, chunks[0] if len(chunks) == 1 else b"".join(chunks))
+
+        def release(ok):
+            for buffer in buffers:
+                buffer.release()
+
+        self.writer.submit(part, write, release)
+
+    def download_chunk(self, file_name, offset_part, size_part, part_number, counts=None):
+        """
+        Tải một part: gói được nhận vào buffer của pool rồi giao cho luồng ghi của part (ghi vào đúng vị trí
+        trong file part), các gói đã nhận được theo dõi bằng SequenceWindow và báo lại cho server bằng SACK sau mỗi gói.
+        Trạng thái được lưu định kỳ để lần tải sau chỉ xin các gói còn thiếu.
+        """
+        counts = counts if counts is not None else [0] * 4  # Bộ đếm tiến trình riêng của luồng
+        chunk_socket = None
+        part = None
+        batch = []  # Các gói liền nhau đã nhận, chờ giao cho luồng ghi: (seq, buffer, dữ liệu)
+        received = retried = 0
+        part_file, state_file = self.part_paths(file_name, part_number)
+        total = -(-size_part // BUFFER)
+        window = self.load_state(state_file, total) if os.path.exists(part_file) else SequenceWindow(total)
+        counts[part_number] += min(size_part, len(window) * BUFFER)
+        if window.complete:
+            return True
+
+        try:
+            os.makedirs(os.path.dirname(part_file), exist_ok=True)
+            part = open(part_file, "r+b" if os.path.exists(part_file) else "w+b")
+            part.truncate(size_part)
+
+            chunk_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            # Kernel cắt SO_RCVBUF ở net.core.rmem_max mà không báo lỗi (mặc định chỉ ~200KB): buffer đầy thì gói bị bỏ
+            granted = set_buffer(chunk_socket, socket.SO_RCVBUF, RECEIVE_BUFFER_SIZE)
+            if granted < RECEIVE_BUFFER_SIZE and not self.buffer_capped:
+                self.buffer_capped = True
+                logging.warning(f"[download_chunk] Receive buffer capped at {granted} bytes by net.core.rmem_max "
+                                f"(wanted {RECEIVE_BUFFER_SIZE}), packets may be dropped at high rates")
+            chunk_socket.settimeout(PACKET_TIMEOUT)
+            request = f"GET_CHUNK|{file_name}|{offset_part}|{size_part}|{part_number}"
+            # Trường tùy chọn: trạng thái để tải tiếp (có thể rỗng), mã transfer khi bật tracing
+            resume = ""
+            if len(window):
+                origin, bits = window.sack()
+                resume = f"{origin}:{bits.hex()}"
+            if resume or TRACER.transfer():
+                request += f"|{resume}"
+            if TRACER.transfer():
+                request += f"|{TRACER.transfer():x}"
+            chunk_socket.sendto(request.encode(CHAR_ENCODING), self.server_addr)
+            logging.info(f"[download_chunk] Sent GET_CHUNK request for {file_name}, part {part_number} "
+                         f"({len(window)}/{total} packets already received)")
+
+            chunk_server = None  # Server gửi part từ một socket riêng, biết địa chỉ khi có gói đầu tiên
+            timeouts = 0
+            unsaved = 0
+
+            while not window.complete and self.is_running:
+                buffer = self.buffers.acquire(block=False)
+                if buffer is None:
+                    # Pool cạn: giao các gói đang gom để luồng ghi trả buffer về
+                    self.submit_batch(part, batch)
+                    batch = []
+                    buffer = self.buffers.acquire()
+                try:
+                    size, sender = chunk_socket.recvfrom_into(buffer.data)
+                    timeouts = 0
+                    if size < 12:
                         continue
-                return True
-            except Exception as e:
-                logging.error(f"[download_chunk] Error: {e}")
-                retry_count += 1
-                return False
-            finally:
-                if chunk_socket:
-                    chunk_socket.close()
-                    chunk_socket = None
-        
-        print(f"Failed to download chunk {part_number + 1} of {file_name} after {3} attempts.")
-        return False
+                    part_recv, seq_recv, checksum = struct.unpack_from("!I I I", buffer.data)
+                    buffer_chunk = memoryview(buffer.data)[12:size]
+                    if part_recv != part_number or seq_recv >= total:
+                        continue
+                    chunk_server = sender
+
+                    if seq_recv in window:
+                        logging.debug(f"[download_chunk] Duplicate packet {part_number}_{seq_recv}, discarding.")
+                    elif checksum != self.calc_checksum(buffer_chunk):
+                        logging.warning(f"[download_chunk] Packet {part_number}_{seq_recv} corrupted, discarding.")
+                    else:
+                        # Gom các gói liền nhau rồi ghi một lần; gặp gói không liền thì ghi phần đã gom
+                        if batch and (seq_recv != batch[-1][0] + 1 or len(batch) >= WRITE_BATCH):
+                            self.submit_batch(part, batch)
+                            batch = []
+                        batch.append((seq_recv, buffer, buffer_chunk))
+                        buffer = None  # Buffer được trả về pool khi lô gói được ghi xong
+                        window.add(seq_recv)
+                        counts[part_number] += len(buffer_chunk)
+                        received += len(buffer_chunk)
+                        unsaved += 1
+                        if unsaved >= STATE_SAVE_INTERVAL:
+                            # Ghi các gói đã đánh dấu trong window trước khi lưu trạng thái (cùng hàng đợi FIFO)
+                            self.submit_batch(part, batch)
+                            batch = []
+                            self.writer.submit(part, functools.partial(self.save_state, part, state_file,
+                                                                       window.to_bytes()))
+                            unsaved = 0
+                except socket.timeout:
+                    self.submit_batch(part, batch)  # Không chờ thêm gói liền sau khi server đang im lặng
+                    batch = []
+                    timeouts += 1
+                    retried += 1
+                    if timeouts >= MAX_TIMEOUTS:
+                        raise ConnectionError(f"No data from server for part {part_number}")
+                    logging.warning(f"[download_chunk] Timeout waiting for part {part_number} "
+                                    f"(next missing packet {window.base}), retrying.")
+                    if chunk_server is None:
+                        # Yêu cầu hoặc gói đầu tiên bị mất
+                        chunk_socket.sendto(request.encode(CHAR_ENCODING), self.server_addr)
+                        continue
+                finally:
+                    if buffer is not None:
+                        buffer.release()  # Gói không được ghi (trùng, hỏng, hết thời gian chờ)
+
+                if chunk_server is not None:
+                    origin, bits = window.sack()
+                    sack = f"SACK|{part_number}|{origin}|{bits.hex()}".encode(CHAR_ENCODING)
+                    # SACK cuối cùng gửi lặp lại vì server chỉ dừng khi nhận được nó
+                    for _ in range(3 if window.complete else 1):
+                        chunk_socket.sendto(sack, chunk_server)
+            self.submit_batch(part, batch)
+            batch = []
+            self.writer.sync(part)
+            self.writer.check(part)
+            return window.complete
+        except Exception as e:
+            logging.error(f"[download_chunk] Error: {e}")
+            print(f"Failed to download chunk {part_number + 1} of {file_name}: {e}")
+            return False
+        finally:
+            with self.stats_lock:
+                self.bytes_received += received
+                self.retries += retried
+            if part:
+                try:
+                    self.submit_batch(part, batch)
+                    self.writer.sync(part)
+                    self.writer.check(part)  # Gói chưa ghi được thì không lưu trạng thái đánh dấu đã nhận
+                    self.save_state(part, state_file, window.to_bytes())
+                except Exception as e:
+                    logging.error(f"[download_chunk] Error saving state: {e}")
+                finally:
+                    part.close()
+            if chunk_socket:
+                chunk_socket.close()
 
     def merge_chunk(self, file_name):
-        with open(os.path.join(DIR_DOWNLOADED, file_name), "wb") as outFile:
+        with open(os.path.join(self.download_dir, file_name), "wb") as outFile, TRACER.span("merge"):
             for part_number in range(4):
-                part_file = os.path.join(DIR_DOWNLOADED, f"{file_name}.part{part_number}")
+                part_file = os.path.join(self.download_dir, f"{file_name}.part{part_number}")
                 with open(part_file, "rb") as inFile:
                     outFile.write(inFile.read())
                 os.remove(part_file)
+                if os.path.exists(f"{part_file}.state"):
+                    os.remove(f"{part_file}.state")
         
         print(f"Successfully merged {file_name}.")
         logging.info(f"Successfully merged {file_name}.")
 
     def download_file(self, file_name):
+        """
+        Tải file bằng 4 luồng, mỗi lần tải có mã transfer riêng (gửi kèm GET_CHUNK khi bật tracing).
+        """
+        TRACER.bind(TRACER.new_transfer() if TRACER.enabled else 0)
+        with TRACER.span("download", file=file_name) as span:
+            downloaded = self.fetch_file(file_name)
+            span.set(ok=downloaded)
+        return downloaded
+
+    def fetch_file(self, file_name):
         if file_name in self.downloaded_files:
             print(f"Error: {file_name} does not exist on the server.")
             logging.error(f"[download_file] Error: {file_name} does not exist on the server.")
@@ -332,11 +504,10 @@ class Client:
         try:
             print(f"\nDownloading file {file_name} ...")
 
-            self.progress = {}
             file_size = self.available_files[file_name]
             chunk_size = file_size // 4
-            
-            print('\n' * 4)
+            part_sizes = [chunk_size if i < 3 else file_size - 3 * chunk_size for i in range(4)]
+            progress = ProgressTracker(file_name, part_sizes, quiet=self.quiet).start()
 
             threads = []
             results = [None] * 4
@@ -345,18 +516,19 @@ class Client:
                 """
                 Hàm hỗ trợ kiểm tra kết quả của từng thread.
                 """
-                results[index] = self.download_chunk(*args)
+                with TRACER.span("part", part=index):
+                    results[index] = self.download_chunk(*args, progress.slot())
 
             for i in range(4):
                 offset_part = i * chunk_size
-                part_size = chunk_size if i < 3 else file_size - offset_part
-                thread = threading.Thread(target=thread_target, args=(i, file_name, offset_part, part_size, i))
+                thread = threading.Thread(target=TRACER.wrap(thread_target), args=(i, file_name, offset_part, part_sizes[i], i))
                 thread.daemon = True
                 thread.start()
                 threads.append(thread)
             
             for thread in threads:
                 thread.join()
+            progress.stop()
 
             if not all(results):
                 print(f"Error downloading file {file_name}: One or more chunks failed to download.")
@@ -378,9 +550,35 @@ class Client:
         Xóa các phần chunk của file.
         """
         for part_number in range(4):
-            part_filename = os.path.join(DIR_DOWNLOADED, f"{filename}.part{part_number}")
-            if os.path.exists(part_filename):
-                os.remove(part_filename)
+            part_filename = os.path.join(self.download_dir, f"{filename}.part{part_number}")
+            for path in (part_filename, f"{part_filename}.state"):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def download_batch(self, file_names):
+        """
+        Tải lần lượt các file, trả về thống kê của từng file theo thứ tự:
+        {"file", "ok", "bytes", "duration", "retries"} (retries: số lần hết thời gian chờ phải gửi lại).
+        """
+        stats = []
+        for file_name in file_names:
+            received, retries = self.bytes_received, self.retries
+            started = time.monotonic()
+            ok = bool(self.is_running and self.download_file(file_name))
+            if not ok:
+                print(f"Error downloading {file_name}")
+            stats.append({"file": file_name, "ok": ok, "bytes": self.bytes_received - received,
+                          "duration": time.monotonic() - started, "retries": self.retries - retries})
+        return stats
+
+    def close(self):
+        """
+        Đóng socket tới server.
+        """
+        if self.client_socket:
+            self.client_socket.close()
+            self.client_socket = None
+        self.writer.close()
 
     def start_client(self):
         while self.is_running:
@@ -391,10 +589,7 @@ class Client:
                     continue
                 
                 new_files_to_download = self.monitor_input()
-                for file in new_files_to_download:
-                    if self.is_running:
-                        if not self.download_file(file):
-                            print(f"Error downloading {file}")
+                self.download_batch(new_files_to_download)
 
                 time.sleep(5)
             except KeyboardInterrupt:
@@ -405,8 +600,130 @@ class Client:
                 time.sleep(5)
         print("\33[JShut down...")
 
+def download_files(file_names, server, download_dir=None):
+    """
+    API thư viện: tải các file từ `server` (host, port) mà không hỏi IP/cổng hay đọc input.txt,
+    trả về thống kê của từng file (Client.download_batch). Không lấy được danh sách file thì ném ConnectionError.
+    """
+    download_dir = download_dir or DIR_DOWNLOADED
+    os.makedirs(download_dir, exist_ok=True)
+    client = Client(tuple(server), download_dir, interactive=False)
+    try:
+        if not client.connect_to_server():
+            raise ConnectionError(f"Cannot get the file list from server {server[0]}:{server[1]}")
+        return client.download_batch(list(file_names))
+    finally:
+        client.close()
+
+async def download_files_async(file_names, server, download_dir=None):
+    """
+    Như download_files nhưng không chặn event loop: chạy trong thread pool của loop,
+    các lần gọi đồng thời tải song song, mỗi lần một Client riêng.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(download_files, file_names, server, download_dir))
+
+def run_batch(file_names, as_json):
+    """
+    Chế độ batch của dòng lệnh: tải các file rồi in thống kê (JSON ra stdout, thông báo tải ra stderr);
+    trả về mã thoát: 0 nếu mọi file tải xong, 1 nếu có file lỗi, 2 nếu không kết nối được server.
+    """
+    try:
+        with contextlib.redirect_stdout(sys.stderr if as_json else sys.stdout):
+            results = download_files(file_names, (SERVER_HOST, SERVER_PORT))
+    except ConnectionError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    if as_json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            print(f"{result['file']}: {'ok' if result['ok'] else 'FAILED'}, {result['bytes']} bytes "
+                  f"in {result['duration']:.2f}s, {result['retries']} retries")
+    return 0 if all(result["ok"] for result in results) else 1
+
+def receive_multicast(group, interface=None, count=1, download_dir=None):
+    """
+    Tham gia nhóm multicast `group` (nhóm, cổng) và nhận `count` file server đẩy tới, trả về thống kê từng file
+    {"file", "ok", "bytes", "duration", "naks"}.
+    """
+    download_dir = download_dir or DIR_DOWNLOADED
+    receiver = MulticastReceiver(group, interface, buffer_size=RECEIVE_BUFFER_SIZE)
+    results = []
+    try:
+        print(f"Joined multicast group {group[0]}:{group[1]}, waiting for files...")
+        for _ in range(count):
+            result = receiver.receive(lambda file_name: os.path.join(download_dir, *file_name.split("/")))
+            logging.info(f"[receive_multicast] {result}")
+            print(f"{'Received' if result['ok'] else 'Failed to receive'} {result['file']} "
+                  f"in {result['duration']:.2f}s ({result['naks']} NAKs)")
+            results.append(result)
+    except socket.timeout:
+        print("Error: no multicast announcement received")
+    finally:
+        receiver.close()
+    return results
+
+def run_multicast(group, interface, count, as_json):
+    """
+    Chế độ multicast của dòng lệnh: nhận `count` file rồi in thống kê; mã thoát 0 nếu nhận đủ và đúng mọi file.
+    """
+    with contextlib.redirect_stdout(sys.stderr if as_json else sys.stdout):
+        results = receive_multicast(group, interface, count)
+    if as_json:
+        print(json.dumps(results, indent=2))
+    return 0 if len(results) == count and all(result["ok"] for result in results) else 1
+
 if __name__ == "__main__":
-    SERVER_HOST = get_server_ip()
-    SERVER_PORT = get_server_port()
-    client = Client()
-    client.start_client()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="UDP file download client")
+    parser.add_argument("files", nargs="*",
+                        help="Chế độ batch: tải các file này rồi thoát thay vì theo dõi input.txt (cần --server)")
+    parser.add_argument("--server", type=parse_endpoint, metavar="HOST:PORT",
+                        help="Địa chỉ server (không hỏi IP/cổng)")
+    parser.add_argument("--download-dir", default=DIR_DOWNLOADED, help="Thư mục lưu file đã tải")
+    parser.add_argument("--json", action="store_true", help="Chế độ batch: in thống kê từng file dạng JSON")
+    parser.add_argument("--multicast", type=parse_group, metavar="GROUP:PORT",
+                        help="Nhận file server đẩy tới nhóm multicast này thay vì tải unicast")
+    parser.add_argument("--multicast-interface", help="Địa chỉ interface nhận multicast (vd: 127.0.0.1 để thử trên một máy)")
+    parser.add_argument("--multicast-count", type=int, default=1, help="Số file nhận qua multicast trước khi thoát")
+    parser.add_argument("--quiet", action="store_true", help="Không vẽ thanh tiến trình (chạy không có terminal)")
+    parser.add_argument("--socket-buffer", type=int, default=RECEIVE_BUFFER_SIZE, metavar="BYTES",
+                        help="Buffer nhận (SO_RCVBUF) của mỗi socket nhận part")
+    parser.add_argument("--writer-threads", type=int, default=WRITER_THREADS,
+                        help="Số luồng ghi part file tách khỏi luồng nhận, 0 = ghi ngay trong luồng nhận")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="Ghi span các pha tải (danh sách file, từng part, gộp part) ra file Chrome trace JSON khi thoát")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="Profile mọi luồng, ghi FILE.pstats (và FILE.collapsed cho flamegraph) khi thoát")
+    parser.add_argument("--profile-mode", choices=["cpu", "wall", "sample"], default=PROFILE_MODE,
+                        help="cProfile mọi luồng theo thời gian CPU hoặc thời gian thực, hoặc lấy mẫu stack (chi phí thấp)")
+    args = parser.parse_args()
+    if args.files and not args.server:
+        parser.error("batch mode needs --server")
+    DIR_DOWNLOADED = args.download_dir
+    QUIET = args.quiet
+    RECEIVE_BUFFER_SIZE = args.socket_buffer
+    WRITER_THREADS = args.writer_threads
+    TRACE_FILE = args.trace
+    PROFILE_FILE, PROFILE_MODE = args.profile, args.profile_mode
+    if TRACE_FILE:
+        TRACER.enable("udp-client")
+
+    if args.server:
+        SERVER_HOST, SERVER_PORT = args.server
+    elif not args.multicast:
+        SERVER_HOST = get_server_ip()
+        SERVER_PORT = get_server_port()
+    exit_code = 0
+    try:
+        with profiled(PROFILE_FILE, PROFILE_MODE):
+            if args.multicast:
+                exit_code = run_multicast(args.multicast, args.multicast_interface, args.multicast_count, args.json)
+            elif args.files:
+                exit_code = run_batch(args.files, args.json)
+            else:
+                Client().start_client()
+    finally:
+        if TRACE_FILE:
+            print(f"Wrote {TRACER.export(TRACE_FILE)} trace spans to {TRACE_FILE}")
+    sys.exit(exit_code)
@@ -7,14 +7,40 @@ import json
 import sys
 import struct
 import threading
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from common.storage import COALESCE_CACHE_SIZE, create_storage
+from common.sequence import SequenceWindow
+from common.tracing import TRACER
+from common.profiling import profiled
+from common.tuning import set_buffer
+from common.multicast import DEFAULT_RATE, MulticastSender, parse_group
 
 SERVER_HOST = "0.0.0.0"
 SERVER_PORT = 6264
 MAX_RECEIVE_BYTES = 4096
+LENGTH_PREFIX = struct.Struct("!I")  # Tiền tố độ dài gửi trong một datagram riêng ngay trước GET_FILE_LIST
+MAX_PENDING_PREFIXES = 1024  # Số địa chỉ tối đa đang chờ message sau tiền tố độ dài
 CHUNK_BUFFER_SIZE = 8192
 CHARACTER_ENCODING = "utf_8"
 METADATA_FILE = "data.txt"
 SERVER_FILE_DIRECTORY = "server_files"
+STORAGE_BACKEND = "local"  # Backend lưu trữ: local, cas (kho theo nội dung) hoặc memory
+CAS_ROOT = "cas_store"
+COALESCE_READS = True  # Các part đồng thời của cùng một file dùng chung một lần đọc đĩa mỗi block (single-flight)
+READ_CACHE = COALESCE_CACHE_SIZE  # Cache các block vừa đọc (bytes), 0 = không cache
+SEND_WINDOW = 32  # Số gói được gửi mà chưa có xác nhận trên mỗi part
+RETRANSMIT_TIMEOUT = 0.2  # Gửi lại gói chưa được xác nhận sau chừng này giây (giây)
+CLIENT_TIMEOUT = 10  # Bỏ part nếu client im lặng quá lâu (giây)
+SEND_BUFFER_SIZE = 1024 * 1024  # SO_SNDBUF của socket gửi part: cả cửa sổ và các gói gửi lại không phải chờ buffer
+PROFILE_FILE = None  # Profile mọi luồng và ghi <file>.pstats (và <file>.collapsed) khi thoát, None = tắt
+PROFILE_MODE = "cpu"  # cpu / wall: cProfile mọi luồng theo thời gian CPU / thời gian thực; sample: lấy mẫu stack
+TRACE_FILE = None  # Ghi span các pha xử lý ra file Chrome trace JSON khi tắt server, None = tắt tracing
+MULTICAST_GROUP = None  # (nhóm, cổng) để đẩy file bằng multicast thay vì phục vụ unicast, None = tắt
+MULTICAST_INTERFACE = None  # Địa chỉ interface gửi multicast, None = kernel chọn
+MULTICAST_RATE = DEFAULT_RATE  # Tốc độ gửi multicast (bytes/s)
+MULTICAST_RECEIVERS = 0  # Số bên nhận cần báo xong để kết thúc mỗi file sớm, 0 = không biết trước
 
 logging.basicConfig(
     level=logging.INFO,
@@ -27,10 +53,13 @@ logging.basicConfig(
 
 class Server:
     def __init__(self):
+        self.storage = create_storage(STORAGE_BACKEND, SERVER_FILE_DIRECTORY, CAS_ROOT,
+                                      coalesce=COALESCE_READS, read_cache=READ_CACHE)
         self.available_files = self.scan_available_files()
         self.is_running = True
         self.server_socket = None
         self.client_threads = []
+        self.pending_lengths = {}  # Địa chỉ client -> độ dài message đã báo trong tiền tố
         signal.signal(signal.SIGINT, self.shutdown_server) # Xử lý tắt server khi nhận tín hiệu SIGINT
 
     def format_file_size(self, size_bytes):
@@ -53,13 +82,10 @@ class Server:
         try:
             file_data = {}
             with open(METADATA_FILE, 'w') as outFile:
-                for file in os.listdir(SERVER_FILE_DIRECTORY):
-                    file_path = os.path.join(SERVER_FILE_DIRECTORY, file)
-                    if os.path.isfile(file_path):
-                        size_bytes = os.path.getsize(file_path)
-                        size_readable = self.format_file_size(size_bytes)
-                        file_data[file] = size_bytes
-                        outFile.write(f"{file}: {size_readable}\n")
+                for file, stat in self.storage.list().items():
+                    size_readable = self.format_file_size(stat.size)
+                    file_data[file] = stat.size
+                    outFile.write(f"{file}: {size_readable}\n")
             
             return file_data
 
@@ -145,51 +171,139 @@ class Server:
 
         return checksum
 
-    def send_chunk(self, part_addr, file_name, offset_part, size_part, part_number):
+    def send_packet(self, chunk_socket, part_addr, inFile, offset_part, size_part, part_number, seq):
+        """
+        Đọc và gửi gói `seq` của part (gửi lần đầu hay gửi lại đều đọc đúng vị trí của gói).
+        """
+        position = seq * CHUNK_BUFFER_SIZE
+        inFile.seek(offset_part + position)
+        data = inFile.read(min(CHUNK_BUFFER_SIZE, size_part - position))
+        checksum = self.calc_checksum(data)
+        packet = struct.pack(f"!I I I {len(data)}s", part_number, seq, checksum, data)
+        chunk_socket.sendto(packet, part_addr)
+        logging.debug(f"[send_chunk] Sent {len(packet)} bytes for chunk {part_number}_{seq} to {part_addr}")
+
+    def send_chunk(self, part_addr, file_name, offset_part, size_part, part_number, resume=None, transfer=0):
+        """
+        Gửi một part theo cửa sổ trượt: tối đa SEND_WINDOW gói chưa xác nhận, client trả về SACK
+        (gói thiếu đầu tiên + bitmap các gói đã nhận), gói bị mất được gửi lại.
+        `resume` là SACK client gửi kèm yêu cầu khi tải tiếp part đang dở, `transfer` là mã transfer để tracing.
+        """
+        chunk_socket = None
+        TRACER.bind(transfer)
         try:
             chunk_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            path_file = os.path.join(SERVER_FILE_DIRECTORY, file_name)
-            with open(path_file, "rb") as inFile:
-                inFile.seek(offset_part)
-                seq_send = 0
-                total_send = b""
-
-                while len(total_send) < size_part:
-                    remaining = size_part - len(total_send)
-                    size_data_send = min(remaining, CHUNK_BUFFER_SIZE)
-                    data = inFile.read(size_data_send)
-                    
-                    # checksum = sum(data) % 256
-                    checksum = self.calc_checksum(data)
-                    packet_format = f"!I I I {len(data)}s"
-                    packet = struct.pack(packet_format, part_number, seq_send, checksum, data)
-
-                    chunk_socket.sendto(packet, part_addr)
-                    logging.info(f"[send_chunk] Sent {len(packet)} bytes for chunk {part_number}_{seq_send} to {part_addr}")
+            set_buffer(chunk_socket, socket.SO_SNDBUF, SEND_BUFFER_SIZE)
+            if file_name not in self.available_files:
+                raise FileNotFoundError(file_name)
+            total = -(-size_part // CHUNK_BUFFER_SIZE)
+            acked = SequenceWindow(total)
+            if resume:
+                acked.merge(*resume)
+            with self.storage.reader(file_name, offset_part) as inFile, \
+                    TRACER.span("send_chunk", file=file_name, part=part_number) as span:
+                send = lambda seq: self.send_packet(chunk_socket, part_addr, inFile, offset_part, size_part,
+                                                    part_number, seq)
+                sent_at = {}  # Gói đang chờ xác nhận -> lần gửi gần nhất
+                retransmits = 0
+                next_seq = acked.base
+                last_heard = time.monotonic()
+                chunk_socket.settimeout(RETRANSMIT_TIMEOUT)
+
+                while not acked.complete and self.is_running:
+                    while next_seq < total and next_seq < acked.base + SEND_WINDOW:
+                        if next_seq not in acked:
+                            send(next_seq)
+                            sent_at[next_seq] = time.monotonic()
+                        next_seq += 1
 
                     try:
-                        chunk_socket.settimeout(10)  # Timeout chờ ACK/NAK
-                        checking_data, _ = chunk_socket.recvfrom(MAX_RECEIVE_BYTES)
-                        message = checking_data.decode(CHARACTER_ENCODING)
-
-                        if message == f"ACK-{part_number}_{seq_send}":
-                            logging.info(f"Received ACK for chunk {part_number}_{seq_send} from {part_addr}")
-                            total_send += data
-                            seq_send += 1
-                        elif message == f"NAK-{part_number}_{seq_send}":
-                            logging.warning(f"[send_chunk] NAK for chunk {part_number}_{seq_send}, retrying...")
+                        message = chunk_socket.recv(MAX_RECEIVE_BYTES).decode(CHARACTER_ENCODING)
+                        _, part, origin, bitmap = message.split("|")
+                        if int(part) != part_number:
                             continue
+                        acked.merge(int(origin), bytes.fromhex(bitmap))
+                        last_heard = now = time.monotonic()
+                        # Gói thiếu nằm trước gói đã nhận được coi là mất (gửi lại nhanh)
+                        for seq in acked.missing():
+                            if now - sent_at.get(seq, 0) >= RETRANSMIT_TIMEOUT:
+                                logging.warning(f"[send_chunk] Chunk {part_number}_{seq} lost, resending")
+                                send(seq)
+                                sent_at[seq] = now
+                                retransmits += 1
                     except socket.timeout:
-                        logging.warning(f"[send_chunk] Timeout for chunk {part_number}_{seq_send}, retrying...")
-                        continue
-                    except Exception as e:
-                        logging.error(f"[send_chunk] Error: {e}")
+                        if time.monotonic() - last_heard > CLIENT_TIMEOUT:
+                            logging.warning(f"[send_chunk] No response from {part_addr} for part {part_number}, "
+                                            f"giving up")
+                            return
+                        # Không có SACK: gửi lại mọi gói trong cửa sổ chưa được xác nhận
+                        now = time.monotonic()
+                        for seq in range(acked.base, next_seq):
+                            if seq not in acked:
+                                send(seq)
+                                sent_at[seq] = now
+                                retransmits += 1
+                    except ValueError as e:
+                        logging.warning(f"[send_chunk] Invalid acknowledgement from {part_addr}: {e}")
+                    for seq in [seq for seq in sent_at if seq in acked]:
+                        del sent_at[seq]
+                span.set(packets=total, retransmits=retransmits)
+            logging.info(f"[send_chunk] Part {part_number} of {file_name} sent to {part_addr}")
         except Exception as e:
             logging.error(f"[send_chunk] Error: {e}")
         finally:
             if chunk_socket:
                 chunk_socket.close()
 
+    def push_multicast(self, file_names):
+        """
+        Gửi các file một lần tới nhóm multicast (mọi bên nhận cùng lúc), gói thiếu được gửi lại theo NAK.
+        """
+        sender = MulticastSender(MULTICAST_GROUP, MULTICAST_INTERFACE, MULTICAST_RATE, MULTICAST_RECEIVERS,
+                                 output=logging.warning)
+        results = []
+        try:
+            for file_name in file_names:
+                if file_name not in self.available_files or not self.is_running:
+                    logging.error(f"[push_multicast] {file_name} does not exist on the server, skipping")
+                    continue
+                logging.info(f"[push_multicast] Sending {file_name} to {MULTICAST_GROUP[0]}:{MULTICAST_GROUP[1]} "
+                             f"at {self.format_file_size(MULTICAST_RATE)}/s")
+                with TRACER.span("multicast", file=file_name) as span:
+                    result = sender.send_file(self.storage, file_name)
+                    span.set(rounds=result["rounds"], repairs=result["repairs"])
+                logging.info(f"[push_multicast] {file_name}: {self.format_file_size(result['sent'])} sent for "
+                             f"{self.format_file_size(result['bytes'])} in {result['duration']:.2f}s, "
+                             f"{result['repairs']} packets repaired in {result['rounds']} rounds, "
+                             f"{result['receivers_done']} receivers done")
+                results.append(result)
+        finally:
+            sender.close()
+        return results
+
+    def parse_request(self, data, addr):
+        """
+        Lấy message từ một datagram yêu cầu; trả về None nếu datagram chỉ là tiền tố độ dài hoặc không hợp lệ.
+        Tiền tố được nhớ theo địa chỉ gửi: datagram kế tiếp từ địa chỉ đó phải có đúng độ dài đã báo.
+        """
+        expected = self.pending_lengths.pop(addr, None)
+        if expected is not None and len(data) != expected:
+            # Message sau tiền tố bị mất: xử lý datagram này như một yêu cầu mới
+            logging.warning(f"Length prefix from {addr} announced {expected} bytes, got {len(data)}")
+            expected = None
+        if expected is None and len(data) == LENGTH_PREFIX.size:
+            length = LENGTH_PREFIX.unpack(data)[0]
+            if 0 < length <= MAX_RECEIVE_BYTES:
+                if len(self.pending_lengths) >= MAX_PENDING_PREFIXES:
+                    self.pending_lengths.clear()
+                self.pending_lengths[addr] = length
+                return None
+        try:
+            return data.decode(CHARACTER_ENCODING)
+        except UnicodeDecodeError:
+            logging.warning(f"Ignoring malformed request from {addr}")
+            return None
+
     def start_server(self):
         try:
             logging.info("[start_server] Server started and waiting for client requests.")
@@ -207,7 +321,8 @@ class Server:
 
             message = data.decode(CHARACTER_ENCODING)
             logging.info(f"Received GET_FILE_LIST from {addr}: {message}")
-            self.send_file_list(addr)
+            with TRACER.span("file_list"):
+                self.send_file_list(addr)
             self.server_socket.settimeout(1)
             
             while self.is_running:
@@ -215,19 +330,37 @@ class Server:
                     if message == "GET_FILE_LIST":
                         while self.is_running:
                             part_data, part_addr = self.server_socket.recvfrom(MAX_RECEIVE_BYTES)
-                            message_part = part_data.decode(CHARACTER_ENCODING)
+                            message_part = self.parse_request(part_data, part_addr)
+                            if message_part is None:
+                                continue
+
+                            if message_part == "GET_FILE_LIST":
+                                # Client mới kết nối trong khi server đang phục vụ
+                                logging.info(f"Received GET_FILE_LIST from {part_addr}")
+                                with TRACER.span("file_list"):
+                                    self.send_file_list(part_addr)
+                                continue
+
                             logging.info(f"Received GET_CHUNK {part_addr}: {message_part}")
-                            
                             if (message_part.startswith("GET_CHUNK")):
                                 parts = message_part.strip().split('|')
-                                _, file_name, offset_part, size_part, part_number = parts
+                                _, file_name, offset_part, size_part, part_number = parts[:5]
                                 offset_part = int(offset_part)
                                 size_part = int(size_part)
                                 part_number = int(part_number)
+                                # Trường tùy chọn: "origin:bitmap" khi client tải tiếp part đang dở,
+                                # mã transfer (hex) khi client bật tracing
+                                resume = None
+                                if len(parts) > 5 and parts[5]:
+                                    origin, bitmap = parts[5].split(":")
+                                    resume = int(origin), bytes.fromhex(bitmap)
+                                transfer = int(parts[6], 16) if len(parts) > 6 else 0
+                            else:
+                                continue
 
                             if self.is_running:
                                 logging.info(f"Processing GET_CHUNK for {file_name}, chunk {part_number}, offset {offset_part}, size {size_part}")
-                                client_thread = threading.Thread(target=self.send_chunk, args=(part_addr, file_name, offset_part, size_part, part_number), daemon=True)
+                                client_thread = threading.Thread(target=self.send_chunk, args=(part_addr, file_name, offset_part, size_part, part_number, resume, transfer), daemon=True)
                                 client_thread.start()
                                 self.client_threads.append(client_thread)
                 except socket.timeout:
@@ -248,5 +381,52 @@ class Server:
                 handler.flush()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="UDP file server")
+    parser.add_argument("--host", default=SERVER_HOST, help="Địa chỉ lắng nghe")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="Cổng lắng nghe")
+    parser.add_argument("--directory", default=SERVER_FILE_DIRECTORY, help="Thư mục chứa file phục vụ")
+    parser.add_argument("--storage", choices=["local", "cas", "memory"], default=STORAGE_BACKEND,
+                        help="Backend lưu trữ: thư mục cục bộ, kho theo nội dung hoặc bộ nhớ")
+    parser.add_argument("--cas-root", default=CAS_ROOT, help="Thư mục kho theo nội dung (backend cas)")
+    parser.add_argument("--no-coalesce", dest="coalesce", action="store_false",
+                        help="Mỗi part tự đọc đĩa thay vì dùng chung lần đọc đồng thời cùng block")
+    parser.add_argument("--read-cache", type=int, default=READ_CACHE,
+                        help="Cache các block vừa đọc để dùng chung giữa các part (bytes), 0 = tắt")
+    parser.add_argument("--socket-buffer", type=int, default=SEND_BUFFER_SIZE, metavar="BYTES",
+                        help="Buffer gửi (SO_SNDBUF) của mỗi socket gửi part")
+    parser.add_argument("--multicast", type=parse_group, metavar="GROUP:PORT",
+                        help="Đẩy các file --push tới nhóm multicast này rồi thoát thay vì phục vụ unicast")
+    parser.add_argument("--push", nargs="+", default=[], metavar="FILE", help="Các file gửi bằng multicast")
+    parser.add_argument("--multicast-interface", help="Địa chỉ interface gửi multicast (vd: 127.0.0.1 để thử trên một máy)")
+    parser.add_argument("--multicast-rate", type=int, default=MULTICAST_RATE, help="Tốc độ gửi multicast (bytes/s)")
+    parser.add_argument("--receivers", type=int, default=MULTICAST_RECEIVERS,
+                        help="Số bên nhận: kết thúc mỗi file khi đủ số bên nhận báo xong, 0 = chờ hết NAK")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="Ghi span các pha xử lý (danh sách file, gửi part) ra file Chrome trace JSON khi tắt server")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="Profile mọi luồng, ghi FILE.pstats (và FILE.collapsed cho flamegraph) khi thoát")
+    parser.add_argument("--profile-mode", choices=["cpu", "wall", "sample"], default=PROFILE_MODE,
+                        help="cProfile mọi luồng theo thời gian CPU hoặc thời gian thực, hoặc lấy mẫu stack (chi phí thấp)")
+    args = parser.parse_args()
+    SERVER_HOST, SERVER_PORT = args.host, args.port
+    SERVER_FILE_DIRECTORY = args.directory
+    STORAGE_BACKEND, CAS_ROOT = args.storage, args.cas_root
+    COALESCE_READS, READ_CACHE = args.coalesce, args.read_cache
+    SEND_BUFFER_SIZE = args.socket_buffer
+    TRACE_FILE = args.trace
+    PROFILE_FILE, PROFILE_MODE = args.profile, args.profile_mode
+    MULTICAST_GROUP, MULTICAST_INTERFACE = args.multicast, args.multicast_interface
+    MULTICAST_RATE, MULTICAST_RECEIVERS = args.multicast_rate, args.receivers
+    if bool(MULTICAST_GROUP) != bool(args.push):
+        parser.error("--multicast and --push go together")
+    if TRACE_FILE:
+        TRACER.enable("udp-server")
+
     server = Server()
-    server.start_server() # Khởi động server
\ No newline at end of file
+    with profiled(PROFILE_FILE, PROFILE_MODE):
+        if MULTICAST_GROUP:
+            server.push_multicast(args.push)
+        else:
+            server.start_server() # Khởi động server
+    if TRACE_FILE:
+        print(f"Wrote {TRACER.export(TRACE_FILE)} trace spans to {TRACE_FILE}")
\ No newline at end of file
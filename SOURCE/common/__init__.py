@@ -0,0 +1,3 @@
+"""
+Các thành phần dùng chung giữa server/client TCP và UDP.
+"""
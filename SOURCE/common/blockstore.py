@@ -0,0 +1,193 @@
+"""
+Kho block theo nội dung phía client: ghi nhớ hash sha256 của từng block trong các file đã tải,
+để khi một file mới (kể cả dưới tên khác) có block trùng thì lấy block đó từ đĩa thay vì tải lại.
+
+Kho không giữ bản sao riêng của dữ liệu: chỉ mục trỏ vào chính các file trong thư mục tải về.
+Block được đưa sang file mới bằng reflink nếu hệ thống file hỗ trợ (không tốn thêm chỗ), nếu
+không thì sao chép trong kernel (copy_file_range) hoặc đọc/ghi; file trùng hoàn toàn được hardlink.
+"""
+import errno
+import hashlib
+import json
+import os
+import struct
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+FICLONERANGE = 0x4020940D  # ioctl reflink một đoạn file (btrfs, xfs, ...)
+CLONE_RANGE = struct.Struct("=qQQQ")  # src_fd, src_offset, src_length, dest_offset
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def hash_blocks(path, block_size):
+    """
+    Hash sha256 (hex) của từng block của file.
+    """
+    digests = []
+    with open(path, "rb") as file:
+        while True:
+            block = file.read(block_size)
+            if not block:
+                break
+            digests.append(hashlib.sha256(block).hexdigest())
+    return digests
+
+
+class BlockStore:
+    """
+    Chỉ mục {hash block: (file, vị trí)} của các file đã tải trong `root`, lưu ở `index_path`.
+
+    Mỗi file được ghi kèm kích thước và mtime lúc đưa vào kho; file đã bị sửa hay xóa sau đó
+    tự bị loại khỏi chỉ mục khi được tra cứu.
+    """
+    def __init__(self, root, index_path):
+        self.root = root
+        self.index_path = index_path
+        self.files = {}  # Tên file -> {"size", "mtime_ns", "block_size", "blocks"}
+        self.blocks = {}  # Hash block -> (tên file, vị trí)
+        self.contents = {}  # (kích thước, hash danh sách block) -> tên file, để nhận ra file trùng hoàn toàn
+        self.lock = threading.Lock()
+        self.reflink = fcntl is not None  # Tắt khi hệ thống file không hỗ trợ reflink
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, "r") as index_file:
+                    files = json.load(index_file)
+            except (OSError, ValueError) as e:
+                print(f"Error loading block index: {e}")
+                files = {}
+            for name, entry in files.items():
+                if self.matches(name, entry):
+                    self.register(name, entry)
+
+    def path(self, name):
+        return os.path.join(self.root, *name.split("/"))
+
+    def matches(self, name, entry):
+        try:
+            stat = os.stat(self.path(name))
+        except OSError:
+            return False
+        return stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]
+
+    @staticmethod
+    def content_key(size, digests):
+        return size, hashlib.sha256("".join(digests).encode()).hexdigest()
+
+    def register(self, name, entry):
+        self.files[name] = entry
+        for index, digest in enumerate(entry["blocks"]):
+            self.blocks.setdefault(digest, (name, index * entry["block_size"]))
+        self.contents.setdefault(self.content_key(entry["size"], entry["blocks"]), name)
+
+    def save(self):
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, "w") as index_file:
+            json.dump(self.files, index_file)
+        os.replace(temp_path, self.index_path)
+
+    def add(self, name, block_size, digests):
+        """
+        Đưa file vừa tải xong (đã kiểm tra hash) vào kho.
+        """
+        stat = os.stat(self.path(name))
+        with self.lock:
+            if name in self.files:
+                self.discard(name)
+            self.register(name, {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                                 "block_size": block_size, "blocks": digests})
+            self.save()
+
+    def discard(self, name):
+        """
+        Bỏ file khỏi chỉ mục (gọi khi đang giữ lock); block của nó chuyển sang file khác nếu có.
+        """
+        entry = self.files.pop(name)
+        stale = set(entry["blocks"])
+        self.blocks = {digest: location for digest, location in self.blocks.items()
+                       if not (digest in stale and location[0] == name)}
+        self.contents = {key: other for key, other in self.contents.items() if other != name}
+        for other, other_entry in self.files.items():
+            for index, digest in enumerate(other_entry["blocks"]):
+                if digest in stale:
+                    self.blocks.setdefault(digest, (other, index * other_entry["block_size"]))
+
+    def locate(self, digest):
+        """
+        Vị trí (đường dẫn, offset) của block trên đĩa, None nếu chưa có.
+        """
+        with self.lock:
+            while digest in self.blocks:
+                name, offset = self.blocks[digest]
+                if self.matches(name, self.files[name]):
+                    return self.path(name), offset
+                self.discard(name)
+                self.save()
+            return None
+
+    def find_file(self, size, digests):
+        """
+        Tên file đã tải có nội dung giống hệt (cùng kích thước và danh sách block), None nếu không có.
+        """
+        with self.lock:
+            name = self.contents.get(self.content_key(size, digests))
+            if name is not None and not self.matches(name, self.files[name]):
+                self.discard(name)
+                self.save()
+                return None
+            return name
+
+    def copy_range(self, source_path, source_offset, target_file, target_offset, length):
+        """
+        Đưa `length` byte từ file nguồn vào file đích (đã mở để ghi) tại `target_offset`.
+        """
+        with open(source_path, "rb") as source:
+            if self.reflink:
+                try:
+                    fcntl.ioctl(target_file.fileno(), FICLONERANGE,
+                                CLONE_RANGE.pack(source.fileno(), source_offset, length, target_offset))
+                    return
+                except OSError as e:
+                    # Hệ thống file không hỗ trợ thì thôi thử; đoạn không thẳng hàng block thì chỉ sao chép đoạn này
+                    if e.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.ENOSYS):
+                        self.reflink = False
+            if hasattr(os, "copy_file_range"):
+                copied = 0
+                while copied < length:
+                    count = os.copy_file_range(source.fileno(), target_file.fileno(), length - copied,
+                                               source_offset + copied, target_offset + copied)
+                    if not count:
+                        break
+                    copied += count
+                if copied == length:
+                    return
+                source_offset, target_offset, length = (source_offset + copied, target_offset + copied,
+                                                        length - copied)
+            source.seek(source_offset)
+            target_file.seek(target_offset)
+            while length > 0:
+                data = source.read(min(length, COPY_BUFFER_SIZE))
+                if not data:
+                    raise ValueError(f"{source_path} is shorter than its index entry")
+                target_file.write(data)
+                length -= len(data)
+            target_file.flush()
+
+    def link_file(self, name, target_path):
+        """
+        Tạo file đích có nội dung giống file `name` trong kho: hardlink, nếu không được thì sao chép.
+        """
+        source_path = self.path(name)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        try:
+            os.link(source_path, target_path)
+            return "hardlink"
+        except OSError:
+            temp_path = f"{target_path}.tmp"
+            with open(temp_path, "wb") as target_file:
+                self.copy_range(source_path, 0, target_file, 0, os.path.getsize(source_path))
+            os.replace(temp_path, target_path)
+            return "copy"
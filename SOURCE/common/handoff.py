@@ -0,0 +1,126 @@
+"""
+Khởi động lại server không gián đoạn (hot restart): tiến trình cũ chuyển socket đang lắng nghe và trạng thái
+(vd: catalog file) cho tiến trình mới qua Unix domain socket (SCM_RIGHTS), rồi ngừng accept và drain các kết nối
+của nó. Socket lắng nghe không lúc nào bị đóng nên kết nối mới chỉ chờ trong hàng đợi accept, không bị từ chối.
+
+Trình tự trên đường dẫn `path`:
+1. tiến trình mới kết nối tới `path`, tiến trình cũ gửi các fd kèm trạng thái dạng JSON;
+2. tiến trình mới bắt đầu accept rồi gửi READY, tiến trình cũ ngừng accept và drain;
+3. tiến trình mới lắng nghe ở `path` cho lần khởi động lại tiếp theo.
+Tiến trình mới chết trước khi gửi READY thì tiến trình cũ tiếp tục phục vụ như chưa có gì.
+"""
+import json
+import os
+import socket
+import struct
+import threading
+
+from common.protocol import recv_exact
+
+HANDOFF_TIMEOUT = 30  # Thời gian chờ tiến trình mới nhận socket và báo READY (giây)
+HANDOFF_HEADER = struct.Struct(">Q")  # Độ dài trạng thái JSON gửi kèm các fd
+HANDOFF_READY = b"READY"
+MAX_HANDOFF_FDS = 16
+
+
+class Handoff:
+    """
+    Phía tiến trình mới: các socket và trạng thái nhận được, còn giữ kết nối để báo READY.
+    """
+    def __init__(self, conn, sockets, state):
+        self.conn = conn
+        self.sockets = sockets
+        self.state = state
+
+    def ready(self):
+        """
+        Báo tiến trình cũ rằng tiến trình mới đã accept trên các socket: tiến trình cũ bắt đầu drain.
+        """
+        try:
+            self.conn.sendall(HANDOFF_READY)
+        finally:
+            self.conn.close()
+
+
+def receive_handoff(path, timeout=HANDOFF_TIMEOUT):
+    """
+    Nhận socket lắng nghe và trạng thái từ tiến trình đang chạy ở `path`; None nếu không có tiến trình nào.
+    """
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.settimeout(timeout)
+    try:
+        conn.connect(path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        conn.close()
+        return None
+    try:
+        header, fds, _, _ = socket.recv_fds(conn, HANDOFF_HEADER.size, MAX_HANDOFF_FDS)
+        sockets = [socket.socket(fileno=fd) for fd in fds]
+        if len(header) < HANDOFF_HEADER.size:
+            header += recv_exact(conn, HANDOFF_HEADER.size - len(header))
+        state = json.loads(recv_exact(conn, HANDOFF_HEADER.unpack(header)[0]))
+    except Exception:
+        conn.close()
+        raise
+    return Handoff(conn, sockets, state)
+
+
+class HandoffListener:
+    """
+    Phía tiến trình đang chạy: lắng nghe ở `path`, gửi các socket (`get_sockets()`) và trạng thái (`get_state()`)
+    cho tiến trình mới, gọi `on_handoff()` khi tiến trình mới báo READY. Thông báo được ghi qua `output`.
+    """
+    def __init__(self, path, get_sockets, get_state, on_handoff, output=print):
+        self.path = path
+        self.output = output
+        self.get_sockets = get_sockets
+        self.get_state = get_state
+        self.on_handoff = on_handoff
+        self.listener = None
+        self.handed_off = False
+
+    def start(self):
+        # Đường dẫn còn lại của tiến trình trước (đã chuyển giao hoặc đã chết) được thay bằng socket của tiến trình này
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.path)
+        self.listener.listen(1)
+        threading.Thread(target=self.run, name="handoff", daemon=True).start()
+        return self
+
+    def run(self):
+        while not self.handed_off:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return  # Đã đóng
+            with conn:
+                try:
+                    self.handle(conn)
+                except Exception as e:
+                    self.output(f"Hot restart handoff failed, still serving: {e}")
+
+    def handle(self, conn):
+        conn.settimeout(HANDOFF_TIMEOUT)
+        state = json.dumps(self.get_state()).encode()
+        fds = [sock.fileno() for sock in self.get_sockets()]
+        socket.send_fds(conn, [HANDOFF_HEADER.pack(len(state))], fds)
+        conn.sendall(state)
+        self.output(f"Passed {len(fds)} listening sockets to the new process, waiting for it to accept")
+        if recv_exact(conn, len(HANDOFF_READY)) != HANDOFF_READY:
+            raise ConnectionError("New process did not confirm the handoff")
+        # `path` giờ thuộc về tiến trình mới: đóng mà không xóa
+        self.handed_off = True
+        self.listener.close()
+        self.on_handoff()
+
+    def close(self):
+        """
+        Ngừng nhận yêu cầu hot restart; xóa `path` nếu chưa chuyển giao cho tiến trình khác.
+        """
+        if self.listener is None:
+            return
+        self.listener.close()
+        if not self.handed_off and os.path.exists(self.path):
+            os.unlink(self.path)
@@ -0,0 +1,284 @@
+"""
+Phân phối một file tới nhiều máy trong cùng mạng LAN bằng UDP multicast: server gửi mỗi gói một lần
+tới nhóm multicast với tốc độ giới hạn, bên nhận theo dõi gói thiếu bằng SequenceWindow (bitmap)
+và báo lại bằng NAK, server gửi lại (multicast) các gói bị thiếu.
+
+Một phiên (mỗi file một phiên, mã phiên ngẫu nhiên) gồm các vòng:
+1. ANNOUNCE (vòng 0: tên, kích thước, số gói) rồi chờ bên nhận sẵn sàng;
+2. gửi các gói của vòng (vòng đầu: cả file; các vòng sau: gói có trong NAK), rồi ANNOUNCE số vòng vừa xong;
+3. mỗi bên nhận còn thiếu gói gửi một NAK gộp mọi chỗ thiếu (origin + bitmap các gói đã nhận),
+   bên nhận đã đủ gửi DONE; server gộp NAK của mọi bên nhận và gửi mỗi gói thiếu đúng một lần ở vòng sau.
+Phiên kết thúc (FIN) khi đủ số bên nhận báo DONE, hoặc sau QUIET_ROUNDS vòng liên tiếp không có NAK.
+"""
+import errno
+import json
+import os
+import random
+import socket
+import struct
+import time
+import zlib
+
+from common.sequence import SequenceWindow
+from common.storage import is_safe_name
+from common.tuning import set_buffer
+
+PACKET_SIZE = 8192  # Dữ liệu mỗi gói
+HEADER = struct.Struct("!BIII")  # Loại gói, mã phiên, số thứ tự gói (DATA) / số vòng (ANNOUNCE), crc32 dữ liệu
+NAK_HEADER = struct.Struct("!QQ")  # origin, hết vùng bitmap phủ (gói thiếu trong [origin, end) chưa có bit)
+ANNOUNCE, DATA, FIN, NAK, DONE = range(5)
+DEFAULT_RATE = 20 * 1024 * 1024  # Tốc độ gửi mặc định (bytes/s)
+MULTICAST_TTL = 1  # Không đi qua router: chỉ trong mạng LAN
+ANNOUNCE_REPEAT = 3  # Gói điều khiển được gửi lặp lại vì multicast không có xác nhận
+JOIN_WAIT = 0.5  # Chờ bên nhận sẵn sàng sau ANNOUNCE đầu tiên (giây)
+NAK_WAIT = 0.3  # Thời gian gom NAK sau mỗi vòng (giây)
+NAK_TIMEOUT = 1  # Bên nhận còn thiếu gói mà im lặng chừng này thì tự gửi NAK (giây)
+RECEIVE_TIMEOUT = 30  # Bên nhận bỏ phiên nếu không nhận được gì trong chừng này (giây)
+QUIET_ROUNDS = 3  # Số vòng liên tiếp không có NAK trước khi kết thúc phiên (khi không biết số bên nhận)
+MAX_ROUNDS = 1000
+MAX_NAK_BITS = 64 * 1024  # Bitmap NAK phủ tối đa chừng này gói, phần sau được báo ở vòng sau
+PACING_SLACK = 0.002  # Chỉ ngủ khi đi trước lịch gửi hơn chừng này (giây)
+SEND_BUFFER = 4 * 1024 * 1024  # SO_SNDBUF của server, cũng là SO_RCVBUF để nhận NAK dồn dập
+RECEIVE_BUFFER = 8 * 1024 * 1024  # SO_RCVBUF của bên nhận
+
+
+def parse_group(value):
+    """
+    "nhóm:cổng" -> (nhóm, cổng); nhóm phải là địa chỉ multicast IPv4 (224.0.0.0/4).
+    """
+    group, _, port = value.rpartition(":")
+    try:
+        first = socket.inet_aton(group)[0]
+        port = int(port)
+    except (OSError, ValueError):
+        raise ValueError(f"Expected GROUP:PORT, got {value}")
+    if not 224 <= first <= 239 or not 1 <= port <= 65535:
+        raise ValueError(f"Not an IPv4 multicast group: {value}")
+    return group, port
+
+
+def packet(kind, session, seq, payload=b""):
+    return HEADER.pack(kind, session, seq, zlib.crc32(payload)) + payload
+
+
+class MulticastSender:
+    """
+    Gửi file tới nhóm `group` (địa chỉ, cổng) qua `interface` (None = kernel chọn) với tốc độ `rate` bytes/s.
+    `receivers` > 0 là số bên nhận cần báo DONE để kết thúc phiên sớm. Thông báo được ghi qua `output`.
+    """
+    def __init__(self, group, interface=None, rate=DEFAULT_RATE, receivers=0, ttl=MULTICAST_TTL, output=print):
+        self.group = group
+        self.rate = rate
+        self.receivers = receivers
+        self.output = output
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        if interface:
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+        set_buffer(self.sock, socket.SO_SNDBUF, SEND_BUFFER)
+        set_buffer(self.sock, socket.SO_RCVBUF, SEND_BUFFER)
+        self.next_send = time.monotonic()
+        self.bytes_sent = 0  # Tổng số byte gửi ra (dữ liệu, gói sửa lỗi và điều khiển)
+
+    def send(self, data):
+        """
+        Gửi một gói theo lịch tốc độ `rate`; buffer gửi đầy (ENOBUFS) thì chờ rồi gửi lại.
+        """
+        now = time.monotonic()
+        if self.next_send - now > PACING_SLACK:
+            time.sleep(self.next_send - now)
+        elif self.next_send < now - PACING_SLACK:
+            self.next_send = now  # Bị chậm (vd: đọc đĩa): không gửi dồn để bù
+        self.next_send += len(data) / self.rate
+        while True:
+            try:
+                self.sock.sendto(data, self.group)
+                break
+            except OSError as e:
+                if e.errno not in (errno.ENOBUFS, errno.EAGAIN):
+                    raise
+                time.sleep(PACING_SLACK)
+        self.bytes_sent += len(data)
+
+    def collect(self, session, total, done, timeout):
+        """
+        Gom NAK và DONE trong `timeout` giây; trả về tập gói bị thiếu ở ít nhất một bên nhận.
+        """
+        missing = set()
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (self.receivers and len(done) >= self.receivers):
+                return missing
+            self.sock.settimeout(remaining)
+            try:
+                data, address = self.sock.recvfrom(HEADER.size + NAK_HEADER.size + MAX_NAK_BITS // 8)
+            except socket.timeout:
+                return missing
+            try:
+                kind, packet_session, _, checksum = HEADER.unpack_from(data)
+                payload = data[HEADER.size:]
+                if packet_session != session or zlib.crc32(payload) != checksum:
+                    continue
+                if kind == DONE:
+                    done.add(address)
+                elif kind == NAK:
+                    origin, end = NAK_HEADER.unpack_from(payload)
+                    window = SequenceWindow(total, origin, payload[NAK_HEADER.size:])
+                    missing.update(window.missing(min(end, total)))
+            except (struct.error, ValueError) as e:
+                self.output(f"Invalid feedback from {address}: {e}")
+
+    def send_file(self, storage, name):
+        """
+        Gửi một file của backend lưu trữ cho cả nhóm, trả về thống kê của phiên.
+        """
+        size = storage.stat(name).size
+        total = -(-size // PACKET_SIZE)
+        session = random.getrandbits(32)
+        announce = json.dumps({"file": name, "size": size, "packet_size": PACKET_SIZE, "total": total}).encode()
+        sent_before = self.bytes_sent
+        started = time.monotonic()
+        done = set()
+        repairs = quiet = rounds = 0
+
+        for _ in range(ANNOUNCE_REPEAT):
+            self.send(packet(ANNOUNCE, session, 0, announce))
+        self.collect(session, total, done, JOIN_WAIT)
+        pending = range(total)
+        with storage.reader(name) as file:
+            while rounds < MAX_ROUNDS:
+                for seq in pending:
+                    file.seek(seq * PACKET_SIZE)
+                    self.send(packet(DATA, session, seq, file.read(PACKET_SIZE)))
+                if rounds:
+                    repairs += len(pending)
+                rounds += 1
+                for _ in range(ANNOUNCE_REPEAT):
+                    self.send(packet(ANNOUNCE, session, rounds, announce))
+                missing = self.collect(session, total, done, NAK_WAIT)
+                if self.receivers and len(done) >= self.receivers:
+                    break
+                quiet = 0 if missing else quiet + 1
+                if quiet >= QUIET_ROUNDS:
+                    break
+                pending = sorted(missing)
+            else:
+                self.output(f"Multicast of {name} stopped after {MAX_ROUNDS} rounds")
+        for _ in range(ANNOUNCE_REPEAT):
+            self.send(packet(FIN, session, rounds))
+        return {"file": name, "bytes": size, "sent": self.bytes_sent - sent_before, "packets": total,
+                "repairs": repairs, "rounds": rounds, "receivers_done": len(done),
+                "duration": time.monotonic() - started}
+
+    def close(self):
+        self.sock.close()
+
+
+class MulticastReceiver:
+    """
+    Tham gia nhóm `group` (địa chỉ, cổng) trên `interface` (None = kernel chọn) và nhận các file được gửi tới nhóm.
+    """
+    def __init__(self, group, interface=None, timeout=RECEIVE_TIMEOUT, buffer_size=RECEIVE_BUFFER):
+        self.group = group
+        self.timeout = timeout
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # Nhiều bên nhận trên cùng máy (kiểm thử qua loopback) dùng chung cổng của nhóm
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(group)
+        membership = socket.inet_aton(group[0]) + socket.inet_aton(interface or "0.0.0.0")
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        self.buffer = set_buffer(self.sock, socket.SO_RCVBUF, buffer_size)
+        # NAK/DONE gửi từ socket riêng: mọi bên nhận dùng chung cổng của nhóm, server phân biệt bằng cổng nguồn
+        self.feedback_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.finished = set()  # Các phiên đã nhận xong, gói còn sót của chúng bị bỏ qua
+
+    def wait_announce(self):
+        """
+        Chờ ANNOUNCE của một phiên mới: (mã phiên, thông tin file, địa chỉ server).
+        """
+        self.sock.settimeout(self.timeout)
+        while True:
+            data, address = self.sock.recvfrom(HEADER.size + PACKET_SIZE)
+            kind, session, _, checksum = HEADER.unpack_from(data)
+            if kind == ANNOUNCE and session not in self.finished and zlib.crc32(data[HEADER.size:]) == checksum:
+                return session, json.loads(data[HEADER.size:]), address
+
+    def feedback(self, session, window, server):
+        """
+        NAK gộp mọi chỗ thiếu (gói đã nhận từ origin dạng bitmap), hoặc DONE nếu đã đủ.
+        """
+        if window.complete:
+            self.feedback_sock.sendto(packet(DONE, session, 0), server)
+            return
+        origin, bits = window.sack()
+        bits = bits[:MAX_NAK_BITS // 8]
+        end = origin + len(bits) * 8 if len(bits) == MAX_NAK_BITS // 8 else window.total
+        self.feedback_sock.sendto(packet(NAK, session, 0, NAK_HEADER.pack(origin, end) + bits), server)
+
+    def receive(self, path_for, on_packet=None):
+        """
+        Nhận file của phiên tiếp theo vào đường dẫn `path_for(tên file)`, trả về thống kê
+        {"file", "ok", "bytes", "duration", "naks"}. `on_packet(số byte)` được gọi sau mỗi gói mới.
+        """
+        session, info, server = self.wait_announce()
+        if not is_safe_name(info["file"]):
+            raise ValueError(f"Unsafe file name in announcement: {info['file']}")
+        started = time.monotonic()
+        total, packet_size = info["total"], info["packet_size"]
+        window = SequenceWindow(total)
+        path = path_for(info["file"])
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = f"{path}.mcast"
+        fd = os.open(temp_path, os.O_RDWR | os.O_CREAT, 0o644)
+        received = naks = last_round = 0
+        try:
+            os.ftruncate(fd, info["size"])
+            self.sock.settimeout(NAK_TIMEOUT)
+            last_heard = time.monotonic()
+            while not window.complete:
+                try:
+                    data, _ = self.sock.recvfrom(HEADER.size + packet_size)
+                except socket.timeout:
+                    if time.monotonic() - last_heard > self.timeout:
+                        raise ConnectionError(f"No multicast data for {info['file']}")
+                    self.feedback(session, window, server)
+                    naks += 1
+                    continue
+                kind, packet_session, seq, checksum = HEADER.unpack_from(data)
+                if packet_session != session:
+                    continue
+                last_heard = time.monotonic()
+                payload = memoryview(data)[HEADER.size:]
+                if zlib.crc32(payload) != checksum:
+                    continue
+                if kind == DATA:
+                    if window.add(seq):
+                        os.pwrite(fd, payload, seq * packet_size)
+                        received += len(payload)
+                        if on_packet:
+                            on_packet(len(payload))
+                elif kind == ANNOUNCE and seq > last_round:
+                    # Hết một vòng: mỗi bên nhận gửi một NAK cho mọi gói còn thiếu
+                    last_round = seq
+                    self.feedback(session, window, server)
+                    naks += 1
+                elif kind == FIN:
+                    break
+            if window.complete:
+                for _ in range(ANNOUNCE_REPEAT):
+                    self.feedback(session, window, server)
+        finally:
+            os.close(fd)
+            self.finished.add(session)
+            if window.complete:
+                os.replace(temp_path, path)
+            else:
+                os.remove(temp_path)
+        return {"file": info["file"], "ok": window.complete, "bytes": received,
+                "duration": time.monotonic() - started, "naks": naks}
+
+    def close(self):
+        self.sock.close()
+        self.feedback_sock.close()
@@ -0,0 +1,214 @@
+"""
+Profile server và client trên mọi luồng (cProfile khi chạy thường chỉ thấy luồng chính, trong khi việc
+thật nằm ở các luồng xử lý client và luồng tải part). Ba chế độ:
+
+- "cpu": cProfile riêng cho từng luồng (gắn qua threading.setprofile) đo bằng thời gian CPU của luồng,
+  thời gian chờ mạng/đĩa không được tính: dùng để tìm hàm tốn CPU;
+- "wall": như "cpu" nhưng đo bằng thời gian thực, thấy cả thời gian chờ;
+- "sample": một luồng nền đọc stack của mọi luồng (sys._current_frames) mỗi SAMPLE_INTERVAL giây,
+  chi phí thấp, tính theo thời gian thực; ghi thêm stack dạng gộp cho flamegraph.
+
+Kết quả gộp mọi luồng, ghi ra `<path>.pstats` (xem bằng `python -m pstats` hoặc snakeviz) và với
+chế độ "sample" thêm `<path>.collapsed` (flamegraph.pl, speedscope).
+"""
+import cProfile
+import collections
+import contextlib
+import io
+import marshal
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+
+SAMPLE_INTERVAL = 0.005  # Chu kỳ lấy mẫu của chế độ sample (giây)
+HOT_SPOTS = 15  # Số hàm tốn thời gian nhất in ra khi dừng
+
+
+class ProfileSnapshot:
+    """
+    Số liệu hiện tại của một cProfile.Profile mà không tắt nó (luồng của nó có thể vẫn đang chạy);
+    pstats.Stats nhận đối tượng có `stats` và `create_stats`.
+    """
+    def __init__(self, profile):
+        profile.snapshot_stats()
+        self.stats = profile.stats
+
+    def create_stats(self):
+        pass
+
+
+class ThreadProfiler:
+    """
+    cProfile cho luồng gọi start() và mọi luồng được tạo sau đó.
+    """
+    def __init__(self, mode="cpu"):
+        self.mode = mode
+        self.timer = time.thread_time if mode == "cpu" else time.perf_counter
+        self.profiles = []
+        self.lock = threading.Lock()
+        self.main_profile = None
+
+    def attach(self, *_):
+        """
+        Chạy ở sự kiện profile đầu tiên của luồng mới: thay hook này bằng một cProfile riêng của luồng.
+        """
+        sys.setprofile(None)
+        profile = cProfile.Profile(self.timer)
+        with self.lock:
+            self.profiles.append(profile)
+        profile.enable()
+        return profile
+
+    def start(self):
+        threading.setprofile(self.attach)
+        self.main_profile = self.attach()
+        return self
+
+    def stop(self):
+        threading.setprofile(None)
+        if self.main_profile:
+            self.main_profile.disable()
+
+    def write(self, path):
+        """
+        Gộp số liệu của mọi luồng, ghi `<path>.pstats` và trả về bảng các hàm tốn thời gian nhất.
+        """
+        with self.lock:
+            snapshots = [ProfileSnapshot(profile) for profile in self.profiles]
+        stats = pstats.Stats(*snapshots, stream=io.StringIO())
+        stats.dump_stats(f"{path}.pstats")
+        return report(f"{len(snapshots)} threads profiled ({self.mode} time), written to {path}.pstats",
+                      f"{path}.pstats")
+
+
+class SamplingProfiler:
+    """
+    Gom mẫu {(nhóm luồng, stack từ gốc đến lá): thời gian (giây)}; mỗi hàm là (file, dòng def, tên).
+    Thời gian trong hàm C được tính cho hàm Python gọi nó.
+    """
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.mode = "sample"
+        self.interval = interval
+        self.samples = collections.Counter()
+        self.hits = collections.Counter()  # Số mẫu của mỗi stack
+        self.sample_count = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="profiler", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+
+    def run(self):
+        own = threading.get_ident()
+        last = time.monotonic()
+        while not self.stopped.wait(self.interval):
+            now = time.monotonic()
+            elapsed, last = now - last, now
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                stack.reverse()
+                # "Thread-12 (handle_clients)" -> "Thread (handle_clients)": gộp các luồng cùng loại
+                group = re.sub(r"-\d+", "", names.get(ident, "thread"))
+                key = (group, tuple(stack))
+                self.samples[key] += elapsed
+                self.hits[key] += 1
+            self.sample_count += 1
+
+    def stats(self):
+        """
+        Dữ liệu dạng pstats: {hàm: (số mẫu, số mẫu, thời gian riêng, thời gian tích lũy, {hàm gọi: ...})}.
+        """
+        entries = {}
+        for key, weight in self.samples.items():
+            stack, hits = key[1], self.hits[key]
+            for depth, function in enumerate(stack):
+                entry = entries.setdefault(function, [0, 0, 0.0, 0.0, {}])
+                if function not in stack[:depth]:  # Hàm đệ quy chỉ tính một lần vào thời gian tích lũy
+                    entry[0] += hits
+                    entry[1] += hits
+                    entry[3] += weight
+                if depth == len(stack) - 1:
+                    entry[2] += weight
+                if depth:
+                    caller = entry[4].setdefault(stack[depth - 1], [0, 0, 0.0, 0.0])
+                    caller[0] += hits
+                    caller[1] += hits
+                    caller[3] += weight
+                    if depth == len(stack) - 1:
+                        caller[2] += weight
+        return {function: (cc, nc, tt, ct, {caller: tuple(values) for caller, values in callers.items()})
+                for function, (cc, nc, tt, ct, callers) in entries.items()}
+
+    def collapsed(self):
+        """
+        Các dòng "luồng;hàm;hàm;... số" (đơn vị micro giây) cho flamegraph.
+        """
+        lines = collections.Counter()
+        for (group, stack), weight in self.samples.items():
+            frames = [group] + [f"{name} ({os.path.basename(filename)}:{line})" for filename, line, name in stack]
+            lines[";".join(frame.replace(";", ":") for frame in frames)] += weight
+        return [f"{stack} {round(weight * 1e6)}" for stack, weight in sorted(lines.items()) if weight >= 1e-6]
+
+    def write(self, path):
+        """
+        Ghi `<path>.pstats` và `<path>.collapsed`, trả về bảng các hàm tốn thời gian nhất.
+        """
+        with open(f"{path}.pstats", "wb") as stats_file:
+            marshal.dump(self.stats(), stats_file)
+        with open(f"{path}.collapsed", "w") as collapsed_file:
+            collapsed_file.write("\n".join(self.collapsed()) + "\n")
+        return report(f"{self.sample_count} samples (wall time), written to {path}.pstats and {path}.collapsed",
+                      f"{path}.pstats")
+
+
+def report(title, stats_path, limit=HOT_SPOTS):
+    """
+    Tiêu đề và bảng `limit` hàm có thời gian riêng lớn nhất.
+    """
+    output = io.StringIO()
+    print(title, file=output)
+    stats = pstats.Stats(stats_path, stream=output)
+    if stats.stats:
+        stats.sort_stats("tottime").print_stats(limit)
+    return output.getvalue()
+
+
+def create_profiler(mode):
+    return SamplingProfiler() if mode == "sample" else ThreadProfiler(mode)
+
+
+@contextlib.contextmanager
+def profiled(path, mode="cpu", output=print):
+    """
+    Profile mọi luồng trong khối lệnh và ghi kết quả khi thoát (kể cả khi thoát do lỗi hay Ctrl+C).
+    Không làm gì nếu `path` rỗng.
+    """
+    if not path:
+        yield None
+        return
+    profiler = create_profiler(mode).start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        try:
+            output(profiler.write(path))
+        except OSError as e:
+            output(f"Error writing profile {path}: {e}")
@@ -0,0 +1,107 @@
+"""
+Hiển thị tiến trình tải tách khỏi các luồng tải: mỗi luồng chỉ cộng số byte vào bộ đếm
+của riêng nó (không khóa), một luồng vẽ duy nhất tổng hợp và vẽ lại với tần số cố định,
+kèm thông lượng và thời gian còn lại (ETA).
+"""
+import sys
+import threading
+import time
+
+REFRESH_INTERVAL = 0.2  # Chu kỳ vẽ lại (giây)
+BAR_LENGTH = 20  # Độ dài thanh tiến trình
+
+
+def format_size(size_bytes):
+    """
+    Chuyển đổi kích thước từ bytes sang KB, MB, GB phù hợp.
+    """
+    for unit, scale in (("TB", 1024 ** 4), ("GB", 1024 ** 3), ("MB", 1024 ** 2), ("KB", 1024)):
+        if size_bytes >= scale:
+            return f"{size_bytes / scale:.2f}{unit}"
+    return f"{size_bytes:.0f}B"
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+
+class ProgressTracker:
+    """
+    Theo dõi tiến trình tải một file gồm nhiều part.
+
+    Mỗi luồng tải lấy một slot (danh sách số byte theo part) bằng `slot()` và chỉ luồng đó ghi vào:
+    `counts[part] += nbytes`. Luồng vẽ đọc và cộng các slot, nên các luồng tải không chờ nhau
+    và không chờ terminal. Với quiet=True không vẽ gì (chạy không có terminal).
+    """
+    def __init__(self, label, part_sizes, quiet=False, interval=REFRESH_INTERVAL, stream=None):
+        self.label = label
+        self.part_sizes = list(part_sizes)
+        self.quiet = quiet
+        self.interval = interval
+        self.stream = stream or sys.stdout
+        self.slots = []
+        self.slots_lock = threading.Lock()  # Chỉ dùng khi tạo slot mới
+        self.started = None
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.drawn = False
+
+    def slot(self):
+        """
+        Bộ đếm riêng của luồng gọi.
+        """
+        counts = [0] * len(self.part_sizes)
+        with self.slots_lock:
+            self.slots.append(counts)
+        return counts
+
+    def totals(self):
+        """
+        Số byte đã nhận của từng part.
+        """
+        with self.slots_lock:
+            slots = list(self.slots)
+        return [sum(counts[part] for counts in slots) for part in range(len(self.part_sizes))]
+
+    def start(self):
+        self.started = time.monotonic()
+        if not self.quiet:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        """
+        Dừng luồng vẽ và vẽ trạng thái cuối cùng.
+        """
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+            self.render()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.render()
+
+    def render(self):
+        totals = self.totals()
+        done, total = sum(totals), sum(self.part_sizes)
+        elapsed = time.monotonic() - self.started
+        rate = done / elapsed if elapsed > 0 else 0
+        eta = format_duration((total - done) / rate) if rate > 0 else "--:--"
+
+        lines = []
+        for part, (received, size) in enumerate(zip(totals, self.part_sizes)):
+            percent = received / size * 100 if size else 100
+            filled = int(BAR_LENGTH * percent // 100)
+            bar = '█' * filled + ' ' * (BAR_LENGTH - filled)
+            lines.append(f"\033[K{self.label} - Part {part + 1} {bar} {percent:.0f}%")
+        lines.append(f"\033[K{format_size(done)}/{format_size(total)} {format_size(rate)}/s ETA {eta}")
+
+        # Lần vẽ sau đưa con trỏ lên đầu khối để vẽ đè
+        prefix = f"\033[{len(lines)}F" if self.drawn else ""
+        self.stream.write(prefix + "\n".join(lines) + "\n")
+        self.stream.flush()
+        self.drawn = True
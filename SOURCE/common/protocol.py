@@ -0,0 +1,208 @@
+"""
+Khung (frame) nhị phân của giao thức TCP. Mọi yêu cầu và phản hồi đều có header cố định:
+
+    loại (1) | cờ (1) | trạng thái (2) | mã yêu cầu (4) | offset (8) | length (8) | độ dài payload (4)
+
+theo sau là payload. Mã yêu cầu do client đặt và được server lặp lại trong phản hồi,
+nhờ đó client có thể gửi nhiều yêu cầu liên tiếp (pipelining) trên một kết nối.
+
+Ở chế độ multiplex (sau frame MUX), mỗi yêu cầu GET là một stream: server chia dữ liệu các stream
+thành frame DATA nhỏ gửi xen kẽ, mỗi stream chỉ được gửi trong giới hạn credit client cấp qua
+frame WINDOW, frame cuối của stream mang FLAG_END.
+
+Khi tắt, server gửi GOAWAY với mã yêu cầu cuối cùng nó nhận xử lý: các yêu cầu có mã lớn hơn
+không được trả lời và client phải gửi lại ở kết nối (hoặc mirror) khác.
+
+Ở chế độ swarm, server còn là tracker (PEERS trả về các client khác đang tải cùng file) và mỗi client
+chạy một peer phục vụ các piece đã tải bằng chính HELLO/GET/CLOSE, cộng thêm HAVE để hỏi peer có những piece nào.
+"""
+import collections
+import struct
+
+FRAME_HEADER = struct.Struct(">BBHIQQI")
+MAX_PAYLOAD = 256 * 1024 * 1024  # Payload lớn hơn coi như khung hỏng
+
+# Loại frame
+FRAME_HELLO = 1  # Server -> client khi kết nối: payload là catalog JSON {tên: kích thước}
+FRAME_GET = 2  # Tải range: offset, length, payload là tên file
+FRAME_STAT = 3  # Kích thước và mtime hiện tại của file: payload là tên file
+FRAME_DELTA = 4  # Delta sync: offset = kích thước block, length = số block, payload = tên + chữ ký
+FRAME_PACK = 5  # Nhiều file nhỏ trong một container: payload là danh sách tên (JSON)
+FRAME_CLOSE = 6  # Client đóng kết nối
+FRAME_DATA = 7  # Phản hồi; phản hồi dạng luồng gồm nhiều frame, frame cuối có FLAG_END
+FRAME_SHUTDOWN = 8  # Server sắp tắt
+FRAME_MUX = 9  # Chuyển kết nối sang chế độ multiplex: length = cửa sổ ban đầu của mỗi stream
+FRAME_WINDOW = 10  # Cấp thêm credit cho stream (mã yêu cầu): length = số byte
+FRAME_BLOCKS = 11  # Hash sha256 của từng block của file: payload là tên file
+FRAME_TRACE = 12  # Client -> server, không có phản hồi: các yêu cầu sau trên kết nối thuộc transfer `offset`
+FRAME_GOAWAY = 13  # Server đang tắt (drain): chỉ trả lời các yêu cầu có mã <= mã yêu cầu của frame này
+FRAME_PEERS = 14  # Client -> tracker: payload JSON {"file", "port"}; phản hồi là danh sách peer JSON [[host, port], ...]
+FRAME_HAVE = 15  # Client -> peer: payload là tên file; phản hồi offset = kích thước piece, length = số piece, payload = bitmap
+
+FLAG_END = 0x01  # Frame cuối của một phản hồi
+
+# Trạng thái phản hồi
+STATUS_OK = 0
+STATUS_NOT_FOUND = 1
+STATUS_BAD_REQUEST = 2
+STATUS_SERVER_ERROR = 3
+STATUS_UNAVAILABLE = 4  # Peer chưa có range được yêu cầu
+
+FILE_STAT = struct.Struct(">QQ")  # Payload phản hồi STAT/DELTA: kích thước, mtime (ns)
+NAME_LENGTH = struct.Struct(">H")  # Độ dài tên file đứng trước chữ ký trong yêu cầu DELTA
+BLOCK_LIST = struct.Struct(">QI")  # Đầu phản hồi BLOCKS: kích thước block, số block; sau đó là các hash
+BLOCK_DIGEST_SIZE = 32  # sha256
+
+Frame = collections.namedtuple("Frame", ["type", "flags", "status", "request_id", "offset", "length", "payload"])
+
+
+class ProtocolError(Exception):
+    """
+    Khung không hợp lệ hoặc phản hồi không khớp yêu cầu.
+    """
+
+
+class ResponseError(Exception):
+    """
+    Server trả về trạng thái lỗi cho một yêu cầu.
+    """
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class GoAway(ConnectionError):
+    """
+    Server đang tắt (frame GOAWAY): các yêu cầu có mã lớn hơn `last_request` sẽ không được trả lời.
+    """
+    def __init__(self, last_request):
+        super().__init__("Server is shutting down")
+        self.last_request = last_request
+
+
+def recv_into(sock, view):
+    """
+    Nhận đủ len(view) byte từ socket thẳng vào `view` (memoryview).
+    """
+    received = 0
+    while received < len(view):
+        count = sock.recv_into(view[received:])
+        if not count:
+            raise ConnectionError("Connection lost")
+        received += count
+
+
+def recv_exact(sock, size):
+    """
+    Nhận đúng `size` byte từ socket.
+    """
+    data = bytearray(size)
+    recv_into(sock, memoryview(data))
+    return bytes(data)
+
+
+def pack_header(frame_type, request_id=0, offset=0, length=0, payload_length=0, flags=0, status=STATUS_OK):
+    return FRAME_HEADER.pack(frame_type, flags, status, request_id, offset, length, payload_length)
+
+
+def send_frame(sock, frame_type, request_id=0, offset=0, length=0, payload=b"", flags=0, status=STATUS_OK):
+    """
+    Gửi một frame hoàn chỉnh (header + payload) trong một lần gọi.
+    """
+    sock.sendall(pack_header(frame_type, request_id, offset, length, len(payload), flags, status) + payload)
+
+
+def read_header(sock):
+    """
+    Đọc header của frame tiếp theo; payload (độ dài ở phần tử cuối) để người gọi tự đọc.
+    """
+    header = FRAME_HEADER.unpack(recv_exact(sock, FRAME_HEADER.size))
+    if header[-1] > MAX_PAYLOAD:
+        raise ProtocolError(f"Frame payload too large: {header[-1]} bytes")
+    return header
+
+
+def read_frame(sock):
+    """
+    Đọc trọn một frame kể cả payload.
+    """
+    frame_type, flags, status, request_id, offset, length, payload_length = read_header(sock)
+    return Frame(frame_type, flags, status, request_id, offset, length, recv_exact(sock, payload_length))
+
+
+class FrameReader:
+    """
+    Đọc phản hồi dạng luồng (nhiều frame DATA cùng mã yêu cầu) như một luồng byte liên tục.
+    """
+    def __init__(self, sock, request_id):
+        self.sock = sock
+        self.request_id = request_id
+        self.buffer = b""
+        self.position = 0
+        self.ended = False
+        self.received = 0  # Tổng byte đã nhận kể cả header
+
+    def next_frame(self):
+        frame = read_frame(self.sock)
+        self.received += FRAME_HEADER.size + len(frame.payload)
+        if frame.type == FRAME_GOAWAY:
+            raise GoAway(frame.request_id)
+        if frame.type == FRAME_SHUTDOWN:
+            raise ConnectionError("Server is shutting down")
+        if frame.type != FRAME_DATA or frame.request_id != self.request_id:
+            raise ProtocolError(f"Unexpected frame {frame.type} for request {frame.request_id}")
+        if frame.status != STATUS_OK:
+            raise ResponseError(frame.status, frame.payload.decode("utf-8", "replace"))
+        self.ended = bool(frame.flags & FLAG_END)
+        self.buffer, self.position = frame.payload, 0
+
+    def read_exact(self, size):
+        """
+        Đọc đúng `size` byte, nối payload của các frame liên tiếp nếu cần.
+        """
+        pieces = []
+        while size > 0:
+            if self.position >= len(self.buffer):
+                if self.ended:
+                    raise ProtocolError("Response ended early")
+                self.next_frame()
+                continue
+            piece = self.buffer[self.position:self.position + size]
+            self.position += len(piece)
+            size -= len(piece)
+            pieces.append(piece)
+        return b"".join(pieces)
+
+    def finish(self):
+        """
+        Bỏ qua phần còn lại của phản hồi để kết nối sẵn sàng cho yêu cầu sau.
+        """
+        while not self.ended:
+            self.next_frame()
+
+
+class FrameWriter:
+    """
+    Ghi phản hồi dạng luồng: gom dữ liệu nhỏ thành các frame DATA khoảng `frame_size` byte,
+    frame cuối mang FLAG_END. `send` là hàm gửi byte (có thể đã giới hạn băng thông).
+    """
+    def __init__(self, send, request_id, frame_size=64 * 1024):
+        self.send = send
+        self.request_id = request_id
+        self.frame_size = frame_size
+        self.pending = bytearray()
+
+    def write(self, data):
+        self.pending += data
+        if len(self.pending) >= self.frame_size:
+            self.flush()
+
+    def flush(self, end=False):
+        if self.pending or end:
+            header = pack_header(FRAME_DATA, self.request_id, payload_length=len(self.pending),
+                                 flags=FLAG_END if end else 0)
+            self.send(header + self.pending)
+            self.pending = bytearray()
+
+    def close(self):
+        self.flush(end=True)
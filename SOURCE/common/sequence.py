@@ -0,0 +1,132 @@
+"""
+Theo dõi các gói đã nhận của một luồng UDP bằng bitmap: mọi số thứ tự nhỏ hơn `origin` coi như
+đã nhận, bit i của bitmap ứng với gói `origin + i`. Bitmap chỉ phủ vùng từ gói thiếu đầu tiên
+đến gói lớn nhất đã nhận, nên bộ nhớ không tăng theo kích thước file (1 bit/gói trong cửa sổ).
+
+Cùng cấu trúc dùng để tạo và đọc selective ACK (SACK) và lưu trạng thái để tải tiếp.
+"""
+import struct
+
+STATE_HEADER = struct.Struct("!QQ")  # Tổng số gói, origin
+TRIM_BYTES = 64  # Cắt phần đầu bitmap khi đã nhận liền mạch ít nhất chừng này byte
+
+
+class SequenceWindow:
+    """
+    Tập các số thứ tự đã nhận trong [0, total).
+    """
+    def __init__(self, total, origin=0, bits=b""):
+        self.total = total
+        self.origin = origin  # Luôn là bội của 8
+        self.bits = bytearray(bits)
+        self.base = origin  # Gói thiếu đầu tiên
+        self.count = origin + sum(bin(byte).count("1") for byte in self.bits)  # Số gói đã nhận
+        self.advance()
+
+    def __contains__(self, seq):
+        if seq < self.base:
+            return True
+        index = seq - self.origin
+        byte = index >> 3
+        return byte < len(self.bits) and bool(self.bits[byte] & (1 << (index & 7)))
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def complete(self):
+        return self.base >= self.total
+
+    @property
+    def highest(self):
+        """
+        Số thứ tự lớn nhất đã nhận cộng 1 (0 nếu chưa nhận gói nào).
+        """
+        for byte in range(len(self.bits) - 1, -1, -1):
+            if self.bits[byte]:
+                return self.origin + byte * 8 + self.bits[byte].bit_length()
+        return self.origin
+
+    def add(self, seq):
+        """
+        Đánh dấu đã nhận gói `seq`; trả về False nếu gói đã nhận trước đó (trùng).
+        """
+        index = seq - self.origin
+        if index < 0 or seq >= self.total:
+            return False
+        byte, mask = index >> 3, 1 << (index & 7)
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte + 1 - len(self.bits)))
+        elif self.bits[byte] & mask:
+            return False
+        self.bits[byte] |= mask
+        self.count += 1
+        if seq == self.base:
+            if index & 7 != 7 and not self.bits[byte] & (mask << 1):
+                self.base += 1  # Trường hợp thường gặp: gói đến đúng thứ tự, gói kế tiếp vẫn thiếu
+            else:
+                self.advance()
+        return True
+
+    def advance(self):
+        """
+        Dời `base` qua các gói đã nhận liền mạch và bỏ phần đầu bitmap đã đầy.
+        """
+        byte = (self.base - self.origin) >> 3
+        while byte < len(self.bits) and self.bits[byte] == 0xFF:
+            byte += 1
+        index = byte * 8
+        if byte < len(self.bits):
+            value = self.bits[byte]
+            while value & (1 << (index & 7)):
+                index += 1
+        self.base = min(self.total, self.origin + index)
+        full = (self.base - self.origin) >> 3
+        if full >= TRIM_BYTES or full == len(self.bits) > 0:
+            del self.bits[:full]
+            self.origin += full * 8
+
+    def missing(self, end=None):
+        """
+        Các số thứ tự chưa nhận trong [base, end), mặc định đến gói lớn nhất đã nhận.
+        """
+        end = min(self.total, self.highest if end is None else end)
+        return [seq for seq in range(self.base, end) if seq not in self]
+
+    def merge(self, origin, bits):
+        """
+        Gộp thông tin từ SACK của bên nhận: mọi gói < origin và các bit đã bật.
+        """
+        if origin > self.origin:
+            skip = (origin - self.origin) >> 3
+            if skip > len(self.bits):
+                self.bits.extend(bytes(skip - len(self.bits)))
+            self.count += sum(8 - bin(byte).count("1") for byte in self.bits[:skip])
+            self.bits[:skip] = b"\xff" * skip
+            offset = skip
+        else:
+            bits = bits[(self.origin - origin) >> 3:]
+            offset = 0
+        if offset + len(bits) > len(self.bits):
+            self.bits.extend(bytes(offset + len(bits) - len(self.bits)))
+        for position, byte in enumerate(bits, offset):
+            new = byte & ~self.bits[position]
+            if new:
+                self.bits[position] |= new
+                self.count += bin(new).count("1")
+        self.count = min(self.count, self.total)
+        self.advance()
+
+    def sack(self):
+        """
+        (origin, bitmap) để gửi trong SACK.
+        """
+        return self.origin, bytes(self.bits)
+
+    def to_bytes(self):
+        return STATE_HEADER.pack(self.total, self.origin) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data):
+        total, origin = STATE_HEADER.unpack_from(data)
+        return cls(total, origin, data[STATE_HEADER.size:])
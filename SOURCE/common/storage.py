@@ -0,0 +1,644 @@
+"""
+Lớp lưu trữ của server: liệt kê, lấy thông tin và đọc một đoạn (range) của file,
+độc lập với nơi lưu dữ liệu thật (thư mục cục bộ, kho theo nội dung, bộ nhớ).
+
+Đọc từ đĩa có gợi ý cho kernel qua posix_fadvise (đọc tuần tự, nạp trước, bỏ trang đã phục vụ
+của file rất lớn) và ReadAheadStorage nạp trước block kế tiếp của các luồng đọc tuần tự trên
+một luồng nền trong lúc block hiện tại đang được gửi đi. CoalescingStorage gộp các lần đọc đồng thời
+cùng một block (nhiều client cùng tải một file mới) thành một lần đọc đĩa.
+"""
+import collections
+import concurrent.futures
+import hashlib
+import io
+import json
+import os
+import queue
+import threading
+
+FileStat = collections.namedtuple("FileStat", ["size", "mtime_ns"])
+
+CAS_BLOCK_SIZE = 1024 * 1024  # Kích thước block trong kho theo nội dung (1MB)
+CAS_MANIFEST = "manifest.json"
+CAS_OBJECTS = "objects"
+
+READ_AHEAD_SIZE = 8 * 1024 * 1024  # Cửa sổ nạp trước phía sau mỗi luồng đọc tuần tự
+DROP_BEHIND_SIZE = 1024 * 1024 * 1024  # File từ kích thước này được bỏ khỏi page cache sau khi phục vụ, 0 = tắt
+READ_AHEAD_STREAMS = 1024  # Số luồng đọc tuần tự được theo dõi cùng lúc
+COALESCE_BLOCK_SIZE = 1024 * 1024  # Đơn vị đọc (căn lề) khi gộp các lần đọc đồng thời
+COALESCE_CACHE_SIZE = 64 * 1024 * 1024  # Giữ các block vừa đọc chừng này byte (LRU), 0 = chỉ dùng chung lần đọc đang chạy
+
+
+def advise(fd, offset, length, advice):
+    """
+    Gợi ý cách truy cập cho kernel; bỏ qua nếu hệ điều hành không hỗ trợ (vd: Windows, macOS).
+    """
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(fd, offset, length, getattr(os, advice))
+        except OSError:
+            pass
+
+
+def is_safe_name(filename):
+    """
+    Tên file trong catalog phải là đường dẫn tương đối dạng "a/b/c", không có "..".
+    """
+    parts = filename.split("/")
+    return bool(filename) and not (filename.startswith("/") or "\\" in filename
+                                   or os.path.splitdrive(filename)[0]
+                                   or any(part in ("", ".", "..") for part in parts))
+
+
+class StorageBackend:
+    """
+    Giao diện chung cho các backend lưu trữ.
+    """
+    def list(self):
+        """
+        Trả về dictionary {tên file: FileStat} của toàn bộ file.
+        """
+        raise NotImplementedError
+
+    def stat(self, name):
+        """
+        Trả về FileStat của file hoặc None nếu không tồn tại.
+        """
+        raise NotImplementedError
+
+    def read_range(self, name, offset, size):
+        """
+        Đọc tối đa `size` byte từ vị trí `offset`.
+        """
+        raise NotImplementedError
+
+    def read_into(self, name, offset, buffer):
+        """
+        Đọc vào buffer có sẵn (tránh cấp phát), trả về số byte đã đọc.
+        """
+        data = self.read_range(name, offset, len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def reader(self, name, offset=0):
+        """
+        Đối tượng giống file để đọc tuần tự từ `offset`.
+        """
+        return RangeReader(self, name, offset)
+
+    def prefetch(self, name, offset, size):
+        """
+        Đưa range sắp được đọc vào bộ nhớ đệm (nếu backend có); mặc định không làm gì.
+        """
+
+    def block_hashes(self, name):
+        """
+        Hash sha256 (bytes) của từng block CAS_BLOCK_SIZE của file, để client nhận ra block đã có.
+        """
+        digests = []
+        with self.reader(name) as file:
+            while True:
+                block = file.read(CAS_BLOCK_SIZE)
+                if not block:
+                    break
+                digests.append(hashlib.sha256(block).digest())
+        return digests
+
+
+class RangeReader(io.RawIOBase):
+    """
+    Đọc tuần tự một file của backend bất kỳ thông qua read_range.
+    """
+    def __init__(self, storage, name, offset=0):
+        self.storage = storage
+        self.name = name
+        self.position = offset
+
+    def readable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.storage.stat(self.name).size
+        self.position = offset
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = max(0, self.storage.stat(self.name).size - self.position)
+        data = self.storage.read_range(self.name, self.position, size)
+        self.position += len(data)
+        return data
+
+    def readinto(self, buffer):
+        count = self.storage.read_into(self.name, self.position, memoryview(buffer))
+        self.position += count
+        return count
+
+
+class LocalStorage(StorageBackend):
+    """
+    Phục vụ file trực tiếp từ một thư mục cục bộ (quét đệ quy).
+
+    File từ `drop_behind_size` byte trở lên thường chỉ được tải một lần: phần đã phục vụ được bỏ
+    khỏi page cache để không đẩy các file nhỏ hay được tải ra ngoài.
+    """
+    def __init__(self, root, drop_behind_size=DROP_BEHIND_SIZE):
+        self.root = os.path.realpath(root)
+        self.drop_behind_size = drop_behind_size
+        self.hash_cache = {}  # Tên file -> (FileStat, hash các block) để không băm lại file chưa đổi
+
+    def resolve(self, name):
+        """
+        Đường dẫn thật của file, None nếu tên thoát ra ngoài thư mục (qua ".." hay symlink).
+        """
+        if not is_safe_name(name):
+            return None
+        file_path = os.path.realpath(os.path.join(self.root, *name.split("/")))
+        if os.path.commonpath([self.root, file_path]) != self.root or file_path == self.root:
+            return None
+        return file_path
+
+    def list(self):
+        files = {}
+        for directory, subdirectories, filenames in os.walk(self.root):
+            subdirectories.sort()
+            for filename in sorted(filenames):
+                name = os.path.relpath(os.path.join(directory, filename), self.root).replace(os.sep, "/")
+                stat = self.stat(name)
+                if stat is not None:
+                    files[name] = stat
+        return files
+
+    def stat(self, name):
+        file_path = self.resolve(name)
+        if not file_path or not os.path.isfile(file_path):
+            return None
+        stat = os.stat(file_path)
+        return FileStat(stat.st_size, stat.st_mtime_ns)
+
+    def open(self, name):
+        file_path = self.resolve(name)
+        if not file_path or not os.path.isfile(file_path):
+            raise FileNotFoundError(name)
+        return open(file_path, "rb")
+
+    def read_range(self, name, offset, size):
+        with self.open(name) as file:
+            advise(file.fileno(), offset, size, "POSIX_FADV_SEQUENTIAL")
+            file.seek(offset)
+            data = file.read(size)
+            self.drop_behind(file, offset, len(data))
+            return data
+
+    def read_into(self, name, offset, buffer):
+        with self.open(name) as file:
+            advise(file.fileno(), offset, len(buffer), "POSIX_FADV_SEQUENTIAL")
+            file.seek(offset)
+            count = file.readinto(buffer)
+            self.drop_behind(file, offset, count)
+            return count
+
+    def drop_behind(self, file, offset, size):
+        """
+        Bỏ các trang vừa phục vụ của file rất lớn khỏi page cache.
+        """
+        if self.drop_behind_size and size and os.fstat(file.fileno()).st_size >= self.drop_behind_size:
+            advise(file.fileno(), offset, size, "POSIX_FADV_DONTNEED")
+
+    def reader(self, name, offset=0):
+        file = self.open(name)
+        advise(file.fileno(), offset, 0, "POSIX_FADV_SEQUENTIAL")
+        file.seek(offset)
+        return file
+
+    def block_hashes(self, name):
+        stat = self.stat(name)
+        cached = self.hash_cache.get(name)
+        if cached and cached[0] == stat:
+            return cached[1]
+        digests = super().block_hashes(name)
+        self.hash_cache[name] = (stat, digests)
+        return digests
+
+    def prefetch(self, name, offset, size):
+        file_path = self.resolve(name)
+        if not file_path:
+            return
+        with open(file_path, "rb", buffering=0) as file:
+            if hasattr(os, "posix_fadvise"):
+                advise(file.fileno(), offset, size, "POSIX_FADV_WILLNEED")
+                return
+            # Không có fadvise: tự đọc để kernel giữ các trang trong page cache
+            file.seek(offset)
+            buffer = bytearray(min(size, READ_AHEAD_SIZE))
+            while size > 0:
+                count = file.readinto(memoryview(buffer)[:min(size, len(buffer))])
+                if not count:
+                    break
+                size -= count
+
+
+class MemoryStorage(StorageBackend):
+    """
+    Giữ toàn bộ file trong bộ nhớ, dùng cho kiểm thử và benchmark.
+    """
+    def __init__(self, files=None):
+        self.files = {}
+        for name, data in (files or {}).items():
+            self.put(name, data)
+
+    @classmethod
+    def from_directory(cls, root):
+        storage = cls()
+        local = LocalStorage(root)
+        for name, stat in local.list().items():
+            storage.put(name, local.read_range(name, 0, stat.size), stat.mtime_ns)
+        return storage
+
+    def put(self, name, data, mtime_ns=None):
+        if not is_safe_name(name):
+            raise ValueError(f"Unsafe file name: {name}")
+        self.files[name] = (bytes(data), mtime_ns if mtime_ns is not None else 0)
+
+    def list(self):
+        return {name: FileStat(len(data), mtime_ns) for name, (data, mtime_ns) in self.files.items()}
+
+    def stat(self, name):
+        if name not in self.files:
+            return None
+        data, mtime_ns = self.files[name]
+        return FileStat(len(data), mtime_ns)
+
+    def read_range(self, name, offset, size):
+        if name not in self.files:
+            raise FileNotFoundError(name)
+        return self.files[name][0][offset:offset + size]
+
+    def read_into(self, name, offset, buffer):
+        if name not in self.files:
+            raise FileNotFoundError(name)
+        data = memoryview(self.files[name][0])[offset:offset + len(buffer)]
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class ContentAddressedStorage(StorageBackend):
+    """
+    Kho theo nội dung: file được chia thành block 1MB lưu theo sha256 trong `objects/`,
+    block trùng nhau giữa các file chỉ lưu một lần. `manifest.json` ánh xạ tên file sang danh sách block.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.manifest = {}
+        os.makedirs(os.path.join(root, CAS_OBJECTS), exist_ok=True)
+        manifest_path = os.path.join(root, CAS_MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r") as manifest_file:
+                self.manifest = json.load(manifest_file)
+
+    def object_path(self, digest):
+        return os.path.join(self.root, CAS_OBJECTS, digest[:2], digest)
+
+    def import_directory(self, source):
+        """
+        Nạp (hoặc cập nhật) toàn bộ file của một thư mục vào kho, trả về số byte thực sự được ghi mới.
+        """
+        local = LocalStorage(source)
+        written = 0
+        for name, stat in local.list().items():
+            entry = self.manifest.get(name)
+            if entry and entry["size"] == stat.size and entry["mtime_ns"] == stat.mtime_ns:
+                continue
+            blocks = []
+            with local.open(name) as file:
+                while True:
+                    block = file.read(CAS_BLOCK_SIZE)
+                    if not block:
+                        break
+                    digest = hashlib.sha256(block).hexdigest()
+                    object_path = self.object_path(digest)
+                    if not os.path.exists(object_path):
+                        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                        temp_path = f"{object_path}.{os.getpid()}.tmp"  # Tên riêng từng tiến trình
+                        with open(temp_path, "wb") as object_file:
+                            object_file.write(block)
+                        os.replace(temp_path, object_path)
+                        written += len(block)
+                    blocks.append(digest)
+            self.manifest[name] = {"size": stat.size, "mtime_ns": stat.mtime_ns, "blocks": blocks}
+
+        # Bỏ các file không còn trong thư mục nguồn
+        current = local.list()
+        for name in list(self.manifest):
+            if name not in current:
+                del self.manifest[name]
+        self.save_manifest()
+        return written
+
+    def save_manifest(self):
+        manifest_path = os.path.join(self.root, CAS_MANIFEST)
+        temp_path = f"{manifest_path}.{os.getpid()}.tmp"  # Hai tiến trình cùng kho không ghi đè file tạm của nhau
+        with open(temp_path, "w") as manifest_file:
+            json.dump(self.manifest, manifest_file)
+        os.replace(temp_path, manifest_path)
+
+    def list(self):
+        return {name: FileStat(entry["size"], entry["mtime_ns"]) for name, entry in self.manifest.items()}
+
+    def stat(self, name):
+        entry = self.manifest.get(name)
+        return FileStat(entry["size"], entry["mtime_ns"]) if entry else None
+
+    def block_slices(self, name, offset, size):
+        """
+        Các đoạn (đường dẫn object, vị trí trong block, độ dài) tạo nên range [offset, offset + size).
+        """
+        entry = self.manifest.get(name)
+        if entry is None:
+            raise FileNotFoundError(name)
+        position, end = offset, min(offset + size, entry["size"])
+        while position < end:
+            index, block_offset = divmod(position, CAS_BLOCK_SIZE)
+            length = min(CAS_BLOCK_SIZE - block_offset, end - position)
+            yield self.object_path(entry["blocks"][index]), block_offset, length
+            position += length
+
+    def read_range(self, name, offset, size):
+        pieces = []
+        for object_path, block_offset, length in self.block_slices(name, offset, size):
+            with open(object_path, "rb") as object_file:
+                object_file.seek(block_offset)
+                pieces.append(object_file.read(length))
+        return pieces[0] if len(pieces) == 1 else b"".join(pieces)
+
+    def read_into(self, name, offset, buffer):
+        view = memoryview(buffer)
+        count = 0
+        for object_path, block_offset, length in self.block_slices(name, offset, len(view)):
+            with open(object_path, "rb") as object_file:
+                object_file.seek(block_offset)
+                read = object_file.readinto(view[count:count + length])
+            count += read
+            if read < length:
+                break
+        return count
+
+    def block_hashes(self, name):
+        # Block của kho cũng là block CAS_BLOCK_SIZE băm sha256: lấy thẳng từ manifest
+        entry = self.manifest.get(name)
+        if entry is None:
+            raise FileNotFoundError(name)
+        return [bytes.fromhex(digest) for digest in entry["blocks"]]
+
+    def prefetch(self, name, offset, size):
+        for object_path, block_offset, length in self.block_slices(name, offset, size):
+            with open(object_path, "rb", buffering=0) as object_file:
+                advise(object_file.fileno(), block_offset, length, "POSIX_FADV_WILLNEED")
+
+
+class ReadAheadStorage(StorageBackend):
+    """
+    Bọc một backend: nhận ra các luồng đọc tuần tự (range bắt đầu đúng chỗ range trước kết thúc,
+    dù đến từ kết nối nào) và nạp trước phần tiếp theo trên một luồng nền, để đĩa đọc block sau
+    trong lúc block hiện tại đang được gửi qua mạng.
+    """
+    def __init__(self, backend, size=READ_AHEAD_SIZE):
+        self.backend = backend
+        self.size = size
+        self.streams = collections.OrderedDict()  # (tên, vị trí đọc tiếp) -> đã nạp trước đến vị trí
+        self.lock = threading.Lock()
+        self.requests = queue.Queue()
+        self.thread = None
+
+    def list(self):
+        return self.backend.list()
+
+    def stat(self, name):
+        return self.backend.stat(name)
+
+    def reader(self, name, offset=0):
+        return self.backend.reader(name, offset)
+
+    def prefetch(self, name, offset, size):
+        self.backend.prefetch(name, offset, size)
+
+    def block_hashes(self, name):
+        return self.backend.block_hashes(name)
+
+    def read_range(self, name, offset, size):
+        data = self.backend.read_range(name, offset, size)
+        self.advance(name, offset, len(data))
+        return data
+
+    def read_into(self, name, offset, buffer):
+        count = self.backend.read_into(name, offset, buffer)
+        self.advance(name, offset, count)
+        return count
+
+    def advance(self, name, offset, size):
+        """
+        Cập nhật luồng đọc chứa range vừa đọc và giữ phần nạp trước luôn đi trước ít nhất một block.
+        """
+        if not size:
+            return
+        end = offset + size
+        with self.lock:
+            prefetched = self.streams.pop((name, offset), None)
+            # Chỉ nạp trước khi range nối tiếp một luồng đã biết hoặc bắt đầu từ đầu file
+            if prefetched is None and offset:
+                self.streams[(name, end)] = end
+            else:
+                start = max(end, prefetched or end)
+                target = end + max(self.size, size)
+                # Nạp lại khi phần đi trước còn dưới nửa cửa sổ, mỗi lần một đoạn liền dài (ít seek)
+                if start - end > self.size // 2:
+                    target = start
+                self.streams[(name, end)] = max(start, target)
+                if start < target:
+                    if self.thread is None:
+                        self.thread = threading.Thread(target=self.run, daemon=True)
+                        self.thread.start()
+                    self.requests.put((name, start, target - start))
+            if len(self.streams) > READ_AHEAD_STREAMS:
+                self.streams.popitem(last=False)
+
+    def run(self):
+        while True:
+            name, offset, size = self.requests.get()
+            try:
+                self.backend.prefetch(name, offset, size)
+            except OSError:
+                pass
+
+
+class CoalescingStorage(StorageBackend):
+    """
+    Bọc một backend (single-flight): range được đọc theo các block `block_size` căn lề, các yêu cầu đồng thời
+    chạm cùng một block chờ chung một lần đọc rồi cùng nhận buffer kết quả thay vì mỗi yêu cầu đọc đĩa một lần.
+    Block vừa đọc được giữ trong cache LRU `cache_size` byte để các yêu cầu đến ngay sau đó cũng không đọc lại.
+    Block được đánh theo FileStat (kích thước, mtime) nên file thay đổi không bị phục vụ dữ liệu cũ.
+    """
+    def __init__(self, backend, cache_size=COALESCE_CACHE_SIZE, block_size=COALESCE_BLOCK_SIZE):
+        self.backend = backend
+        self.cache_size = cache_size
+        self.block_size = block_size
+        self.lock = threading.Lock()
+        self.flights = {}  # (tên, FileStat, số thứ tự block) -> Future của lần đọc đang chạy
+        self.cache = collections.OrderedDict()  # (tên, FileStat, số thứ tự block) -> dữ liệu block
+        self.cached_bytes = 0
+        self.reads = 0  # Số lần đọc backend
+        self.shared = 0  # Số block lấy từ lần đọc đang chạy của yêu cầu khác
+        self.hits = 0  # Số block lấy từ cache
+
+    def list(self):
+        return self.backend.list()
+
+    def stat(self, name):
+        return self.backend.stat(name)
+
+    def prefetch(self, name, offset, size):
+        self.backend.prefetch(name, offset, size)
+
+    def block_hashes(self, name):
+        return self.backend.block_hashes(name)
+
+    def reader(self, name, offset=0):
+        return BlockReader(self, name, offset)
+
+    def version(self, name):
+        stat = self.backend.stat(name)
+        if stat is None:
+            raise FileNotFoundError(name)
+        return stat
+
+    def block(self, name, version, index):
+        """
+        Dữ liệu block `index` của file: từ cache, từ lần đọc đang chạy, hoặc tự đọc và chia cho các yêu cầu đang chờ.
+        """
+        key = (name, version, index)
+        with self.lock:
+            data = self.cache.get(key)
+            if data is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return data
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = concurrent.futures.Future()
+            else:
+                self.shared += 1
+        if not leader:
+            return flight.result()
+
+        try:
+            data = self.backend.read_range(name, index * self.block_size, self.block_size)
+        except BaseException as e:
+            with self.lock:
+                del self.flights[key]
+            flight.set_exception(e)
+            raise
+        with self.lock:
+            del self.flights[key]
+            self.reads += 1
+            if self.cache_size and len(data) <= self.cache_size:
+                self.cache[key] = data
+                self.cached_bytes += len(data)
+                while self.cached_bytes > self.cache_size:
+                    self.cached_bytes -= len(self.cache.popitem(last=False)[1])
+        flight.set_result(data)
+        return data
+
+    def slices(self, name, offset, size, version=None):
+        """
+        Các đoạn memoryview của block tạo nên range [offset, offset + size), dừng ở cuối file.
+        """
+        version = version or self.version(name)
+        position, end = offset, min(offset + size, version.size)
+        while position < end:
+            index, block_offset = divmod(position, self.block_size)
+            data = self.block(name, version, index)
+            piece = memoryview(data)[block_offset:block_offset + end - position]
+            if not piece:
+                break
+            yield piece
+            position += len(piece)
+
+    def read_range(self, name, offset, size, version=None):
+        pieces = list(self.slices(name, offset, size, version))
+        if len(pieces) == 1 and len(pieces[0]) == len(pieces[0].obj):
+            return pieces[0].obj  # Nguyên một block: dùng chung buffer, không sao chép
+        return b"".join(pieces)
+
+    def read_into(self, name, offset, buffer, version=None):
+        view = memoryview(buffer)
+        count = 0
+        for piece in self.slices(name, offset, len(view), version):
+            view[count:count + len(piece)] = piece
+            count += len(piece)
+        return count
+
+
+class BlockReader(RangeReader):
+    """
+    Đọc tuần tự qua CoalescingStorage với phiên bản file cố định từ lúc mở, để nhiều luồng gửi cùng một file
+    (vd: các part của server UDP) dùng chung block thay vì mỗi luồng đọc đĩa riêng.
+    """
+    def __init__(self, storage, name, offset=0):
+        super().__init__(storage, name, offset)
+        self.file_version = storage.version(name)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_END:
+            offset += self.file_version.size
+            whence = io.SEEK_SET
+        return super().seek(offset, whence)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = max(0, self.file_version.size - self.position)
+        data = self.storage.read_range(self.name, self.position, size, self.file_version)
+        self.position += len(data)
+        return data
+
+    def readinto(self, buffer):
+        count = self.storage.read_into(self.name, self.position, memoryview(buffer), self.file_version)
+        self.position += count
+        return count
+
+
+def open_backend(kind, directory, cas_root="cas_store", drop_behind=DROP_BEHIND_SIZE):
+    """
+    Mở backend theo tên: "local", "cas" (nạp thư mục vào kho theo nội dung) hoặc "memory".
+    """
+    if kind == "local":
+        return LocalStorage(directory, drop_behind)
+    elif kind == "memory":
+        return MemoryStorage.from_directory(directory)
+    elif kind == "cas":
+        storage = ContentAddressedStorage(cas_root)
+        storage.import_directory(directory)
+        return storage
+    raise ValueError(f"Unknown storage backend: {kind}")
+
+
+def create_storage(kind, directory, cas_root="cas_store", read_ahead=0, drop_behind=DROP_BEHIND_SIZE,
+                   coalesce=False, read_cache=COALESCE_CACHE_SIZE, backend=None):
+    """
+    Tạo backend theo tên (xem open_backend); `backend` đã mở sẵn (vd: supervisor mở một lần trước khi fork
+    worker) thì dùng luôn thay vì nạp lại thư mục.
+    `coalesce` bọc backend đọc từ đĩa bằng CoalescingStorage với cache `read_cache` byte,
+    `read_ahead` > 0 bọc tiếp bằng ReadAheadStorage với kích thước nạp trước đó.
+    """
+    storage = backend if backend is not None else open_backend(kind, directory, cas_root, drop_behind)
+    if kind == "memory":
+        return storage
+    if coalesce:
+        storage = CoalescingStorage(storage, read_cache)
+    return ReadAheadStorage(storage, read_ahead) if read_ahead else storage
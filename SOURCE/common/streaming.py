@@ -0,0 +1,155 @@
+"""
+Đọc file theo thứ tự ngay trong lúc các range còn đang được tải song song.
+
+Range về không theo thứ tự được giữ trong OrderedBuffer đến khi nối liền với phần đã nhận, người đọc lấy dần
+các đoạn liền nhau qua DownloadStream. Bộ nhớ bị chặn bởi cửa sổ: scheduler chỉ giao range bắt đầu trước
+limit() (vị trí đã đọc + window), nên luồng tải đứng chờ (backpressure) khi người đọc chậm hơn mạng.
+"""
+import collections
+import io
+import threading
+
+
+class OrderedBuffer:
+    """
+    Bộ đệm sắp xếp lại các range của một file theo offset.
+    """
+    def __init__(self, size, window, on_consume=None):
+        self.size = size
+        self.window = window
+        self.on_consume = on_consume  # Gọi sau mỗi lần đọc: cửa sổ vừa trượt lên
+        self.segments = {}  # Offset -> dữ liệu chưa nối liền với phần đã nhận
+        self.ready = collections.deque()  # Các đoạn liền nhau chờ đọc (memoryview, cắt không sao chép)
+        self.received = 0  # Cuối phần liền nhau đã nhận
+        self.consumed = 0  # Số byte đã đọc
+        self.buffered = 0  # Số byte đang giữ trong bộ đệm
+        self.peak = 0  # Số byte giữ nhiều nhất
+        self.error = None
+        self.done = False  # Luồng tải đã kết thúc
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def put(self, offset, data):
+        """
+        Nhận dữ liệu tại `offset` (mỗi byte của file chỉ được đưa vào một lần).
+        """
+        if not data:
+            return
+        with self.cond:
+            if self.closed:
+                return
+            self.segments[offset] = memoryview(data if isinstance(data, bytes) else bytes(data))
+            self.buffered += len(data)
+            self.peak = max(self.peak, self.buffered)
+            while self.received in self.segments:
+                segment = self.segments.pop(self.received)
+                self.ready.append(segment)
+                self.received += len(segment)
+            self.cond.notify_all()
+
+    def limit(self):
+        """
+        Offset đầu tiên chưa được phép tải trước.
+        """
+        with self.cond:
+            return self.consumed + self.window
+
+    def finish(self, error=None):
+        """
+        Luồng tải kết thúc; thiếu dữ liệu mà không có lỗi cụ thể thì người đọc nhận ConnectionError.
+        """
+        with self.cond:
+            if error is None and self.received < self.size:
+                error = ConnectionError(f"Download stopped after {self.received} of {self.size} bytes")
+            self.error = error
+            self.done = True
+            self.cond.notify_all()
+
+    def next_chunk(self, max_size=-1):
+        """
+        Đoạn liền nhau tiếp theo (tối đa `max_size` byte nếu max_size >= 0), memoryview rỗng khi đã hết file.
+        Chờ nếu đoạn tiếp theo chưa về.
+        """
+        with self.cond:
+            while not self.ready:
+                if self.consumed >= self.size:
+                    return memoryview(b"")
+                if self.closed:
+                    raise ValueError("I/O operation on closed stream")
+                if self.error is not None:
+                    raise self.error
+                self.cond.wait()
+            chunk = self.ready.popleft()
+            if 0 <= max_size < len(chunk):
+                self.ready.appendleft(chunk[max_size:])
+                chunk = chunk[:max_size]
+            self.consumed += len(chunk)
+            self.buffered -= len(chunk)
+        if self.on_consume:
+            self.on_consume()
+        return chunk
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.segments.clear()
+            self.ready.clear()
+            self.buffered = 0
+            self.cond.notify_all()
+
+
+class StreamSink:
+    """
+    Giao diện seek/write của part file (Client.write_part) ghi vào OrderedBuffer.
+    """
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.offset = 0
+
+    def seek(self, offset):
+        self.offset = offset
+
+    def write(self, data):
+        self.buffer.put(self.offset, data)
+        self.offset += len(data)
+
+    def flush(self):
+        pass
+
+
+class DownloadStream(io.RawIOBase):
+    """
+    File nhị phân chỉ đọc của một file đang tải: read/readinto/readline như file thường, chunks() trả lần lượt
+    các đoạn đã về không sao chép. close() trước khi đọc hết thì dừng tải.
+    """
+    def __init__(self, buffer, *on_close):
+        super().__init__()
+        self.buffer = buffer
+        self.on_close = list(on_close)  # Gọi khi đóng: dừng scheduler, đóng kết nối
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        chunk = self.buffer.next_chunk(len(b))
+        b[:len(chunk)] = chunk
+        return len(chunk)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return self.readall()
+        return bytes(self.buffer.next_chunk(size))
+
+    def chunks(self):
+        while True:
+            chunk = self.buffer.next_chunk()
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        if not self.closed:
+            self.buffer.close()
+            for callback in self.on_close:
+                callback()
+        super().close()
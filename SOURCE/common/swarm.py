@@ -0,0 +1,250 @@
+"""
+Tải theo kiểu swarm giữa các client: mỗi client chạy một peer phục vụ các piece đã tải của file cho client khác
+bằng chính giao thức range của server (HELLO, GET, CLOSE) cộng thêm HAVE (bitmap các piece đã có).
+Server làm tracker: client báo file đang tải và cổng peer của mình (PEERS), nhận lại danh sách các peer khác
+đang tải hoặc đã có file đó; server vẫn phục vụ những piece chưa peer nào có.
+"""
+import json
+import random
+import socket
+import threading
+import time
+
+from common.protocol import (FRAME_CLOSE, FRAME_DATA, FRAME_GET, FRAME_HAVE, FRAME_HELLO, FRAME_TRACE, FLAG_END,
+                             STATUS_BAD_REQUEST, STATUS_NOT_FOUND, STATUS_UNAVAILABLE, read_frame, send_frame)
+
+PIECE_SIZE = 256 * 1024  # Đơn vị trao đổi giữa các peer; HAVE báo theo piece
+PEER_TTL = 30  # Tracker bỏ peer không báo lại trong chừng này (giây)
+MAX_PEERS = 30  # Số peer tối đa tracker trả về cho mỗi lần hỏi
+PEER_BACKLOG = 64
+PEER_TIMEOUT = 30  # Kết nối tới peer không có yêu cầu nào trong chừng này thì đóng (giây)
+
+
+def piece_count(size):
+    return -(-size // PIECE_SIZE)
+
+
+def has_piece(bitmap, index):
+    """
+    Bit `index` của bitmap (bit thấp trước trong mỗi byte) có được bật không.
+    """
+    return index >> 3 < len(bitmap) and bitmap[index >> 3] >> (index & 7) & 1
+
+
+class PieceMap:
+    """
+    Số byte đã ghi xuống đĩa của từng piece trong file đang tải; piece đủ byte là đã có và được phục vụ cho peer.
+    Mỗi piece giữ các đoạn đã ghi (gộp lại khi chồng nhau) nên một range bị báo hai lần (vd: tải lại sau lỗi)
+    không làm piece còn lỗ hổng bị coi là đã có.
+    """
+    def __init__(self, size, complete=False):
+        self.size = size
+        self.count = piece_count(size)
+        self.received = [self.length(index) if complete else 0 for index in range(self.count)]
+        # Các đoạn [đầu, cuối) đã ghi của từng piece, đã sắp xếp và không chồng nhau
+        self.spans = [[(index * PIECE_SIZE, index * PIECE_SIZE + self.length(index))] if complete else []
+                      for index in range(self.count)]
+        self.lock = threading.Lock()
+
+    def length(self, index):
+        return min(PIECE_SIZE, self.size - index * PIECE_SIZE)
+
+    def add(self, start, end):
+        """
+        Ghi nhận đoạn [start, end) đã được ghi xuống part file.
+        """
+        with self.lock:
+            for index in range(start // PIECE_SIZE, piece_count(end)):
+                piece_start = index * PIECE_SIZE
+                low, high = max(start, piece_start), min(end, piece_start + PIECE_SIZE)
+                spans = []
+                for span_start, span_end in self.spans[index]:
+                    if span_end < low or span_start > high:
+                        spans.append((span_start, span_end))
+                    else:
+                        low, high = min(low, span_start), max(high, span_end)
+                spans.append((low, high))
+                spans.sort()
+                self.spans[index] = spans
+                self.received[index] = sum(span_end - span_start for span_start, span_end in spans)
+
+    def has(self, offset, length):
+        if length <= 0 or offset + length > self.size:
+            return False
+        with self.lock:
+            return all(self.received[index] == self.length(index)
+                       for index in range(offset // PIECE_SIZE, piece_count(offset + length)))
+
+    def bitmap(self):
+        bitmap = bytearray(-(-self.count // 8))
+        with self.lock:
+            for index, received in enumerate(self.received):
+                if received == self.length(index):
+                    bitmap[index >> 3] |= 1 << (index & 7)
+        return bytes(bitmap)
+
+
+class SharedFile:
+    """
+    File một peer phục vụ: các đoạn (đường dẫn, offset đầu, offset cuối) ghép thành file (4 part file khi đang tải,
+    file hoàn chỉnh khi đã gộp) và các piece đã có. File mở sẵn đến khi close() nên vẫn đọc được khi part đã bị xóa.
+    """
+    def __init__(self, size, segments, pieces=None):
+        self.size = size
+        self.segments = segments
+        self.pieces = pieces or PieceMap(size, complete=True)
+        self.files = {}  # Đường dẫn -> file đã mở
+        self.lock = threading.Lock()
+        for path, _, _ in segments:
+            self.files[path] = open(path, "rb")
+
+    def read(self, offset, length):
+        """
+        Đọc một range, None nếu chưa có đủ các piece của range.
+        """
+        if not self.pieces.has(offset, length):
+            return None
+        data = bytearray()
+        with self.lock:
+            for path, start, end in self.segments:
+                low, high = max(offset, start), min(offset + length, end)
+                if low < high:
+                    file = self.files[path]
+                    file.seek(low - start)
+                    data += file.read(high - low)
+        return bytes(data) if len(data) == length else None
+
+    def close(self):
+        with self.lock:
+            for file in self.files.values():
+                file.close()
+            self.files.clear()
+
+
+class PeerServer:
+    """
+    Phục vụ các file đang tải/đã tải của client cho các peer khác; mỗi kết nối một luồng.
+    """
+    def __init__(self, host="0.0.0.0", port=0, output=print):
+        self.files = {}  # Tên file -> SharedFile
+        self.lock = threading.Lock()
+        self.output = output
+        self.bytes_sent = 0
+        self.is_running = True
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(PEER_BACKLOG)
+        self.port = self.sock.getsockname()[1]
+
+    def start(self):
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+        return self
+
+    def share(self, name, shared_file):
+        """
+        Bắt đầu (hoặc tiếp tục với nguồn mới) phục vụ file `name`.
+        """
+        with self.lock:
+            previous = self.files.get(name)
+            self.files[name] = shared_file
+        if previous is not None:
+            previous.close()
+
+    def unshare(self, name):
+        with self.lock:
+            shared_file = self.files.pop(name, None)
+        if shared_file is not None:
+            shared_file.close()
+
+    def is_shared(self, name):
+        with self.lock:
+            return name in self.files
+
+    def accept_loop(self):
+        while self.is_running:
+            try:
+                conn, address = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.serve, args=(conn, address), daemon=True).start()
+
+    def serve(self, conn, address):
+        """
+        Trả lời HELLO (catalog các file đang phục vụ), GET và HAVE của một peer.
+        """
+        try:
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn.settimeout(PEER_TIMEOUT)
+            with self.lock:
+                catalog = {name: shared_file.size for name, shared_file in self.files.items()}
+            send_frame(conn, FRAME_HELLO, payload=json.dumps(catalog).encode())
+            while self.is_running:
+                frame = read_frame(conn)
+                if frame.type == FRAME_CLOSE:
+                    return
+                if frame.type == FRAME_TRACE:
+                    continue
+                with self.lock:
+                    shared_file = self.files.get(frame.payload.decode("utf-8", "replace"))
+                if frame.type not in (FRAME_GET, FRAME_HAVE):
+                    self.send_error(conn, frame.request_id, STATUS_BAD_REQUEST, f"Unsupported frame {frame.type}")
+                elif shared_file is None:
+                    self.send_error(conn, frame.request_id, STATUS_NOT_FOUND, "File not shared by this peer")
+                elif frame.type == FRAME_HAVE:
+                    send_frame(conn, FRAME_DATA, frame.request_id, PIECE_SIZE, shared_file.pieces.count,
+                               shared_file.pieces.bitmap(), FLAG_END)
+                else:
+                    try:
+                        data = shared_file.read(frame.offset, frame.length)
+                    except (OSError, ValueError):
+                        data = None  # Vừa ngừng phục vụ (file đã đóng)
+                    if data is None:
+                        self.send_error(conn, frame.request_id, STATUS_UNAVAILABLE, "Range not available yet")
+                        continue
+                    send_frame(conn, FRAME_DATA, frame.request_id, frame.offset, len(data), data, FLAG_END)
+                    with self.lock:
+                        self.bytes_sent += len(data)
+        except (OSError, ConnectionError, ValueError):
+            pass  # Peer đã đóng kết nối hoặc gửi khung hỏng
+        finally:
+            conn.close()
+
+    def send_error(self, conn, request_id, status, message):
+        send_frame(conn, FRAME_DATA, request_id, payload=message.encode(), flags=FLAG_END, status=status)
+
+    def close(self):
+        self.is_running = False
+        self.sock.close()
+        with self.lock:
+            files, self.files = list(self.files.values()), {}
+        for shared_file in files:
+            shared_file.close()
+
+
+class Tracker:
+    """
+    Danh sách peer của từng file trên server. Peer báo lại định kỳ trong lúc tải và seed,
+    quá PEER_TTL giây không báo thì bị bỏ.
+    """
+    def __init__(self, ttl=PEER_TTL, max_peers=MAX_PEERS):
+        self.ttl = ttl
+        self.max_peers = max_peers
+        self.peers = {}  # Tên file -> {(host, port): thời điểm báo gần nhất}
+        self.lock = threading.Lock()
+
+    def announce(self, name, endpoint):
+        """
+        Ghi nhận `endpoint` (cổng 0: chỉ hỏi, không phục vụ) và trả về tối đa max_peers peer khác
+        của file, chọn ngẫu nhiên để các peer không cùng dồn vào vài peer đầu danh sách.
+        """
+        now = time.monotonic()
+        with self.lock:
+            peers = self.peers.setdefault(name, {})
+            for peer, seen in list(peers.items()):
+                if now - seen > self.ttl:
+                    del peers[peer]
+            others = [peer for peer in peers if peer != endpoint]
+            if endpoint[1]:
+                peers[endpoint] = now
+        return random.sample(others, min(len(others), self.max_peers))
@@ -0,0 +1,138 @@
+"""
+Ghi lại các pha của một lần tải (span: kết nối, nhận danh sách file, đọc đĩa, gửi/nhận range, gộp part, ...)
+để biết lần tải chậm vì đâu. Span được giữ trong một ring buffer cố định (span cũ nhất bị ghi đè) và
+xuất ra định dạng JSON của Chrome trace (mở bằng chrome://tracing hoặc ui.perfetto.dev).
+
+Mỗi lần tải có một mã transfer do client tạo và gửi cho server, span ở cả hai phía mang cùng mã đó
+nên có thể ghép trace của client và server. Khi tắt, `span()` chỉ trả về một context rỗng dùng chung.
+"""
+import collections
+import json
+import os
+import random
+import threading
+import time
+
+TRACE_BUFFER_SIZE = 100000  # Số span giữ lại trong ring buffer
+
+
+class NullSpan:
+    """
+    Span rỗng khi tracing tắt.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    __slots__ = ("tracer", "name", "transfer", "args", "start")
+
+    def __init__(self, tracer, name, transfer, args):
+        self.tracer = tracer
+        self.name = name
+        self.transfer = transfer
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.record(self.name, self.transfer, self.start, time.time_ns(), self.args)
+        return False
+
+    def set(self, **args):
+        """
+        Thêm thông tin cho span (vd: số byte) khi đã biết trong lúc chạy.
+        """
+        self.args.update(args)
+
+
+class Tracer:
+    """
+    Bộ ghi span của một tiến trình. Span là tuple (tên, transfer, bắt đầu, thời lượng, luồng, args)
+    trong một deque giới hạn độ dài (thêm phần tử an toàn giữa các luồng).
+    """
+    def __init__(self, process_name="", capacity=TRACE_BUFFER_SIZE):
+        self.process_name = process_name
+        self.enabled = False
+        self.events = collections.deque(maxlen=capacity)
+        self.current = threading.local()  # Mã transfer của luồng hiện tại
+
+    def enable(self, process_name=None):
+        if process_name:
+            self.process_name = process_name
+        self.enabled = True
+
+    def new_transfer(self):
+        """
+        Mã transfer mới (khác 0) cho một lần tải.
+        """
+        return random.getrandbits(63) | 1
+
+    def bind(self, transfer):
+        """
+        Đặt mã transfer mặc định cho các span của luồng hiện tại.
+        """
+        self.current.transfer = transfer
+
+    def transfer(self):
+        return getattr(self.current, "transfer", 0)
+
+    def wrap(self, target):
+        """
+        Hàm chạy `target` trên luồng khác với cùng mã transfer của luồng đang gọi.
+        """
+        if not self.enabled:
+            return target
+        transfer = self.transfer()
+
+        def run(*args, **kwargs):
+            self.bind(transfer)
+            return target(*args, **kwargs)
+        return run
+
+    def span(self, name, transfer=None, **args):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, self.transfer() if transfer is None else transfer, args)
+
+    def record(self, name, transfer, start, end, args):
+        self.events.append((name, transfer, start, end - start, threading.get_ident(), args))
+
+    def export(self, path):
+        """
+        Ghi các span đang có ra file Chrome trace JSON, trả về số span đã ghi.
+        """
+        pid = os.getpid()
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": self.process_name or str(pid)}}]
+        threads = {thread.ident: thread.name for thread in threading.enumerate()}
+        spans = list(self.events)
+        for tid in {span[4] for span in spans}:
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                           "args": {"name": threads.get(tid, str(tid))}})
+        for name, transfer, start, duration, tid, args in spans:
+            args = dict(args, transfer=f"{transfer:016x}") if transfer else args
+            events.append({"name": name, "cat": self.process_name, "ph": "X", "pid": pid, "tid": tid,
+                           "ts": start / 1000, "dur": duration / 1000, "args": args})
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as trace_file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
+        os.replace(temp_path, path)
+        return len(spans)
+
+
+TRACER = Tracer()  # Bộ ghi dùng chung của tiến trình, tắt cho đến khi gọi enable()
@@ -0,0 +1,199 @@
+"""
+Tự điều chỉnh buffer và tùy chọn socket theo BDP (bandwidth-delay product) đo được.
+
+Bên gửi chỉ có tối đa một cửa sổ dữ liệu chưa được ACK, cửa sổ không lớn hơn buffer nhận của bên nhận
+(và buffer gửi của bên gửi), nên một kết nối không nhanh hơn buffer / RTT: 128KB trên đường 100ms chỉ được ~1.3MB/s.
+RTT được đo khi kết nối bắt đầu, thông lượng đo liên tục trên kết nối; buffer được đặt bằng
+BDP_HEADROOM x thông lượng x RTT. Kết nối bị giới hạn bởi buffer có thông lượng đúng bằng buffer / RTT,
+nên mỗi lần đo buffer tăng gấp BDP_HEADROOM đến khi thông lượng chạm băng thông đường truyền.
+
+Đặt SO_RCVBUF/SO_SNDBUF tắt cơ chế tự điều chỉnh buffer của kernel cho socket đó, nên buffer chỉ được
+đặt khi cần lớn hơn buffer hiện có; trên mạng LAN (BDP nhỏ) socket giữ nguyên mặc định của kernel.
+"""
+import socket
+import struct
+import sys
+import threading
+import time
+
+TUNING_MODES = ("auto", "off")  # auto: buffer theo BDP đo được; off: giữ mặc định của kernel
+MIN_BUFFER = 64 * 1024
+MAX_BUFFER = 64 * 1024 * 1024
+INITIAL_RATE = 12.5 * 1024 * 1024  # Thông lượng giả định của endpoint chưa đo được (100 Mbit/s)
+BDP_HEADROOM = 2  # Buffer = BDP_HEADROOM x BDP: đủ chỗ cho thông lượng tăng gấp đôi trước lần đo sau
+MEASURE_INTERVAL = 0.25  # Đo thông lượng sau ít nhất chừng này giây (và ít nhất MEASURE_RTTS RTT)
+MEASURE_RTTS = 4
+NOTSENT_LOWAT = 128 * 1024  # Lượng dữ liệu chưa gửi tối đa nằm trong buffer gửi (TCP_NOTSENT_LOWAT)
+
+# Linux: *BUFFORCE bỏ qua giới hạn net.core.rmem_max/wmem_max (cần CAP_NET_ADMIN), Python không định nghĩa sẵn
+IS_LINUX = sys.platform.startswith("linux")
+FORCE_OPTIONS = {socket.SO_RCVBUF: 33, socket.SO_SNDBUF: 32} if IS_LINUX else {}
+TCP_INFO_RTT = 68  # Vị trí tcpi_rtt (micro giây) trong struct tcp_info
+TCP_INFO_DELIVERY_RATE = 160  # Vị trí tcpi_delivery_rate (bytes/s)
+TCP_INFO_SIZE = 168
+
+
+def get_buffer(sock, option=socket.SO_RCVBUF):
+    """
+    Kích thước buffer mà ứng dụng dùng được (Linux trả về gấp đôi giá trị đã đặt để tính cả phần quản lý).
+    """
+    size = sock.getsockopt(socket.SOL_SOCKET, option)
+    return size // 2 if IS_LINUX else size
+
+
+def set_buffer(sock, option, size):
+    """
+    Đặt buffer gửi/nhận `size` byte, vượt giới hạn hệ thống nếu có quyền; trả về kích thước thực tế được cấp.
+    """
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, FORCE_OPTIONS[option], size)
+    except (KeyError, OSError):
+        sock.setsockopt(socket.SOL_SOCKET, option, size)  # Bị cắt ở net.core.rmem_max/wmem_max
+    return get_buffer(sock, option)
+
+
+def tcp_info(sock):
+    """
+    RTT (giây) và thông lượng gửi (bytes/s) kernel đo được trên kết nối TCP; (None, None) nếu không hỗ trợ.
+    """
+    if not IS_LINUX:
+        return None, None
+    try:
+        info = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, TCP_INFO_SIZE)
+    except OSError:
+        return None, None
+    if len(info) < TCP_INFO_SIZE:
+        return None, None
+    rtt, = struct.unpack_from("=I", info, TCP_INFO_RTT)
+    rate, = struct.unpack_from("=Q", info, TCP_INFO_DELIVERY_RATE)
+    return rtt / 1e6 or None, rate or None
+
+
+def bdp_buffer(rate, rtt):
+    """
+    Kích thước buffer cho thông lượng `rate` (bytes/s) trên đường có RTT `rtt` (giây).
+    """
+    return int(min(MAX_BUFFER, max(MIN_BUFFER, BDP_HEADROOM * rate * rtt)))
+
+
+class SocketTuner:
+    """
+    Ước lượng RTT và thông lượng của từng endpoint, đặt buffer socket theo BDP.
+    `mode` "off" giữ nguyên mặc định của kernel; `buffer_size` đặt cố định buffer thay vì tính theo BDP.
+    Thông báo (vd: buffer bị giới hạn bởi cấu hình hệ thống) được ghi qua `output`.
+    """
+    def __init__(self, mode="auto", buffer_size=None, output=print):
+        if mode not in TUNING_MODES:
+            raise ValueError(f"Unknown socket tuning mode {mode}")
+        self.mode = mode
+        self.buffer_size = buffer_size
+        self.output = output
+        self.links = {}  # Endpoint -> [RTT nhỏ nhất (giây), thông lượng lớn nhất (bytes/s)]
+        self.capped = set()  # Các option đã báo bị giới hạn
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.mode != "off" or bool(self.buffer_size)
+
+    def observe(self, endpoint, rtt=None, rate=None):
+        """
+        Ghi nhận một lần đo của endpoint: RTT nhỏ nhất gần với độ trễ đường truyền nhất (không tính hàng đợi),
+        thông lượng lớn nhất gần với băng thông nhất (các lần đo bị giới hạn bởi buffer luôn thấp hơn).
+        """
+        with self.lock:
+            link = self.links.setdefault(endpoint, [None, None])
+            if rtt and (link[0] is None or rtt < link[0]):
+                link[0] = rtt
+            if rate and (link[1] is None or rate > link[1]):
+                link[1] = rate
+
+    def buffer_for(self, endpoint):
+        """
+        Kích thước buffer cho kết nối tới endpoint, None nếu để kernel tự điều chỉnh.
+        """
+        if self.buffer_size:
+            return self.buffer_size
+        if self.mode == "off":
+            return None
+        with self.lock:
+            rtt, rate = self.links.get(endpoint, (None, None))
+        if rtt is None:
+            return None
+        return bdp_buffer(rate or INITIAL_RATE, rtt)
+
+    def apply(self, sock, endpoint, option=socket.SO_RCVBUF):
+        """
+        Đặt buffer của socket theo ước lượng hiện tại của endpoint.
+        """
+        self.resize(sock, option, self.buffer_for(endpoint))
+
+    def resize(self, sock, option, size):
+        """
+        Đặt buffer `size` byte; chỉ tăng (giữ cơ chế tự điều chỉnh của kernel), trừ khi kích thước được cấu hình cố định.
+        """
+        if size is None:
+            return
+        current = get_buffer(sock, option)
+        if size == current or (size < current and not self.buffer_size):
+            return
+        granted = set_buffer(sock, option, size)
+        if granted < size and option not in self.capped:
+            self.capped.add(option)
+            limit = "net.core.rmem_max" if option == socket.SO_RCVBUF else "net.core.wmem_max"
+            self.output(f"Socket buffer capped at {granted} bytes by {limit} (wanted {size})")
+
+    def connected(self, sock, endpoint, rtt):
+        """
+        Điều chỉnh kết nối vừa mở tới endpoint để nhận dữ liệu; `rtt` là thời gian bắt tay / chờ phản hồi đầu tiên.
+        Thông lượng đo bằng ReceiveMeter trên kết nối.
+        """
+        self.observe(endpoint, rtt=rtt)
+        if self.enabled:
+            self.apply(sock, endpoint)
+
+    def sender(self, sock):
+        """
+        Tùy chọn cho kết nối gửi dữ liệu vừa accept.
+        """
+        if self.mode == "auto" and hasattr(socket, "TCP_NOTSENT_LOWAT"):
+            # Chỉ dữ liệu đang trên đường truyền nằm lâu trong buffer gửi, phần chưa gửi được giữ nhỏ
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NOTSENT_LOWAT, NOTSENT_LOWAT)
+        if self.buffer_size:
+            self.resize(sock, socket.SO_SNDBUF, self.buffer_size)
+
+    def sent(self, sock, nbytes):
+        """
+        Tăng buffer gửi theo RTT và thông lượng kernel đo được trên kết nối sau khi gửi xong một phản hồi `nbytes` byte.
+        """
+        # Phản hồi nhỏ không làm buffer đầy: bỏ qua để không tốn thêm syscall cho mỗi yêu cầu nhỏ
+        if self.mode != "auto" or self.buffer_size or nbytes < MIN_BUFFER:
+            return
+        rtt, rate = tcp_info(sock)
+        if rtt is not None and rate is not None:
+            self.resize(sock, socket.SO_SNDBUF, bdp_buffer(rate, rtt))
+
+
+class ReceiveMeter:
+    """
+    Đo thông lượng nhận của một kết nối theo từng khoảng và tăng buffer nhận khi BDP tăng.
+    """
+    def __init__(self, tuner, sock, endpoint):
+        self.tuner = tuner
+        self.sock = sock
+        self.endpoint = endpoint
+        rtt = tuner.links.get(endpoint, (None, None))[0] or 0
+        self.interval = max(MEASURE_INTERVAL, MEASURE_RTTS * rtt)
+        self.received = 0
+        self.started = time.monotonic()
+
+    def add(self, nbytes):
+        self.received += nbytes
+        elapsed = time.monotonic() - self.started
+        if elapsed < self.interval:
+            return
+        if self.tuner.mode == "auto" and not self.tuner.buffer_size:
+            self.tuner.observe(self.endpoint, rate=self.received / elapsed)
+            self.tuner.apply(self.sock, self.endpoint)
+        self.received = 0
+        self.started = time.monotonic()
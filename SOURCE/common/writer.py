@@ -0,0 +1,180 @@
+"""
+Tách việc ghi đĩa khỏi luồng nhận mạng.
+
+Luồng nhận lấy buffer từ BufferPool, nhận dữ liệu vào đó rồi giao cho WriterPool và nhận tiếp ngay; luồng ghi
+ghi buffer xuống file rồi trả buffer về pool. Đĩa khựng lại (writeback, fsync) chỉ làm hàng đợi đầy dần thay vì
+chặn recv; khi pool cạn, luồng nhận mới phải chờ (backpressure), nên bộ nhớ bị chặn bởi số buffer của pool
+và không cấp phát thêm theo kích thước file.
+
+Mỗi file đích được gắn cố định với một luồng ghi (hàng đợi FIFO riêng): các lần ghi, rào sync() và lệnh lưu
+trạng thái của cùng một file chạy đúng thứ tự gửi, các file khác nhau được ghi song song.
+"""
+import errno
+import mmap
+import os
+import queue
+import threading
+import weakref
+
+DIRECT_ALIGNMENT = 4096  # O_DIRECT cần offset, độ dài và địa chỉ buffer căn theo khối
+
+
+class PooledBuffer:
+    """
+    Buffer cấp phát một lần và dùng lại; bộ nhớ là mmap ẩn danh nên địa chỉ căn theo trang (dùng được cho O_DIRECT).
+    data[:length] là phần đã có dữ liệu.
+    """
+    def __init__(self, pool, capacity):
+        self.pool = pool
+        self.data = mmap.mmap(-1, capacity)
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def reserve(self, size):
+        """
+        Vùng trống `size` byte ngay sau phần đã có dữ liệu; người gọi tự cộng số byte nhận được vào length.
+        """
+        if self.length + size > len(self.data):
+            raise ValueError(f"Response of {self.length + size} bytes exceeds buffer capacity {len(self.data)}")
+        return memoryview(self.data)[self.length:self.length + size]
+
+    def view(self):
+        return memoryview(self.data)[:self.length]
+
+    def release(self):
+        self.pool.release(self)
+
+
+class BufferPool:
+    """
+    Tối đa `count` buffer dung lượng `capacity`, chỉ cấp phát khi cần lần đầu.
+    """
+    def __init__(self, capacity, count):
+        self.capacity = capacity
+        self.count = count
+        self.free = []
+        self.created = 0
+        self.cond = threading.Condition()
+
+    def acquire(self, block=True):
+        """
+        Lấy một buffer rỗng; hết buffer thì chờ buffer được trả lại, hoặc trả về None nếu block=False.
+        """
+        with self.cond:
+            while not self.free:
+                if self.created < self.count:
+                    self.created += 1
+                    return PooledBuffer(self, self.capacity)
+                if not block:
+                    return None
+                self.cond.wait()
+            return self.free.pop()
+
+    def release(self, buffer):
+        with self.cond:
+            buffer.length = 0
+            self.free.append(buffer)
+            self.cond.notify()
+
+
+class WriterPool:
+    """
+    Các luồng ghi, mỗi luồng một hàng đợi giới hạn `depth` lần ghi. threads=0: ghi ngay trong luồng gọi.
+    Lỗi ghi được giữ theo file đích (check()); các lần ghi sau vào file đó bị bỏ qua nhưng `done(ok)` vẫn được
+    gọi (ok=False) để buffer được trả lại và luồng nhận không chờ mãi.
+    """
+    def __init__(self, threads, depth):
+        self.queues = [queue.Queue(depth) for _ in range(threads)]
+        self.assigned = weakref.WeakKeyDictionary()  # File đích -> chỉ số luồng ghi
+        self.errors = weakref.WeakKeyDictionary()  # File đích -> lỗi ghi đầu tiên
+        self.next_queue = 0
+        self.lock = threading.Lock()
+        for jobs in self.queues:
+            threading.Thread(target=self.run, args=(jobs,), daemon=True).start()
+
+    def submit(self, key, write, done=None):
+        """
+        Xếp `write` vào hàng đợi của luồng ghi gắn với file `key` (chờ nếu hàng đợi đầy), sau đó gọi
+        `done(ok)`: ok=False nếu lần ghi lỗi hoặc bị bỏ qua vì file đã có lỗi ghi trước đó.
+        """
+        if not self.queues:
+            self.execute(key, write, done)
+            return
+        with self.lock:
+            index = self.assigned.get(key)
+            if index is None:
+                index = self.assigned[key] = self.next_queue % len(self.queues)
+                self.next_queue += 1
+        self.queues[index].put((key, write, done))
+
+    def execute(self, key, write, done):
+        ok = False
+        try:
+            if key not in self.errors:
+                write()
+                ok = True
+        except Exception as e:
+            with self.lock:
+                self.errors.setdefault(key, e)
+        finally:
+            if done:
+                done(ok)
+
+    def run(self, jobs):
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            self.execute(*job)
+
+    def sync(self, key):
+        """
+        Chờ mọi lần ghi đã gửi cho file `key` hoàn tất.
+        """
+        written = threading.Event()
+        self.submit(key, lambda: None, lambda ok: written.set())
+        written.wait()
+
+    def check(self, key):
+        """
+        Ném lại lỗi ghi (nếu có) của file `key`.
+        """
+        error = self.errors.get(key)
+        if error is not None:
+            raise error
+
+    def close(self):
+        for jobs in self.queues:
+            jobs.put(None)
+        self.queues = []
+
+
+def open_direct(path):
+    """
+    Mở thêm một fd ghi O_DIRECT (bỏ qua page cache) tới file, None nếu hệ điều hành hoặc hệ thống file không hỗ trợ.
+    """
+    flag = getattr(os, "O_DIRECT", 0)
+    if not flag:
+        return None
+    try:
+        return os.open(path, os.O_WRONLY | flag)
+    except OSError:
+        return None
+
+
+def write_direct(fd, position, data):
+    """
+    Ghi phần đầu của `data` (bội số DIRECT_ALIGNMENT) qua fd O_DIRECT nếu `position` căn theo khối, trả về số byte
+    đã ghi; phần lẻ còn lại người gọi ghi qua page cache. `data` phải bắt đầu ở đầu một PooledBuffer.
+    """
+    size = len(data) - len(data) % DIRECT_ALIGNMENT
+    if position % DIRECT_ALIGNMENT or not size:
+        return 0
+    try:
+        return os.pwrite(fd, data[:size], position)
+    except OSError as e:
+        if e.errno == errno.EINVAL:
+            return 0  # Không căn được (vd: hệ thống file đòi khối lớn hơn): ghi thường
+        raise
@@ -0,0 +1,110 @@
+"""
+Benchmark số job tải mỗi phút khi điều khiển client từ chương trình khác (vd: pipeline xử lý dữ liệu).
+Mỗi job tải --files-per-job file vào một thư mục riêng:
+
+- process: chạy CLI batch của client cho mỗi job (client.py --server HOST:PORT --json FILE...) và đọc JSON;
+- sync: gọi download_files() trong cùng tiến trình, lần lượt từng job;
+- async: download_files_async(), --concurrency job chạy đồng thời trên một event loop.
+
+    python benchmarks/bench_batch.py --protocol tcp --jobs 40 --size 256 --files-per-job 2 --concurrency 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import harness
+
+CLIENTS = {"tcp": harness.TCP_CLIENT, "udp": harness.UDP_CLIENT}
+
+
+def job_files(job, args):
+    return [f"file{(job * args.files_per_job + index) % args.files:03}.bin" for index in range(args.files_per_job)]
+
+
+def run_process(job, server, workdir, args):
+    result = subprocess.run(
+        [sys.executable, CLIENTS[args.protocol], "--server", f"{server[0]}:{server[1]}", "--json",
+         "--download-dir", os.path.join(workdir, f"job{job}"), *job_files(job, args)],
+        cwd=workdir, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=False,
+    )
+    return json.loads(result.stdout)
+
+
+def run_sync(client_module, server, workdir, args):
+    results = []
+    for job in range(args.jobs):
+        results += client_module.download_files(job_files(job, args), server,
+                                                download_dir=os.path.join(workdir, f"job{job}"))
+    return results
+
+
+async def run_async(client_module, server, workdir, args):
+    limit = asyncio.Semaphore(args.concurrency)
+
+    async def job(index):
+        async with limit:
+            return await client_module.download_files_async(job_files(index, args), server,
+                                                            download_dir=os.path.join(workdir, f"job{index}"))
+
+    return [result for results in await asyncio.gather(*(job(index) for index in range(args.jobs)))
+            for result in results]
+
+
+def run(mode, server, tmp, args):
+    workdir = os.path.join(tmp, mode)
+    with harness.working_directory(workdir), harness.quiet_stdout():
+        # Nạp module (và khởi động interpreter) được tính vào thời gian của mode in-process như một lần khởi động
+        started = time.monotonic()
+        if mode == "process":
+            results = [result for job in range(args.jobs) for result in run_process(job, server, workdir, args)]
+        else:
+            client_module = harness.load_module(CLIENTS[args.protocol], f"{args.protocol}_client_{mode}")
+            client_module.QUIET = True
+            if mode == "sync":
+                results = run_sync(client_module, server, workdir, args)
+            else:
+                results = asyncio.run(run_async(client_module, server, workdir, args))
+        elapsed = time.monotonic() - started
+
+    failed = sum(not result["ok"] for result in results)
+    received = sum(result["bytes"] for result in results)
+    retries = sum(result["retries"] for result in results)
+    print(f"{mode:8} {args.jobs / elapsed * 60:10.0f} {elapsed:8.2f}s {received / elapsed / 1024 / 1024:8.1f}MB/s "
+          f"{retries:8} {failed:7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--protocol", choices=sorted(CLIENTS), default="tcp")
+    parser.add_argument("--jobs", type=int, default=40, help="Số job")
+    parser.add_argument("--files-per-job", type=int, default=2, help="Số file mỗi job tải")
+    parser.add_argument("--files", type=int, default=16, help="Số file khác nhau trên server")
+    parser.add_argument("--size", type=int, default=256, help="Kích thước mỗi file (KB)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Số job async chạy đồng thời")
+    parser.add_argument("--modes", nargs="+", choices=["process", "sync", "async"],
+                        default=["process", "sync", "async"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files_dir = os.path.join(tmp, "files")
+        for index in range(args.files):
+            harness.make_file(os.path.join(files_dir, f"file{index:03}.bin"), args.size * 1024, seed=index)
+        start = harness.start_tcp_server if args.protocol == "tcp" else harness.start_udp_server
+        process, port = start(os.path.join(tmp, "server"), files_dir)
+        try:
+            print(f"{args.jobs} {args.protocol.upper()} jobs of {args.files_per_job} x {args.size}KB files, "
+                  f"async concurrency {args.concurrency}")
+            print(f"{'mode':8} {'jobs/min':>10} {'time':>9} {'rate':>10} {'retries':>8} {'failed':>7}")
+            for mode in args.modes:
+                run(mode, ("127.0.0.1", port), tmp, args)
+        finally:
+            harness.stop_process(process)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Benchmark "thundering herd" của server TCP: --clients client cùng lúc tải mọi range 1MB của một file vừa
+xuất hiện (cache lạnh), đếm số lần server đọc đĩa cho mỗi range.
+
+- off: mỗi yêu cầu tự đọc đĩa (--no-coalesce);
+- flight: yêu cầu đồng thời cùng block dùng chung lần đọc đang chạy (--read-cache 0);
+- cache: như flight, thêm cache LRU các block vừa đọc cho yêu cầu đến sau khi lần đọc đã xong.
+Đĩa giả lập: mỗi lần đọc tốn --latency ms cộng thời gian đọc theo --disk-rate, các lần đọc xếp hàng trên một đầu đọc.
+
+    python benchmarks/bench_coalesce.py --clients 50 --size 8 --latency 5 --disk-rate 200
+"""
+import argparse
+import logging
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import harness
+
+sys.path.append(os.path.join(harness.ROOT, "SOURCE"))
+from common.protocol import FRAME_DATA, FRAME_GET, FRAME_HELLO, STATUS_OK, read_frame, send_frame  # noqa: E402
+from common.storage import CoalescingStorage, StorageBackend, create_storage  # noqa: E402
+
+FILENAME = "dataset.bin"
+RANGE_SIZE = 1024 * 1024
+READ_CACHE = {"off": None, "flight": 0, "cache": 64 * 1024 * 1024}
+
+
+class CountingDisk(StorageBackend):
+    """
+    Đĩa chậm giả lập đếm số lần đọc: một đầu đọc, mỗi lần đọc tốn `latency` giây cộng size / rate.
+    """
+    def __init__(self, backend, latency, rate):
+        self.backend = backend
+        self.latency = latency
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.reads = 0
+        self.bytes_read = 0
+
+    def list(self):
+        return self.backend.list()
+
+    def stat(self, name):
+        return self.backend.stat(name)
+
+    def read_range(self, name, offset, size):
+        with self.lock:
+            self.reads += 1
+            self.bytes_read += size
+            time.sleep(self.latency + size / self.rate)
+        return self.backend.read_range(name, offset, size)
+
+
+def fetch(port, ranges, barrier, errors):
+    """
+    Một client: kết nối, chờ mọi client sẵn sàng rồi tải lần lượt các range.
+    """
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=60) as sock:
+            if read_frame(sock).type != FRAME_HELLO:
+                raise ConnectionError("no HELLO")
+            barrier.wait()
+            for request_id, (offset, length) in enumerate(ranges, 1):
+                send_frame(sock, FRAME_GET, request_id, offset, length, FILENAME.encode())
+                frame = read_frame(sock)
+                if frame.type != FRAME_DATA or frame.status != STATUS_OK or len(frame.payload) != length:
+                    raise ConnectionError(f"bad response (frame {frame.type})")
+    except (OSError, threading.BrokenBarrierError) as e:
+        errors.append(e)
+
+
+def run(mode, tmp, files_dir, args):
+    workdir = os.path.join(tmp, mode)
+    with harness.working_directory(workdir):
+        server_module = harness.load_module(harness.TCP_SERVER, f"tcp_server_{mode}")
+        server_module.SERVER_HOST, server_module.SERVER_PORT = "127.0.0.1", harness.free_port()
+        server_module.SERVER_FILES_DIRECTORY = files_dir
+        server = server_module.Server()
+    logging.disable(logging.INFO)
+    disk = CountingDisk(create_storage("local", files_dir), args.latency / 1000, args.disk_rate * 1024 * 1024)
+    server.storage = disk if READ_CACHE[mode] is None else CoalescingStorage(disk, READ_CACHE[mode])
+    thread = threading.Thread(target=server.start, daemon=True)
+    thread.start()
+    harness.wait_for_port(server_module.SERVER_PORT)
+
+    size = args.size * 1024 * 1024
+    ranges = [(offset, min(RANGE_SIZE, size - offset)) for offset in range(0, size, RANGE_SIZE)]
+    barrier = threading.Barrier(args.clients + 1)
+    errors = []
+    clients = [threading.Thread(target=fetch, args=(server_module.SERVER_PORT, ranges, barrier, errors), daemon=True)
+               for _ in range(args.clients)]
+    try:
+        for client in clients:
+            client.start()
+        barrier.wait()
+        started = time.monotonic()
+        for client in clients:
+            client.join()
+        elapsed = time.monotonic() - started
+    finally:
+        server.is_running = False
+        thread.join(5)
+
+    served = args.clients * size
+    print(f"{mode:7} {disk.reads:7} {disk.reads / len(ranges):10.2f} {disk.bytes_read / served:9.2f} "
+          f"{elapsed:8.2f}s {served / elapsed / 1024 / 1024:8.1f}MB/s {len(errors):7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=50, help="Số client tải cùng lúc")
+    parser.add_argument("--size", type=int, default=8, help="Kích thước file (MB)")
+    parser.add_argument("--latency", type=float, default=5, help="Độ trễ mỗi lần đọc của đĩa giả lập (ms)")
+    parser.add_argument("--disk-rate", type=float, default=200, help="Tốc độ đọc của đĩa giả lập (MB/s)")
+    parser.add_argument("--modes", nargs="+", choices=sorted(READ_CACHE), default=["off", "flight", "cache"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files_dir = os.path.join(tmp, "files")
+        harness.make_file(os.path.join(files_dir, FILENAME), args.size * 1024 * 1024)
+        print(f"{args.clients} clients fetching the {args.size} {RANGE_SIZE // 1024}KB ranges of a new file at once, "
+              f"disk {args.latency:g}ms + {args.disk_rate:g}MB/s per read")
+        print(f"{'mode':7} {'reads':>7} {'per range':>10} {'read/sent':>9} {'time':>9} {'rate':>10} {'errors':>7}")
+        for mode in args.modes:
+            run(mode, tmp, files_dir, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark kho block theo nội dung phía client: tải một bộ file có khoảng 40% nội dung trùng
+(một file giống hệt file khác, các file còn lại chia sẻ một số block 1MB) với và không có --dedup.
+Đo lượng byte thực sự đi qua mạng (đếm ở relay), dung lượng đĩa của thư mục tải về và thời gian.
+
+    python benchmarks/bench_dedup.py --files 10 --blocks 8
+"""
+import argparse
+import filecmp
+import os
+import random
+import tempfile
+import time
+
+import harness
+import relay
+
+BLOCK_SIZE = 1024 * 1024  # Trùng kích thước block hash của server
+
+
+def make_corpus(files_dir, files, blocks, duplicate_ratio, seed=0):
+    """
+    Tạo `files` file, mỗi file `blocks` block; file cuối giống hệt file đầu, các file ở giữa
+    lấy lại block của các file trước cho đủ tỉ lệ trùng. Trả về (tên file, tỉ lệ trùng thực tế).
+    """
+    rng = random.Random(seed)
+    os.makedirs(files_dir, exist_ok=True)
+    contents = []
+    duplicates = blocks  # File cuối trùng hoàn toàn
+    # Số block mỗi file ở giữa lấy lại từ các file trước
+    per_file = min(blocks, round((duplicate_ratio * files * blocks - duplicates) / max(1, files - 2)))
+    for index in range(files):
+        if index == files - 1 and files > 1:
+            file_blocks = list(contents[0])
+        else:
+            file_blocks = [rng.randbytes(BLOCK_SIZE) for _ in range(blocks)]
+            if 0 < index < files - 1:
+                for position in rng.sample(range(blocks), per_file):
+                    file_blocks[position] = rng.choice(rng.choice(contents))
+                duplicates += per_file
+        contents.append(file_blocks)
+
+    names = []
+    for index, file_blocks in enumerate(contents):
+        name = f"dataset_{index:02d}.bin"
+        with open(os.path.join(files_dir, name), "wb") as out:
+            out.write(b"".join(file_blocks))
+        names.append(name)
+    return names, duplicates / (files * blocks)
+
+
+def disk_usage(directory):
+    """
+    Dung lượng thật trên đĩa (block đã cấp phát, hardlink chỉ tính một lần).
+    """
+    seen, total = set(), 0
+    for root, _, filenames in os.walk(directory):
+        for filename in filenames:
+            stat = os.stat(os.path.join(root, filename))
+            if (stat.st_dev, stat.st_ino) not in seen:
+                seen.add((stat.st_dev, stat.st_ino))
+                total += stat.st_blocks * 512
+    return total
+
+
+def run(tmp, files_dir, names, dedup):
+    workdir = os.path.join(tmp, "dedup" if dedup else "plain")
+    process, port = harness.start_tcp_server(os.path.join(workdir, "server"), files_dir)
+    network = relay.TcpRelay(("127.0.0.1", port))
+    relay_port = network.start()
+    try:
+        with harness.working_directory(os.path.join(workdir, "client")), harness.quiet_stdout():
+            client_module = harness.load_module(harness.TCP_CLIENT, f"tcp_client_{dedup}")
+            client_module.SERVER_HOST, client_module.SERVER_PORT = "127.0.0.1", relay_port
+            client_module.BLOCK_DEDUP = dedup
+            os.makedirs(client_module.DOWNLOAD_DIR, exist_ok=True)
+            client = client_module.Client()
+            client.connect_to_server()
+            started = time.monotonic()
+            ok = all(client.download_file(name) for name in names)
+            elapsed = time.monotonic() - started
+            client.client_socket.close()
+            download_dir = os.path.abspath(client_module.DOWNLOAD_DIR)
+        ok = ok and all(filecmp.cmp(os.path.join(files_dir, name), os.path.join(download_dir, name), shallow=False)
+                        for name in names)
+        time.sleep(0.2)  # Chờ relay chuyển tiếp nốt
+        return ok, network.transferred, disk_usage(download_dir), elapsed
+    finally:
+        network.stop()
+        harness.stop_process(process)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=10, help="Số file")
+    parser.add_argument("--blocks", type=int, default=8, help="Số block 1MB mỗi file")
+    parser.add_argument("--duplicates", type=float, default=0.4, help="Tỉ lệ nội dung trùng")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files_dir = os.path.join(tmp, "files")
+        names, ratio = make_corpus(files_dir, args.files, args.blocks, args.duplicates)
+        corpus = args.files * args.blocks * BLOCK_SIZE
+        print(f"Corpus: {len(names)} files, {corpus / 1024 / 1024:.0f}MB, {ratio * 100:.0f}% duplicate blocks")
+        print(f"{'mode':8} {'ok':>5} {'transferred':>12} {'disk used':>10} {'time':>8}")
+        for dedup in (False, True):
+            ok, transferred, used, elapsed = run(tmp, files_dir, names, dedup)
+            print(f"{'dedup' if dedup else 'plain':8} {str(ok):>5} {transferred / 1024 / 1024:10.1f}MB "
+                  f"{used / 1024 / 1024:8.1f}MB {elapsed:7.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark delta sync: client giữ bản cũ của file, server có bản đã sửa 1%, 10% và 50%.
+Đo số byte truyền qua mạng và thời gian CPU của client/server so với tải lại toàn bộ.
+
+    python benchmarks/bench_delta.py --size 64
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import harness
+
+
+def modify(source, target, percent, region, seed=1):
+    """
+    Sao chép file và sửa ngẫu nhiên `percent`% nội dung (ghi đè, chèn và xóa từng đoạn `region` byte).
+    """
+    rng = random.Random(seed)
+    with open(source, "rb") as src:
+        data = bytearray(src.read())
+    edits = max(1, len(data) * percent // 100 // region)
+    for _ in range(edits):
+        position = rng.randrange(len(data))
+        kind = rng.random()
+        if kind < 0.8:
+            data[position:position + region] = rng.randbytes(region)
+        elif kind < 0.9:
+            data[position:position] = rng.randbytes(region)
+        else:
+            del data[position:position + region]
+    with open(target, "wb") as out:
+        out.write(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=64, help="Kích thước file (MB)")
+    parser.add_argument("--percent", type=int, nargs="+", default=[1, 10, 50], help="Tỉ lệ nội dung bị sửa")
+    parser.add_argument("--region", type=int, default=16, help="Kích thước mỗi đoạn bị sửa (KB)")
+    parser.add_argument("--block-size", type=int, default=64, help="Kích thước block chữ ký (KB)")
+    args = parser.parse_args()
+
+    client_module = harness.load_module(harness.TCP_CLIENT, "tcp_client")
+    client_module.DELTA_BLOCK_SIZE = args.block_size * 1024
+    filename = "dataset.bin"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        original = os.path.join(tmp, "original.bin")
+        harness.make_file(original, args.size * 1024 * 1024)
+        with open(original, "r+b") as file:
+            file.write(random.Random(0).randbytes(args.size * 1024 * 1024))
+
+        print(f"{'modified':>8} {'wire':>10} {'full':>10} {'saving':>8} {'client cpu':>11} {'server cpu':>11} {'time':>7}")
+        for percent in args.percent:
+            files_dir = os.path.join(tmp, f"server_files_{percent}")
+            os.makedirs(files_dir)
+            modify(original, os.path.join(files_dir, filename), percent, args.region * 1024)
+            new_size = os.path.getsize(os.path.join(files_dir, filename))
+
+            process, port = harness.start_tcp_server(os.path.join(tmp, f"server_{percent}"), files_dir)
+            try:
+                client_module.SERVER_HOST, client_module.SERVER_PORT = "127.0.0.1", port
+                with harness.working_directory(os.path.join(tmp, f"client_{percent}")):
+                    os.makedirs(client_module.DOWNLOAD_DIR, exist_ok=True)
+                    shutil.copy(original, os.path.join(client_module.DOWNLOAD_DIR, filename))
+                    with harness.quiet_stdout():
+                        client = client_module.Client()
+                        client.connect_to_server()
+                        server_cpu = harness.process_cpu_time(process.pid)
+                        client_cpu = time.process_time()
+                        started = time.monotonic()
+                        ok = client.sync_file(filename)
+                        elapsed = time.monotonic() - started
+                        client_cpu = time.process_time() - client_cpu
+                        server_cpu = harness.process_cpu_time(process.pid) - server_cpu
+                    client.client_socket.close()
+                    with open(os.path.join(client_module.DOWNLOAD_DIR, filename), "rb") as synced, \
+                            open(os.path.join(files_dir, filename), "rb") as expected:
+                        ok = ok and synced.read() == expected.read()
+            finally:
+                harness.stop_process(process)
+
+            stats = client.last_sync_stats
+            wire = stats["sent"] + stats["received"] if ok else float("nan")
+            print(f"{percent:>7}% {wire / 1024 / 1024:9.2f}M {new_size / 1024 / 1024:9.2f}M "
+                  f"{new_size / wire:7.1f}x {client_cpu:10.2f}s {server_cpu:10.2f}s {elapsed:6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
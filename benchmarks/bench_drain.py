@@ -0,0 +1,117 @@
+"""
+Benchmark tắt server TCP (SIGINT) theo số client đang kết nối: đo thời gian từ lúc gửi tín hiệu đến khi
+tiến trình server thoát. Phần lớn client chỉ kết nối và chờ; --busy client đang nhận dở một range lớn
+(server bị giới hạn băng thông) và phải nhận đủ range trước khi kết nối đóng. Mỗi client ghi lại frame
+cuối cùng nhận được (GOAWAY, SHUTDOWN hay bị đóng ngang).
+
+--server chạy một bản server khác (vd: bản cũ lấy bằng `git archive`) để so sánh.
+
+    python benchmarks/bench_drain.py --clients 10 100 500 --busy 4 --range-size 8
+"""
+import argparse
+import collections
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import harness
+
+sys.path.append(os.path.join(harness.ROOT, "SOURCE"))
+from common.protocol import (FRAME_DATA, FRAME_GET, FRAME_GOAWAY, FRAME_HELLO, FRAME_SHUTDOWN,  # noqa: E402
+                             read_frame, send_frame)
+
+FILENAME = "dataset.bin"
+FRAME_NAMES = {FRAME_GOAWAY: "goaway", FRAME_SHUTDOWN: "shutdown"}
+
+
+def connect(port):
+    sock = socket.create_connection(("127.0.0.1", port))
+    if read_frame(sock).type != FRAME_HELLO:
+        raise RuntimeError("Expected HELLO")
+    return sock
+
+
+def listen_for_close(sock, results, request_size=0):
+    """
+    Đọc đến khi kết nối đóng; với client bận kiểm tra range (mã yêu cầu 1) được nhận đủ.
+    """
+    outcome = "reset"
+    received = 0
+    try:
+        while True:
+            frame = read_frame(sock)
+            if frame.type == FRAME_DATA:
+                received += len(frame.payload)
+                continue
+            outcome = FRAME_NAMES.get(frame.type, f"frame {frame.type}")
+    except OSError:
+        pass
+    finally:
+        sock.close()
+    if request_size:
+        outcome += ", range complete" if received == request_size else f", range cut at {received}"
+    results[outcome] += 1
+
+
+def run(files_dir, workdir, clients, args):
+    extra = ("--throttle", str(args.throttle * 1024 * 1024))
+    if args.drain_timeout is not None:
+        extra += ("--drain-timeout", str(args.drain_timeout))
+    process, port = harness.start_tcp_server(workdir, files_dir, extra_args=extra)
+    results = collections.Counter()
+    threads = []
+    try:
+        sockets = [connect(port) for _ in range(clients)]
+        request_size = args.range_size * 1024 * 1024
+        for index, sock in enumerate(sockets):
+            busy = index < args.busy
+            if busy:
+                send_frame(sock, FRAME_GET, 1, 0, request_size, FILENAME.encode())
+            thread = threading.Thread(target=listen_for_close, args=(sock, results, request_size if busy else 0),
+                                      daemon=True)
+            thread.start()
+            threads.append(thread)
+        time.sleep(0.5)  # Cho các range lớn bắt đầu được gửi
+
+        started = time.monotonic()
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(args.timeout)
+            elapsed = f"{time.monotonic() - started:8.2f}s"
+        except subprocess.TimeoutExpired:
+            elapsed = f"{'>' + str(args.timeout):>8}s"
+        for thread in threads:
+            thread.join(5)
+    finally:
+        harness.stop_process(process)
+    print(f"{clients:8} {elapsed:>9}  " + ", ".join(f"{count} {outcome}" for outcome, count in sorted(results.items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 100, 500], help="Số client đang kết nối")
+    parser.add_argument("--busy", type=int, default=4, help="Số client đang nhận dở một range khi tắt")
+    parser.add_argument("--range-size", type=int, default=8, help="Kích thước range của client bận (MB)")
+    parser.add_argument("--throttle", type=int, default=16, help="Giới hạn băng thông của server (MB/s)")
+    parser.add_argument("--drain-timeout", type=float, help="Hạn chót drain của server (giây, mặc định của server)")
+    parser.add_argument("--timeout", type=float, default=60, help="Bỏ cuộc nếu server chưa thoát sau chừng này giây")
+    parser.add_argument("--server", default=harness.TCP_SERVER, help="Script server cần đo (mặc định: bản hiện tại)")
+    args = parser.parse_args()
+    harness.TCP_SERVER = os.path.abspath(args.server)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files_dir = os.path.join(tmp, "files")
+        harness.make_file(os.path.join(files_dir, FILENAME), args.range_size * 1024 * 1024)
+        print(f"{args.busy} clients receiving a {args.range_size}MB range at {args.throttle}MB/s when SIGINT arrives")
+        print(f"{'clients':>8} {'shutdown':>9}  client outcome")
+        for clients in args.clients:
+            run(files_dir, os.path.join(tmp, f"server_{clients}"), clients, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark chia băng thông giữa các client trên server TCP có giới hạn băng thông: một client
+tải lớn (nhiều kết nối, tải liên tục các range 1MB) chạy cùng nhiều client nhỏ (mỗi client một
+địa chỉ 127.0.0.x, tải lặp lại một range nhỏ). So thứ tự gửi FIFO với --fair-share: đo độ trễ
+p50/p99 của client nhỏ, thông lượng của client lớn và tổng.
+
+    python benchmarks/bench_fairness.py --throttle 40 --small-clients 20 --duration 8
+"""
+import argparse
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import harness
+
+sys.path.append(os.path.join(harness.ROOT, "SOURCE"))
+from common.protocol import FRAME_DATA, FRAME_GET, FRAME_HELLO, read_frame, send_frame  # noqa: E402
+
+FILENAME = "dataset.bin"
+BULK_ADDRESS = "127.0.0.2"
+SMALL_ADDRESS_BASE = 10  # Client nhỏ thứ i dùng địa chỉ 127.0.0.(10 + i)
+
+
+def connect(port, address):
+    sock = socket.create_connection(("127.0.0.1", port), timeout=60, source_address=(address, 0))
+    hello = read_frame(sock)
+    if hello.type != FRAME_HELLO:
+        raise RuntimeError(f"Unexpected frame {hello.type}")
+    return sock
+
+
+def fetch(sock, request_id, offset, length):
+    send_frame(sock, FRAME_GET, request_id, offset, length, FILENAME.encode())
+    frame = read_frame(sock)
+    if frame.type != FRAME_DATA or len(frame.payload) != length:
+        raise RuntimeError(f"Bad response for request {request_id}")
+
+
+def bulk_worker(port, file_size, range_size, stop, received, index):
+    sock = connect(port, BULK_ADDRESS)
+    request_id = 0
+    while not stop.is_set():
+        request_id += 1
+        offset = (request_id * range_size + index * range_size) % (file_size - range_size)
+        fetch(sock, request_id, offset, range_size)
+        received[index] += range_size
+    sock.close()
+
+
+def small_worker(port, index, small_size, think, stop, latencies):
+    sock = connect(port, f"127.0.0.{SMALL_ADDRESS_BASE + index}")
+    request_id = 0
+    while not stop.is_set():
+        request_id += 1
+        started = time.monotonic()
+        fetch(sock, request_id, index * small_size, small_size)
+        latencies.append(time.monotonic() - started)
+        time.sleep(think)
+    sock.close()
+
+
+def run(files_dir, workdir, args, fair_share):
+    extra = ["--throttle", str(args.throttle * 1024 * 1024)] + (["--fair-share"] if fair_share else [])
+    process, port = harness.start_tcp_server(workdir, files_dir, extra_args=extra)
+    stop = threading.Event()
+    received = [0] * args.bulk_connections
+    latencies = []
+    threads = [threading.Thread(target=bulk_worker,
+                                args=(port, args.size * 1024 * 1024, 1024 * 1024, stop, received, index),
+                                daemon=True)
+               for index in range(args.bulk_connections)]
+    threads += [threading.Thread(target=small_worker,
+                                 args=(port, index, args.small_size * 1024, args.think, stop, latencies),
+                                 daemon=True)
+                for index in range(args.small_clients)]
+    try:
+        for thread in threads:
+            thread.start()
+        time.sleep(args.warmup)
+        bulk_before, latencies_before = sum(received), len(latencies)
+        started = time.monotonic()
+        time.sleep(args.duration)
+        elapsed = time.monotonic() - started
+        bulk_bytes = sum(received) - bulk_before
+        measured = sorted(latencies[latencies_before:])
+        stop.set()
+        for thread in threads:
+            thread.join(30)
+    finally:
+        harness.stop_process(process)
+
+    small_bytes = len(measured) * args.small_size * 1024
+    return {
+        "p50": statistics.median(measured) * 1000 if measured else None,
+        "p99": measured[min(len(measured) - 1, int(0.99 * len(measured)))] * 1000 if measured else None,
+        "requests": len(measured),
+        "bulk": bulk_bytes / elapsed / 1024 / 1024,
+        "total": (bulk_bytes + small_bytes) / elapsed / 1024 / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--throttle", type=int, default=40, help="Giới hạn băng thông server (MB/s)")
+    parser.add_argument("--size", type=int, default=64, help="Kích thước file (MB)")
+    parser.add_argument("--bulk-connections", type=int, default=8, help="Số kết nối của client lớn")
+    parser.add_argument("--small-clients", type=int, default=20, help="Số client nhỏ")
+    parser.add_argument("--small-size", type=int, default=256, help="Kích thước mỗi yêu cầu của client nhỏ (KB)")
+    parser.add_argument("--think", type=float, default=0.2, help="Thời gian nghỉ giữa các yêu cầu nhỏ (giây)")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Thời gian chạy trước khi đo (giây)")
+    parser.add_argument("--duration", type=float, default=8.0, help="Thời gian đo (giây)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files_dir = os.path.join(tmp, "files")
+        harness.make_file(os.path.join(files_dir, FILENAME), args.size * 1024 * 1024)
+        print(f"{'mode':12} {'small p50':>10} {'small p99':>10} {'requests':>9} {'bulk':>12} {'total':>12}")
+        for name, fair_share in (("fifo", False), ("fair-share", True)):
+            result = run(files_dir, os.path.join(tmp, name), args, fair_share)
+            print(f"{name:12} {result['p50']:8.1f}ms {result['p99']:8.1f}ms {result['requests']:9} "
+                  f"{result['bulk']:8.1f}MB/s {result['total']:8.1f}MB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark khởi động lại server TCP dưới tải liên tục: các luồng client liên tục kết nối, tải một range nhỏ
+rồi đóng kết nối, trong khi server được khởi động lại --restarts lần.
+
+- hot: chạy bản mới với cùng --handoff, bản mới nhận socket lắng nghe (SCM_RIGHTS) và catalog, bản cũ drain rồi thoát;
+- cold: tắt bản cũ (SIGTERM, drain) rồi mới chạy bản mới, client kết nối trong khoảng trống bị từ chối.
+
+    python benchmarks/bench_hot_restart.py --clients 8 --restarts 3 --files 2000
+"""
+import argparse
+import collections
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import harness
+
+sys.path.append(os.path.join(harness.ROOT, "SOURCE"))
+from common.protocol import FRAME_DATA, FRAME_GET, FRAME_HELLO, STATUS_OK, read_frame, send_frame  # noqa: E402
+
+FILENAME = "dataset.bin"
+RANGE_SIZE = 64 * 1024
+
+
+def spawn_server(workdir, files_dir, port, handoff_path, workers):
+    """
+    Chạy server như harness.start_tcp_server nhưng không chờ cổng: khi hot restart cổng vẫn mở bởi bản cũ.
+    """
+    os.makedirs(workdir, exist_ok=True)
+    return subprocess.Popen(
+        [sys.executable, harness.TCP_SERVER, "--host", "127.0.0.1", "--port", str(port),
+         "--directory", os.path.abspath(files_dir), "--handoff", handoff_path, "--workers", str(workers)],
+        cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def load(port, stop, results):
+    """
+    Vòng lặp của một client: kết nối, nhận HELLO, tải một range, đóng kết nối.
+    """
+    while not stop.is_set():
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=10) as sock:
+                if read_frame(sock).type != FRAME_HELLO:
+                    raise ConnectionError("no HELLO")
+                send_frame(sock, FRAME_GET, 1, 0, RANGE_SIZE, FILENAME.encode())
+                frame = read_frame(sock)
+                if frame.type != FRAME_DATA or frame.status != STATUS_OK or len(frame.payload) != RANGE_SIZE:
+                    raise ConnectionError(f"bad response (frame {frame.type})")
+            results["ok"] += 1
+        except OSError as e:
+            results[type(e).__name__] += 1
+            time.sleep(0.01)
+
+
+def run(mode, tmp, files_dir, args):
+    port = harness.free_port()
+    handoff_path = os.path.join(tmp, f"{mode}.sock")
+    process = spawn_server(os.path.join(tmp, mode, "server0"), files_dir, port, handoff_path, args.workers)
+    harness.wait_for_port(port)
+
+    stop = threading.Event()
+    results = collections.Counter()
+    threads = [threading.Thread(target=load, args=(port, stop, results), daemon=True) for _ in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    restart_times = []
+    try:
+        for restart in range(1, args.restarts + 1):
+            time.sleep(args.interval)
+            started = time.monotonic()
+            workdir = os.path.join(tmp, mode, f"server{restart}")
+            if mode == "hot":
+                new_process = spawn_server(workdir, files_dir, port, handoff_path, args.workers)
+                process.wait(60)  # Bản cũ thoát sau khi bản mới nhận socket và bản cũ drain xong
+            else:
+                harness.stop_process(process, 60)
+                new_process = spawn_server(workdir, files_dir, port, handoff_path, args.workers)
+                harness.wait_for_port(port)
+            restart_times.append(time.monotonic() - started)
+            process = new_process
+        time.sleep(args.interval)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join(15)
+        harness.stop_process(process)
+
+    failed = sum(count for outcome, count in results.items() if outcome != "ok")
+    errors = ", ".join(f"{count} {outcome}" for outcome, count in sorted(results.items()) if outcome != "ok")
+    print(f"{mode:5} {results['ok']:10} {failed:8} {max(restart_times):9.2f}s  {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=8, help="Số luồng client tạo tải liên tục")
+    parser.add_argument("--restarts", type=int, default=3, help="Số lần khởi động lại")
+    parser.add_argument("--interval", type=float, default=1.0, help="Thời gian chạy giữa các lần khởi động lại (giây)")
+    parser.add_argument("--workers", type=int, default=1, help="Số tiến trình worker của server (supervisor)")
+    parser.add_argument("--files", type=int, default=2000, help="Số file thêm vào thư mục server (catalog lớn)")
+    parser.add_argument("--modes", nargs="+", choices=["hot", "cold"], default=["hot", "cold"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files_dir = os.path.join(tmp, "files")
+        harness.make_file(os.path.join(files_dir, FILENAME), 1024 * 1024)
+        os.makedirs(os.path.join(files_dir, "small"))
+        for index in range(args.files):
+            with open(os.path.join(files_dir, "small", f"file{index:05}.bin"), "wb") as small_file:
+                small_file.write(bytes([index % 256]) * 1024)
+        print(f"{args.clients} clients in a connect/GET {RANGE_SIZE // 1024}KB/close loop, {args.restarts} restarts, "
+              f"{args.workers} workers")
+        print(f"{'mode':5} {'requests':>10} {'failed':>8} {'restart':>10}  errors")
+        for mode in args.modes:
+            run(mode, tmp, files_dir, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark tải từ nhiều mirror: 3 server TCP cục bộ cùng phục vụ một file,
+một server bị giới hạn băng thông. So sánh với tải từ một server và kiểm tra failover
+khi một mirror bị tắt giữa chừng.
+
+    python benchmarks/bench_mirrors.py --size 64 --throttle 4
+"""
+import argparse
+import filecmp
+import os
+import tempfile
+import threading
+import time
+
+import harness
+
+
+def download(client_module, workdir, endpoints, filename, source, kill=None):
+    primary, *mirrors = endpoints
+    client_module.SERVER_HOST, client_module.SERVER_PORT = primary
+    client_module.MIRRORS = mirrors
+
+    with harness.working_directory(workdir):
+        os.makedirs(client_module.DOWNLOAD_DIR, exist_ok=True)
+        with harness.quiet_stdout():
+            client = client_module.Client()
+            client.connect_to_server()
+            if kill:
+                threading.Timer(*kill).start()
+            started = time.monotonic()
+            ok = client.download_file(filename)
+            elapsed = time.monotonic() - started
+        client.client_socket.close()
+        ok = ok and filecmp.cmp(source, os.path.join(client_module.DOWNLOAD_DIR, filename), shallow=False)
+    return ok, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=64, help="Kích thước file (MB)")
+    parser.add_argument("--throttle", type=int, default=4, help="Băng thông mirror chậm (MB/s)")
+    parser.add_argument("--rate", type=int, default=16, help="Băng thông mỗi mirror thường (MB/s), giả lập NIC")
+    args = parser.parse_args()
+
+    client_module = harness.load_module(harness.TCP_CLIENT, "tcp_client")
+    filename = "dataset.bin"
+    size = args.size * 1024 * 1024
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files_dir = os.path.join(tmp, "server_files")
+        harness.make_file(os.path.join(files_dir, filename), size)
+
+        rates = [args.rate, args.rate, args.throttle]
+        servers = [harness.start_tcp_server(os.path.join(tmp, f"server{i}"), files_dir,
+                                            extra_args=("--throttle", str(rate * 1024 * 1024)))
+                   for i, rate in enumerate(rates)]
+        endpoints = [("127.0.0.1", port) for _, port in servers]
+        try:
+            scenarios = [
+                ("single server", endpoints[:1], None),
+                ("3 mirrors (1 throttled)", endpoints, None),
+                ("3 mirrors, mirror 2 killed after 1s", endpoints, (1.0, harness.stop_process, (servers[1][0],))),
+            ]
+            print(f"{'scenario':40} {'ok':>4} {'time':>8} {'throughput':>12}")
+            for index, (name, scenario_endpoints, kill) in enumerate(scenarios):
+                ok, elapsed = download(client_module, os.path.join(tmp, f"client{index}"),
+                                       scenario_endpoints, filename, os.path.join(files_dir, filename), kill)
+                print(f"{name:40} {str(ok):>4} {elapsed:7.2f}s {size / elapsed / 1024 / 1024:9.1f}MB/s")
+        finally:
+            for process, _ in servers:
+                harness.stop_process(process)
+
+
+if __name__ == "__main__":
+    main()
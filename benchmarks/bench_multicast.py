@@ -0,0 +1,91 @@
+"""
+Benchmark phân phối một file tới nhiều máy bằng UDP multicast (sửa lỗi bằng NAK) trên một máy qua loopback:
+với mỗi số bên nhận trong --receivers, chạy chừng đó tiến trình client (--multicast) rồi đẩy file từ server,
+đo lượng byte server gửi ra và thời gian đến khi bên nhận cuối cùng nhận xong.
+
+Unicast cần gửi ít nhất (số bên nhận x kích thước file); multicast gửi file một lần cộng các gói sửa lỗi.
+Bên nhận chậm hơn tốc độ gửi (nhiều tiến trình trên ít CPU) làm đầy buffer nhận (--receiver-buffer) và mất gói,
+các gói này được sửa bằng NAK.
+
+    python benchmarks/bench_multicast.py --size 16 --receivers 1 5 10 20 --rate 20 --receiver-buffer 256
+"""
+import argparse
+import filecmp
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import harness
+
+sys.path.append(os.path.join(harness.ROOT, "SOURCE"))
+from common.multicast import MulticastSender  # noqa: E402
+from common.storage import LocalStorage  # noqa: E402
+
+FILENAME = "dataset.bin"
+JOIN_DELAY = 1.5  # Chờ các tiến trình bên nhận khởi động và tham gia nhóm (giây)
+
+
+def run(count, tmp, files_dir, args):
+    group = (f"239.255.{random.randint(0, 255)}.{random.randint(1, 254)}", harness.free_port())
+    workdirs = [os.path.join(tmp, f"run{count}", f"receiver{index}") for index in range(count)]
+    receivers = []
+    for workdir in workdirs:
+        os.makedirs(workdir)
+        receivers.append(subprocess.Popen(
+            [sys.executable, harness.UDP_CLIENT, "--multicast", f"{group[0]}:{group[1]}",
+             "--multicast-interface", "127.0.0.1", "--socket-buffer", str(args.receiver_buffer * 1024), "--json"],
+            cwd=workdir, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        ))
+    time.sleep(JOIN_DELAY + count * 0.05)
+
+    sender = MulticastSender(group, "127.0.0.1", args.rate * 1024 * 1024, receivers=count, output=lambda message: None)
+    started = time.monotonic()
+    try:
+        result = sender.send_file(LocalStorage(files_dir), FILENAME)
+        outputs = [receiver.communicate(timeout=120)[0] for receiver in receivers]
+        elapsed = time.monotonic() - started
+    finally:
+        sender.close()
+        for receiver in receivers:
+            harness.stop_process(receiver)
+
+    source = os.path.join(files_dir, FILENAME)
+    ok = 0
+    naks = 0
+    for workdir, output in zip(workdirs, outputs):
+        stats = json.loads(output or b"[]")
+        naks += sum(entry["naks"] for entry in stats)
+        path = os.path.join(workdir, "downloads", FILENAME)
+        ok += os.path.exists(path) and filecmp.cmp(source, path, shallow=False)
+
+    size = args.size * 1024 * 1024
+    print(f"{count:9} {result['sent'] / 1024 / 1024:9.1f}MB {count * size / 1024 / 1024:9.0f}MB "
+          f"{result['sent'] / size:8.2f}x {result['repairs']:8} {result['rounds']:6} {naks:6} {elapsed:8.2f}s "
+          f"{ok:>4}/{count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=16, help="Kích thước file (MB)")
+    parser.add_argument("--receivers", type=int, nargs="+", default=[1, 5, 10, 20], help="Các số bên nhận cần đo")
+    parser.add_argument("--rate", type=float, default=20, help="Tốc độ gửi multicast (MB/s)")
+    parser.add_argument("--receiver-buffer", type=int, default=4096, help="Buffer nhận (SO_RCVBUF) của bên nhận (KB)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files_dir = os.path.join(tmp, "files")
+        harness.make_file(os.path.join(files_dir, FILENAME), args.size * 1024 * 1024)
+        print(f"{args.size}MB file multicast over loopback at {args.rate:g}MB/s, "
+              f"{args.receiver_buffer}KB receive buffers")
+        print(f"{'receivers':>9} {'egress':>11} {'unicast':>11} {'vs file':>9} {'repairs':>8} {'rounds':>6} "
+              f"{'NAKs':>6} {'complete':>9} {'ok':>6}")
+        for count in args.receivers:
+            run(count, tmp, files_dir, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Benchmark chế độ multiplex so với nhiều kết nối: nhiều client đồng thời (mặc định 1000, chia cho
+vài tiến trình, mỗi client là một nhóm luồng) cùng tải một file. Đo bộ nhớ mỗi client,
+số luồng và bộ nhớ của server, thông lượng tổng.
+
+    python benchmarks/bench_mux.py --clients 1000 --processes 10 --size 2
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import threading
+import time
+
+import harness
+
+FILENAME = "dataset.bin"
+
+
+class DiscardFile:
+    """
+    File part giả: bỏ dữ liệu nhận được để đo giao thức, không đo ổ đĩa.
+    """
+    def seek(self, offset):
+        pass
+
+    def write(self, data):
+        pass
+
+    def flush(self):
+        pass
+
+
+def simulated_client(client, client_module, port, size, multiplex, done):
+    """
+    Một client: kết nối điều khiển + các luồng tải range như download_file (không ghi ra đĩa).
+    """
+    control_socket, _ = client.open_server_socket("127.0.0.1", port)
+    part_size = size // 4
+    part_bounds = [(i * part_size, (i + 1) * part_size if i < 3 else size) for i in range(4)]
+    mirror = client_module.Mirror("127.0.0.1", port)
+    scheduler = client_module.RangeScheduler(part_bounds, [mirror])
+    part_files = [(DiscardFile(), threading.Lock(), start) for start, _ in part_bounds]
+    if multiplex:
+        targets = [client.download_ranges_mux]
+    else:
+        targets = [client.download_ranges] * min(client_module.CONNECTIONS_PER_MIRROR,
+                                                 -(-size // client_module.MIN_RANGE_SIZE))
+    threads = [threading.Thread(target=target, args=(FILENAME, size, mirror, scheduler, part_files))
+               for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    client.close_range_socket(control_socket)
+    done.append(scheduler.finished())
+
+
+def client_process(port, size, clients, multiplex, workdir, barrier, results):
+    """
+    Tiến trình chạy `clients` client đồng thời, báo số client thành công, RSS tăng thêm và số luồng.
+    """
+    with harness.working_directory(workdir), harness.quiet_stdout():
+        client_module = harness.load_module(harness.TCP_CLIENT, "tcp_client")
+        client_module.SERVER_HOST, client_module.SERVER_PORT = "127.0.0.1", port
+        # Server một nhân với hàng nghìn kết nối có thể chậm trả lời lúc cao điểm
+        client_module.SOCKET_TIMEOUT = 60
+        os.makedirs(client_module.DOWNLOAD_DIR, exist_ok=True)
+        client = client_module.Client()
+        baseline_rss = harness.process_rss(os.getpid())
+
+        done = []
+        barrier.wait()
+        threads = [threading.Thread(target=simulated_client,
+                                    args=(client, client_module, port, size, multiplex, done),
+                                    daemon=True)
+                   for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        peak_threads = 0
+        while any(thread.is_alive() for thread in threads):
+            peak_threads = max(peak_threads, threading.active_count())
+            time.sleep(0.05)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    results.put((sum(done), peak_rss - baseline_rss, peak_threads))
+
+
+def run_mode(tmp, files_dir, size, clients, processes, multiplex):
+    process, port = harness.start_tcp_server(os.path.join(tmp, f"server_{multiplex}"), files_dir)
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(processes + 1)
+    results = context.Queue()
+    per_process = [clients // processes + (1 if i < clients % processes else 0) for i in range(processes)]
+    workers = [context.Process(target=client_process,
+                               args=(port, size, count, multiplex, os.path.join(tmp, f"client{i}"),
+                                     barrier, results))
+               for i, count in enumerate(per_process)]
+    try:
+        for worker in workers:
+            worker.start()
+        barrier.wait()
+        started = time.monotonic()
+
+        # Lấy mẫu số luồng và RSS của server trong lúc tải
+        peak_threads = peak_rss = 0
+        reports = []
+        while len(reports) < len(workers):
+            peak_threads = max(peak_threads, harness.process_threads(process.pid))
+            peak_rss = max(peak_rss, harness.process_rss(process.pid))
+            try:
+                reports.append(results.get(timeout=0.2))
+            except Exception:
+                pass
+        elapsed = time.monotonic() - started
+        for worker in workers:
+            worker.join()
+    finally:
+        harness.stop_process(process)
+
+    completed = sum(report[0] for report in reports)
+    client_memory = sum(report[1] for report in reports) / clients
+    client_threads = sum(report[2] for report in reports)
+    return completed, elapsed, client_memory, client_threads, peak_threads, peak_rss
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=1000, help="Số client đồng thời")
+    parser.add_argument("--processes", type=int, default=10, help="Số tiến trình chạy client")
+    parser.add_argument("--size", type=int, default=2, help="Kích thước file mỗi client tải (MB)")
+    args = parser.parse_args()
+
+    size = args.size * 1024 * 1024
+    with tempfile.TemporaryDirectory() as tmp:
+        files_dir = os.path.join(tmp, "server_files")
+        harness.make_file(os.path.join(files_dir, FILENAME), size)
+
+        print(f"{'mode':16} {'done':>6} {'time':>8} {'throughput':>12} {'mem/client':>11} "
+              f"{'client thr':>10} {'server thr':>10} {'server rss':>10}")
+        for name, multiplex in [("multi-connection", False), ("multiplexed", True)]:
+            completed, elapsed, client_memory, client_threads, server_threads, server_rss = run_mode(
+                tmp, files_dir, size, args.clients, args.processes, multiplex)
+            print(f"{name:16} {completed:>6} {elapsed:7.2f}s {completed * size / elapsed / 1024 / 1024:8.1f}MB/s "
+                  f"{client_memory / 1024:8.1f}KB {client_threads:>10} {server_threads:>10} "
+                  f"{server_rss / 1024 / 1024:8.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
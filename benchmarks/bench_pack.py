@@ -0,0 +1,68 @@
+"""
+Benchmark file nhỏ: 10,000 file 1KB. So sánh đường tải range cũ (4 part, 4 kết nối mỗi file),
+container PACK cho từng file và container PACK gộp nhiều file trên một kết nối.
+
+    python benchmarks/bench_pack.py --files 10000 --sample 200
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import harness
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=10000, help="Số file")
+    parser.add_argument("--file-size", type=int, default=1024, help="Kích thước mỗi file (bytes)")
+    parser.add_argument("--sample", type=int, default=200, help="Số file dùng cho các chế độ tải từng file")
+    args = parser.parse_args()
+
+    client_module = harness.load_module(harness.TCP_CLIENT, "tcp_client")
+    pack_threshold = client_module.BATCH_FILE_SIZE
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files_dir = os.path.join(tmp, "server_files")
+        os.makedirs(files_dir)
+        for index in range(args.files):
+            with open(os.path.join(files_dir, f"small{index:05d}.bin"), "wb") as out:
+                out.write(os.urandom(args.file_size))
+
+        process, port = harness.start_tcp_server(os.path.join(tmp, "server"), files_dir)
+        client_module.SERVER_HOST, client_module.SERVER_PORT = "127.0.0.1", port
+        modes = {
+            "range path (4 parts)": -1,  # Tắt PACK để đi đường range cũ
+            "pack per file": pack_threshold,
+            "pack batched": pack_threshold,
+        }
+        results = {}
+        try:
+            for index, (mode, threshold) in enumerate(modes.items()):
+                client_module.BATCH_FILE_SIZE = threshold
+                with harness.working_directory(os.path.join(tmp, f"client{index}")):
+                    os.makedirs(client_module.DOWNLOAD_DIR, exist_ok=True)
+                    with harness.quiet_stdout():
+                        client = client_module.Client()
+                        client.connect_to_server()
+                        filenames = sorted(client.server_files)
+                        started = time.monotonic()
+                        if mode == "pack batched":
+                            for batch in client.make_batches(filenames):
+                                client.download_pack(batch)
+                        else:
+                            for filename in filenames[:args.sample]:
+                                client.download_file(filename)
+                        elapsed = time.monotonic() - started
+                    client.client_socket.close()
+                    results[mode] = (len(client_module.scan_downloaded_files(client.download_dir)), elapsed)
+        finally:
+            harness.stop_process(process)
+
+    print(f"{'mode':24} {'files':>7} {'time':>9} {'files/s':>10}")
+    for mode, (count, elapsed) in results.items():
+        print(f"{mode:24} {count:>7} {elapsed:8.2f}s {count / elapsed:10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark pipelining: tốc độ yêu cầu range nhỏ trên một kết nối với độ sâu pipeline 1
+(gửi - chờ - gửi) so với 32 yêu cầu chờ phản hồi cùng lúc, qua loopback và qua relay có độ trễ.
+
+    python benchmarks/bench_pipeline.py --range-size 4096 --duration 5 --delay 1
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import harness
+import relay
+
+FILENAME = "dataset.bin"
+
+
+def measure(client_module, workdir, port, size, range_size, depth, duration):
+    """
+    Giữ `depth` yêu cầu range đang chờ trên một kết nối, trả về số yêu cầu hoàn thành mỗi giây.
+    """
+    client_module.WRITE_BUFFERS = max(client_module.WRITE_BUFFERS, depth)  # Mỗi yêu cầu đang chờ giữ một buffer
+    with harness.working_directory(workdir):
+        os.makedirs(client_module.DOWNLOAD_DIR, exist_ok=True)
+        client = client_module.Client()
+    mirror = client_module.Mirror("127.0.0.1", port)
+    range_socket = client.open_range_socket(mirror, FILENAME, size)
+    buffers = {}
+    offset = 0
+    completed = 0
+    deadline = time.monotonic() + duration
+    started = time.monotonic()
+    while time.monotonic() < deadline:
+        while len(buffers) < depth:
+            request_id = client.request_range(range_socket, FILENAME, offset, range_size)
+            buffers[request_id] = client.buffers.acquire()
+            offset = (offset + range_size) % (size - range_size)
+        request_id = client.receive_data(range_socket, buffers, lambda request_id, nbytes: None)
+        buffer = buffers.pop(request_id)
+        short = len(buffer) != range_size
+        buffer.release()
+        if short:
+            raise ValueError("Short range response")
+        completed += 1
+    elapsed = time.monotonic() - started
+    # Nhận nốt các phản hồi còn lại trước khi đóng kết nối
+    while buffers:
+        buffers.pop(client.receive_data(range_socket, buffers, lambda request_id, nbytes: None)).release()
+    client.close_range_socket(range_socket)
+    client.close()
+    return completed / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--range-size", type=int, default=4096, help="Kích thước mỗi range (byte)")
+    parser.add_argument("--depths", type=int, nargs="+", default=[1, 32], help="Độ sâu pipeline cần đo")
+    parser.add_argument("--duration", type=float, default=5, help="Thời gian đo mỗi cấu hình (giây)")
+    parser.add_argument("--delay", type=float, default=1, help="Độ trễ một chiều của relay (ms)")
+    args = parser.parse_args()
+
+    client_module = harness.load_module(harness.TCP_CLIENT, "tcp_client")
+    size = 16 * 1024 * 1024
+    with tempfile.TemporaryDirectory() as tmp:
+        files_dir = os.path.join(tmp, "server_files")
+        harness.make_file(os.path.join(files_dir, FILENAME), size)
+        process, port = harness.start_tcp_server(os.path.join(tmp, "server"), files_dir)
+        network = relay.TcpRelay(("127.0.0.1", port), args.delay / 1000)
+        relay_port = network.start()
+        try:
+            print(f"{'network':18} {'depth':>5} {'requests/s':>11} {'speedup':>8}")
+            for name, target in [("loopback", port), (f"relay {args.delay:g}ms", relay_port)]:
+                baseline = None
+                for depth in args.depths:
+                    rate = measure(client_module, os.path.join(tmp, "client"), target, size,
+                                   args.range_size, depth, args.duration)
+                    baseline = baseline or rate
+                    print(f"{name:18} {depth:>5} {rate:11.0f} {rate / baseline:7.1f}x")
+        finally:
+            network.stop()
+            harness.stop_process(process)
+
+
+if __name__ == "__main__":
+    main()
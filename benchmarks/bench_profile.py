@@ -0,0 +1,99 @@
+"""
+Chạy workload tải file với --profile: server (TCP và UDP) chạy như tiến trình con với --profile,
+client chạy trong tiến trình này dưới profiler cùng chế độ. In các hàm tốn thời gian nhất của mỗi bên;
+file .pstats (.collapsed với --mode sample) được giữ lại trong --output-dir để xem tiếp (snakeviz, flamegraph.pl, speedscope).
+
+    python benchmarks/bench_profile.py --tcp-size 64 --udp-size 4 --output-dir profiles
+"""
+import argparse
+import os
+import pstats
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import harness
+
+sys.path.append(os.path.join(harness.ROOT, "SOURCE"))
+from common.profiling import create_profiler  # noqa: E402
+
+FILENAME = "dataset.bin"
+DOWNLOAD_DIRS = {"tcp": "DOWNLOAD_DIR", "udp": "DIR_DOWNLOADED"}  # Tên biến thư mục tải về của mỗi client
+
+
+def stop_server(process):
+    """
+    SIGINT để server tắt bình thường và ghi profile.
+    """
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(20)
+    except subprocess.TimeoutExpired:
+        harness.stop_process(process)
+
+
+def download(transport, client_module, port, workdir, repeat):
+    client_module.SERVER_HOST, client_module.SERVER_PORT = "127.0.0.1", port
+    client_module.QUIET = True
+    with harness.working_directory(workdir), harness.quiet_stdout():
+        download_dir = getattr(client_module, DOWNLOAD_DIRS[transport])
+        os.makedirs(download_dir, exist_ok=True)
+        for _ in range(repeat):
+            client = client_module.Client()
+            client.downloaded_files.discard(FILENAME)
+            client.connect_to_server()
+            if not client.download_file(FILENAME):
+                raise RuntimeError("Download failed")
+            client.client_socket.close()
+            client.client_socket = None
+            os.remove(os.path.join(download_dir, FILENAME))
+
+
+def run(transport, files_dir, output_dir, args):
+    size = args.tcp_size if transport == "tcp" else args.udp_size
+    harness.make_file(os.path.join(files_dir, FILENAME), size * 1024 * 1024)
+    server_profile = os.path.abspath(os.path.join(output_dir, f"{transport}_server"))
+    extra = ("--profile", server_profile, "--profile-mode", args.mode)
+    start = harness.start_tcp_server if transport == "tcp" else harness.start_udp_server
+    process, port = start(os.path.join(output_dir, transport, "server"), files_dir, extra_args=extra)
+
+    client_module = harness.load_module(harness.TCP_CLIENT if transport == "tcp" else harness.UDP_CLIENT,
+                                        f"{transport}_client")
+    profiler = create_profiler(args.mode).start()
+    started = time.monotonic()
+    try:
+        download(transport, client_module, port, os.path.join(output_dir, transport, "client"), args.repeat)
+    finally:
+        profiler.stop()
+        stop_server(process)
+    elapsed = time.monotonic() - started
+
+    print(f"=== {transport.upper()}: {args.repeat} x {size}MB in {elapsed:.2f}s ===")
+    print(f"--- client ---\n{profiler.write(os.path.join(output_dir, f'{transport}_client'))}")
+    if os.path.exists(f"{server_profile}.pstats"):
+        print("--- server ---")
+        pstats.Stats(f"{server_profile}.pstats").sort_stats("tottime").print_stats(args.top)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tcp-size", type=int, default=64, help="Kích thước file tải qua TCP (MB)")
+    parser.add_argument("--udp-size", type=int, default=4, help="Kích thước file tải qua UDP (MB)")
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần tải")
+    parser.add_argument("--mode", choices=["cpu", "wall", "sample"], default="cpu", help="Chế độ profile")
+    parser.add_argument("--top", type=int, default=15, help="Số hàm in ra cho server")
+    parser.add_argument("--transports", nargs="+", choices=["tcp", "udp"], default=["tcp", "udp"])
+    parser.add_argument("--output-dir", help="Giữ file profile trong thư mục này (mặc định: thư mục tạm)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output_dir = args.output_dir or tmp
+        os.makedirs(output_dir, exist_ok=True)
+        for transport in args.transports:
+            run(transport, os.path.join(tmp, f"files_{transport}"), output_dir, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark chi phí hiển thị tiến trình: tải một file lớn qua loopback với thanh tiến trình
+được vẽ ra terminal (pty giả) so với chế độ quiet, đo thông lượng và CPU của client.
+
+    python benchmarks/bench_progress.py --size 512 --repeat 3
+"""
+import argparse
+import os
+import resource
+import tempfile
+import threading
+import time
+
+import harness
+
+FILENAME = "dataset.bin"
+
+
+def drain(master_fd):
+    """
+    Đọc hết dữ liệu ghi ra pty như một terminal thật.
+    """
+    while True:
+        try:
+            if not os.read(master_fd, 65536):
+                return
+        except OSError:
+            return
+
+
+def download(client_module, workdir, port, quiet, terminal):
+    client_module.SERVER_HOST, client_module.SERVER_PORT = "127.0.0.1", port
+    client_module.QUIET = quiet
+    with harness.working_directory(workdir):
+        os.makedirs(client_module.DOWNLOAD_DIR, exist_ok=True)
+        with harness.quiet_stdout():
+            client = client_module.Client()
+            client.connect_to_server()
+        with harness.redirect_stdout(terminal):
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            started = time.monotonic()
+            ok = client.download_file(FILENAME)
+            elapsed = time.monotonic() - started
+            after = resource.getrusage(resource.RUSAGE_SELF)
+        client.client_socket.close()
+        os.remove(os.path.join(client_module.DOWNLOAD_DIR, FILENAME))
+    cpu = after.ru_utime + after.ru_stime - usage.ru_utime - usage.ru_stime
+    return ok, elapsed, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=512, help="Kích thước file (MB)")
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần đo mỗi chế độ (lấy tốt nhất)")
+    args = parser.parse_args()
+
+    client_module = harness.load_module(harness.TCP_CLIENT, "tcp_client")
+    size = args.size * 1024 * 1024
+    master_fd, slave_fd = os.openpty()
+    threading.Thread(target=drain, args=(master_fd,), daemon=True).start()
+    terminal = os.fdopen(slave_fd, "w", buffering=1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files_dir = os.path.join(tmp, "server_files")
+        harness.make_file(os.path.join(files_dir, FILENAME), size)
+        process, port = harness.start_tcp_server(os.path.join(tmp, "server"), files_dir)
+        try:
+            print(f"{'mode':10} {'ok':>4} {'time':>8} {'throughput':>12} {'client cpu':>11}")
+            for name, quiet in [("render", False), ("quiet", True)]:
+                runs = [download(client_module, os.path.join(tmp, "client"), port, quiet, terminal)
+                        for _ in range(args.repeat)]
+                ok = all(run[0] for run in runs)
+                _, elapsed, cpu = min(runs, key=lambda run: run[1])
+                print(f"{name:10} {str(ok):>4} {elapsed:7.2f}s {size / elapsed / 1024 / 1024:8.1f}MB/s {cpu:10.2f}s")
+        finally:
+            harness.stop_process(process)
+
+
+if __name__ == "__main__":
+    main()
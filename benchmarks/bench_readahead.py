@@ -0,0 +1,181 @@
+"""
+Benchmark đọc đĩa của server TCP khi client tải một file bằng 4 luồng song song:
+
+1. Đĩa chậm kiểu HDD (giả lập: một đầu đọc, mỗi lần nhảy vị trí tốn thời gian seek, đọc theo
+   tốc độ cố định, có page cache riêng) với cache lạnh: thông lượng khi có và không có read-ahead.
+2. Đĩa thật với cache lạnh (trang của file được bỏ khỏi page cache trước mỗi lần chạy):
+   thông lượng và lượng page cache file còn chiếm sau khi tải, có và không có drop-behind.
+
+    python benchmarks/bench_readahead.py --size 64 --disk-rate 60 --seek 8 --read-ahead 0 8
+"""
+import argparse
+import ctypes
+import logging
+import mmap
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import harness
+
+sys.path.append(os.path.join(harness.ROOT, "SOURCE"))
+from common.storage import ReadAheadStorage, StorageBackend, create_storage  # noqa: E402
+
+FILENAME = "dataset.bin"
+DISK_BLOCK = 64 * 1024  # Đơn vị page cache của đĩa giả lập
+
+
+class SimulatedDisk(StorageBackend):
+    """
+    Đĩa chậm giả lập trên một backend thật: block chưa có trong cache phải chờ đọc từ đĩa
+    (một đầu đọc, đọc không liền vị trí trước thì tốn thêm thời gian seek).
+    """
+    def __init__(self, backend, rate, seek):
+        self.backend = backend
+        self.rate = rate
+        self.seek = seek
+        self.cached = set()
+        self.head = None  # (tên, vị trí) đầu đọc đang đứng
+        self.lock = threading.Lock()
+        self.seeks = 0
+
+    def load(self, name, offset, size):
+        with self.lock:
+            first, last = offset // DISK_BLOCK, (offset + size - 1) // DISK_BLOCK
+            missing = [block for block in range(first, last + 1) if (name, block) not in self.cached]
+            cost = 0.0
+            for block in missing:
+                if self.head != (name, block):
+                    cost += self.seek
+                    self.seeks += 1
+                cost += DISK_BLOCK / self.rate
+                self.head = (name, block + 1)
+                self.cached.add((name, block))
+            if cost:
+                time.sleep(cost)
+
+    def list(self):
+        return self.backend.list()
+
+    def stat(self, name):
+        return self.backend.stat(name)
+
+    def read_range(self, name, offset, size):
+        self.load(name, offset, size)
+        return self.backend.read_range(name, offset, size)
+
+    def prefetch(self, name, offset, size):
+        self.load(name, offset, size)
+
+
+def resident_bytes(path):
+    """
+    Số byte của file đang nằm trong page cache (mincore).
+    """
+    size = os.path.getsize(path)
+    libc = ctypes.CDLL(None, use_errno=True)
+    with open(path, "rb") as file:
+        mapping = mmap.mmap(file.fileno(), size, access=mmap.ACCESS_COPY)
+        pages = (ctypes.c_ubyte * ((size + mmap.PAGESIZE - 1) // mmap.PAGESIZE))()
+        anchor = ctypes.c_ubyte.from_buffer(mapping)
+        try:
+            libc.mincore(ctypes.c_void_p(ctypes.addressof(anchor)), ctypes.c_size_t(size), pages)
+        finally:
+            del anchor
+            mapping.close()
+    return sum(page & 1 for page in pages) * mmap.PAGESIZE
+
+
+def drop_cache(path):
+    with open(path, "rb") as file:
+        os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def download(client_module, port, workdir):
+    """
+    Tải file bằng client TCP trong tiến trình hiện tại, trả về thời gian (None nếu lỗi).
+    """
+    client_module.SERVER_HOST, client_module.SERVER_PORT = "127.0.0.1", port
+    with harness.working_directory(workdir), harness.quiet_stdout():
+        os.makedirs(client_module.DOWNLOAD_DIR, exist_ok=True)
+        client = client_module.Client()
+        client.connect_to_server()
+        started = time.monotonic()
+        ok = client.download_file(FILENAME)
+        elapsed = time.monotonic() - started
+        client.client_socket.close()
+    return elapsed if ok else None
+
+
+def run_simulated(tmp, files_dir, client_module, args, read_ahead):
+    """
+    Server chạy trong tiến trình này với storage là đĩa giả lập (cache lạnh).
+    """
+    workdir = os.path.join(tmp, f"simulated_{read_ahead}")
+    with harness.working_directory(workdir):
+        server_module = harness.load_module(harness.TCP_SERVER, f"tcp_server_{read_ahead}")
+        server_module.SERVER_HOST, server_module.SERVER_PORT = "127.0.0.1", harness.free_port()
+        server_module.SERVER_FILES_DIRECTORY = files_dir
+        server = server_module.Server()
+    logging.disable(logging.INFO)
+    disk = SimulatedDisk(create_storage("local", files_dir), args.disk_rate * 1024 * 1024, args.seek / 1000)
+    server.storage = ReadAheadStorage(disk, read_ahead) if read_ahead else disk
+    thread = threading.Thread(target=server.start, daemon=True)
+    thread.start()
+    harness.wait_for_port(server_module.SERVER_PORT)
+    try:
+        elapsed = download(client_module, server_module.SERVER_PORT, os.path.join(workdir, "client"))
+    finally:
+        server.is_running = False
+        thread.join(5)
+    return elapsed, disk.seeks
+
+
+def run_real(tmp, files_dir, client_module, drop_behind):
+    source = os.path.join(files_dir, FILENAME)
+    drop_cache(source)
+    workdir = os.path.join(tmp, f"real_{drop_behind}")
+    process, port = harness.start_tcp_server(os.path.join(workdir, "server"), files_dir,
+                                             extra_args=("--drop-behind", str(drop_behind)))
+    try:
+        elapsed = download(client_module, port, os.path.join(workdir, "client"))
+    finally:
+        harness.stop_process(process)
+    return elapsed, resident_bytes(source)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=64, help="Kích thước file (MB)")
+    parser.add_argument("--disk-rate", type=float, default=60, help="Tốc độ đọc của đĩa giả lập (MB/s)")
+    parser.add_argument("--seek", type=float, default=8, help="Thời gian seek của đĩa giả lập (ms)")
+    parser.add_argument("--read-ahead", type=int, nargs="+", default=[0, 2, 8, 16],
+                        help="Các cửa sổ read-ahead cần đo (MB), 0 = tắt")
+    args = parser.parse_args()
+    size = args.size * 1024 * 1024
+
+    client_module = harness.load_module(harness.TCP_CLIENT, "tcp_client")
+    with tempfile.TemporaryDirectory() as tmp:
+        files_dir = os.path.join(tmp, "files")
+        harness.make_file(os.path.join(files_dir, FILENAME), size)
+
+        print(f"Simulated disk: {args.disk_rate:.0f}MB/s, {args.seek:.0f}ms seek, cold cache")
+        print(f"{'read-ahead':>10} {'time':>8} {'throughput':>12} {'seeks':>6}")
+        for read_ahead in (window * 1024 * 1024 for window in args.read_ahead):
+            elapsed, seeks = run_simulated(tmp, files_dir, client_module, args, read_ahead)
+            label = f"{read_ahead // 1024 // 1024}MB" if read_ahead else "off"
+            print(f"{label:>10} {elapsed:7.2f}s {size / elapsed / 1024 / 1024:8.1f}MB/s {seeks:6}")
+
+        print("\nReal disk, cold cache")
+        print(f"{'drop-behind':>11} {'time':>8} {'throughput':>12} {'cached after':>13}")
+        for drop_behind in (0, 1):
+            elapsed, cached = run_real(tmp, files_dir, client_module, drop_behind)
+            label = "on" if drop_behind else "off"
+            print(f"{label:>11} {elapsed:7.2f}s {size / elapsed / 1024 / 1024:8.1f}MB/s "
+                  f"{cached / 1024 / 1024:10.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark cấu trúc theo dõi gói đã nhận của client UDP: SequenceWindow (bitmap từ gói thiếu
+đầu tiên) so với tập các tuple (part, seq) trước đây. Đo bộ nhớ đỉnh (tracemalloc) và thời gian
+mỗi gói (thêm + kiểm tra trùng) cho một luồng nhiều gói, có mất gói và đảo thứ tự.
+Tập tuple chỉ chạy tới --set-limit gói rồi ngoại suy tuyến tính.
+
+    python benchmarks/bench_sequence.py --packets 10000000 --loss 0.01
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import harness
+
+sys.path.append(os.path.join(harness.ROOT, "SOURCE"))
+from common.sequence import SequenceWindow  # noqa: E402
+
+
+def arrivals(packets, loss, reorder, seed=0):
+    """
+    Thứ tự gói đến: gói mất được gửi lại sau `reorder` gói, một số gói đến lệch chỗ.
+    """
+    rng = random.Random(seed)
+    pending = []
+    for seq in range(packets):
+        if rng.random() < loss:
+            pending.append((seq + reorder, seq))
+        else:
+            yield seq
+        while pending and pending[0][0] <= seq:
+            yield pending.pop(0)[1]
+    for _, seq in pending:
+        yield seq
+
+
+def run_window(packets, loss, reorder):
+    window = SequenceWindow(packets)
+    started = time.perf_counter()
+    for seq in arrivals(packets, loss, reorder):
+        if seq not in window:
+            window.add(seq)
+    return time.perf_counter() - started, window.complete
+
+
+def run_set(packets, loss, reorder):
+    received = set()
+    started = time.perf_counter()
+    for seq in arrivals(packets, loss, reorder):
+        packet_id = (0, seq)
+        if packet_id not in received:
+            received.add(packet_id)
+    return time.perf_counter() - started, len(received) == packets
+
+
+def measure(function, packets, loss, reorder):
+    """
+    (ns/gói đã trừ chi phí sinh thứ tự gói, bộ nhớ đỉnh, kết quả đúng).
+    """
+    started = time.perf_counter()
+    for _ in arrivals(packets, loss, reorder):
+        pass
+    baseline = time.perf_counter() - started
+    elapsed, ok = function(packets, loss, reorder)
+    # Đo bộ nhớ ở lần chạy riêng vì tracemalloc làm chậm mọi lần cấp phát
+    tracemalloc.start()
+    function(packets, loss, reorder)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return max(0.0, elapsed - baseline) / packets * 1e9, peak, ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--packets", type=int, default=10_000_000, help="Số gói của luồng")
+    parser.add_argument("--set-limit", type=int, default=2_000_000, help="Số gói tối đa chạy với tập tuple")
+    parser.add_argument("--loss", type=float, default=0.01, help="Tỉ lệ gói mất (được gửi lại sau)")
+    parser.add_argument("--reorder", type=int, default=64, help="Gói mất đến muộn chừng này gói")
+    args = parser.parse_args()
+
+    print(f"{args.packets:,} packets, {args.loss * 100:.1f}% loss, retransmits arrive {args.reorder} packets late")
+    print(f"{'structure':16} {'packets':>12} {'ns/packet':>10} {'peak memory':>12} {'ok':>5}")
+    ns, peak, ok = measure(run_window, args.packets, args.loss, args.reorder)
+    print(f"{'SequenceWindow':16} {args.packets:12,} {ns:10.0f} {peak / 1024:10.1f}KB {str(ok):>5}")
+
+    packets = min(args.packets, args.set_limit)
+    ns, peak, ok = measure(run_set, packets, args.loss, args.reorder)
+    scale = args.packets / packets
+    label = f"{peak * scale / 1024 / 1024:10.1f}MB" + (" (extrapolated)" if scale > 1 else "")
+    print(f"{'set of tuples':16} {packets:12,} {ns:10.0f} {label} {str(ok):>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark các backend lưu trữ của server (local, cas, memory):
+độ trễ đọc từng range trực tiếp qua giao diện storage và cùng một bộ tải file qua server TCP.
+
+    python benchmarks/bench_storage.py --size 64
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import harness
+
+sys.path.append(os.path.join(harness.ROOT, "SOURCE"))
+from common.storage import create_storage  # noqa: E402
+
+
+def measure_ranges(storage, name, size, range_size, count, use_read_into):
+    rng = random.Random(0)
+    buffer = bytearray(range_size)
+    samples = []
+    for _ in range(count):
+        offset = rng.randrange(0, max(1, size - range_size))
+        started = time.perf_counter()
+        if use_read_into:
+            storage.read_into(name, offset, buffer)
+        else:
+            storage.read_range(name, offset, range_size)
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return statistics.mean(samples), samples[len(samples) // 2], samples[int(len(samples) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=64, help="Kích thước file (MB)")
+    parser.add_argument("--reads", type=int, default=500, help="Số range đọc cho mỗi phép đo")
+    args = parser.parse_args()
+
+    client_module = harness.load_module(harness.TCP_CLIENT, "tcp_client")
+    filename = "dataset.bin"
+    size = args.size * 1024 * 1024
+    backends = ("local", "cas", "memory")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files_dir = os.path.join(tmp, "server_files")
+        harness.make_file(os.path.join(files_dir, filename), size)
+
+        print(f"{'backend':8} {'range':>6} {'api':>10} {'mean':>9} {'p50':>9} {'p99':>9}")
+        for backend in backends:
+            storage = create_storage(backend, files_dir, os.path.join(tmp, "cas_direct"))
+            for range_size in (64 * 1024, 1024 * 1024):
+                for use_read_into in (False, True):
+                    mean, p50, p99 = measure_ranges(storage, filename, size, range_size, args.reads, use_read_into)
+                    api = "read_into" if use_read_into else "read_range"
+                    print(f"{backend:8} {range_size // 1024:>5}K {api:>10} {mean:8.0f}us {p50:8.0f}us {p99:8.0f}us")
+
+        print(f"\n{'backend':8} {'transfer':>9} {'throughput':>12}")
+        for backend in backends:
+            process, port = harness.start_tcp_server(
+                os.path.join(tmp, f"server_{backend}"), files_dir,
+                extra_args=("--storage", backend, "--cas-root", os.path.join(tmp, "cas_server")))
+            try:
+                client_module.SERVER_HOST, client_module.SERVER_PORT = "127.0.0.1", port
+                with harness.working_directory(os.path.join(tmp, f"client_{backend}")):
+                    os.makedirs(client_module.DOWNLOAD_DIR, exist_ok=True)
+                    with harness.quiet_stdout():
+                        client = client_module.Client()
+                        client.connect_to_server()
+                        started = time.monotonic()
+                        ok = client.download_file(filename)
+                        elapsed = time.monotonic() - started
+                    client.client_socket.close()
+            finally:
+                harness.stop_process(process)
+            status = f"{elapsed:8.2f}s" if ok else "   failed"
+            print(f"{backend:8} {status} {size / elapsed / 1024 / 1024:9.1f}MB/s")
+
+
+if __name__ == "__main__":
+    main()
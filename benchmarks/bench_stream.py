@@ -0,0 +1,113 @@
+"""
+Benchmark tải rồi xử lý một file nén (gunzip) của client TCP, thu nhỏ từ tình huống file 5GB:
+
+- download: tải cả file xuống đĩa (chế độ batch) rồi mới chạy gunzip trên file đã tải;
+- stream: client.py --stdout ghi file theo thứ tự ra pipe trong lúc các range vẫn tải song song, gunzip đọc ngay.
+Đo thời gian đến byte đầu tiên chương trình xử lý nhận được (TTFB), thời gian cả pipeline và bộ nhớ cao nhất
+của client (chế độ stream bị chặn bởi --stream-window). Server bị giới hạn băng thông (--rate) để giả lập mạng.
+
+    python benchmarks/bench_stream.py --size 256 --rate 100 --stream-window 32
+"""
+import argparse
+import base64
+import gzip
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import harness
+
+FILENAME = "dataset.gz"
+RELAY_SIZE = 1024 * 1024
+
+
+def make_gzip(path, size):
+    """
+    File gzip có khoảng `size` byte sau khi giải nén (văn bản base64 ngẫu nhiên, nén được khoảng 75%).
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    rng = random.Random(0)
+    with gzip.open(path, "wb", compresslevel=1) as file:
+        for _ in range(size // (1024 * 1024)):
+            file.write(base64.b64encode(rng.randbytes(768 * 1024)))
+
+
+def run_download(port, workdir, args):
+    started = time.monotonic()
+    client = subprocess.Popen([sys.executable, harness.TCP_CLIENT, "--server", f"127.0.0.1:{port}", "--json",
+                               FILENAME], cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    peak = 0
+    while client.poll() is None:
+        try:
+            peak = max(peak, harness.process_peak_rss(client.pid))
+        except OSError:
+            break
+        time.sleep(0.05)
+    first_byte = time.monotonic() - started
+    subprocess.run(["gunzip", "-c", os.path.join(workdir, "downloads", FILENAME)], stdout=subprocess.DEVNULL,
+                   check=True)
+    return first_byte, time.monotonic() - started, peak
+
+
+def run_stream(port, workdir, args):
+    started = time.monotonic()
+    client = subprocess.Popen([sys.executable, harness.TCP_CLIENT, "--server", f"127.0.0.1:{port}", "--stdout",
+                               "--stream-window", str(args.stream_window * 1024 * 1024), FILENAME],
+                              cwd=workdir, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    gunzip = subprocess.Popen(["gunzip", "-c"], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+    first_byte = None
+    peak = 0
+    try:
+        while True:
+            data = client.stdout.read1(RELAY_SIZE)
+            if not data:
+                break
+            if first_byte is None:
+                first_byte = time.monotonic() - started
+            try:
+                peak = max(peak, harness.process_peak_rss(client.pid))
+            except OSError:
+                pass
+            gunzip.stdin.write(data)
+        gunzip.stdin.close()
+        gunzip.wait()
+    finally:
+        harness.stop_process(client)
+    if client.returncode or gunzip.returncode:
+        raise RuntimeError(f"pipeline failed (client {client.returncode}, gunzip {gunzip.returncode})")
+    return first_byte, time.monotonic() - started, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=256, help="Kích thước dữ liệu sau khi giải nén (MB)")
+    parser.add_argument("--rate", type=float, default=100, help="Băng thông gửi của server (MB/s), 0 = không giới hạn")
+    parser.add_argument("--stream-window", type=int, default=32, help="Cửa sổ tải trước của chế độ stream (MB)")
+    parser.add_argument("--modes", nargs="+", choices=["download", "stream"], default=["download", "stream"])
+    args = parser.parse_args()
+
+    runners = {"download": run_download, "stream": run_stream}
+    with tempfile.TemporaryDirectory() as tmp:
+        files_dir = os.path.join(tmp, "files")
+        make_gzip(os.path.join(files_dir, FILENAME), args.size * 1024 * 1024)
+        compressed = os.path.getsize(os.path.join(files_dir, FILENAME))
+        extra = ["--throttle", str(int(args.rate * 1024 * 1024))] if args.rate else []
+        process, port = harness.start_tcp_server(os.path.join(tmp, "server"), files_dir, extra_args=extra)
+        try:
+            rate = f"{args.rate:g}MB/s" if args.rate else "unlimited"
+            print(f"{compressed / 1024 / 1024:.0f}MB gzip file ({args.size}MB uncompressed), server upload {rate}")
+            print(f"{'mode':9} {'TTFB':>8} {'pipeline':>9} {'client RSS':>11}")
+            for mode in args.modes:
+                workdir = os.path.join(tmp, mode)
+                os.makedirs(workdir)
+                first_byte, total, peak = runners[mode](port, workdir, args)
+                print(f"{mode:9} {first_byte:7.2f}s {total:8.2f}s {peak / 1024 / 1024:9.0f}MB")
+        finally:
+            harness.stop_process(process)
+
+
+if __name__ == "__main__":
+    main()
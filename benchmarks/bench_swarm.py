@@ -0,0 +1,106 @@
+"""
+Benchmark tải swarm của client TCP: --clients tiến trình client (chế độ batch) cùng tải một file từ một server.
+
+- server: mọi client chỉ tải từ server;
+- swarm: client tải cả từ các client khác (--swarm, server làm tracker) và phục vụ lại các piece đã tải.
+Đo số byte server gửi ra (so với kích thước file) và thời gian đến khi client cuối cùng tải xong.
+Băng thông gửi của server có thể giới hạn bằng --server-rate để giống server có đường lên hẹp.
+
+    python benchmarks/bench_swarm.py --clients 20 --size 64 --server-rate 100
+"""
+import argparse
+import filecmp
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import harness
+
+FILENAME = "dataset.bin"
+SEED_TIME = 600  # Client swarm tiếp tục phục vụ đến khi benchmark dừng chúng (giây)
+
+
+def wait_result(process, finished, index):
+    """
+    Ghi lại thời điểm client in xong thống kê JSON (client swarm còn chạy tiếp để seed).
+    """
+    for line in process.stdout:
+        if line.rstrip() == b"]":
+            finished[index] = time.monotonic()
+            return
+
+
+def run(mode, tmp, files_dir, args):
+    workdir = os.path.join(tmp, mode)
+    with harness.working_directory(os.path.join(workdir, "server")):
+        server_module = harness.load_module(harness.TCP_SERVER, f"tcp_server_{mode}")
+        server_module.SERVER_HOST, server_module.SERVER_PORT = "127.0.0.1", harness.free_port()
+        server_module.SERVER_FILES_DIRECTORY = files_dir
+        server_module.THROTTLE_RATE = args.server_rate * 1024 * 1024
+        server = server_module.Server()
+    logging.disable(logging.INFO)
+    thread = threading.Thread(target=server.start, daemon=True)
+    thread.start()
+    harness.wait_for_port(server_module.SERVER_PORT)
+
+    command = [sys.executable, harness.TCP_CLIENT, "--server", f"127.0.0.1:{server_module.SERVER_PORT}", "--json"]
+    if mode == "swarm":
+        command += ["--swarm", "--seed-time", str(SEED_TIME)]
+    clients = []
+    finished = [None] * args.clients
+    readers = []
+    started = time.monotonic()
+    try:
+        for index in range(args.clients):
+            client_dir = os.path.join(workdir, f"client{index}")
+            os.makedirs(client_dir)
+            clients.append(subprocess.Popen(command + [FILENAME], cwd=client_dir,
+                                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL))
+            readers.append(threading.Thread(target=wait_result, args=(clients[-1], finished, index), daemon=True))
+            readers[-1].start()
+            time.sleep(args.stagger / 1000)
+        for reader in readers:
+            reader.join(args.timeout)
+    finally:
+        for client in clients:
+            harness.stop_process(client)
+        server.is_running = False
+        thread.join(5)
+
+    source = os.path.join(files_dir, FILENAME)
+    ok = sum(filecmp.cmp(source, os.path.join(workdir, f"client{index}", "downloads", FILENAME), shallow=False)
+             for index in range(args.clients)
+             if os.path.exists(os.path.join(workdir, f"client{index}", "downloads", FILENAME)))
+    done = [moment - started for moment in finished if moment is not None]
+    egress = server.metrics.values[server.metrics.FIELDS.index("bytes_sent")]
+    size = args.size * 1024 * 1024
+    print(f"{mode:7} {egress / 1024 / 1024:9.1f}MB {egress / size:8.2f}x "
+          f"{sorted(done)[len(done) // 2] if done else 0:8.2f}s {max(done, default=0):8.2f}s {ok:>4}/{args.clients}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=20, help="Số tiến trình client")
+    parser.add_argument("--size", type=int, default=64, help="Kích thước file (MB)")
+    parser.add_argument("--server-rate", type=float, default=100, help="Băng thông gửi của server (MB/s), 0 = không giới hạn")
+    parser.add_argument("--stagger", type=float, default=50, help="Khoảng cách giữa lúc khởi động các client (ms)")
+    parser.add_argument("--timeout", type=float, default=300, help="Thời gian chờ tối đa mỗi client (giây)")
+    parser.add_argument("--modes", nargs="+", choices=["server", "swarm"], default=["server", "swarm"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files_dir = os.path.join(tmp, "files")
+        harness.make_file(os.path.join(files_dir, FILENAME), args.size * 1024 * 1024)
+        rate = f"{args.server_rate:g}MB/s" if args.server_rate else "unlimited"
+        print(f"{args.clients} clients downloading a {args.size}MB file, server upload {rate}")
+        print(f"{'mode':7} {'egress':>11} {'vs file':>9} {'median':>9} {'complete':>9} {'ok':>6}")
+        for mode in args.modes:
+            run(mode, tmp, files_dir, args)
+
+
+if __name__ == "__main__":
+    main()
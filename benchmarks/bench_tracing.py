@@ -0,0 +1,127 @@
+"""
+Benchmark chi phí tracing: thời gian một span khi tắt/bật tracing, và thời gian tải một file qua TCP
+khi tắt tracing (mặc định) so với bật tracing ở cả client và server. Khi bật, trace của client và
+server được xuất ra Chrome trace JSON và kiểm tra span hai phía có chung mã transfer.
+
+    python benchmarks/bench_tracing.py --size 64 --repeat 5 --output trace_client.json
+"""
+import argparse
+import json
+import os
+import signal
+import statistics
+import sys
+import tempfile
+import time
+
+import harness
+
+sys.path.append(os.path.join(harness.ROOT, "SOURCE"))
+from common.tracing import TRACER  # noqa: E402
+
+FILENAME = "dataset.bin"
+
+
+def span_cost(iterations):
+    """
+    ns mỗi span (đã trừ chi phí vòng lặp rỗng) với tracing đang ở trạng thái hiện tại.
+    """
+    started = time.perf_counter_ns()
+    for _ in range(iterations):
+        pass
+    empty = time.perf_counter_ns() - started
+    started = time.perf_counter_ns()
+    for _ in range(iterations):
+        with TRACER.span("disk_read", bytes=1):
+            pass
+    return max(0, time.perf_counter_ns() - started - empty) / iterations
+
+
+def download_times(client_module, port, workdir, repeat):
+    client_module.SERVER_HOST, client_module.SERVER_PORT = "127.0.0.1", port
+    times = []
+    with harness.working_directory(workdir), harness.quiet_stdout():
+        os.makedirs(client_module.DOWNLOAD_DIR, exist_ok=True)
+        for _ in range(repeat):
+            client = client_module.Client()
+            client.downloaded_files.discard(FILENAME)
+            client.connect_to_server()
+            started = time.monotonic()
+            if not client.download_file(FILENAME):
+                raise RuntimeError("Download failed")
+            times.append(time.monotonic() - started)
+            client.client_socket.close()
+            os.remove(os.path.join(client_module.DOWNLOAD_DIR, FILENAME))
+    return times
+
+
+def run(tmp, files_dir, client_module, repeat, traced):
+    """
+    Tải `repeat` lần; trả về (thời gian trung vị, các span phía client, các span phía server).
+    """
+    name = "traced" if traced else "plain"
+    server_trace = os.path.join(tmp, f"{name}_server.json")
+    extra = ("--trace", server_trace) if traced else ()
+    process, port = harness.start_tcp_server(os.path.join(tmp, name, "server"), files_dir, extra_args=extra)
+    TRACER.events.clear()
+    TRACER.enabled = traced
+    try:
+        times = download_times(client_module, port, os.path.join(tmp, name, "client"), repeat)
+    finally:
+        TRACER.enabled = False
+        # SIGINT để server tắt bình thường và ghi file trace
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(15)
+        except Exception:
+            harness.stop_process(process)
+    server_spans = []
+    if traced and os.path.exists(server_trace):
+        with open(server_trace) as trace_file:
+            server_spans = [event for event in json.load(trace_file)["traceEvents"] if event["ph"] == "X"]
+    return statistics.median(times), list(TRACER.events), server_spans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=64, help="Kích thước file (MB)")
+    parser.add_argument("--repeat", type=int, default=5, help="Số lần tải mỗi chế độ")
+    parser.add_argument("--iterations", type=int, default=1_000_000, help="Số span khi đo chi phí một span")
+    parser.add_argument("--output", help="Ghi trace phía client của lần chạy có tracing ra file này")
+    args = parser.parse_args()
+
+    TRACER.enabled = False
+    disabled = span_cost(args.iterations)
+    TRACER.enable("tcp-client")
+    enabled = span_cost(args.iterations)
+    TRACER.enabled = False
+    TRACER.events.clear()
+    print(f"Span cost: {disabled:.0f}ns disabled, {enabled:.0f}ns enabled")
+
+    client_module = harness.load_module(harness.TCP_CLIENT, "tcp_client")
+    client_module.QUIET = True
+    with tempfile.TemporaryDirectory() as tmp:
+        files_dir = os.path.join(tmp, "files")
+        harness.make_file(os.path.join(files_dir, FILENAME), args.size * 1024 * 1024)
+        plain, _, _ = run(tmp, files_dir, client_module, args.repeat, False)
+        traced, client_spans, server_spans = run(tmp, files_dir, client_module, args.repeat, True)
+
+        per_download = len(client_spans) / args.repeat
+        print(f"{'tracing':8} {'median':>8} {'throughput':>12}")
+        for label, elapsed in (("off", plain), ("on", traced)):
+            print(f"{label:8} {elapsed:7.3f}s {args.size / elapsed:8.1f}MB/s")
+        # Khi tắt, mỗi span chỉ tốn chi phí đo ở trên: ước lượng phần trăm thời gian tải
+        print(f"{per_download:.0f} client spans per download; disabled tracing costs "
+              f"~{per_download * disabled / 1e9 / plain * 100:.4f}% of the download time")
+
+        transfers = {event[1] for event in client_spans if event[1]}
+        matched = sum(1 for event in server_spans if int(event["args"].get("transfer", "0"), 16) in transfers)
+        # Span chưa có mã transfer là lời chào (HELLO) gửi trước frame TRACE của mỗi kết nối
+        print(f"Server spans: {len(server_spans)}, {matched} tagged with a client transfer id "
+              f"({len(transfers)} transfers)")
+        if args.output:
+            print(f"Wrote {TRACER.export(args.output)} spans to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark cây thư mục: N file 4KB lồng nhau, client yêu cầu bằng glob trong input.txt.
+So sánh tải theo lô (container PACK) với gọi download_file cho từng file trên một mẫu nhỏ.
+
+    python benchmarks/bench_tree.py --files 100000 --sample 200
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import harness
+
+
+def make_tree(root, count, size, per_directory=100):
+    for index in range(count):
+        directory = os.path.join(root, f"group{index // (per_directory * 10):03d}",
+                                 f"set{index // per_directory % 10}")
+        if index % per_directory == 0:
+            os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"file{index:06d}.dat"), "wb") as out:
+            out.write(index.to_bytes(8, "big") * (size // 8))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=100000, help="Số file trong cây")
+    parser.add_argument("--file-size", type=int, default=4096, help="Kích thước mỗi file (bytes)")
+    parser.add_argument("--sample", type=int, default=200, help="Số file tải theo đường từng file để so sánh")
+    args = parser.parse_args()
+
+    client_module = harness.load_module(harness.TCP_CLIENT, "tcp_client")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files_dir = os.path.join(tmp, "server_files")
+        started = time.monotonic()
+        make_tree(files_dir, args.files, args.file_size)
+        print(f"Created {args.files} files in {time.monotonic() - started:.1f}s")
+
+        process, port = harness.start_tcp_server(os.path.join(tmp, "server"), files_dir)
+        client_module.SERVER_HOST, client_module.SERVER_PORT = "127.0.0.1", port
+        try:
+            results = {}
+            for mode in ("per-file", "batch"):
+                with harness.working_directory(os.path.join(tmp, f"client_{mode}")):
+                    os.makedirs(client_module.DOWNLOAD_DIR, exist_ok=True)
+                    with open(client_module.INPUT_TXT, "w") as input_file:
+                        input_file.write("group*/set*/*.dat\n")
+                    with harness.quiet_stdout():
+                        client = client_module.Client()
+                        client.connect_to_server()
+                        filenames = client.monitor_input()
+                        started = time.monotonic()
+                        if mode == "batch":
+                            for batch in client.make_batches(filenames):
+                                client.download_pack(batch)
+                        else:
+                            filenames = filenames[:args.sample]
+                            for filename in filenames:
+                                client.download_file(filename)
+                        elapsed = time.monotonic() - started
+                    client.client_socket.close()
+                    downloaded = len(client_module.scan_downloaded_files(client.download_dir))
+                results[mode] = (downloaded, elapsed)
+        finally:
+            harness.stop_process(process)
+
+    print(f"{'mode':10} {'files':>8} {'time':>9} {'files/s':>10} {'MB/s':>8}")
+    for mode, (count, elapsed) in results.items():
+        print(f"{mode:10} {count:>8} {elapsed:8.2f}s {count / elapsed:10.0f} "
+              f"{count * args.file_size / elapsed / 1024 / 1024:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
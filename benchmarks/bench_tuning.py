@@ -0,0 +1,94 @@
+"""
+Benchmark điều chỉnh buffer socket theo BDP: tải một file qua relay giả lập đường truyền có RTT --rtt,
+trên đó dữ liệu đang truyền bị giới hạn bởi cửa sổ nhận client quảng bá (relay.TcpRelay với window=True).
+
+- off: buffer mặc định của kernel (tự tăng dần theo cơ chế autotuning);
+- auto: client đặt buffer nhận theo RTT đo lúc kết nối x thông lượng đo được, server điều chỉnh buffer gửi;
+- fixed: buffer cố định --buffer byte (--socket-buffer) ở cả hai phía.
+Mỗi chế độ tải --repeat lần với cùng một client: từ lần thứ hai client đã biết thông lượng của server.
+
+    python benchmarks/bench_tuning.py --size 32 --rtt 100 --repeat 2 --connections 4
+"""
+import argparse
+import filecmp
+import os
+import tempfile
+import time
+
+import harness
+import relay
+
+FILENAME = "dataset.bin"
+SERVER_ARGS = {"off": ("--socket-tuning", "off"), "auto": ("--socket-tuning", "auto")}
+
+
+def download(client_module, workdir, source, repeat):
+    """
+    Tải file `repeat` lần với cùng một client, trả về thời gian mỗi lần và ước lượng (RTT, thông lượng) của client.
+    """
+    times = []
+    with harness.working_directory(workdir), harness.quiet_stdout():
+        os.makedirs(client_module.DOWNLOAD_DIR, exist_ok=True)
+        client = client_module.Client()
+        client.connect_to_server()
+        for _ in range(repeat):
+            started = time.monotonic()
+            if not client.download_file(FILENAME):
+                raise RuntimeError("Download failed")
+            times.append(time.monotonic() - started)
+            path = os.path.join(client_module.DOWNLOAD_DIR, FILENAME)
+            if not filecmp.cmp(source, path, shallow=False):
+                raise RuntimeError("Downloaded file differs from the source")
+            os.remove(path)
+            client.downloaded_files.discard(FILENAME)
+        client.client_socket.close()
+    endpoint = (client_module.SERVER_HOST, client_module.SERVER_PORT)
+    return times, client.tuner.links.get(endpoint, (None, None))
+
+
+def run(mode, tmp, files_dir, args):
+    extra = SERVER_ARGS.get(mode, ("--socket-buffer", str(args.buffer)))
+    process, port = harness.start_tcp_server(os.path.join(tmp, mode, "server"), files_dir, extra_args=extra)
+    network = relay.TcpRelay(("127.0.0.1", port), args.rtt / 2000, window=True)
+    try:
+        client_module = harness.load_module(harness.TCP_CLIENT, f"tcp_client_{mode}")
+        client_module.SERVER_HOST, client_module.SERVER_PORT = "127.0.0.1", network.start()
+        client_module.QUIET = True
+        client_module.CONNECTIONS_PER_MIRROR = args.connections
+        client_module.SOCKET_TUNING = "off" if mode == "off" else "auto"
+        client_module.SOCKET_BUFFER = args.buffer if mode == "fixed" else None
+        times, (rtt, rate) = download(client_module, os.path.join(tmp, mode, "client"),
+                                      os.path.join(files_dir, FILENAME), args.repeat)
+    finally:
+        network.stop()
+        harness.stop_process(process)
+
+    size = args.size * 1024 * 1024
+    runs = " ".join(f"{size / elapsed / 1024 / 1024:8.1f}MB/s" for elapsed in times)
+    estimate = f"rtt {rtt * 1000:.0f}ms" if rtt else "-"
+    if rate:
+        estimate += f", {rate / 1024 / 1024:.1f}MB/s per connection"
+    print(f"{mode:6} {runs}   {estimate}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=32, help="Kích thước file (MB)")
+    parser.add_argument("--rtt", type=float, default=100, help="RTT của đường truyền giả lập (ms)")
+    parser.add_argument("--repeat", type=int, default=2, help="Số lần tải với cùng một client")
+    parser.add_argument("--connections", type=int, default=4, help="Số kết nối song song của client")
+    parser.add_argument("--buffer", type=int, default=4 * 1024 * 1024, help="Buffer của chế độ fixed (byte)")
+    parser.add_argument("--modes", nargs="+", choices=["off", "auto", "fixed"], default=["off", "auto", "fixed"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files_dir = os.path.join(tmp, "server_files")
+        harness.make_file(os.path.join(files_dir, FILENAME), args.size * 1024 * 1024)
+        print(f"{args.size}MB over a {args.rtt:g}ms RTT link limited by the receive window, {args.connections} "
+              f"connections, throughput of each of {args.repeat} downloads")
+        for mode in args.modes:
+            run(mode, tmp, files_dir, args)
+
+
+if __name__ == "__main__":
+    main()
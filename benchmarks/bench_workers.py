@@ -0,0 +1,133 @@
+"""
+Benchmark server TCP nhiều tiến trình (pre-fork, SO_REUSEPORT): nhiều tiến trình client
+liên tục tải range 1MB của một file qua loopback, đo thông lượng tổng với 1, 2, 4, 8 worker
+trên từng backend lưu trữ. Kèm theo số lần worker bị khởi động lại (vd: các worker cùng nạp kho cas)
+và bộ nhớ thực của supervisor + worker (PSS: trang dùng chung qua fork chỉ tính một lần).
+
+    python benchmarks/bench_workers.py --workers 1 2 4 8 --clients 16 --duration 10 --storage memory cas
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import tempfile
+import time
+
+import harness
+
+FILENAME = "dataset.bin"
+RANGE = 1024 * 1024
+
+
+def client_load(port, size, duration, workdir, results):
+    """
+    Một tiến trình client: giữ một kết nối và tải liên tục các range cho đến hết thời gian đo.
+    """
+    client_module = harness.load_module(harness.TCP_CLIENT, "tcp_client")
+    client_module.SERVER_HOST, client_module.SERVER_PORT = "127.0.0.1", port
+    with harness.working_directory(workdir):
+        os.makedirs(client_module.DOWNLOAD_DIR, exist_ok=True)
+        client = client_module.Client()
+    mirror = client_module.Mirror("127.0.0.1", port)
+    range_socket = client.open_range_socket(mirror, FILENAME, size)
+    received = 0
+    offset = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        buffer = client.buffers.acquire()
+        try:
+            client.receive_range(range_socket, FILENAME, offset, RANGE, buffer, lambda n: None)
+            received += len(buffer)
+        finally:
+            buffer.release()
+        offset = (offset + RANGE) % (size - RANGE)
+    client.close_range_socket(range_socket)
+    client.close()
+    results.put(received)
+
+
+def server_memory(pid):
+    """
+    Tổng PSS (byte) của tiến trình `pid` và các tiến trình con trực tiếp (Linux).
+    """
+    total = 0
+    with open(f"/proc/{pid}/task/{pid}/children") as children:
+        pids = [pid] + [int(child) for child in children.read().split()]
+    for child in pids:
+        try:
+            with open(f"/proc/{child}/smaps_rollup") as rollup:
+                for line in rollup:
+                    if line.startswith("Pss:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except FileNotFoundError:
+            pass
+    return total
+
+
+def count_restarts(workdir):
+    """
+    Số lần supervisor phải khởi động lại worker, đếm trong file log của server.
+    """
+    restarts = 0
+    for log_path in glob.glob(os.path.join(workdir, "logs", "*.log")):
+        with open(log_path) as log_file:
+            restarts += sum("restarting" in line for line in log_file)
+    return restarts
+
+
+def run(storage, workers, size, tmp, files_dir, baseline, args):
+    """
+    Đo một cấu hình (backend, số worker); trả về thông lượng cơ sở để tính speedup.
+    """
+    workdir = os.path.join(tmp, f"server_{storage}_{workers}")
+    process, port = harness.start_tcp_server(workdir, files_dir,
+                                             extra_args=("--workers", str(workers), "--storage", storage))
+    # Chờ các worker khởi động xong
+    time.sleep(1 + workers * 0.2)
+    try:
+        results = multiprocessing.Queue()
+        clients = [multiprocessing.Process(target=client_load,
+                                           args=(port, size, args.duration,
+                                                 os.path.join(tmp, f"client_{storage}_{workers}_{index}"), results))
+                   for index in range(args.clients)]
+        for client in clients:
+            client.start()
+        total = sum(results.get() for _ in clients)
+        for client in clients:
+            client.join()
+        memory = server_memory(process.pid)
+    finally:
+        harness.stop_process(process, timeout=15)
+
+    throughput = total / args.duration
+    baseline = baseline or throughput
+    print(f"{storage:>7} {workers:>7} {throughput / 1024 / 1024:9.1f}MB/s {throughput / baseline:7.2f}x "
+          f"{count_restarts(workdir):>8} {memory / 1024 / 1024:6.0f}MB")
+    return baseline
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="Số worker cần đo")
+    parser.add_argument("--clients", type=int, default=16, help="Số tiến trình client đồng thời")
+    parser.add_argument("--duration", type=float, default=10, help="Thời gian đo mỗi cấu hình (giây)")
+    parser.add_argument("--size", type=int, default=64, help="Kích thước file (MB)")
+    parser.add_argument("--storage", nargs="+", choices=["local", "cas", "memory"], default=["memory", "cas"],
+                        help="Các backend lưu trữ cần đo")
+    args = parser.parse_args()
+
+    size = args.size * 1024 * 1024
+    print(f"CPU cores: {os.cpu_count()}")
+    print(f"{'storage':>7} {'workers':>7} {'throughput':>12} {'speedup':>8} {'restarts':>8} {'memory':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        files_dir = os.path.join(tmp, "server_files")
+        harness.make_file(os.path.join(files_dir, FILENAME), size)
+        for storage in args.storage:
+            baseline = None
+            for workers in args.workers:
+                baseline = run(storage, workers, size, tmp, files_dir, baseline, args)
+
+
+if __name__ == "__main__":
+    main()
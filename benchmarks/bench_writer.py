@@ -0,0 +1,144 @@
+"""
+Benchmark luồng ghi tách khỏi luồng nhận (--writer-threads) của client TCP và UDP trên một đĩa chậm giả lập.
+
+Mọi lần ghi part file của client đi qua SlowDisk: một thiết bị (ghi tuần tự), mỗi lần ghi tốn --latency ms cộng
+thời gian theo --disk-rate, và cứ sau --stall-every MB thì khựng --stall ms (writeback/fsync). Với
+--writer-threads 0 luồng nhận đứng chờ đĩa (TCP: mạng và đĩa chạy nối tiếp; UDP: buffer socket đầy, gói bị bỏ và
+phải gửi lại); với luồng ghi, nhận và ghi chồng lên nhau, đĩa khựng chỉ làm hàng đợi đầy dần.
+Buffer nhận của socket (--socket-buffer) cũng hứng được một đoạn khựng ngắn, nên được cố định nhỏ như trên
+đường truyền thật (trên loopback kernel tự nới tới vài MB). Đo thông lượng, số lần gửi lại và bộ nhớ tăng thêm
+của tiến trình trong lúc tải.
+
+    python benchmarks/bench_writer.py --size 64 --rate 40 --disk-rate 200 --stall 500 --stall-every 24
+"""
+import argparse
+import filecmp
+import os
+import tempfile
+import threading
+import time
+
+import harness
+
+FILENAME = "dataset.bin"
+
+
+class SlowDisk:
+    """
+    Một thiết bị ghi chậm dùng chung cho mọi luồng: các lần ghi xếp hàng qua một khóa.
+    """
+    def __init__(self, rate, latency, stall, stall_every):
+        self.rate = rate
+        self.latency = latency
+        self.stall = stall
+        self.stall_every = stall_every
+        self.written = 0
+        self.next_stall = stall_every
+        self.lock = threading.Lock()
+
+    def wait(self, size):
+        with self.lock:
+            delay = self.latency + size / self.rate
+            self.written += size
+            if self.stall_every and self.written >= self.next_stall:
+                self.next_stall += self.stall_every
+                delay += self.stall
+            time.sleep(delay)
+
+
+class MemorySampler:
+    """
+    RSS cao nhất của tiến trình benchmark trong lúc tải, so với lúc bắt đầu.
+    """
+    def __init__(self):
+        self.baseline = harness.process_rss(os.getpid())
+        self.peak = self.baseline
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            self.peak = max(self.peak, harness.process_rss(os.getpid()))
+            time.sleep(0.02)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        return self.peak - self.baseline
+
+
+def slow_down(client_module, method, disk):
+    """
+    Cho phương thức ghi part file của client (`method`) chờ SlowDisk trước khi ghi thật.
+    """
+    original = getattr(client_module.Client, method)
+
+    def write(self, part, offset, data):
+        disk.wait(len(data))
+        return original(self, part, offset, data)
+
+    setattr(client_module.Client, method, write)
+
+
+def run(protocol, threads, port, tmp, files_dir, args):
+    workdir = os.path.join(tmp, f"{protocol}_{threads}")
+    path = harness.TCP_CLIENT if protocol == "tcp" else harness.UDP_CLIENT
+    with harness.working_directory(workdir), harness.quiet_stdout():
+        client_module = harness.load_module(path, f"{protocol}_client_{threads}")
+        client_module.QUIET = True
+        client_module.WRITER_THREADS = threads
+        if protocol == "tcp":
+            client_module.SOCKET_BUFFER = args.socket_buffer * 1024 or None
+        else:
+            client_module.RECEIVE_BUFFER_SIZE = args.socket_buffer * 1024 or client_module.RECEIVE_BUFFER_SIZE
+        slow_down(client_module, "write_part" if protocol == "tcp" else "write_packet",
+                  SlowDisk(args.disk_rate * 1024 * 1024, args.latency / 1000, args.stall / 1000,
+                           args.stall_every * 1024 * 1024))
+        sampler = MemorySampler()
+        started = time.monotonic()
+        stats = client_module.download_files([FILENAME], ("127.0.0.1", port))
+        elapsed = time.monotonic() - started
+        memory = sampler.stop()
+        downloaded = os.path.join(workdir, "downloads", FILENAME)
+    ok = stats[0]["ok"] and filecmp.cmp(os.path.join(files_dir, FILENAME), downloaded, shallow=False)
+    print(f"{protocol:4} {threads:>8} {args.size / elapsed:9.1f}MB/s {elapsed:8.2f}s {stats[0]['retries']:>8} "
+          f"{memory / 1024 / 1024:8.0f}MB {'yes' if ok else 'NO':>4}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=64, help="Kích thước file (MB)")
+    parser.add_argument("--rate", type=float, default=40, help="Băng thông gửi của server TCP (MB/s), 0 = không giới hạn")
+    parser.add_argument("--disk-rate", type=float, default=200, help="Tốc độ ghi của đĩa giả lập (MB/s)")
+    parser.add_argument("--latency", type=float, default=0.05, help="Thời gian cố định mỗi lần ghi (ms)")
+    parser.add_argument("--stall", type=float, default=500, help="Thời gian đĩa khựng (ms)")
+    parser.add_argument("--stall-every", type=int, default=24, help="Đĩa khựng sau mỗi chừng này MB, 0 = không khựng")
+    parser.add_argument("--socket-buffer", type=int, default=256,
+                        help="SO_RCVBUF mỗi socket nhận của client (KB), 0 = mặc định của client")
+    parser.add_argument("--threads", type=int, nargs="+", default=[0, 4], help="Các giá trị --writer-threads cần đo")
+    parser.add_argument("--protocols", nargs="+", choices=["tcp", "udp"], default=["tcp", "udp"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files_dir = os.path.join(tmp, "files")
+        harness.make_file(os.path.join(files_dir, FILENAME), args.size * 1024 * 1024)
+        rate = f"{args.rate:g}MB/s" if args.rate else "unlimited"
+        print(f"{args.size}MB file, TCP server upload {rate}, disk {args.disk_rate:g}MB/s "
+              f"with a {args.stall:g}ms stall every {args.stall_every}MB")
+        print(f"{'':4} {'writers':>8} {'throughput':>13} {'time':>9} {'retries':>8} {'memory':>10} {'ok':>4}")
+        for protocol in args.protocols:
+            if protocol == "tcp":
+                extra = ["--throttle", str(int(args.rate * 1024 * 1024))] if args.rate else []
+                process, port = harness.start_tcp_server(os.path.join(tmp, "tcp_server"), files_dir, extra_args=extra)
+            else:
+                process, port = harness.start_udp_server(os.path.join(tmp, "udp_server"), files_dir)
+            try:
+                for threads in args.threads:
+                    run(protocol, threads, port, tmp, files_dir, args)
+            finally:
+                harness.stop_process(process)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Tiện ích dùng chung cho các benchmark: khởi động server trên cổng trống,
+nạp module client và tạo dữ liệu thử.
+"""
+import contextlib
+import importlib.util
+import os
+import socket
+import struct
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TCP_SERVER = os.path.join(ROOT, "SOURCE", "TCP", "Server", "server.py")
+TCP_CLIENT = os.path.join(ROOT, "SOURCE", "TCP", "Client", "client.py")
+UDP_SERVER = os.path.join(ROOT, "SOURCE", "UDP", "Server", "server.py")
+UDP_CLIENT = os.path.join(ROOT, "SOURCE", "UDP", "Client", "client.py")
+
+
+def free_port(kind=socket.SOCK_STREAM):
+    """
+    Lấy một cổng trống trên loopback.
+    """
+    with socket.socket(socket.AF_INET, kind) as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def make_file(path, size, seed=0):
+    """
+    Tạo file dữ liệu giả ngẫu nhiên (lặp lại được theo seed).
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    block = bytes((seed + i * 131) % 251 for i in range(1024 * 1024))
+    with open(path, "wb") as out:
+        remaining = size
+        while remaining > 0:
+            out.write(block[:min(remaining, len(block))])
+            remaining -= len(block)
+
+
+def wait_for_port(port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with contextlib.suppress(OSError):
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5) as probe:
+                # Đọc hết lời chào (danh sách file) để server không ghi log lỗi
+                probe.settimeout(0.5)
+                with contextlib.suppress(OSError):
+                    probe.recv(1 << 20)
+            return
+        time.sleep(0.1)
+    raise TimeoutError(f"Server on port {port} did not start")
+
+
+def start_tcp_server(workdir, files_dir, port=None, extra_args=()):
+    """
+    Chạy server TCP như một tiến trình con, trả về (process, port).
+    """
+    port = port or free_port()
+    os.makedirs(workdir, exist_ok=True)
+    process = subprocess.Popen(
+        [sys.executable, TCP_SERVER, "--host", "127.0.0.1", "--port", str(port),
+         "--directory", os.path.abspath(files_dir), *extra_args],
+        cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(port)
+    except TimeoutError:
+        process.kill()
+        raise
+    return process, port
+
+
+def start_udp_server(workdir, files_dir, port=None, extra_args=()):
+    """
+    Chạy server UDP như một tiến trình con, trả về (process, port).
+    """
+    port = port or free_port(socket.SOCK_DGRAM)
+    os.makedirs(workdir, exist_ok=True)
+    process = subprocess.Popen(
+        [sys.executable, UDP_SERVER, "--host", "127.0.0.1", "--port", str(port),
+         "--directory", os.path.abspath(files_dir), *extra_args],
+        cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    # UDP không có bắt tay: hỏi danh sách file cho đến khi server trả lời
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+            probe.settimeout(0.5)
+            with contextlib.suppress(OSError):
+                probe.sendto(struct.pack("!I", 13), ("127.0.0.1", port))
+                probe.sendto(b"GET_FILE_LIST", ("127.0.0.1", port))
+                length = struct.unpack("!I", probe.recv(4))[0]
+                probe.recv(length)
+                return process, port
+        time.sleep(0.1)
+    process.kill()
+    raise TimeoutError(f"Server on port {port} did not start")
+
+
+def stop_process(process, timeout=5.0):
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def load_module(path, name):
+    """
+    Nạp một script (client/server) như module với tên riêng để tránh trùng tên.
+    """
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@contextlib.contextmanager
+def working_directory(path):
+    os.makedirs(path, exist_ok=True)
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield path
+    finally:
+        os.chdir(previous)
+
+
+@contextlib.contextmanager
+def quiet_stdout():
+    """
+    Ẩn thanh tiến trình của client trong lúc đo.
+    """
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+@contextlib.contextmanager
+def redirect_stdout(stream):
+    """
+    Chuyển output của client sang `stream` (vd: một pty giả lập terminal).
+    """
+    with contextlib.redirect_stdout(stream):
+        yield
+
+
+def process_cpu_time(pid):
+    """
+    Thời gian CPU (user + system, giây) của một tiến trình, đọc từ /proc (Linux).
+    """
+    with open(f"/proc/{pid}/stat") as stat:
+        fields = stat.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def process_peak_rss(pid):
+    """
+    Bộ nhớ thường trú cao nhất (VmHWM, byte) của một tiến trình, đọc từ /proc (Linux).
+    """
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def process_rss(pid):
+    """
+    Bộ nhớ thường trú hiện tại (VmRSS, byte) của một tiến trình.
+    """
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def process_threads(pid):
+    """
+    Số luồng hiện tại của một tiến trình.
+    """
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("Threads:"):
+                return int(line.split()[1])
+    return 0
@@ -0,0 +1,234 @@
+"""
+Relay cục bộ giả lập mạng xấu giữa client và server: thêm độ trễ một chiều
+cho TCP và UDP, làm mất gói ngẫu nhiên cho UDP.
+
+TCP không thể làm mất gói ở tầng ứng dụng (kernel tự truyền lại), nên với TCP
+chỉ giả lập độ trễ. Relay đọc hết dữ liệu server gửi nên bình thường cửa sổ TCP không giới hạn
+thông lượng; với `window=True` relay chỉ giữ trên "đường truyền" lượng dữ liệu bằng cửa sổ nhận client
+đang quảng bá (tcpi_snd_wnd), mỗi byte chiếm cửa sổ trong một RTT (2 x delay), như một đường truyền thật. Với UDP, tỉ lệ mất gói chỉ áp dụng cho gói dữ liệu/ACK của
+các chunk; yêu cầu danh sách file và GET_CHUNK được giữ nguyên vì client UDP
+không có cơ chế thử lại cho chúng.
+"""
+import collections
+import heapq
+import itertools
+import random
+import selectors
+import socket
+import struct
+import threading
+import time
+
+RELAY_BUFFER = 65536
+TCP_INFO_SND_WND = 228  # Vị trí tcpi_snd_wnd (cửa sổ bên kia quảng bá) trong struct tcp_info
+
+
+class TcpRelay:
+    """
+    Proxy TCP: mỗi kết nối đến được nối với một kết nối tới server, dữ liệu
+    mỗi chiều được giữ lại `delay` giây trước khi chuyển tiếp. `window` giới hạn dữ liệu
+    server -> client đang trên đường theo cửa sổ nhận của client.
+    """
+    def __init__(self, upstream, delay=0.0, window=False):
+        self.upstream = upstream
+        self.delay = delay
+        self.window = window
+        self.listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listen_socket.bind(("127.0.0.1", 0))
+        self.listen_socket.listen(128)
+        self.port = self.listen_socket.getsockname()[1]
+        self.is_running = True
+        self.sockets = []
+        self.transferred = 0  # Tổng byte đã chuyển tiếp (cả hai chiều)
+        self.counter_lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+        return self.port
+
+    def stop(self):
+        self.is_running = False
+        for sock in [self.listen_socket, *self.sockets]:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def accept_loop(self):
+        while self.is_running:
+            try:
+                downstream, _ = self.listen_socket.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.connect, args=(downstream,), daemon=True).start()
+
+    def connect(self, downstream):
+        """
+        Nối kết nối đến với server sau `delay` giây, như gói SYN đi hết một chiều đường truyền.
+        """
+        time.sleep(self.delay)
+        try:
+            upstream = socket.create_connection(self.upstream)
+        except OSError:
+            downstream.close()
+            return
+        self.sockets += [downstream, upstream]
+        if self.window:
+            # Dữ liệu không nằm chờ trong buffer gửi của relay: cửa sổ client quyết định lượng đang trên đường
+            downstream.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, RELAY_BUFFER)
+        self.pipe(downstream, upstream)
+        self.pipe(upstream, downstream, self.window)
+
+    def pipe(self, source, target, window=False):
+        """
+        Một chiều truyền: luồng đọc đưa dữ liệu vào hàng đợi kèm thời điểm đến hạn,
+        luồng ghi chờ đến hạn rồi mới gửi. Với `window`, luồng đọc chỉ đọc thêm khi
+        dữ liệu chưa được "ACK" (đọc trong 2 x delay gần nhất) còn nhỏ hơn cửa sổ của `target`.
+        """
+        pending = collections.deque()
+        ready = threading.Condition()
+        unacked = collections.deque()  # (thời điểm được ACK, số byte)
+        in_flight = 0
+
+        def room():
+            nonlocal in_flight
+            while True:
+                now = time.monotonic()
+                while unacked and unacked[0][0] <= now:
+                    in_flight -= unacked.popleft()[1]
+                try:
+                    info = target.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, TCP_INFO_SND_WND + 4)
+                except OSError:
+                    return RELAY_BUFFER
+                available = struct.unpack_from("=I", info, TCP_INFO_SND_WND)[0] - in_flight
+                if available > 0:
+                    return min(RELAY_BUFFER, available)
+                time.sleep(0.001)
+
+        def reader():
+            nonlocal in_flight
+            while True:
+                try:
+                    data = source.recv(room() if window else RELAY_BUFFER)
+                except OSError:
+                    data = b""
+                if window and data:
+                    unacked.append((time.monotonic() + 2 * self.delay, len(data)))
+                    in_flight += len(data)
+                with ready:
+                    pending.append((time.monotonic() + self.delay, data))
+                    ready.notify()
+                if not data:
+                    return
+
+        def writer():
+            while True:
+                with ready:
+                    while not pending:
+                        ready.wait()
+                    due, data = pending.popleft()
+                wait = due - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                try:
+                    if not data:
+                        target.shutdown(socket.SHUT_WR)
+                        return
+                    target.sendall(data)
+                except OSError:
+                    return
+                with self.counter_lock:
+                    self.transferred += len(data)
+
+        threading.Thread(target=reader, daemon=True).start()
+        threading.Thread(target=writer, daemon=True).start()
+
+
+class UdpRelay:
+    """
+    Relay UDP kiểu NAT: mỗi client có một socket riêng phía server; mỗi socket chunk
+    mà server mở (cổng tạm) được ánh xạ sang một socket riêng phía client để ACK/NAK
+    của client quay về đúng socket chunk đó.
+    """
+    def __init__(self, upstream, delay=0.0, loss=0.0, seed=0):
+        self.upstream = upstream
+        self.delay = delay
+        self.loss = loss
+        self.random = random.Random(seed)
+        self.listen_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.listen_socket.bind(("127.0.0.1", 0))
+        self.port = self.listen_socket.getsockname()[1]
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.listen_socket, selectors.EVENT_READ, ("listen", None))
+        self.client_sockets = {}  # Địa chỉ client -> socket phía server
+        self.chunk_sockets = {}  # (địa chỉ client, địa chỉ chunk server) -> socket phía client
+        self.queue = []  # Heap các gói chờ gửi (đến hạn, thứ tự, socket, dữ liệu, đích)
+        self.order = itertools.count()
+        self.dropped = 0
+        self.is_running = True
+
+    def start(self):
+        threading.Thread(target=self.loop, daemon=True).start()
+        return self.port
+
+    def stop(self):
+        self.is_running = False
+
+    def forward(self, sock, data, address, lossy):
+        if lossy and self.random.random() < self.loss:
+            self.dropped += 1
+            return
+        heapq.heappush(self.queue, (time.monotonic() + self.delay, next(self.order), sock, data, address))
+
+    def client_socket(self, client_addr):
+        sock = self.client_sockets.get(client_addr)
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind(("127.0.0.1", 0))
+            self.selector.register(sock, selectors.EVENT_READ, ("upstream", client_addr))
+            self.client_sockets[client_addr] = sock
+        return sock
+
+    def chunk_socket(self, client_addr, chunk_addr):
+        key = (client_addr, chunk_addr)
+        sock = self.chunk_sockets.get(key)
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind(("127.0.0.1", 0))
+            self.selector.register(sock, selectors.EVENT_READ, ("chunk", key))
+            self.chunk_sockets[key] = sock
+        return sock
+
+    def loop(self):
+        while self.is_running:
+            timeout = 0.1
+            if self.queue:
+                timeout = max(0.0, min(timeout, self.queue[0][0] - time.monotonic()))
+            for key, _ in self.selector.select(timeout):
+                kind, context = key.data
+                try:
+                    data, source = key.fileobj.recvfrom(RELAY_BUFFER)
+                except OSError:
+                    continue
+                if kind == "listen":
+                    self.forward(self.client_socket(source), data, self.upstream, lossy=False)
+                elif kind == "upstream":
+                    if source == self.upstream:
+                        self.forward(self.listen_socket, data, context, lossy=False)
+                    else:
+                        self.forward(self.chunk_socket(context, source), data, context, lossy=True)
+                else:
+                    client_addr, chunk_addr = context
+                    self.forward(self.client_sockets[client_addr], data, chunk_addr, lossy=True)
+
+            now = time.monotonic()
+            while self.queue and self.queue[0][0] <= now:
+                _, _, sock, data, address = heapq.heappop(self.queue)
+                try:
+                    sock.sendto(data, address)
+                except OSError:
+                    pass
+
+        for key in list(self.selector.get_map().values()):
+            key.fileobj.close()
+        self.selector.close()
@@ -0,0 +1,287 @@
+"""
+Bộ benchmark/hồi quy đầu-cuối cho cả hai giao thức: chạy server TCP và UDP trên cổng
+tạm, điều khiển client không tương tác (mỗi client một tiến trình), đo thông lượng,
+độ trễ, CPU và RSS theo kích thước file, số client đồng thời và điều kiện mạng
+(giả lập qua relay cục bộ). Kết quả ghi ra JSON và có thể so với một baseline đã lưu.
+
+    python benchmarks/run.py --quick --output results.json
+    python benchmarks/run.py --save-baseline baseline.json
+    python benchmarks/run.py --baseline baseline.json --threshold 15
+
+Thoát với mã 1 nếu có kịch bản thất bại hoặc hồi quy vượt ngưỡng.
+"""
+import argparse
+import filecmp
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import tempfile
+import time
+
+import harness
+import relay
+
+FILENAME = "dataset.bin"
+CLIENT_TIMEOUT = 120  # Thời gian tối đa cho một kịch bản (giây)
+
+# Điều kiện mạng: độ trễ một chiều (giây) và tỉ lệ mất gói (chỉ UDP)
+PROFILES = {
+    "loopback": {"delay": 0.0, "loss": 0.0},
+    "wan": {"delay": 0.005, "loss": 0.0},
+    "lossy": {"delay": 0.002, "loss": 0.01},
+}
+
+# Chỉ số so với baseline: (hướng tốt hơn, chênh lệch tuyệt đối nhỏ nhất mới tính là hồi quy)
+METRICS = {
+    "throughput_mbps": ("higher", 0.5),
+    "duration_p95_s": ("lower", 0.05),
+    "connect_ms_p50": ("lower", 1.0),
+    "server_cpu_s": ("lower", 0.05),
+    "client_cpu_s": ("lower", 0.05),
+    "server_rss_mb": ("lower", 2.0),
+    "client_rss_mb": ("lower", 2.0),
+}
+
+
+def client_run(transport, port, source, workdir, barrier, results, timeout):
+    """
+    Một client trong tiến trình riêng: lấy danh sách file, chờ các client khác,
+    tải file rồi báo kết quả cùng CPU/RSS của chính tiến trình.
+    """
+    path = harness.TCP_CLIENT if transport == "tcp" else harness.UDP_CLIENT
+    report = {"ok": False, "elapsed": None, "connect": None}
+    try:
+        with harness.working_directory(workdir), harness.quiet_stdout():
+            module = harness.load_module(path, f"{transport}_client")
+            module.SERVER_HOST, module.SERVER_PORT = "127.0.0.1", port
+            download_dir = module.DOWNLOAD_DIR if transport == "tcp" else module.DIR_DOWNLOADED
+            os.makedirs(download_dir, exist_ok=True)
+
+            client = module.Client()
+            started = time.monotonic()
+            connected = client.connect_to_server()
+            report["connect"] = time.monotonic() - started
+
+            barrier.wait(timeout)
+            started = time.monotonic()
+            ok = connected and client.download_file(FILENAME)
+            report["elapsed"] = time.monotonic() - started
+            report["ok"] = bool(ok) and filecmp.cmp(source, os.path.join(download_dir, FILENAME), shallow=False)
+    except Exception as e:
+        report["error"] = str(e)
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    report["cpu"] = usage.ru_utime + usage.ru_stime
+    report["rss"] = usage.ru_maxrss * 1024
+    results.put(report)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_scenario(tmp, transport, size, concurrency, profile, timeout=CLIENT_TIMEOUT):
+    """
+    Chạy một kịch bản với server mới; trả về dict các chỉ số.
+    """
+    files_dir = os.path.join(tmp, f"files_{size}")
+    source = os.path.join(files_dir, FILENAME)
+    if not os.path.exists(source):
+        harness.make_file(source, size)
+
+    workdir = tempfile.mkdtemp(dir=tmp)
+    start_server = harness.start_tcp_server if transport == "tcp" else harness.start_udp_server
+    process, port = start_server(os.path.join(workdir, "server"), files_dir)
+
+    settings = PROFILES[profile]
+    network = None
+    if settings["delay"] or settings["loss"]:
+        if transport == "tcp":
+            network = relay.TcpRelay(("127.0.0.1", port), settings["delay"])
+        else:
+            network = relay.UdpRelay(("127.0.0.1", port), settings["delay"], settings["loss"])
+        port = network.start()
+
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(concurrency + 1)
+    results = context.Queue()
+    clients = [context.Process(target=client_run,
+                               args=(transport, port, source, os.path.join(workdir, f"client{index}"),
+                                     barrier, results, timeout))
+               for index in range(concurrency)]
+    reports = []
+    server_cpu = 0.0
+    server_rss = 0
+    try:
+        for client in clients:
+            client.start()
+        barrier.wait(timeout)
+        cpu_before = harness.process_cpu_time(process.pid)
+
+        deadline = time.monotonic() + timeout
+        for _ in clients:
+            try:
+                reports.append(results.get(timeout=max(0.1, deadline - time.monotonic())))
+            except Exception:
+                break
+        server_cpu = harness.process_cpu_time(process.pid) - cpu_before
+        server_rss = harness.process_peak_rss(process.pid)
+    except Exception as e:
+        print(f"Error: {e}")
+    finally:
+        for client in clients:
+            client.join(1)
+            if client.is_alive():
+                client.kill()
+        if network:
+            network.stop()
+        harness.stop_process(process)
+
+    durations = [report["elapsed"] for report in reports if report["elapsed"]]
+    connects = [report["connect"] for report in reports if report["connect"]]
+    ok = len(reports) == concurrency and all(report["ok"] for report in reports)
+    return {
+        "id": f"{transport}/{size // 1024 // 1024}MB/c{concurrency}/{profile}",
+        "transport": transport,
+        "size": size,
+        "concurrency": concurrency,
+        "profile": profile,
+        "ok": ok,
+        "errors": [report["error"] for report in reports if "error" in report],
+        "throughput_mbps": size * len(durations) / max(durations) / 1024 / 1024 if durations else 0.0,
+        "duration_p50_s": statistics.median(durations) if durations else None,
+        "duration_p95_s": percentile(durations, 0.95) if durations else None,
+        "connect_ms_p50": statistics.median(connects) * 1000 if connects else None,
+        "server_cpu_s": server_cpu,
+        "client_cpu_s": sum(report["cpu"] for report in reports),
+        "server_rss_mb": server_rss / 1024 / 1024,
+        "client_rss_mb": max((report["rss"] for report in reports), default=0) / 1024 / 1024,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    So từng kịch bản với baseline; trả về danh sách (id, chỉ số, cũ, mới, % thay đổi).
+    """
+    previous = {entry["id"]: entry for entry in baseline["results"]}
+    regressions = []
+    for entry in results:
+        old = previous.get(entry["id"])
+        if old is None:
+            continue
+        if old["ok"] and not entry["ok"]:
+            regressions.append((entry["id"], "ok", True, False, None))
+            continue
+        for metric, (better, min_delta) in METRICS.items():
+            before, after = old.get(metric), entry.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100
+            worse = -change if better == "higher" else change
+            if worse > threshold and abs(after - before) > min_delta:
+                regressions.append((entry["id"], metric, before, after, change))
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=harness.ROOT,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transports", nargs="+", choices=["tcp", "udp"], default=["tcp", "udp"])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 16], help="Kích thước file (MB)")
+    parser.add_argument("--udp-max-size", type=int, default=4,
+                        help="Bỏ qua UDP với file lớn hơn (MB), checksum tính bằng Python nên UDP chậm")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4], help="Số client đồng thời")
+    parser.add_argument("--profiles", nargs="+", choices=list(PROFILES), default=list(PROFILES))
+    parser.add_argument("--repeat", type=int, default=1, help="Số lần chạy mỗi kịch bản (lấy trung vị)")
+    parser.add_argument("--timeout", type=float, default=CLIENT_TIMEOUT, help="Thời gian tối đa mỗi kịch bản (giây)")
+    parser.add_argument("--quick", action="store_true", help="Ma trận nhỏ: 1MB, 1 client, loopback")
+    parser.add_argument("--output", default="benchmark_results.json", help="File JSON kết quả")
+    parser.add_argument("--baseline", help="File JSON baseline để so sánh")
+    parser.add_argument("--save-baseline", help="Ghi kết quả lần chạy này làm baseline")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Ngưỡng hồi quy (%%)")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.sizes, args.concurrency, args.profiles = [1], [1], ["loopback"]
+
+    scenarios = [(transport, size * 1024 * 1024, concurrency, profile)
+                 for transport in args.transports
+                 for size in args.sizes
+                 for concurrency in args.concurrency
+                 for profile in args.profiles
+                 if transport == "tcp" or size <= args.udp_max_size]
+
+    print(f"{'scenario':28} {'ok':>5} {'throughput':>12} {'p50':>8} {'p95':>8} {'connect':>9} "
+          f"{'srv cpu':>8} {'srv rss':>8} {'cli cpu':>8} {'cli rss':>8}")
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for scenario in scenarios:
+            runs = [run_scenario(tmp, *scenario, args.timeout) for _ in range(args.repeat)]
+            runs.sort(key=lambda run: run["throughput_mbps"])
+            entry = runs[len(runs) // 2]
+            entry["ok"] = all(run["ok"] for run in runs)
+            results.append(entry)
+
+            def fmt(value, unit, spec="7.2f"):
+                return f"{value:{spec}}{unit}" if value is not None else "-"
+            print(f"{entry['id']:28} {str(entry['ok']):>5} {fmt(entry['throughput_mbps'], 'MB/s', '8.1f'):>12} "
+                  f"{fmt(entry['duration_p50_s'], 's'):>8} {fmt(entry['duration_p95_s'], 's'):>8} "
+                  f"{fmt(entry['connect_ms_p50'], 'ms', '7.1f'):>9} {fmt(entry['server_cpu_s'], 's'):>8} "
+                  f"{fmt(entry['server_rss_mb'], 'MB', '6.1f'):>8} {fmt(entry['client_cpu_s'], 's'):>8} "
+                  f"{fmt(entry['client_rss_mb'], 'MB', '6.1f'):>8}")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as out:
+        json.dump(report, out, indent=2)
+    print(f"Results written to {args.output}")
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as out:
+            json.dump(report, out, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    failed = [entry["id"] for entry in results if not entry["ok"]]
+    for scenario_id in failed:
+        print(f"FAILED: {scenario_id}")
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, args.threshold)
+        print(f"Compared with baseline {args.baseline} (revision {baseline['meta'].get('revision')}), "
+              f"threshold {args.threshold:.0f}%")
+        for scenario_id, metric, before, after, change in regressions:
+            if change is None:
+                print(f"REGRESSION: {scenario_id} {metric}: was passing, now failing")
+            else:
+                print(f"REGRESSION: {scenario_id} {metric}: {before:.3f} -> {after:.3f} ({change:+.1f}%)")
+        if not regressions:
+            print("No regressions.")
+
+    if failed or regressions:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""
+Nạp các script client/server như module cho test (giống benchmarks/harness.py).
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "SOURCE"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import harness  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def tcp_server(tmp_path_factory):
+    # Server tạo thư mục logs trong thư mục hiện tại khi được nạp
+    with harness.working_directory(str(tmp_path_factory.mktemp("tcp_server"))):
+        return harness.load_module(harness.TCP_SERVER, "test_tcp_server")
+
+
+@pytest.fixture(scope="session")
+def tcp_client():
+    return harness.load_module(harness.TCP_CLIENT, "test_tcp_client")
@@ -0,0 +1,91 @@
+"""
+Delta sync: lệnh do server sinh (generate_delta) phải dựng lại đúng bản mới ở client (apply_delta).
+"""
+import hashlib
+import io
+import random
+import zlib
+
+import pytest
+
+BLOCK_SIZE = 1024
+
+
+class StreamReader:
+    """
+    Đọc phản hồi delta đã mã hóa từ bộ nhớ thay cho FrameReader.
+    """
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+
+    def read_exact(self, size):
+        data = self.stream.read(size)
+        assert len(data) == size, "delta stream ended early"
+        return data
+
+
+def signatures(data):
+    blocks = (data[i:i + BLOCK_SIZE] for i in range(0, len(data) - BLOCK_SIZE + 1, BLOCK_SIZE))
+    return [(zlib.adler32(block), hashlib.blake2b(block, digest_size=16).digest()) for block in blocks]
+
+
+def round_trip(server, client, old, new):
+    """
+    Mã hóa các lệnh như handle_delta, dựng lại bằng apply_delta; trả về (bản dựng lại, số byte literal).
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    response = bytearray()
+    literal = 0
+    for op in server.generate_delta(io.BytesIO(new), BLOCK_SIZE, signatures(old), digest):
+        if op[0] == "copy":
+            response += server.DELTA_OP.pack(server.DELTA_COPY, op[1], op[2])
+        else:
+            literal += len(op[1])
+            response += server.DELTA_OP.pack(server.DELTA_DATA, len(op[1]), 0) + op[1]
+    response += server.DELTA_OP.pack(server.DELTA_END, 0, 0) + digest.digest()
+
+    rebuilt = io.BytesIO()
+    actual, expected = client.apply_delta(StreamReader(bytes(response)), io.BytesIO(old), rebuilt, BLOCK_SIZE)
+    assert actual == expected
+    return rebuilt.getvalue(), literal
+
+
+OLD = random.Random(0).randbytes(64 * BLOCK_SIZE + 300)
+
+# Bản mới và số byte literal tối đa: phần sửa cộng các block bị phần sửa chạm tới và đoạn cuối lẻ (300 byte)
+EDITS = {
+    "unchanged": (OLD, 300),
+    "insert": (OLD[:20000] + b"inserted" * 100 + OLD[20000:], 300 + 800 + 2 * BLOCK_SIZE),
+    "delete": (OLD[:10000] + OLD[25000:], 300 + 2 * BLOCK_SIZE),
+    "shift": (b"xyz" + OLD, 300 + 3),
+    "overwrite": (OLD[:5000] + bytes(100) + OLD[5100:], 300 + 2 * BLOCK_SIZE),
+    "truncate": (OLD[:40 * BLOCK_SIZE], 0),
+    "append": (OLD + b"tail" * 50, 300 + 200),
+}
+
+
+@pytest.mark.parametrize("edit", EDITS)
+def test_round_trip_reuses_unchanged_blocks(tcp_server, tcp_client, edit):
+    new, max_literal = EDITS[edit]
+    rebuilt, literal = round_trip(tcp_server, tcp_client, OLD, new)
+    assert rebuilt == new
+    assert literal <= max_literal
+
+
+def test_empty_old_file_sends_everything(tcp_server, tcp_client):
+    rebuilt, literal = round_trip(tcp_server, tcp_client, b"", OLD)
+    assert rebuilt == OLD
+    assert literal == len(OLD)
+
+
+def test_empty_new_file(tcp_server, tcp_client):
+    rebuilt, literal = round_trip(tcp_server, tcp_client, OLD, b"")
+    assert rebuilt == b""
+    assert literal == 0
+
+
+def test_short_local_copy_is_rejected(tcp_server, tcp_client):
+    # Lệnh COPY trỏ ra ngoài bản cũ (bản cục bộ bị cắt sau khi tính chữ ký)
+    response = tcp_server.DELTA_OP.pack(tcp_server.DELTA_COPY, 60, 10)
+    with pytest.raises(ValueError):
+        tcp_client.apply_delta(StreamReader(response), io.BytesIO(OLD), io.BytesIO(), BLOCK_SIZE)
@@ -0,0 +1,76 @@
+"""
+FairShareScheduler: khi nhiều client cùng có tồn đọng, mỗi client nhận phần byte theo trọng số của mình.
+"""
+QUANTUM = 64 * 1024
+RATE = 64 * 1024 * 1024  # Đủ chậm để thứ tự gửi (send_at) tăng dần, đủ nhanh để test chạy trong ~0.1s
+
+
+def schedule(scheduler, backlog):
+    """
+    Xếp hàng toàn bộ tồn đọng {client: (các lát, trọng số)} rồi chờ cấp hết; trả về thứ tự gửi [(client, byte)].
+    """
+    tickets = {key: scheduler.submit(key, sizes, weight) for key, (sizes, weight) in backlog.items()}
+    for key, queued in tickets.items():
+        scheduler.wait(queued[-1])
+    for key, queued in tickets.items():
+        scheduler.release(key, queued)
+    granted = sorted((ticket["send_at"], key, ticket["nbytes"]) for key, queued in tickets.items() for ticket in queued)
+    return [(key, nbytes) for _, key, nbytes in granted]
+
+
+def backlogged_shares(order, backlog):
+    """
+    Số byte mỗi client đã được gửi sau từng lượt, cho đến khi client đầu tiên gửi hết tồn đọng.
+    """
+    remaining = {key: sum(sizes) for key, (sizes, _) in backlog.items()}
+    sent = dict.fromkeys(backlog, 0)
+    for key, nbytes in order:
+        sent[key] += nbytes
+        remaining[key] -= nbytes
+        if not remaining[key]:
+            return
+        yield dict(sent)
+
+
+def test_equal_clients_share_evenly(tcp_server):
+    backlog = {client: ([QUANTUM] * 32, 1) for client in ("10.0.0.1", "10.0.0.2", "10.0.0.3")}
+    order = schedule(tcp_server.FairShareScheduler(RATE, QUANTUM), backlog)
+    shares = list(backlogged_shares(order, backlog))
+    assert shares
+    for sent in shares:
+        assert max(sent.values()) - min(sent.values()) <= QUANTUM
+
+
+def test_share_is_by_bytes_not_slices(tcp_server):
+    # Client gửi lát nhỏ không bị thiệt so với client gửi lát lớn (và ngược lại)
+    backlog = {
+        "large": ([QUANTUM] * 16, 1),
+        "medium": ([16 * 1024] * 64, 1),
+        "small": ([4 * 1024] * 256, 1),
+    }
+    order = schedule(tcp_server.FairShareScheduler(RATE, QUANTUM), backlog)
+    for sent in backlogged_shares(order, backlog):
+        assert max(sent.values()) - min(sent.values()) <= 2 * QUANTUM
+    # Cả ba cùng hết tồn đọng trong vòng cuối
+    last = {key: max(index for index, (client, _) in enumerate(order) if client == key) for key in backlog}
+    assert len(order) - min(last.values()) <= len(order) // 8
+
+
+def test_weights_scale_the_share(tcp_server):
+    backlog = {"high": ([QUANTUM] * 64, 2), "normal": ([QUANTUM] * 64, 1)}
+    order = schedule(tcp_server.FairShareScheduler(RATE, QUANTUM), backlog)
+    shares = list(backlogged_shares(order, backlog))
+    assert shares[-1]["high"] >= 60 * QUANTUM
+    for sent in shares:
+        assert abs(sent["high"] - 2 * sent["normal"]) <= 2 * QUANTUM
+
+
+def test_release_drops_unsent_slices(tcp_server):
+    scheduler = tcp_server.FairShareScheduler(RATE, QUANTUM)
+    gone = scheduler.submit("gone", [QUANTUM] * 8)
+    stays = scheduler.submit("stays", [QUANTUM] * 8)
+    scheduler.release("gone", gone)  # Client ngắt trước khi gửi
+    scheduler.wait(stays[-1])
+    scheduler.release("stays", stays)
+    assert all(ticket["send_at"] is None for ticket in gone)
+    assert not scheduler.flows and not scheduler.active
@@ -0,0 +1,119 @@
+"""
+SequenceWindow: theo dõi gói UDP đã nhận, SACK giữa client và server, trạng thái để tải tiếp.
+"""
+import random
+
+from common.sequence import TRIM_BYTES, SequenceWindow
+
+
+def assert_same(window, received, total):
+    assert len(window) == len(received)
+    assert [seq for seq in range(total) if seq in window] == sorted(received)
+    assert window.complete == (len(received) == total)
+
+
+def test_in_order_packets_advance_base_and_trim_bitmap():
+    total = 64 * TRIM_BYTES
+    window = SequenceWindow(total)
+    for seq in range(total - 1):
+        assert window.add(seq)
+        assert window.base == seq + 1
+    assert len(window.bits) < TRIM_BYTES  # Phần đã nhận liền mạch được bỏ khỏi bitmap
+    assert not window.complete
+    window.add(total - 1)
+    assert window.complete
+    assert window.missing() == []
+
+
+def test_out_of_order_packets():
+    window = SequenceWindow(20)
+    for seq in (5, 3, 9, 0, 1):
+        assert window.add(seq)
+    assert window.base == 2
+    assert window.highest == 10
+    assert window.missing() == [2, 4, 6, 7, 8]
+    assert window.missing(12) == [2, 4, 6, 7, 8, 10, 11]
+    window.add(2)
+    window.add(4)
+    assert window.base == 6
+    assert_same(window, {0, 1, 2, 3, 4, 5, 9}, 20)
+
+
+def test_shuffled_packets_across_trimmed_bytes():
+    total = 20 * 1000 + 3
+    order = list(range(total))
+    random.Random(1).shuffle(order)
+    window = SequenceWindow(total)
+    received = set()
+    for seq in order:
+        assert window.add(seq)
+        received.add(seq)
+        if len(received) % 997 == 0:
+            assert_same(window, received, total)
+            assert window.base == min(set(range(total + 1)) - received)
+    assert window.complete and len(window) == total
+
+
+def test_duplicates_are_reported_and_not_counted():
+    window = SequenceWindow(100)
+    assert window.add(7)
+    assert not window.add(7)
+    for seq in range(80):
+        window.add(seq)
+    assert len(window) == 80
+    assert not window.add(3)  # Dưới base (đã cắt khỏi bitmap)
+    assert not window.add(100)  # Ngoài file
+    assert not window.add(-1)
+    assert len(window) == 80
+
+
+def test_sack_round_trip():
+    total = 5000
+    receiver = SequenceWindow(total)
+    received = set(random.Random(2).sample(range(total), 3000)) | set(range(1200))
+    for seq in received:
+        receiver.add(seq)
+
+    # Mã hóa như client (origin + bitmap hex) rồi gộp vào cửa sổ của bên gửi
+    origin, bits = receiver.sack()
+    _, _, origin, bits = f"SACK|0|{origin}|{bits.hex()}".split("|")
+    sender = SequenceWindow(total)
+    sender.merge(int(origin), bytes.fromhex(bits))
+    assert_same(sender, received, total)
+    assert sender.missing(total) == receiver.missing(total)
+
+
+def test_stale_and_repeated_sacks_do_not_lose_or_double_count():
+    total = 2000
+    receiver = SequenceWindow(total)
+    sender = SequenceWindow(total)
+    for seq in range(0, 1800, 3):
+        receiver.add(seq)
+    stale = receiver.sack()
+    for seq in range(1800):
+        receiver.add(seq)
+    sender.merge(*receiver.sack())
+    sender.merge(*stale)  # SACK cũ đến muộn
+    sender.merge(*receiver.sack())  # SACK lặp lại
+    assert_same(sender, set(range(1800)), total)
+
+
+def test_sack_ahead_of_sender_with_partial_bitmap():
+    sender = SequenceWindow(1000)
+    for seq in (1, 2, 30, 70):
+        sender.add(seq)
+    receiver = SequenceWindow(1000)
+    for seq in list(range(800)) + [850]:
+        receiver.add(seq)
+    sender.merge(*receiver.sack())
+    assert_same(sender, set(range(800)) | {850}, 1000)
+
+
+def test_state_round_trip():
+    window = SequenceWindow(10000)
+    received = set(random.Random(3).sample(range(10000), 4000)) | set(range(2000))
+    for seq in received:
+        window.add(seq)
+    restored = SequenceWindow.from_bytes(window.to_bytes())
+    assert restored.base == window.base
+    assert_same(restored, received, 10000)
@@ -0,0 +1,124 @@
+"""
+Chế độ stream: OrderedBuffer sắp xếp lại range về không theo thứ tự, cửa sổ chặn luồng tải khi người đọc chậm,
+DownloadStream dừng được trong lúc người đọc đang chờ.
+"""
+import random
+import threading
+
+import pytest
+
+from common.streaming import DownloadStream, OrderedBuffer
+
+MB = 1024 * 1024
+
+
+def read_in_thread(stream, size=-1):
+    """
+    Đọc trong một luồng riêng; trả về (luồng, dict kết quả/lỗi).
+    """
+    result = {}
+
+    def read():
+        try:
+            result["data"] = stream.read(size)
+        except Exception as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=read, daemon=True)
+    thread.start()
+    return thread, result
+
+
+def test_out_of_order_puts_are_read_in_order():
+    data = random.Random(0).randbytes(256 * 1024)
+    pieces = [(offset, data[offset:offset + 10000]) for offset in range(0, len(data), 10000)]
+    random.Random(1).shuffle(pieces)
+    buffer = OrderedBuffer(len(data), len(data))
+    for offset, piece in pieces:
+        buffer.put(offset, piece)
+    buffer.finish()
+    assert buffer.peak == len(data)
+    assert DownloadStream(buffer).read() == data
+    assert buffer.buffered == 0
+
+
+def test_reader_waits_for_the_gap():
+    buffer = OrderedBuffer(300, 300)
+    stream = DownloadStream(buffer)
+    buffer.put(100, b"b" * 100)
+    buffer.put(200, b"c" * 100)
+    thread, result = read_in_thread(stream, 300)
+    thread.join(0.2)
+    assert thread.is_alive()  # Range đầu chưa về: người đọc phải chờ
+    buffer.put(0, b"a" * 100)
+    thread.join(2)
+    assert result["data"] == b"a" * 100  # Mỗi lần đọc trả tối đa một đoạn liền nhau
+    assert stream.read() == b"b" * 100 + b"c" * 100
+
+
+def test_window_blocks_download_until_reader_consumes(tcp_client):
+    size = 8 * MB
+    window = 2 * tcp_client.RANGE_SIZE
+    buffer = OrderedBuffer(size, window)
+    part_bounds = [(part * size // 4, (part + 1) * size // 4) for part in range(4)]
+    scheduler = tcp_client.StreamScheduler(part_bounds, [], buffer)
+    buffer.on_consume = scheduler.wake
+    mirror = tcp_client.Mirror("127.0.0.1", 0)
+
+    # Chỉ các range bắt đầu trong cửa sổ được giao, theo thứ tự offset
+    first = scheduler.take(mirror, block=False)
+    second = scheduler.take(mirror, block=False)
+    assert (first[1], second[1]) == (0, tcp_client.RANGE_SIZE)
+    assert scheduler.take(mirror, block=False) is None
+
+    # Luồng tải đứng chờ đến khi người đọc lấy dữ liệu
+    taken = {}
+    thread = threading.Thread(target=lambda: taken.update(task=scheduler.take(mirror)), daemon=True)
+    thread.start()
+    thread.join(0.2)
+    assert thread.is_alive()
+    buffer.put(0, bytes(first[2] - first[1]))
+    scheduler.complete(mirror, first[2] - first[1], 0.01, first)
+    assert len(DownloadStream(buffer).read(MB)) == MB
+    thread.join(2)
+    assert taken["task"][1] == window
+    assert taken["task"][1] < buffer.limit() == MB + window
+
+
+def test_finish_with_error_wakes_waiting_reader():
+    buffer = OrderedBuffer(MB, MB)
+    stream = DownloadStream(buffer)
+    buffer.put(0, b"x" * 1000)
+    assert stream.read(1000) == b"x" * 1000
+    thread, result = read_in_thread(stream)
+    thread.join(0.2)
+    assert thread.is_alive()
+    buffer.finish(ConnectionResetError("mirror went away"))
+    thread.join(2)
+    assert isinstance(result["error"], ConnectionResetError)
+
+
+def test_download_ending_early_is_an_error():
+    buffer = OrderedBuffer(2000, 2000)
+    buffer.put(0, b"y" * 1000)
+    buffer.finish()
+    stream = DownloadStream(buffer)
+    assert stream.read(1000) == b"y" * 1000
+    with pytest.raises(ConnectionError):
+        stream.read(1)
+
+
+def test_close_aborts_download_while_reader_waits(tcp_client):
+    buffer = OrderedBuffer(4 * MB, MB)
+    scheduler = tcp_client.StreamScheduler([(0, 4 * MB)], [], buffer)
+    stream = DownloadStream(buffer, scheduler.abort)
+    thread, result = read_in_thread(stream)
+    thread.join(0.2)
+    assert thread.is_alive()
+    stream.close()
+    thread.join(2)
+    assert isinstance(result["error"], ValueError)
+    assert scheduler.aborted
+    assert scheduler.take(tcp_client.Mirror("127.0.0.1", 0)) is None
+    buffer.put(0, b"late")  # Range về sau khi đóng bị bỏ
+    assert buffer.buffered == 0
@@ -0,0 +1,43 @@
+"""
+PieceMap: piece chỉ được coi là đã có khi mọi byte của nó đã được ghi.
+"""
+from common.swarm import PIECE_SIZE, PieceMap
+
+
+def test_ranges_across_pieces():
+    pieces = PieceMap(3 * PIECE_SIZE + 100)
+    pieces.add(0, PIECE_SIZE + 10)
+    assert pieces.has(0, PIECE_SIZE)
+    assert not pieces.has(0, PIECE_SIZE + 11)
+    pieces.add(PIECE_SIZE + 10, 3 * PIECE_SIZE + 100)
+    assert pieces.has(0, 3 * PIECE_SIZE + 100)
+    assert pieces.bitmap() == b"\x0f"
+
+
+def test_range_reported_twice_does_not_fill_a_hole():
+    pieces = PieceMap(2 * PIECE_SIZE)
+    half = PIECE_SIZE // 2
+    pieces.add(0, half)
+    pieces.add(0, half)  # Range tải lại sau lỗi
+    assert pieces.received[0] == half
+    assert not pieces.has(0, PIECE_SIZE)
+    pieces.add(half - 100, PIECE_SIZE + 100)
+    assert pieces.received[0] == PIECE_SIZE
+    assert pieces.has(0, PIECE_SIZE)
+    assert pieces.bitmap() == b"\x01"
+
+
+def test_out_of_order_spans_merge():
+    pieces = PieceMap(PIECE_SIZE)
+    for start in range(PIECE_SIZE - 4096, -1, -4096):
+        pieces.add(start, start + 4096)
+    assert pieces.spans[0] == [(0, PIECE_SIZE)]
+    assert pieces.has(0, PIECE_SIZE)
+
+
+def test_complete_map():
+    pieces = PieceMap(PIECE_SIZE + 1, complete=True)
+    pieces.add(0, 10)
+    assert pieces.received == [PIECE_SIZE, 1]
+    assert pieces.has(0, PIECE_SIZE + 1)
+    assert not pieces.has(0, PIECE_SIZE + 2)